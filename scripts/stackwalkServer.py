@@ -0,0 +1,23 @@
+#! /usr/bin/env python
+"""a long-lived stackwalker for the processor's stackwalker pool (see
+socorro.processor.stackwalker).  It reads dump pathnames from stdin, runs
+the given command for each one with DUMPFILEPATHNAME replaced by the
+pathname, and writes the command's output followed by an end-of-output line
+with its return code.
+
+It still starts the command, which loads its symbols, for every dump, so it
+is no faster than the processor's stackwalkCommandLine: it is there to try
+the pool out.  The pool is worth running with a stackwalker that speaks the
+protocol itself.
+
+usage: stackwalkServer.py command [arguments...]"""
+
+import sys
+
+import socorro.processor.stackwalker as stackwalker
+
+if __name__ == '__main__':
+  if len(sys.argv) < 2:
+    print >>sys.stderr, __doc__
+    sys.exit(2)
+  stackwalker.serve(sys.argv[1:], sys.stdin, sys.stdout)
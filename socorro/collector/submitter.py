@@ -138,6 +138,9 @@ def submitter (config):
                 processTime = statsPool.processTime.read()
                 logger.info('average time in last five minutes: %s', \
                       processTime)
+                processTimeSnapshot = statsPool.processTime.snapshot()
+                logger.info('p50/p95/p99 time (ms) in last five minutes: '
+                            '%(p50)s/%(p95)s/%(p99)s', processTimeSnapshot)
         statsReportingWaitingFunc.reportingCounter += 1
     statsReportingWaitingFunc.reportingCounter = 0
 
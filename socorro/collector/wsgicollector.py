@@ -22,26 +22,26 @@ class Collector(object):
   uri = '/submit'
   #-----------------------------------------------------------------------------
   def POST(self, *args):
-    crashStorage = self.context.crashStoragePool.crashStorage()
-    theform = web.input()
+    with self.context.crashStoragePool.borrowed() as crashStorage:
+      theform = web.input()
 
-    dump = theform[self.context.dumpField]
-    currentTimestamp = utc_now()
-    jsonDataDictionary = crashStorage.makeJsonDictFromForm(theform)
-    jsonDataDictionary.submitted_timestamp = currentTimestamp.isoformat()
-    #for future use when we start sunsetting products
-    #if crashStorage.terminated(jsonDataDictionary):
-      #return "Terminated=%s" % jsonDataDictionary.Version
-    ooid = sooid.createNewOoid(currentTimestamp)
-    jsonDataDictionary.legacy_processing = \
-        self.legacyThrottler.throttle(jsonDataDictionary)
-    self.logger.info('%s received', ooid)
-    result = crashStorage.save_raw(ooid,
-                                   jsonDataDictionary,
-                                   dump,
-                                   currentTimestamp)
-    if result == cstore.CrashStorageSystem.DISCARDED:
-      return "Discarded=1\n"
-    elif result == cstore.CrashStorageSystem.ERROR:
-      raise Exception("CrashStorageSystem ERROR")
-    return "CrashID=%s%s\n" % (self.dumpIDPrefix, ooid)
+      dump = theform[self.context.dumpField]
+      currentTimestamp = utc_now()
+      jsonDataDictionary = crashStorage.makeJsonDictFromForm(theform)
+      jsonDataDictionary.submitted_timestamp = currentTimestamp.isoformat()
+      #for future use when we start sunsetting products
+      #if crashStorage.terminated(jsonDataDictionary):
+        #return "Terminated=%s" % jsonDataDictionary.Version
+      ooid = sooid.createNewOoid(currentTimestamp)
+      jsonDataDictionary.legacy_processing = \
+          self.legacyThrottler.throttle(jsonDataDictionary)
+      self.logger.info('%s received', ooid)
+      result = crashStorage.save_raw(ooid,
+                                     jsonDataDictionary,
+                                     dump,
+                                     currentTimestamp)
+      if result == cstore.CrashStorageSystem.DISCARDED:
+        return "Discarded=1\n"
+      elif result == cstore.CrashStorageSystem.ERROR:
+        raise Exception("CrashStorageSystem ERROR")
+      return "CrashID=%s%s\n" % (self.dumpIDPrefix, ooid)
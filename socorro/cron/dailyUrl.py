@@ -7,7 +7,11 @@ import datetime as dt
 import gzip
 import csv
 import time
+import os
 import os.path
+import Queue
+import sys
+import threading
 
 import contextlib
 
@@ -63,6 +67,11 @@ sql = """
       order by 5 -- r.date_processed, munged
       """
 
+# the same query through COPY: the rows come as tab separated text, with NULL
+# written as \N like process_crash writes it
+copy_sql = ("COPY (%s) TO STDOUT WITH CSV HEADER DELIMITER AS E'\\t' "
+            "NULL AS E'\\\\N'")
+
 #-------------------------------------------------------------------------------
 def setup_query_parameters(config):
     now = config.day + dt.timedelta(1)
@@ -101,9 +110,46 @@ def setup_query_parameters(config):
                           'prod_phrase' : prod_phrase,
                           'ver_phrase' : ver_phrase})
 
+#-------------------------------------------------------------------------------
+class BufferedGzipFile(object):
+    """a gzip file that compresses what is written to it in blocks of about
+    'buffer_size' bytes.  The csv writer writes each row on its own, and
+    compressing them one by one took more time than compressing the data."""
+
+    #---------------------------------------------------------------------------
+    def __init__(self, path, mode, buffer_size=256 * 1024, gzip=gzip):
+        self.gzip_file = gzip.open(path, mode)
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+
+    #---------------------------------------------------------------------------
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    #---------------------------------------------------------------------------
+    def flush(self):
+        if self.buffer:
+            self.gzip_file.write(''.join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+
+    #---------------------------------------------------------------------------
+    def close(self):
+        self.flush()
+        self.gzip_file.close()
+
+#-------------------------------------------------------------------------------
+class buffered_gzip(object):
+    """stands in for the gzip module in gzipped_csv_files"""
+    open = BufferedGzipFile
+
 #-------------------------------------------------------------------------------
 @contextlib.contextmanager
-def gzipped_csv_files(config, gzip=gzip, csv=csv):
+def gzipped_csv_files(config, gzip=buffered_gzip, csv=csv):
     private_out_filename = ("%s-crashdata.csv.gz"
                             % config.day.strftime('%Y%m%d'))
     private_out_pathname = os.path.join(config.outputPath,
@@ -133,36 +179,159 @@ def gzipped_csv_files(config, gzip=gzip, csv=csv):
     if public_gzip_file_handle:
         public_gzip_file_handle.close()
 
+#-------------------------------------------------------------------------------
+class BackgroundCsvWriter(object):
+    """a csv writer whose rows are formatted and compressed by a thread of its
+    own.  Rows are handed to the thread in batches of 'batch_size' through a
+    queue of at most 'queue_size' batches, so the thread that reads the
+    database waits only when the writer falls behind.  'close' writes what is
+    left and raises the exception that stopped the thread, if any."""
+
+    #---------------------------------------------------------------------------
+    def __init__(self, csv_writer, name, batch_size=1000, queue_size=16):
+        self.csv_writer = csv_writer
+        self.batch_size = batch_size
+        self.batch = []
+        self.queue = Queue.Queue(queue_size)
+        self.exc_info = None
+        self.thread = threading.Thread(target=self._run, name=name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    #---------------------------------------------------------------------------
+    def writerow(self, row):
+        self.batch.append(row)
+        if len(self.batch) >= self.batch_size:
+            self.queue.put(self.batch)
+            self.batch = []
+
+    #---------------------------------------------------------------------------
+    def close(self):
+        if self.batch:
+            self.queue.put(self.batch)
+            self.batch = []
+        self.queue.put(None)
+        self.thread.join()
+        if self.exc_info:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+    #---------------------------------------------------------------------------
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            if self.exc_info:
+                continue  # keep draining the queue so that writerow can't block
+            try:
+                self.csv_writer.writerows(batch)
+            except Exception:
+                self.exc_info = sys.exc_info()
+
+#-------------------------------------------------------------------------------
+@contextlib.contextmanager
+def background_csv_writers(file_handles_tuple, batch_size=1000):
+    """wrap the private and public csv writers in BackgroundCsvWriters, so
+    that the two files are compressed in parallel"""
+    names = ('dailyUrlPrivateWriter', 'dailyUrlPublicWriter')
+    writers = tuple(BackgroundCsvWriter(x, name, batch_size) if x else None
+                    for x, name in zip(file_handles_tuple, names))
+    try:
+        yield writers
+    finally:
+        for a_writer in writers:
+            if a_writer:
+                a_writer.close()
+
+#-------------------------------------------------------------------------------
+class OsVersionCache(object):
+    """the results of IdCache.getAppropriateOsVersion, which runs up to three
+    regular expressions over a version, for every pair of os name and version
+    seen so far.  A day of crashes has a few thousand distinct pairs for
+    hundreds of thousands of crashes."""
+
+    #---------------------------------------------------------------------------
+    def __init__(self, id_cache):
+        self.id_cache = id_cache
+        self.versions = {}
+
+    #---------------------------------------------------------------------------
+    def getAppropriateOsVersion(self, name, origVersion):
+        try:
+            return self.versions[(name, origVersion)]
+        except KeyError:
+            version = self.id_cache.getAppropriateOsVersion(name, origVersion)
+            self.versions[(name, origVersion)] = version
+            return version
+
+#-------------------------------------------------------------------------------
+def fetch_rows(cursor, sql_query, fetch_size):
+    """yield the rows of the query from a named (server-side) cursor,
+    'fetch_size' rows at a time, instead of having the whole day of crashes
+    sent to the client at once"""
+    cursor.execute(sql_query)
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        for a_row in rows:
+            yield a_row
+
+#-------------------------------------------------------------------------------
+def copy_rows(cursor, sql_query):
+    """yield the rows of the query, column names first, read with COPY ... TO
+    STDOUT.  The values are the text that PostgreSQL writes for them, which
+    is what the csv writer makes of the values from a cursor, except for
+    arrays, which process_crash handles.  COPY writes to a pipe from a thread
+    of its own while the rows are read."""
+    read_fd, write_fd = os.pipe()
+    copy_out = os.fdopen(write_fd, 'w')
+    copy_in = os.fdopen(read_fd)
+    failure = []
+    def copy():
+        try:
+            cursor.copy_expert(copy_sql % sql_query, copy_out)
+        except Exception:
+            failure.append(sys.exc_info())
+        finally:
+            copy_out.close()
+    copy_thread = threading.Thread(target=copy, name='dailyUrlCopy')
+    copy_thread.daemon = True
+    copy_thread.start()
+    try:
+        for a_row in csv.reader(copy_in, delimiter='\t'):
+            yield a_row
+    finally:
+        copy_in.close()
+        copy_thread.join()
+    if failure:
+        raise failure[0][0], failure[0][1], failure[0][2]
+
 #-------------------------------------------------------------------------------
 def process_crash(a_crash_row, id_cache):
-    column_value_list = []
-    os_name = None
-    ooid = ''
-    for i, x in enumerate(a_crash_row):
-        if x is None:
-            x = r'\N'
-        if i == 2:
-            ooid = x.rsplit('/',1)[-1]
-        if i == 10: #r.os_name
-            x = os_name = x.strip()
-        if i == 11: #r.os_version
-            # per bug 519703
-            x = id_cache.getAppropriateOsVersion(os_name, x)
-            os_name=None
-        if i == 14: #bug_associations.bug_id
-            x = ','.join(str(bugid) for bugid in x)
-        if i == 15: #r.user_comments
-            x = x.replace('\t',' '); # per bug 519703
-        if i == 17: #r.email -- show 'email' if the email is likely useful
-            # per bugs 529431/519703
-            if '@' in x:
-                x='yes'
-            else:
-                x = ''
-        if type(x) == str:
-            x = x.strip().replace('\r','').replace('\n',' | ')
-        column_value_list.append(x)
-    return column_value_list
+    column_value_list = [r'\N' if x is None else x for x in a_crash_row]
+    # r.os_name
+    os_name = column_value_list[10] = column_value_list[10].strip()
+    # r.os_version, per bug 519703
+    column_value_list[11] = id_cache.getAppropriateOsVersion(
+                              os_name, column_value_list[11])
+    # bug_associations.bug_id
+    bug_list = column_value_list[14]
+    if isinstance(bug_list, basestring):
+        column_value_list[14] = bug_list.strip('{}') # an array as COPY writes it
+    else:
+        column_value_list[14] = ','.join(str(bugid) for bugid in bug_list)
+    # r.user_comments, per bug 519703
+    column_value_list[15] = column_value_list[15].replace('\t',' ')
+    # r.email -- show 'email' if the email is likely useful
+    # per bugs 529431/519703
+    if '@' in column_value_list[17]:
+        column_value_list[17] = 'yes'
+    else:
+        column_value_list[17] = ''
+    return [x.strip().replace('\r','').replace('\n',' | ')
+              if type(x) == str else x
+            for x in column_value_list]
 
 #-------------------------------------------------------------------------------
 def write_row(file_handles_tuple,
@@ -174,10 +343,12 @@ def write_row(file_handles_tuple,
     private_file_handle, public_file_handle = file_handles_tuple
     # logger.debug("Writing crash %s (%s)",crash_list,len(crash_list))
     private_file_handle.writerow(crash_list)
-    crash_list[1] = 'URL (removed)' # remove url
-    crash_list[17] = '' # remove email
     if public_file_handle:
-        public_file_handle.writerow(crash_list)
+        # the private writer may not have written crash_list yet
+        public_list = list(crash_list)
+        public_list[1] = 'URL (removed)' # remove url
+        public_list[17] = '' # remove email
+        public_file_handle.writerow(public_list)
 
 #-------------------------------------------------------------------------------
 def dailyUrlDump(config, sdb=sdb,
@@ -185,15 +356,20 @@ def dailyUrlDump(config, sdb=sdb,
                  IdCache=IdCache,
                  write_row=write_row,
                  process_crash=process_crash,
-                 logger=logger):
+                 logger=logger,
+                 background_csv_writers=background_csv_writers,
+                 fetch_rows=fetch_rows,
+                 copy_rows=copy_rows):
     dbConnectionPool = sdb.DatabaseConnectionPool(config, logger)
     try:
         try:
             db_conn, db_cursor = dbConnectionPool.connectionCursorPair()
 
-            with gzipped_csv_files(config) as csv_file_handles_tuple:
+            with gzipped_csv_files(config) as gzipped_csv_writers_tuple, \
+                 background_csv_writers(gzipped_csv_writers_tuple) \
+                   as csv_file_handles_tuple:
                 headers_not_yet_written = True
-                id_cache = IdCache(db_cursor)
+                id_cache = OsVersionCache(IdCache(db_cursor))
                 sql_parameters = setup_query_parameters(config)
                 logger.debug("config.day = %s; now = %s; yesterday = %s",
                              config.day,
@@ -201,10 +377,19 @@ def dailyUrlDump(config, sdb=sdb,
                              sql_parameters.yesterday_str)
                 sql_query = sql % sql_parameters
                 logger.debug("SQL is: %s", sql_query)
-                for crash_row in sdb.execute(db_cursor, sql_query):
+                if config.get('useCopy'):
+                    crash_rows = copy_rows(db_cursor, sql_query)
+                    column_names = next(crash_rows, None)
+                    get_column_names = lambda: column_names
+                else:
+                    named_cursor = db_conn.cursor('dailyUrlDump')
+                    crash_rows = fetch_rows(named_cursor, sql_query,
+                                            config.get('fetchSize', 10000))
+                    get_column_names = lambda: [x[0] for x in
+                                                named_cursor.description]
+                for crash_row in crash_rows:
                     if headers_not_yet_written:
-                        write_row(csv_file_handles_tuple,
-                                  [x[0] for x in db_cursor.description])
+                        write_row(csv_file_handles_tuple, get_column_names())
                         headers_not_yet_written = False
                     column_value_list = process_crash(crash_row, id_cache)
                     write_row(csv_file_handles_tuple,
@@ -214,4 +399,3 @@ def dailyUrlDump(config, sdb=sdb,
             dbConnectionPool.cleanup()
     except:
         util.reportExceptionAndContinue(logger)
-
@@ -269,5 +269,6 @@ class TopCrashesByUrl(object):
         logger.info("Window starting at %s had no data",startWindow)
       # whether or not we saved some data, advance to next slot
       startWindow += deltaWindow
+    logger.info("Id cache statistics: %s",socorro_cia.cacheStatistics())
     logger.info("Done processIntervals")
 
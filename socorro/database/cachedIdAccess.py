@@ -1,5 +1,4 @@
 import re
-from operator import itemgetter
 import logging
 import sys
 import threading
@@ -7,20 +6,18 @@ import time
 
 import psycopg2
 
+from socorro.lib.sharded_cache import ShardedCache
+
 logger = logging.getLogger("cachedIdAccess")
 
 maxOsIdCacheLength = 2048
 maxProductIdCacheLength = 256
 maxUriIdCacheLength = 32768
-osIdCache = None     # may become {(os_name,os_version): osdims_id}
-osIdCount = None     # may become {(os_name,os_version): count_of_cache_hits}
-productIdCache = None # may become {(product_name,version_string): productdims_id}
+osIdCache = None     # may become a ShardedCache {(os_name,os_version): osdims_id}
+productIdCache = None # may become a ShardedCache {(product_name,version_string): productdims_id}
 productBranchCache = None # may become {productdims_id: branch}
-productIdCount = None # may become {(product_name,version_string): count_of_cache_hits}
 #signatureIdCache = None  # may become {(signature,): signatureims_id}
-#signatureIdCount = None  # may become {(signature,): count_of_cache_hits}
-uriIdCache = None     # may become {(domain,url): urldims_id}
-uriIdCount = None     # may become {(domain,url): count_of_cache_hits}
+uriIdCache = None     # may become a ShardedCache {(domain,url): urldims_id}
 
 # Retain the trailing $ needed to force a match on the full value
 #-----------------------------------------------------------------------------------------------------------------
@@ -41,15 +38,17 @@ def createProductRelease(version):
   return None
 
 #-----------------------------------------------------------------------------------------------------------------
-def initializeIdCache(keyColumns, idColumn, tableName, cursor):
-  """create maps {key:id} (actual cache) and {key:0} (cache count) for all keys in the given table, and return them"""
-  sql = "SELECT %s,%s from %s"%(','.join(keyColumns),idColumn,tableName)
+def initializeIdCache(keyColumns, idColumn, tableName, cursor, maximumSize):
+  """
+  create and return a ShardedCache {key:id} whose snapshot holds the newest maximumSize keys in the given table.
+  Keys found later are kept in the cache's LRU shards, which hold at most another maximumSize of them
+  """
+  sql = "SELECT %s,%s from %s ORDER BY %s DESC LIMIT %d"%(','.join(keyColumns),idColumn,tableName,idColumn,maximumSize)
   cursor.execute(sql)
   data = cursor.fetchall()
-  idCache = dict((tuple(x[:-1]),x[-1]) for x in data)
-  idCount = dict((tuple(x[:-1]),0) for x in data)
+  idCache = ShardedCache(maximumSize, snapshot=((tuple(x[:-1]),x[-1]) for x in data))
   cursor.connection.commit()
-  return idCache, idCount
+  return idCache
 
 #-----------------------------------------------------------------------------------------------------------------
 def initializeProductBranchCache(idMap,cursor):
@@ -60,32 +59,16 @@ def initializeProductBranchCache(idMap,cursor):
 
 #-----------------------------------------------------------------------------------------------------------------
 def clearCache():
-  global productIdCache,productIdCount,productBranchCache,uriIdCache,uriIdCount,osIdCache,osIdCount
-  productIdCache = productIdCount = productBranchCache = None
-  uriIdCache = uriIdCount = None
-  osIdCache = osIdCount = None
+  global productIdCache,productBranchCache,uriIdCache,osIdCache
+  productIdCache = productBranchCache = None
+  uriIdCache = None
+  osIdCache = None
 
 #-----------------------------------------------------------------------------------------------------------------
-def shrinkIdCache(cacheMap, cacheCount, oneKeyToSave=None):
-  """
-  Remove the least-used half of the cached data, retaining oneKeyToSave (most recently used) if provided
-  return two new cache maps. Raises KeyError if oneKeyToSave is not a key in both maps
-  counts for retained keys are reset to 1
-  """
-  if oneKeyToSave:
-    oneIdToSave = cacheMap[oneKeyToSave]
-  killer = []
-  for (k,count) in cacheCount.items():
-    killer.append((k,count))
-  killer.sort(key=itemgetter(1))
-  s2 = len(killer)/2
-  idCache = dict([(x[0],cacheMap[x[0]]) for x in killer[s2:]])
-  idCount = dict((x[0],1) for x in killer[s2:])
-  if oneKeyToSave:
-    # may be redundant if oneKeyToSave is already there. Oh well.
-    idCache[oneKeyToSave] = oneIdToSave
-    idCount[oneKeyToSave] = 1
-  return idCache,idCount
+def cacheStatistics():
+  """return {cacheName: {'hits':..., 'misses':..., 'evictions':..., ...}} for each cache that is in use"""
+  caches = (('product',productIdCache),('uri',uriIdCache),('os',osIdCache))
+  return dict((name,cache.statistics()) for name,cache in caches if None != cache)
 
 #=================================================================================================================
 class IdCache:
@@ -105,26 +88,27 @@ class IdCache:
 
   def initializeCache(self):
     global maxOsIdCacheLength, maxProductIdCacheLength, maxUriIdCacheLength
-    global productIdCache,productIdCount,productBranchCache
-    global uriIdCache,uriIdCount
-    global osIdCache,osIdCount
-    if not productIdCache:
+    global productIdCache,productBranchCache
+    global uriIdCache
+    global osIdCache
+    if None == productIdCache:
       if maxProductIdCacheLength:
-        productIdCache,productIdCount = initializeIdCache(('product','version'),'id','productdims',self.cursor)
+        productIdCache = initializeIdCache(('product','version'),'id','productdims',self.cursor,maxProductIdCacheLength)
         productBranchCache = initializeProductBranchCache(productIdCache,self.cursor)
-    if not uriIdCache:
+    if None == uriIdCache:
       if maxUriIdCacheLength:
-        uriIdCache, uriIdCount = initializeIdCache(('domain','url'),'id','urldims',self.cursor)
-    if not osIdCache:
+        uriIdCache = initializeIdCache(('domain','url'),'id','urldims',self.cursor,maxUriIdCacheLength)
+    if None == osIdCache:
       if maxOsIdCacheLength:
-        osIdCache,osIdCount = initializeIdCache(('os_name','os_version',),'id','osdims',self.cursor)
+        osIdCache = initializeIdCache(('os_name','os_version',),'id','osdims',self.cursor,maxOsIdCacheLength)
 
   #---------------------------------------------------------------------------------------------------------------
-  def assureAndGetId(self, key, table, getSql, putSql, cacheMap, countMap, dkey=None):
+  def assureAndGetId(self, key, table, getSql, putSql, cache, dkey=None):
     """
-    If possible, get the cached id associated with key and update the cache count.
+    If possible, get the cached id associated with key.
     If not, then assure the data in (dkey, else key) is available in the database, and get the id from table
-    If caching is turned on (cacheMap is not None), then cache the key and its id, and update count
+    If caching is turned on (cache is a ShardedCache, not None), then cache the key and its id. Threads that miss
+    on the same key at the same time wait for one of them to query the database rather than each querying it.
     return the id, which may be None if all attempts to get the id fail.
     Called by individual getSomeKindId() methods
     key is a tuple, suitable for key in a dictionary. Must be present if caching is turned on.
@@ -132,42 +116,36 @@ class IdCache:
     """
     sqlKey = key
     if dkey: sqlKey = dkey
+    loader = lambda key: self.selectOrInsertId(key, sqlKey, table, getSql, putSql)
+    if None == cache:
+      return loader(key)
+    return cache.get_or_load(key, loader)
+
+  #---------------------------------------------------------------------------------------------------------------
+  def selectOrInsertId(self, key, sqlKey, table, getSql, putSql):
+    """
+    get the id for sqlKey from table, inserting a row for it if there is none. return None if that fails
+    """
     id = None
-    if None != cacheMap:
-      try:
-        id = cacheMap[key]
-        countMap[key] += 1
-      except KeyError:
-        pass
-    if not id:
-      self.cursor.execute(getSql,sqlKey)
-      self.cursor.connection.rollback() # we didn't change the data, no need to commit
+    self.cursor.execute(getSql,sqlKey)
+    self.cursor.connection.rollback() # we didn't change the data, no need to commit
+    try:
+      id = self.cursor.fetchone()[0]
+    except (IndexError, TypeError): # might be empty list or None
       try:
+        self.cursor.execute(putSql,sqlKey)
+        self.cursor.execute('SELECT lastval()')
+        self.cursor.connection.commit()
         id = self.cursor.fetchone()[0]
-        if None != cacheMap:
-          cacheMap[key] = id
-          countMap[key] = 1
-      except (IndexError, TypeError): # might be empty list or None
+      except psycopg2.IntegrityError,x: # in case of race condition
+        logger.info("%s - Failed (%s) insert %s into %s",threading.currentThread().getName(),x,key,table)
+        self.cursor.connection.rollback()
+        self.cursor.execute(getSql,sqlKey)
         try:
-          self.cursor.execute(putSql,sqlKey)
-          self.cursor.execute('SELECT lastval()')
-          self.cursor.connection.commit()
           id = self.cursor.fetchone()[0]
-          if None != cacheMap:
-            cacheMap[key] = id
-            countMap[key] = 1
-        except psycopg2.IntegrityError,x: # in case of race condition
-          logger.info("%s - Failed (%s) insert %s into %s",threading.currentThread().getName(),x,key,table)
-          self.cursor.connection.rollback()
-          self.cursor.execute(getSql,sqlKey)
-          try:
-            uriId = self.cursor.fetchone()[0]
-            self.cursor.connection.commit()
-            if None != cacheMap:
-              cacheMap[key] = id
-              countMap[key] = 1
-          except (IndexError, TypeError):
-            logger.error("%s - Unable to SELECT %s.id for (%s). Giving up.",threading.currentThread().getName(),table,key)
+          self.cursor.connection.commit()
+        except (IndexError, TypeError):
+          logger.error("%s - Unable to SELECT %s.id for (%s). Giving up.",threading.currentThread().getName(),table,key)
     return id
 
   #---------------------------------------------------------------------------------------------------------------
@@ -192,11 +170,11 @@ class IdCache:
   uriPattern = re.compile(URIstring)
   def getUrlId(self,fullUrl):
     """
-    Get the uri id given a full string. Cache results. Clean cache if length is too great.
+    Get the uri id given a full string. Cache results.
     Note that the 'full url' that is stored will be truncated at any of [?&=;] after the first '/'
     Note that the 'full url' that is stored may be truncated at self.truncateUrlLength if set
     """
-    global uriIdCache,uriIdCount
+    global uriIdCache
     uriId = None
     queryPart = ''
     if not fullUrl:
@@ -219,7 +197,7 @@ class IdCache:
     uriId = self.assureAndGetId(key,'urldims',
                                 "SELECT id FROM urldims WHERE domain=%s and url=%s",
                                 "INSERT INTO urldims (domain,url) VALUES (%s,%s)",
-                                uriIdCache, uriIdCount)
+                                uriIdCache)
     return uriId,queryPart
 
   #---------------------------------------------------------------------------------------------------------------
@@ -243,7 +221,7 @@ class IdCache:
       try:
         branch = self.cursor.fetchone()[0]
         if None != productBranchCache:
-          productBranchCache['id'] = branch
+          productBranchCache[id] = branch
         return branch
       except (IndexError, TypeError): # might be empty list or None
         pass
@@ -260,9 +238,9 @@ class IdCache:
   #---------------------------------------------------------------------------------------------------------------
   def getProductId(self,product,version,branch=''):
     """
-    Get product id given a product and version. Cache results. Clean cache if length is too great.
+    Get product id given a product and version. Cache results.
     """
-    global productIdCache,productIdCount
+    global productIdCache
     productId = None
     if not product or not version:
       return productId
@@ -278,7 +256,7 @@ class IdCache:
                                     """SELECT id FROM productdims WHERE product=%(product)s and version=%(version)s""",
                                     """INSERT INTO productdims (product,version,branch,release)
                                              VALUES (%(product)s,%(version)s,%(branch)s,%(release)s)""",
-                                productIdCache, productIdCount, dkey=dkey)
+                                productIdCache, dkey=dkey)
     return productId
 
   #-----------------------------------------------------------------------------------------------------------------
@@ -313,9 +291,9 @@ class IdCache:
   #-----------------------------------------------------------------------------------------------------------------
   def getOsId(self,osName,osVersion):
     """
-    Get the os id given the name and version. Cache results. Clean cache if length is too great.
+    Get the os id given the name and version. Cache results.
     """
-    global osIdCache, osIdCount
+    global osIdCache
     osId = None
     if None != osName:
       osName = osName.strip()
@@ -325,5 +303,5 @@ class IdCache:
     osId = self.assureAndGetId(key,'osdims',
                                "SELECT id FROM osdims WHERE os_name=%s and os_version=%s",
                                "INSERT INTO osdims (os_name,os_version) VALUES (%s,%s)",
-                                osIdCache, osIdCount)
+                                osIdCache)
     return osId
@@ -144,6 +144,34 @@ class LoggingCursor(psycopg2.extensions.cursor):
     super(LoggingCursor,self).executemany(sql,args)
 
 
+#=================================================================================================================
+statementCounter = threading.local()
+
+#-----------------------------------------------------------------------------------------------------------------
+def resetStatementCount():
+  """start counting the statements executed by CountingCursors in this thread from zero"""
+  statementCounter.count = 0
+
+#-----------------------------------------------------------------------------------------------------------------
+def statementCount():
+  """the number of statements executed by CountingCursors in this thread since resetStatementCount"""
+  return getattr(statementCounter, 'count', 0)
+
+#=================================================================================================================
+class CountingCursor(psycopg2.extensions.cursor):
+  """Use as cursor_factory when getting cursor from connection.  Every call to execute or executemany is counted in
+  a per thread counter - see statementCount
+  """
+  #-----------------------------------------------------------------------------------------------------------------
+  def execute(self, sql, args=None):
+    statementCounter.count = statementCount() + 1
+    super(CountingCursor, self).execute(sql, args)
+  #-----------------------------------------------------------------------------------------------------------------
+  def executemany(self, sql, args=None):
+    statementCounter.count = statementCount() + 1
+    super(CountingCursor, self).executemany(sql, args)
+
+
 #=================================================================================================================
 class Database(object):
   """a simple factory for creating connections for a database.  It doesn't track what it gives out"""
@@ -173,10 +201,12 @@ class Database(object):
 #=================================================================================================================
 class DatabaseConnectionPool(dict):
   #-----------------------------------------------------------------------------------------------------------------
-  def __init__(self, parameters, logger=None):
+  def __init__(self, parameters, logger=None, countStatements=False):
+    """with countStatements, the cursors from connectionCursorPair are CountingCursors - see statementCount"""
     super(DatabaseConnectionPool, self).__init__()
     self.database = Database(parameters, logger)
     self.logger = self.database.logger
+    self.countStatements = countStatements
 
   #-----------------------------------------------------------------------------------------------------------------
   def connection(self, name=None):
@@ -192,6 +222,8 @@ class DatabaseConnectionPool(dict):
   def connectionCursorPair(self, name=None):
     """Just like connection, but returns a tuple with a connection and a cursor"""
     connection = self.connection(name)
+    if self.countStatements:
+      return (connection, connection.cursor(cursor_factory=CountingCursor))
     return (connection, connection.cursor())
 
   #-----------------------------------------------------------------------------------------------------------------
@@ -1,6 +1,7 @@
 import psycopg2 as pg
 import datetime as dt
 import threading
+import re
 
 import socorro.lib.prioritize as socorro_pri
 import socorro.lib.psycopghelper as socorro_psy
@@ -68,6 +69,10 @@ def markPartitionCreated(partitionTableName):
   """Helper function to update partitionCreationHistory"""
   global partitionCreationHistory
   partitionCreationHistory.add(partitionTableName)
+#-----------------------------------------------------------------------------------------------------------------
+def forgetPartitionCreated(partitionTableName):
+  """Helper function to remove a partition from partitionCreationHistory, so that it is looked for again"""
+  partitionCreationHistory.discard(partitionTableName)
 
 #=================================================================================================================
 class PartitionControlParameterRequired(Exception):
@@ -162,7 +167,9 @@ class PartitionedTable(Table):
   Classes that inherit PartitionedTable
    - Must supply self.insertSql with 'TABLENAME' replacing the actual table name
    - Must supply appropriate creationSql and partitionCreationSqlTemplate to the superclass constructor
-   - Should NOT override method insert, which does something special for PartitionedTables
+   - Should NOT override methods insert and insertMany, which do something special for PartitionedTables
+   - May override partitionWeeksAhead: the number of weeks after a newly seen week whose partitions are created with it
+   - May override partitionCreationTimeout: the seconds that creating a partition may wait for the locks it needs
    - May override method partitionCreationParameters(self, partitionDetails) which returns a dictionary suitable for string formatting
 
    Every leaf class that inherits PartitionedTable should be aware of the module-level dictionary: databaseDependenciesForPartition
@@ -173,6 +180,8 @@ class PartitionedTable(Table):
   """
   #-----------------------------------------------------------------------------------------------------------------
   partitionCreationLock = threading.RLock()
+  partitionWeeksAhead = 2
+  partitionCreationTimeout = 60
   def __init__ (self, name=None, logger=None, creationSql=None, partitionNameTemplate='%s', partitionCreationSqlTemplate='', weekInterval=None, **kwargs):
     super(PartitionedTable, self).__init__(name=name, logger=logger, creationSql=creationSql)
     self.partitionNameTemplate = partitionNameTemplate
@@ -254,31 +263,88 @@ class PartitionedTable(Table):
       databaseCursor.execute("alter table %s inherit %s", (aTable, aChildTableName))
   #-----------------------------------------------------------------------------------------------------------------
   def insert(self, databaseCursor, row, alternateCursorFunction, **kwargs):
+    """insert one row into the partition for kwargs['date_processed'], creating the partition if necessary.
+       alternateCursorFunction returns a (connection, cursor) pair used to create partitions.  Its connection must not
+       be databaseCursor's, since creating partitions commits it.
+       Returns the rows returned by the statement (if insertSql has a 'returning' clause) or an empty list"""
+    return self.executeOnPartition(databaseCursor, self.insertSql, row, alternateCursorFunction, **kwargs)
+  #-----------------------------------------------------------------------------------------------------------------
+  insertSqlRE = re.compile(r'^(.*\bvalues\b)\s*(\(.*\))\s*$', re.IGNORECASE | re.DOTALL)
+  def insertMany(self, databaseCursor, rows, alternateCursorFunction, **kwargs):
+    """insert several rows into the same partition with a single multi-row 'values' statement"""
+    if not rows:
+      return []
+    insertHead, rowTemplate = PartitionedTable.insertSqlRE.match(self.insertSql).groups()
+    insertSql = "%s %s" % (insertHead, ", ".join([rowTemplate] * len(rows)))
+    parameters = [x for aRow in rows for x in aRow]
+    return self.executeOnPartition(databaseCursor, insertSql, parameters, alternateCursorFunction, **kwargs)
+  #-----------------------------------------------------------------------------------------------------------------
+  def partitionNameForDate(self, uniqueIdentifier):
+    monday = uniqueIdentifier - dt.timedelta(uniqueIdentifier.weekday())
+    return self.partitionCreationParameters((monday, monday + dt.timedelta(7)))["partitionName"]
+  #-----------------------------------------------------------------------------------------------------------------
+  @staticmethod
+  def fetchResult(databaseCursor):
+    if databaseCursor.description is None:
+      return []
+    return databaseCursor.fetchall()
+  #-----------------------------------------------------------------------------------------------------------------
+  def assurePartitions(self, uniqueIdentifier, alternateCursorFunction):
+    """
+    Make sure that the partitions for the week holding uniqueIdentifier and for the partitionWeeksAhead weeks after
+    it exist, along with the partitions they depend upon, and that all of them are in partitionCreationHistory.
+    Partitions that already exist are found with one catalog query per table, rather than by failing to use them.
+    A new partition may need locks that the caller's uncommitted rows hold, so callers make sure of their partitions
+    before their transaction writes anything.  Only executeOnPartition's recovery, from a partition that has gone
+    away, runs in the middle of a transaction: there the creation gives up after partitionCreationTimeout seconds
+    rather than waiting on the caller forever.
+    side effect: the alternate cursor's connection is committed
+    """
+    with PartitionedTable.partitionCreationLock:
+      if partitionWasCreated(self.partitionNameForDate(uniqueIdentifier)):
+        return # another thread got here first
+      altConnection, altCursor = alternateCursorFunction()
+      try:
+        altCursor.execute("set statement_timeout = %d" % (1000 * self.partitionCreationTimeout))
+        for tableClass in getOrderedPartitionList([self.__class__]):
+          tableName = self.name
+          if not self.__class__ == tableClass:
+            tableName = tableClass(logger=self.logger).name
+          for aPartitionName in socorro_pg.tablesMatchingPattern('%s_%%' % tableName, altCursor):
+            markPartitionCreated(aPartitionName)
+        lastDate = uniqueIdentifier + dt.timedelta(7 * self.partitionWeeksAhead)
+        self.createPartitions(altCursor, mondayPairsIteratorFactory(uniqueIdentifier, lastDate))
+      except pg.DatabaseError,x:
+        self.logger.debug("%s - Failed to create partition(s) for %s: %s:%s", threading.currentThread().getName(), uniqueIdentifier, type(x), x)
+        altConnection.rollback()
+      altCursor.execute("reset statement_timeout")
+      altConnection.commit()
+  #-----------------------------------------------------------------------------------------------------------------
+  def executeOnPartition(self, databaseCursor, sql, parameters, alternateCursorFunction, **kwargs):
+    """execute sql, with 'TABLENAME' replaced by the name of the partition for kwargs['date_processed'].  A partition
+       that this process hasn't used before is first made sure of with assurePartitions.  The sql is sent in the same
+       round trip as a savepoint, which the caller's commit releases.  If the partition has gone away behind our back,
+       the caller's transaction is rolled back to the savepoint, the partition is created again and the sql is tried
+       a second time"""
     try:
       uniqueIdentifier = kwargs["date_processed"]
     except KeyError:
       raise PartitionControlParameterRequired()
-    dateRangeTuple = mondayPairsIteratorFactory(uniqueIdentifier, uniqueIdentifier).next()# create iterator and throw away
-    partitionName = self.partitionCreationParameters(dateRangeTuple)["partitionName"]
-    insertSql = self.insertSql.replace('TABLENAME', partitionName)
+    partitionName = self.partitionNameForDate(uniqueIdentifier)
+    if not partitionWasCreated(partitionName):
+      self.assurePartitions(uniqueIdentifier, alternateCursorFunction)
+    partitionSql = sql.replace('TABLENAME', partitionName)
     try:
-      databaseCursor.execute("savepoint %s" % partitionName)
-      #self.logger.debug("%s - Trying to insert into %s", threading.currentThread().getName(), self.name)
-      databaseCursor.execute(insertSql, row)
-      databaseCursor.execute("release savepoint %s" % partitionName)
+      databaseCursor.execute("savepoint %s; %s" % (partitionName, partitionSql), parameters)
+      return PartitionedTable.fetchResult(databaseCursor)
     except pg.ProgrammingError, x:
       self.logger.debug('%s - Rolling back and releasing savepoint: failed: %s', threading.currentThread().getName(), str(x).strip())
       databaseCursor.execute("rollback to %s; release savepoint %s;" % (partitionName, partitionName))
-      databaseCursor.connection.commit() # This line added after of hours of blood, sweat, tears. Remove only per deathwish.
-
-      altConnection, altCursor = alternateCursorFunction()
-      dateIterator = mondayPairsIteratorFactory(uniqueIdentifier, uniqueIdentifier)
-      try:
-        self.createPartitions(altCursor,dateIterator)
-      except pg.DatabaseError,x:
-        self.logger.debug("%s - Failed to create partition(s) %s: %s:%s", threading.currentThread().getName(), partitionName, type(x), x)
+      forgetPartitionCreated(partitionName)
+      self.assurePartitions(uniqueIdentifier, alternateCursorFunction)
       self.logger.debug("%s - trying to insert into %s for the second time", threading.currentThread().getName(), self.name)
-      databaseCursor.execute(insertSql, row)
+      databaseCursor.execute(partitionSql, parameters)
+      return PartitionedTable.fetchResult(databaseCursor)
 
 #=================================================================================================================
 class ReportsTable(PartitionedTable):
@@ -348,6 +414,24 @@ class ReportsTable(PartitionedTable):
     self.insertSql = """insert into TABLENAME
                             (uuid, client_crash_date, date_processed, product, version, build, url, install_age, last_crash, uptime, email, user_id, user_comments, app_notes, distributor, distributor_version, topmost_filenames, addons_checked, flash_version, hangid, process_type, release_channel) values
                             (%s,   %s,                %s,             %s,      %s,      %s,    %s,  %s,          %s,         %s,     %s,    %s,      %s,            %s,        %s,          %s,                  %s,                %s,             %s,            %s,     %s,           %s)"""
+    self.insertReturningIdSql = self.insertSql + " returning id"
+    # there is no upsert in PostgreSQL 9.0: a replacement is a delete and an insert sent as one query string
+    self.replaceSql = "delete from TABLENAME where uuid = %s and date_processed = %s; " + self.insertReturningIdSql
+  #-----------------------------------------------------------------------------------------------------------------
+  def insertReturningId(self, databaseCursor, row, alternateCursorFunction, **kwargs):
+    """insert a row and return the id that the database gave it"""
+    return self.executeOnPartition(databaseCursor, self.insertReturningIdSql, row, alternateCursorFunction, **kwargs)[0][0]
+  #-----------------------------------------------------------------------------------------------------------------
+  def replace(self, databaseCursor, row, **kwargs):
+    """replace the row having the same uuid and date_processed in a single round trip and return the new id.  The
+       partition must already exist - it holds the row being replaced"""
+    try:
+      date_processed = kwargs["date_processed"]
+    except KeyError:
+      raise PartitionControlParameterRequired()
+    replaceSql = self.replaceSql.replace('TABLENAME', self.partitionNameForDate(date_processed))
+    databaseCursor.execute(replaceSql, (row[0], date_processed) + tuple(row))
+    return databaseCursor.fetchall()[0][0]
   #-----------------------------------------------------------------------------------------------------------------
   def additionalCreationProcedures(self, databaseCursor):
     pass
@@ -1328,7 +1412,9 @@ class PluginsTable(Table):
                                                 );""" % name)
 
   def insert(self, databaseCursor, rowTuple=None):
-    databaseCursor.execute("insert into plugins (filename, name) values (%s, %s)", rowTuple)
+    """insert a plugin and return its new id"""
+    databaseCursor.execute("insert into plugins (filename, name) values (%s, %s) returning id", rowTuple)
+    return databaseCursor.fetchall()[0][0]
 
 databaseDependenciesForSetup[PluginsTable] = []
 
@@ -1,6 +1,9 @@
+import json
 import logging
+import threading
+import time
 
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 import socorro.lib.datetimeutil as dtutil
 import socorro.lib.httpclient as httpc
@@ -8,6 +11,124 @@ import socorro.lib.httpclient as httpc
 logger = logging.getLogger("webapi")
 
 
+class IndexCatalog(object):
+
+    """
+    The names of the indexes and aliases of an ElasticSearch instance.
+
+    They are loaded with a single request, and refreshed in a background
+    thread once they are older than ttl seconds, so that queries never wait
+    for a refresh but the first one. Until the names could be loaded, every
+    index is assumed to exist.
+
+    A daily index for the day the names were loaded, or a later day, may
+    have been created since. It is assumed to exist until a query finds it
+    missing.
+    """
+
+    daily_index_format = "socorro_%y%m%d"
+
+    def __init__(self, host, port, ttl=300, time_function=time.time):
+        self.http = httpc.HttpClient(host, port, pool=httpc.default_pool)
+        self.ttl = ttl
+        self.time_function = time_function
+        self.names = None
+        self.names_requested_at = None
+        self.missing = set()
+        self.loaded_at = None
+        self.lock = threading.Lock()
+        self.refreshing = False
+
+    def existing(self, index_names):
+        """
+        Return the names in index_names that exist as an index or an alias,
+        or may have been created since the names were loaded.
+        """
+        if self.loaded_at is None:
+            self.refresh()
+        elif self.time_function() - self.loaded_at > self.ttl:
+            self.refresh_in_background()
+        names, missing = self.names, self.missing
+        if names is None:
+            return list(index_names)
+        requested_on = datetime.utcfromtimestamp(
+                                            self.names_requested_at).date()
+        return [x for x in index_names
+                if x in names or
+                   (x not in missing and
+                    self.is_daily_index_since(x, requested_on))]
+
+    def is_daily_index_since(self, index_name, day):
+        """
+        Return True if index_name is the daily index of day or a later one.
+        """
+        try:
+            index_day = datetime.strptime(index_name,
+                                          self.daily_index_format).date()
+        except ValueError:
+            return False
+        return index_day >= day
+
+    def forget(self, index_name):
+        """
+        Drop an index that a query found missing until the next refresh.
+        """
+        names = self.names
+        if names is not None:
+            self.names = names - set([index_name])
+        self.missing = self.missing | set([index_name])
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        thread = threading.Thread(target=self.refresh)
+        thread.daemon = True
+        thread.start()
+
+    def refresh(self):
+        """
+        Load the names of all indexes and aliases. A failure keeps the names
+        known so far until the ttl has passed again.
+        """
+        try:
+            requested_at = self.time_function()
+            with self.http:
+                http_response = self.http.get("/_aliases")
+            if isinstance(http_response, dict):
+                raise IOError(http_response["error"]["reason"])
+            names = set()
+            for index, info in json.loads(http_response).items():
+                names.add(index)
+                names.update(info.get("aliases", {}))
+            self.names_requested_at = requested_at
+            self.names = names
+            self.missing = set()
+        except Exception:
+            logger.error("could not load the ElasticSearch indexes",
+                         exc_info=True)
+        finally:
+            self.loaded_at = self.time_function()
+            self.refreshing = False
+
+
+# The index catalogs by (host, port), shared by the instances of
+# ElasticSearchBase, which are made for each request.
+_index_catalogs = {}
+_index_catalogs_lock = threading.Lock()
+
+
+def get_index_catalog(host, port, ttl):
+    with _index_catalogs_lock:
+        try:
+            return _index_catalogs[(host, port)]
+        except KeyError:
+            catalog = _index_catalogs[(host, port)] = IndexCatalog(host, port,
+                                                                   ttl)
+            return catalog
+
+
 class ElasticSearchBase(object):
 
     """
@@ -24,11 +145,12 @@ class ElasticSearchBase(object):
         """
         self.context = kwargs.get("config")
         self.http = httpc.HttpClient(self.context.elasticSearchHostname,
-                                     self.context.elasticSearchPort)
-
-        # A simulation of cache, good enough for the current needs,
-        # but wouldn't mind being replaced.
-        self.cache = {}
+                                     self.context.elasticSearchPort,
+                                     pool=httpc.default_pool)
+        self.index_catalog = get_index_catalog(
+                        self.context.elasticSearchHostname,
+                        self.context.elasticSearchPort,
+                        self.context.get("elasticSearchIndexCatalogTTL", 300))
 
     def query(self, from_date, to_date, json_query):
         """
@@ -41,56 +163,56 @@ class ElasticSearchBase(object):
         from_date = dtutil.string_to_datetime(from_date) or lastweek
         to_date = dtutil.string_to_datetime(to_date) or now
 
-        # Create the indexes to use for querying.
+        # Create the indexes to use for querying, leaving out the ones
+        # that don't exist.
         daterange = []
         delta_day = to_date - from_date
         for delta in range(0, delta_day.days + 1):
             day = from_date + timedelta(delta)
-            index = "socorro_%s" % day.strftime("%y%m%d")
-            # Cache protection for limitating the number of HTTP calls
-            if index not in self.cache or not self.cache[index]:
-                daterange.append(index)
+            daterange.append(day.strftime(IndexCatalog.daily_index_format))
+        daterange = self.index_catalog.existing(daterange)
 
         can_return = False
 
         # -
         # This code is here to avoid failing queries caused by missing
-        # indexes. It should not happen on prod, but doing this makes
-        # sure users will never see a 500 Error because of this eventuality.
+        # indexes, that the index catalog did not know about yet. It should
+        # not happen on prod, but doing this makes sure users will never see
+        # a 500 Error because of this eventuality.
         # -
 
-        # Iterate until we can return an actual result and not an error
-        while not can_return:
-            if not daterange:
-                http_response = "{}"
-                break
+        # Iterate until we can return an actual result and not an error,
+        # sending all the retries on the same pooled connection
+        with self.http:
+            while not can_return:
+                if not daterange:
+                    http_response = "{}"
+                    break
 
-            datestring = ",".join(daterange)
-            uri = "/%s/_search" % datestring
+                datestring = ",".join(daterange)
+                uri = "/%s/_search" % datestring
 
-            with self.http:
                 http_response = self.http.post(uri, json_query)
 
-            # If there has been an error,
-            # then we get a dict instead of some json.
-            if isinstance(http_response, dict):
-                data = http_response["error"]["data"]
-
-                # If an index is missing,
-                # try to remove it from the list of indexes and retry.
-                if (http_response["error"]["code"] == 404 and
-                    data.find("IndexMissingException") >= 0):
-                    index = data[data.find("[[") + 2:data.find("]")]
-
-                    # Cache protection for limitating the number of HTTP calls
-                    self.cache[index] = True
-
-                    try:
-                        daterange.remove(index)
-                    except Exception:
-                        raise
-            else:
-                can_return = True
+                # If there has been an error,
+                # then we get a dict instead of some json.
+                if isinstance(http_response, dict):
+                    data = http_response["error"]["data"]
+
+                    # If an index is missing,
+                    # try to remove it from the list of indexes and retry.
+                    if (http_response["error"]["code"] == 404 and
+                        data.find("IndexMissingException") >= 0):
+                        index = data[data.find("[[") + 2:data.find("]")]
+
+                        self.index_catalog.forget(index)
+
+                        try:
+                            daterange.remove(index)
+                        except Exception:
+                            raise
+                else:
+                    can_return = True
 
         return (http_response, "text/json")
 
@@ -1,4 +1,5 @@
 import logging
+import psycopg2
 
 import socorro.database.database as db
 import socorro.lib.util as util
@@ -37,6 +38,32 @@ class PostgreSQLBase(object):
 
         self.connection = None
 
+    def stream_query(self, cursor_name, sql_query, sql_params):
+        """
+        Execute a query on a server-side cursor and yield its rows.
+
+        Rows are fetched streamingFetchSize at a time, so only that many
+        are held in memory whatever the size of the result.  The connection
+        is closed once all the rows were read, or when the generator is
+        closed.
+
+        """
+        fetch_size = self.context.get("streamingFetchSize", 1000)
+        try:
+            cursor = self.connection.cursor(cursor_name)
+            try:
+                cursor.execute(sql_query, sql_params)
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield row
+            except psycopg2.Error:
+                util.reportExceptionAndContinue(logger)
+        finally:
+            self.connection.close()
+
     @staticmethod
     def parse_versions(versions_list, products):
         """
@@ -1,6 +1,5 @@
 import logging
 import datetime
-import psycopg2
 
 from socorro.external.postgresql.base import PostgreSQLBase
 from socorro.external.postgresql.util import Util
@@ -137,53 +136,53 @@ class Report(PostgreSQLBase):
             total = 0
             util.reportExceptionAndContinue(logger)
 
-        results = []
-
         # No need to call Postgres if we know there will be no results
         if total != 0:
-            try:
-                results = db.execute(cur, sql_query, sql_params)
-            except psycopg2.Error:
-                util.reportExceptionAndContinue(logger)
+            results = self.stream_query("report_list", sql_query, sql_params)
+        else:
+            results = []
+            self.connection.close()
 
+        # The hits are read from the database while they are sent
         json_result = {
             "total": total,
-            "hits": []
+            "hits": (self.format_row(crash) for crash in results)
         }
 
-        # Transforming the results into what we want
-        for crash in results:
-            row = dict(zip((
-                       "date_processed",
-                       "uptime",
-                       "user_comments",
-                       "uuid",
-                       "product",
-                       "version",
-                       "build",
-                       "signature",
-                       "url",
-                       "os_name",
-                       "os_version",
-                       "cpu_name",
-                       "cpu_info",
-                       "address",
-                       "reason",
-                       "last_crash",
-                       "install_age",
-                       "hangid",
-                       "process_type",
-                       "install_time",
-                       "duplicate_of"), crash))
-            for i in row:
-                if isinstance(row[i], datetime.datetime):
-                    row[i] = str(row[i])
-            json_result["hits"].append(row)
-
-        self.connection.close()
-
         return json_result
 
+    @staticmethod
+    def format_row(crash):
+        """
+        Transform a row of the report list query into a hit.
+        """
+        row = dict(zip((
+                   "date_processed",
+                   "uptime",
+                   "user_comments",
+                   "uuid",
+                   "product",
+                   "version",
+                   "build",
+                   "signature",
+                   "url",
+                   "os_name",
+                   "os_version",
+                   "cpu_name",
+                   "cpu_info",
+                   "address",
+                   "reason",
+                   "last_crash",
+                   "install_age",
+                   "hangid",
+                   "process_type",
+                   "install_time",
+                   "duplicate_of"), crash))
+        for i in row:
+            if isinstance(row[i], datetime.datetime):
+                row[i] = str(row[i])
+        return row
+
     def generate_sql_select(self, params):
         """
         Generate and return the SELECT part of the final SQL query.
@@ -1,5 +1,4 @@
 import logging
-import psycopg2
 
 from socorro.external.postgresql.base import PostgreSQLBase
 from socorro.external.postgresql.util import Util
@@ -115,37 +114,36 @@ class Search(PostgreSQLBase):
             total = 0
             util.reportExceptionAndContinue(logger)
 
-        results = []
-
         # No need to call Postgres if we know there will be no results
         if total != 0:
-            try:
-                results = db.execute(cur, sql_query, sql_params)
-            except psycopg2.Error:
-                util.reportExceptionAndContinue(logger)
+            results = self.stream_query("search", sql_query, sql_params)
+        else:
+            results = []
+            self.connection.close()
 
+        # The hits are read from the database while they are sent
         json_result = {
             "total": total,
-            "hits": []
+            "hits": (self.format_row(crash, params["report_process"])
+                     for crash in results)
         }
 
-        # Transforming the results into what we want
-        for crash in results:
-            if params["report_process"] == "plugin":
-                row = dict(zip(("signature", "count", "is_windows", "is_mac",
-                                "is_linux", "numhang", "numplugin",
-                                "numcontent", "pluginname", "pluginversion",
-                                "pluginfilename"), crash))
-            else:
-                row = dict(zip(("signature", "count", "is_windows", "is_mac",
-                                "is_linux", "numhang", "numplugin",
-                                "numcontent"), crash))
-            json_result["hits"].append(row)
-
-        self.connection.close()
-
         return json_result
 
+    @staticmethod
+    def format_row(crash, report_process):
+        """
+        Transform a row of the search query into a hit.
+        """
+        if report_process == "plugin":
+            return dict(zip(("signature", "count", "is_windows", "is_mac",
+                             "is_linux", "numhang", "numplugin",
+                             "numcontent", "pluginname", "pluginversion",
+                             "pluginfilename"), crash))
+        return dict(zip(("signature", "count", "is_windows", "is_mac",
+                         "is_linux", "numhang", "numplugin", "numcontent"),
+                        crash))
+
     def generate_sql_select(self, params):
         """
         Generate and return the SELECT part of the final SQL query.
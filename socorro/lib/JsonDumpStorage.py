@@ -43,6 +43,14 @@ class JsonDumpStorage(socorro_dumpStorage.DumpStorage):
 
   Note: If so configured, the bottom nodes in the date path will be %(webheadName)s_n for n in range(N) for some
   reasonable (5, perhaps) N. Files are placed into these buckets in rotation.
+
+  Each daily directory also holds a journal: an append-only file with a line per new ooid whose date branch link is
+  in that day, giving its date slot, its name directory and its date directory (relative to root). destructiveDateWalk
+  reads the journals from where it last stopped, recorded in %(journalName)s.offset, so finding new ooids costs in
+  proportion to the number of new ooids rather than to the size of the date branch. The symbolic links are still
+  made and are what marks an ooid as not yet seen. The first time a JsonDumpStorage visits a day, it journals the
+  links it finds in the date branch, so that trees written without a journal, and ooids whose journal line was lost
+  in a crash, are found too.
   """
   #-----------------------------------------------------------------------------------------------------------------
   def __init__(self, root=".", osModule=os, **kwargs):
@@ -63,6 +71,8 @@ class JsonDumpStorage(socorro_dumpStorage.DumpStorage):
     if not self.dumpSuffix.startswith('.'):
       self.dumpSuffix = ".%s" % (self.dumpSuffix)
     self.logger = kwargs.get('logger', socorro_util.FakeLogger())
+    self.journalName = kwargs.get('journalName', 'journal')
+    self.journalsChecked = set()
 
   #-----------------------------------------------------------------------------------------------------------------
   def newEntry (self, ooid, webheadHostName='webhead01', timestamp=None):
@@ -103,6 +113,7 @@ class JsonDumpStorage(socorro_dumpStorage.DumpStorage):
       dateParts = dateDir.split(os.path.sep)[-dateDepth:]
       rparts.extend(dateParts)
       self.osModule.symlink(os.path.sep.join(rparts),os.path.join(nameDir,ooid))
+      self.journalNewEntries([(ooid,nameDir,dateDir)])
       if self.dumpGID:
         def chown1(path):
           self.osModule.chown(path,-1,self.dumpGID)
@@ -175,6 +186,7 @@ class JsonDumpStorage(socorro_dumpStorage.DumpStorage):
       except OSError, e:
         self.osModule.unlink(os.path.join(nameDir,ooid))
         raise e
+      self.journalNewEntries([(ooid,nameDir,dateDir)])
     if removeOld:
       self.logger.debug('%s - removing old %s, %s', threading.currentThread().getName(), jsonpath, dumppath)
       try:
@@ -278,53 +290,183 @@ class JsonDumpStorage(socorro_dumpStorage.DumpStorage):
       else:
         raise e
 
+  #-----------------------------------------------------------------------------------------------------------------
+  def slotKey(self, date):
+    """return YYYYMMDDhhmm for the start of the date slot holding date"""
+    slot = self.minutesPerSlot * (int(date.minute/self.minutesPerSlot))
+    return "%s%02d%02d" % (self.dailyPart('',date),date.hour,slot)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def journalNewEntries(self, entries):
+    """
+    Append a journal line for each (ooid,nameDir,dateDir) in entries to the journal of the day holding dateDir.
+    The lines go in a single write to a file opened for appending, so that threads and processes can share a journal.
+    A failure is logged rather than raised: the links are already in place, and the first visit to the day by a
+    later JsonDumpStorage will journal them
+    """
+    byDay = {}
+    for ooid,nameDir,dateDir in entries:
+      dateParts = os.path.relpath(dateDir,self.root).split(os.sep) # daily, dateName, hh, mm[_n], ...
+      slot = "%s%s%s" % (dateParts[0],dateParts[2],dateParts[3][:2])
+      line = "%s\t%s\t%s\t%s\n" % (slot,ooid,os.path.relpath(nameDir,self.root),os.sep.join(dateParts))
+      byDay.setdefault(dateParts[0],[]).append(line)
+    for daily,lines in byDay.items():
+      journalPath = os.path.join(self.root,daily,self.journalName)
+      try:
+        fd = self.osModule.open(journalPath,os.O_WRONLY|os.O_APPEND|os.O_CREAT,self.dumpPermissions)
+        try:
+          self.osModule.write(fd,''.join(lines))
+        finally:
+          self.osModule.close(fd)
+        if self.dumpGID:
+          self.osModule.chown(journalPath,-1,self.dumpGID)
+      except OSError, x:
+        self.logger.warning("%s - cannot journal %d new entries in %s: %s", threading.currentThread().getName(), len(lines), journalPath, x)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def journalLinks(self, daily):
+    """
+    The crash recovery check: walk the date branch of the given day and journal every ooid that still has its links.
+    Lines for ooids that are already in the journal do no harm: destructiveDateWalk yields an ooid only while it
+    still has its link in the name branch
+    """
+    entries = []
+    for dir,dirs,files in self.osModule.walk(os.sep.join((self.root,daily,self.dateName))):
+      for d in dirs:
+        try:
+          nameDir = os.path.normpath(os.path.join(dir,self.osModule.readlink(os.path.join(dir,d))))
+        except OSError:
+          continue # not a link
+        entries.append((d,nameDir,dir))
+    if entries:
+      self.logger.info("%s - journaling %d linked entries in %s", threading.currentThread().getName(), len(entries), daily)
+      self.journalNewEntries(entries)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def retireJournal(self, daily):
+    """
+    Remove the journal of a past day once no links are left in its date branch, and then the day's directory if
+    nothing else is left in it. The current day is left alone, as newEntry may be about to append to its journal
+    """
+    if daily >= self.dailyPart('',utc_now()):
+      return
+    dailyPath = os.path.join(self.root,daily)
+    for dir,dirs,files in self.osModule.walk(os.path.join(dailyPath,self.dateName)):
+      for d in dirs:
+        if self.osModule.path.islink(os.path.join(dir,d)):
+          return
+    try:
+      for journalFile in (self.journalName,self.journalName+'.offset'):
+        try:
+          self.osModule.unlink(os.path.join(dailyPath,journalFile))
+        except OSError, x:
+          if errno.ENOENT != x.errno:
+            raise
+      self.osModule.rmdir(dailyPath)
+    except OSError:
+      pass # the name branch is still there, or the day is already gone
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def claimJournalEntry(self, ooid, nameRel, dateRel):
+    """
+    Remove the links for a journaled ooid, returning False if it no longer had its name branch link (it was seen,
+    removed or journaled twice) or if its .json or .dump file is missing, in which case the links are left alone
+    """
+    nameDir = os.path.join(self.root,nameRel)
+    if not self.osModule.path.isfile(os.path.join(nameDir,ooid+self.jsonSuffix)):
+      return False
+    if not self.osModule.path.isfile(os.path.join(nameDir,ooid+self.dumpSuffix)):
+      return False
+    try:
+      self.osModule.unlink(os.path.join(nameDir,ooid))
+    except OSError, x:
+      if errno.ENOENT == x.errno:
+        return False
+      raise
+    try:
+      self.osModule.unlink(os.path.join(self.root,dateRel,ooid))
+    except OSError, x:
+      if errno.ENOENT != x.errno:
+        raise
+    return True
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def readJournalOffset(self, offsetPath):
+    try:
+      offsetFile = open(offsetPath)
+      try:
+        return int(offsetFile.read())
+      finally:
+        offsetFile.close()
+    except (IOError, ValueError):
+      return 0 # start over: entries that have been seen are skipped
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def writeJournalOffset(self, offsetPath, offset):
+    offsetFile = open(offsetPath,'w')
+    try:
+      offsetFile.write(str(offset))
+    finally:
+      offsetFile.close()
+
   #-----------------------------------------------------------------------------------------------------------------
   def destructiveDateWalk (self):
     """
-    This function is a generator that yields all ooids found by walking the date branch of the file system.
-    Just before yielding a value, it deletes both the links (from date to name and from name to date)
-    After visiting all the ooids in a given date branch, recursively travels up, deleting any empty subdirectories
-    Since the file system may be manipulated in a different thread, if no .json or .dump file is found, the
-    links are left, and we do not yield that ooid
+    This function is a generator that yields the ooids of all new entries, found by reading the journal of each day
+    from where the last walk stopped. Just before yielding a value, it deletes both the links (from date to name and
+    from name to date). Entries in the current date slot are left for a later walk, as their files may still be being
+    written. After reading a day's journal, travels up from each date directory it used, deleting any empty ones
     """
-    def handleLink(dir,name):
-      nameDir = self.namePath(name)[0]
-      if not self.osModule.path.isfile(os.path.join(nameDir,name+self.jsonSuffix)):
-        #print '        handleLink 1'
-        return None
-      if not self.osModule.path.isfile(os.path.join(nameDir,name+self.dumpSuffix)):
-        #print '        handleLink 2'
-        return None
-      if self.osModule.path.islink(os.path.join(nameDir,name)):
-        self.osModule.unlink(os.path.join(nameDir,name))
-        self.osModule.unlink(os.path.join(dir,name))
-        #print '        handleLink 3'
-        return name
-      #print '        handleLink off end'
     dailyParts = []
     try:
       dailyParts = self.osModule.listdir(self.root)
     except OSError:
       # If root doesn't exist, quietly do nothing, eh?
       return
+    currentSlot = self.slotKey(utc_now())
     for daily in dailyParts:
-      #print 'daily: %s' % daily
-      for dir,dirs,files in self.osModule.walk(os.sep.join((self.root,daily,self.dateName))):
-        #print dir,dirs,files
-        if os.path.split(dir)[0] == os.path.split(self.datePath(utc_now())[0]):
-          #print 'skipping dir %s' % dir
-          #print 'because: %s == %s' % (os.path.split(dir)[0],os.path.split(self.datePath(utc_now())[0]))
-          continue
-        # the links are all to (relative) directories, so we need not look at files
-        for d in dirs:
-          #print 'dir  ', d
-          if self.osModule.path.islink(os.path.join(dir,d)):
-            r = handleLink(dir,d)
-            #print '       r ', r
-            if r:
-              yield r
-        # after finishing a given directory...
-        socorro_fs.cleanEmptySubdirectories(os.path.join(self.root,daily),dir,self.osModule)
+      if daily not in self.journalsChecked:
+        self.journalLinks(daily)
+        self.journalsChecked.add(daily)
+      journalPath = os.path.join(self.root,daily,self.journalName)
+      try:
+        journal = open(journalPath)
+      except IOError:
+        continue # nothing has been journaled for this day
+      offsetPath = journalPath + '.offset'
+      dateDirs = set()
+      try:
+        offset = self.readJournalOffset(offsetPath)
+        journal.seek(0,2)
+        if offset > journal.tell():
+          offset = 0
+        journal.seek(offset)
+        while True:
+          line = journal.readline()
+          if not line.endswith('\n'):
+            break # the end, or a line still being written
+          try:
+            slot,ooid,nameRel,dateRel = line[:-1].split('\t')
+          except ValueError:
+            self.logger.warning("%s - skipping bad line in %s: %r", threading.currentThread().getName(), journalPath, line)
+            offset += len(line)
+            continue
+          if slot >= currentSlot:
+            break
+          offset += len(line)
+          if self.claimJournalEntry(ooid,nameRel,dateRel):
+            dateDirs.add(dateRel)
+            yield ooid
+      finally:
+        journal.close()
+        self.writeJournalOffset(offsetPath,offset)
+        for dateRel in dateDirs:
+          try:
+            socorro_fs.cleanEmptySubdirectories(os.path.join(self.root,daily),os.path.join(self.root,dateRel),self.osModule)
+          except OSError:
+            pass
+        if dateDirs:
+          self.retireJournal(daily)
 
   #-----------------------------------------------------------------------------------------------------------------
   def remove (self,ooid, timestamp=None):
@@ -416,6 +558,10 @@ class JsonDumpStorage(socorro_dumpStorage.DumpStorage):
         socorro_fs.cleanEmptySubdirectories(self.root,datePath,self.osModule)
       except:
         pass
+      dateDaily = os.path.relpath(datePath,self.root).split(os.sep)[0]
+      if dateDaily != dailyPart:
+        self.retireJournal(dateDaily)
+    self.retireJournal(dailyPart)
     if not seenCount:
       self.logger.warning("%s - %s was totally unknown" % (threading.currentThread().getName(), ooid))
       raise NoSuchUuidFound, "no trace of %s was found" % ooid
@@ -0,0 +1,242 @@
+"""a base class for asynchronous stages that take items off a bounded queue
+in batches and spill the batches they can't process to files.
+
+Callers hand items to '_put', which puts them on a bounded queue and
+returns.  A single thread takes them off the queue and hands them to
+'_process_batch', at most 'batch_size' items, or 'batch_bytes' bytes, at a
+time, waiting no more than 'flush_interval' seconds to fill a batch.
+
+When a batch can't be processed, it is written as a spill file in
+'spill_directory', named '<spill_prefix>-<time>-<id>.json'.  Spill files are
+processed again, oldest first, once a batch gets through or while the thread
+is idle, and are deleted once they are processed.  A spill file that can't
+be read is renamed to '<name>.bad' and left alone.
+
+A subclass provides '_process_batch', which raises when the batch wasn't
+processed, and '_spill_text' and '_parse_spill' that turn a batch into the
+text of a spill file and back."""
+
+import os
+import Queue
+import threading
+import time
+
+import socorro.lib.stats as stats
+import socorro.lib.util as sutil
+
+
+#==============================================================================
+class BatchingStage(object):
+    """the queue, the thread and the spill files of a stage"""
+
+    _stop = object()
+
+    # the names of a subclass's spill files start with this
+    spill_prefix = 'batch'
+    # what the items are, for the log
+    item_name = 'items'
+    # the counters in 'statistics', beyond the ones kept here
+    counter_names = ()
+    # failures that need no traceback in the log
+    expected_failures = ()
+
+    #--------------------------------------------------------------------------
+    def __init__(self, logger, batch_size, flush_interval, queue_size,
+                 spill_directory=None, batch_bytes=None,
+                 time_function=time.time):
+        """constructor for the stage.  Its thread is started right away.
+
+        Parameters:
+            logger - a logger object
+            batch_size - the largest number of items processed at once
+            flush_interval - the number of seconds that an item may wait for
+                             its batch to fill up
+            queue_size - the number of items that may wait for the thread
+                         before '_put' blocks
+            spill_directory - where batches go while they can't be processed
+                              (None to drop them)
+            batch_bytes - the largest size of a batch, as '_item_bytes'
+                          counts it, give or take one item (None for no
+                          limit)"""
+        self.logger = logger
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.spill_directory = spill_directory
+        self.time_function = time_function
+        self.queue = Queue.Queue(queue_size)
+        # there may be spill files left by an earlier run
+        self.spill_pending = bool(spill_directory)
+        self.counters_lock = threading.Lock()
+        self.counters = dict.fromkeys(('queued', 'batches', 'spilled',
+                                       'replayed', 'dropped') +
+                                      self.counter_names, 0)
+        self.thread = threading.Thread(target=self._run,
+                                       name=self.__class__.__name__)
+        self.thread.daemon = True
+        self.thread.start()
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """process what is still queued and stop the thread"""
+        self.queue.put(self._stop)
+        self.thread.join()
+
+    #--------------------------------------------------------------------------
+    def statistics(self):
+        with self.counters_lock:
+            statistics = dict(self.counters)
+        statistics['queue_size'] = self.queue.qsize()
+        return statistics
+
+    #--------------------------------------------------------------------------
+    def export_statistics(self, stats_client, prefix):
+        stats.sendGauges(stats_client, prefix, self.statistics())
+
+    #--------------------------------------------------------------------------
+    def _put(self, item):
+        """queue an item.  This blocks only while the queue is full."""
+        self.queue.put(item)
+        self._count('queued')
+
+    #--------------------------------------------------------------------------
+    def _count(self, name, increment=1):
+        with self.counters_lock:
+            self.counters[name] += increment
+
+    #--------------------------------------------------------------------------
+    def _item_bytes(self, item):
+        return 0
+
+    #--------------------------------------------------------------------------
+    def _process_batch(self, batch):
+        raise NotImplementedError
+
+    #--------------------------------------------------------------------------
+    def _spill_text(self, batch):
+        raise NotImplementedError
+
+    #--------------------------------------------------------------------------
+    def _parse_spill(self, text):
+        """return the batch in the text of a spill file, raising ValueError
+        if it can't be read"""
+        raise NotImplementedError
+
+    #--------------------------------------------------------------------------
+    def _run(self):
+        batch = []
+        batch_bytes = 0
+        deadline = None
+        while True:
+            if batch:
+                timeout = max(0, deadline - self.time_function())
+            else:
+                timeout = self.flush_interval
+            try:
+                item = self.queue.get(True, timeout)
+            except Queue.Empty:
+                item = None
+            if item is self._stop:
+                break
+            if item is not None:
+                if not batch:
+                    deadline = self.time_function() + self.flush_interval
+                batch.append(item)
+                batch_bytes += self._item_bytes(item)
+            if batch and (len(batch) >= self.batch_size or
+                          (self.batch_bytes and
+                           batch_bytes >= self.batch_bytes) or
+                          self.time_function() >= deadline):
+                processed = self._send(batch)
+                batch = []
+                batch_bytes = 0
+                if processed and self.spill_pending:
+                    self._replay_spill_files()
+            elif not batch and self.spill_pending:
+                self._replay_spill_files()
+        if batch:
+            self._send(batch)
+
+    #--------------------------------------------------------------------------
+    def _send(self, batch):
+        """process a batch, spilling it if that fails.  Return True if it was
+        processed."""
+        try:
+            self._process_batch(batch)
+            return True
+        except self.expected_failures, x:
+            self.logger.warning('%s: %d %s failed: %s', self.thread.name,
+                                len(batch), self.item_name, x)
+        except Exception:
+            self.logger.warning('%s: %d %s failed', self.thread.name,
+                                len(batch), self.item_name)
+            sutil.reportExceptionAndContinue(self.logger)
+        self._spill(batch)
+        return False
+
+    #--------------------------------------------------------------------------
+    def _spill(self, batch):
+        if not self.spill_directory:
+            self.logger.error('%s: dropping %d %s', self.thread.name,
+                              len(batch), self.item_name)
+            self._count('dropped', len(batch))
+            return
+        path = os.path.join(self.spill_directory,
+                            '%s-%017.6f-%d.json' % (self.spill_prefix,
+                                                    self.time_function(),
+                                                    id(batch)))
+        try:
+            spill_file = open(path + '.tmp', 'w')
+            try:
+                spill_file.write(self._spill_text(batch))
+            finally:
+                spill_file.close()
+            os.rename(path + '.tmp', path)
+            self.spill_pending = True
+            self._count('spilled', len(batch))
+        except (IOError, OSError):
+            sutil.reportExceptionAndContinue(self.logger)
+            self._count('dropped', len(batch))
+
+    #--------------------------------------------------------------------------
+    def _read_spill_file(self, path):
+        spill_file = open(path)
+        try:
+            return self._parse_spill(spill_file.read())
+        finally:
+            spill_file.close()
+
+    #--------------------------------------------------------------------------
+    def _replay_spill_files(self):
+        self.spill_pending = False
+        for name in sorted(os.listdir(self.spill_directory)):
+            if not (name.startswith(self.spill_prefix + '-') and
+                    name.endswith('.json')):
+                continue
+            path = os.path.join(self.spill_directory, name)
+            try:
+                batch = self._read_spill_file(path)
+            except IOError:
+                continue  # replayed by another process sharing the directory
+            except ValueError:
+                self.logger.error("%s can't be read, renaming it to %s.bad",
+                                  path, path)
+                os.rename(path, path + '.bad')
+                continue
+            try:
+                self._process_batch(batch)
+            except self.expected_failures, x:
+                self.logger.warning('%s: replaying %s failed: %s',
+                                    self.thread.name, path, x)
+                self.spill_pending = True
+                return
+            except Exception:
+                sutil.reportExceptionAndContinue(self.logger,
+                                                 showTraceback=False)
+                self.spill_pending = True
+                return
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            self._count('replayed', len(batch))
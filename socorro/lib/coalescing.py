@@ -0,0 +1,56 @@
+"""miss coalescing for caches: while one thread computes the value for a key,
+other threads asking for the same key wait for its result instead of
+computing it themselves."""
+
+import threading
+
+
+#==============================================================================
+class _Pending(object):
+    """a computation in progress that other threads asking for the same key
+    wait on"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+#==============================================================================
+class Coalescer(object):
+    """runs at most one computation per key at a time.  'waits' counts the
+    threads that waited for another thread's computation."""
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.waits = 0
+
+    #--------------------------------------------------------------------------
+    def run(self, key, function):
+        """return (value, shared): the value of 'function()' and whether it
+        came from another thread's computation for the same key.  If that
+        computation raises an exception, the threads that were waiting for it
+        run 'function' themselves."""
+        with self.lock:
+            pending = self.pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self.pending[key] = _Pending()
+            else:
+                self.waits += 1
+        if not leader:
+            pending.done.wait()
+            if not pending.failed:
+                return pending.value, True
+            return function(), False
+        try:
+            pending.value = function()
+            return pending.value, False
+        except:
+            pending.failed = True
+            raise
+        finally:
+            with self.lock:
+                del self.pending[key]
+            pending.done.set()
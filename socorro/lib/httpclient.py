@@ -1,33 +1,194 @@
 import httplib
+import socket
+import threading
+
+import socorro.lib.stats as stats
+
+
+class PooledHTTPConnection(httplib.HTTPConnection):
+    """An httplib connection that tells its pool each time it opens a socket.
+    httplib reopens a connection by itself when the server has closed it, so
+    this is the count of connection setups.
+    """
+
+    def __init__(self, pool, host, port, timeout=None):
+        httplib.HTTPConnection.__init__(self, host, port, timeout=timeout)
+        self.pool = pool
+        self.requests = 0
+
+    def connect(self):
+        httplib.HTTPConnection.connect(self)
+        # a kept alive connection sends small requests back to back
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.pool.count_connect()
+
+
+class HttpConnectionPool(object):
+    """A thread safe pool of keep-alive HTTP connections.
+
+    Connections are kept per (host, port) and handed out most recently used
+    first. At most maximum_per_host connections to a host are open at once:
+    acquire waits for one to be released beyond that.
+    """
+
+    def __init__(self, maximum_per_host=8,
+                 connection_class=PooledHTTPConnection):
+        self.maximum_per_host = maximum_per_host
+        self.connection_class = connection_class
+        self.lock = threading.Condition()
+        self.idle = {}
+        self.open = {}
+        self.connects = 0
+        self.requests = 0
+        self.reused = 0
+        self.discarded = 0
+        self.waits = 0
+
+    def acquire(self, host, port, timeout=None):
+        """Return a connection to host:port, idle or new."""
+        key = (host, port)
+        with self.lock:
+            while True:
+                idle = self.idle.get(key)
+                if idle:
+                    self.reused += 1
+                    connection = idle.pop()
+                    connection.timeout = timeout
+                    if connection.sock is not None:
+                        connection.sock.settimeout(timeout)
+                    return connection
+                if self.open.get(key, 0) < self.maximum_per_host:
+                    self.open[key] = self.open.get(key, 0) + 1
+                    break
+                self.waits += 1
+                self.lock.wait()
+        try:
+            return self.connection_class(self, host, port, timeout=timeout)
+        except Exception:
+            self._forget(key)
+            raise
+
+    def release(self, connection, reusable=True):
+        """Give a connection back. A connection that is not reusable, for
+        example after an error part way through a request, is closed.
+        """
+        key = (connection.host, connection.port)
+        if not reusable:
+            connection.close()
+            self._forget(key)
+            return
+        with self.lock:
+            self.idle.setdefault(key, []).append(connection)
+            self.lock.notify()
+
+    def _forget(self, key):
+        with self.lock:
+            self.open[key] -= 1
+            self.discarded += 1
+            self.lock.notify()
+
+    def count_connect(self):
+        with self.lock:
+            self.connects += 1
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def clear(self):
+        """Close all the idle connections."""
+        with self.lock:
+            for key, connections in self.idle.items():
+                for connection in connections:
+                    connection.close()
+                self.open[key] -= len(connections)
+            self.idle = {}
+            self.lock.notify_all()
+
+    def statistics(self):
+        """Return the pool's counters and its open and idle connections."""
+        with self.lock:
+            return {
+                "connects": self.connects,
+                "requests": self.requests,
+                "reused": self.reused,
+                "discarded": self.discarded,
+                "waits": self.waits,
+                "open": sum(self.open.values()),
+                "idle": sum(len(x) for x in self.idle.values()),
+            }
+
+    def export_statistics(self, stats_client, prefix):
+        stats.sendGauges(stats_client, prefix, self.statistics())
+
+
+# The pool that HttpClients share unless they are given another one.
+default_pool = HttpConnectionPool()
 
 
 class HttpClient(object):
     """Class for doing HTTP requests to any server. Encapsulate python's httplib.
+
+    With a pool, each `with` block borrows a keep-alive connection from it
+    rather than opening a new one.
     """
 
-    def __init__(self, host, port, timeout=None):
+    def __init__(self, host, port, timeout=None, pool=None):
         """Set the host, port and optional timeout for all HTTP requests ran by
-        this client.
+        this client, and the optional HttpConnectionPool to take connections
+        from.
         """
         self.host = host
         self.port = port
         self.timeout = timeout
+        self.pool = pool
 
     def __enter__(self):
-        self.conn = httplib.HTTPConnection(self.host, self.port,
-                                           timeout=self.timeout)
+        if self.pool is None:
+            self.conn = httplib.HTTPConnection(self.host, self.port,
+                                               timeout=self.timeout)
+        else:
+            self.conn = self.pool.acquire(self.host, self.port, self.timeout)
 
     def __exit__(self, type, value, traceback):
-        self.conn.close()
+        if self.pool is None:
+            self.conn.close()
+        else:
+            self.pool.release(self.conn, reusable=type is None)
+
+    def _request(self, method, url, data=None, headers=None):
+        """Send a request and return its response.
+
+        A pooled connection that was idle may have been closed by the server
+        in the meantime, which shows when the response is read. The request
+        is then sent once more on a new socket.
+        """
+        headers = headers or {}
+        if self.pool is None:
+            self.conn.request(method, url, data, headers)
+            return self.conn.getresponse()
+        self.pool.count_request()
+        self.conn.requests += 1
+        try:
+            self.conn.request(method, url, data, headers)
+            return self.conn.getresponse()
+        except socket.timeout:
+            raise
+        except (httplib.BadStatusLine, socket.error):
+            if self.conn.requests == 1:
+                raise
+            self.conn.close()
+            self.conn.requests = 1
+            self.conn.request(method, url, data, headers)
+            return self.conn.getresponse()
 
-    def _process_response(self):
+    def _process_response(self, response):
         """Return a JSON result after an HTTP Request.
 
         Process the response of an HTTP Request and make it a JSON error if
         it failed. Otherwise return the response's content.
 
         """
-        response = self.conn.getresponse()
         if response.status == 200 or response.status == 201:
             data = response.read()
         else:
@@ -44,8 +205,7 @@ class HttpClient(object):
     def get(self, url):
         """Send a HTTP GET request to a URL and return the result.
         """
-        self.conn.request("GET", url)
-        return self._process_response()
+        return self._process_response(self._request("GET", url))
 
     def post(self, url, data):
         """Send a HTTP POST request to a URL and return the result.
@@ -54,17 +214,15 @@ class HttpClient(object):
             "Content-type": "application/x-www-form-urlencoded",
             "Accept": "text/json"
         }
-        self.conn.request("POST", url, data, headers)
-        return self._process_response()
+        return self._process_response(self._request("POST", url, data,
+                                                    headers))
 
     def put(self, url, data=None):
         """Send a HTTP PUT request to a URL and return the result.
         """
-        self.conn.request("PUT", url, data)
-        return self._process_response()
+        return self._process_response(self._request("PUT", url, data))
 
     def delete(self, url):
         """Send a HTTP DELETE request to a URL and return the result.
         """
-        self.conn.request("DELETE", url)
-        return self._process_response()
+        return self._process_response(self._request("DELETE", url))
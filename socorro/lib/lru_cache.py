@@ -0,0 +1,100 @@
+"""a bounded, thread safe mapping that evicts the least recently used entry"""
+
+import threading
+
+# the slots of a link in the circular doubly linked list of entries
+_PREV, _NEXT, _KEY, _VALUE = 0, 1, 2, 3
+
+
+#==============================================================================
+class LRUCache(object):
+    """a mapping with at most 'maximum_size' entries.  When a new entry would
+    exceed that size, the entry that was used the longest time ago is thrown
+    away.  Both 'get' and 'put' count as a use.
+
+    The entries are kept in a dict of links in a circular doubly linked list,
+    in order of use, so all operations are O(1).  The counters 'hits',
+    'misses' and 'evictions' record how well the cache is doing."""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, maximum_size):
+        self.maximum_size = maximum_size
+        self.lock = threading.Lock()
+        self.links = {}
+        self.root = root = []
+        root[:] = [root, root, None, None]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    #--------------------------------------------------------------------------
+    def get(self, key, default=None):
+        """return the value for key, or default if it isn't in the cache"""
+        with self.lock:
+            link = self.links.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            # move the link to the most recently used end of the list
+            link_prev, link_next = link[_PREV], link[_NEXT]
+            link_prev[_NEXT] = link_next
+            link_next[_PREV] = link_prev
+            root = self.root
+            last = root[_PREV]
+            last[_NEXT] = root[_PREV] = link
+            link[_PREV] = last
+            link[_NEXT] = root
+            return link[_VALUE]
+
+    #--------------------------------------------------------------------------
+    def put(self, key, value):
+        """add or replace the value for key"""
+        with self.lock:
+            link = self.links.get(key)
+            if link is not None:
+                link_prev, link_next = link[_PREV], link[_NEXT]
+                link_prev[_NEXT] = link_next
+                link_next[_PREV] = link_prev
+            elif len(self.links) >= self.maximum_size:
+                if self.maximum_size <= 0:
+                    return
+                # reuse the oldest link for the new entry
+                oldest = self.root[_NEXT]
+                oldest[_PREV][_NEXT] = oldest[_NEXT]
+                oldest[_NEXT][_PREV] = oldest[_PREV]
+                del self.links[oldest[_KEY]]
+                self.evictions += 1
+                link = oldest
+            else:
+                link = [None, None, None, None]
+            root = self.root
+            last = root[_PREV]
+            link[:] = [last, root, key, value]
+            last[_NEXT] = root[_PREV] = link
+            self.links[key] = link
+
+    #--------------------------------------------------------------------------
+    def __contains__(self, key):
+        return key in self.links
+
+    #--------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.links)
+
+    #--------------------------------------------------------------------------
+    def keys(self):
+        """the keys from least to most recently used"""
+        with self.lock:
+            result = []
+            link = self.root[_NEXT]
+            while link is not self.root:
+                result.append(link[_KEY])
+                link = link[_NEXT]
+            return result
+
+    #--------------------------------------------------------------------------
+    def clear(self):
+        with self.lock:
+            self.links.clear()
+            self.root[:] = [self.root, self.root, None, None]
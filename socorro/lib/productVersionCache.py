@@ -1,13 +1,15 @@
 import socorro.database.database as db
 import socorro.lib.util as util
 
+from socorro.lib.sharded_cache import ShardedCache
+
 #=================================================================================================================
 class ProductVersionCache(object):
   #-----------------------------------------------------------------------------------------------------------------
   def __init__(self, context):
     super(ProductVersionCache, self).__init__()
     self.config = context
-    self.cache = {}
+    snapshot = {}
     sql = """
       select
           product_name as product,
@@ -20,15 +22,23 @@ class ProductVersionCache(object):
     connection = self.database.connection()
     cursor = connection.cursor()
     for product, version, id in db.execute(cursor, sql):
-      self.cache[(product, version)] = id
+      snapshot[(product, version)] = id
     connection.close()
+    self.cache = ShardedCache(self.config.get('productVersionCacheSize', 1024), snapshot=snapshot)
 
   #-----------------------------------------------------------------------------------------------------------------
   def getId(self, product, version):
+    """return the product_version_id for (product, version), raising KeyError if there is none.  Threads asking
+    for the same missing pair at the same time share a single query."""
+    id = self.cache.get_or_load((product, version), self._loadId)
+    if id is None:
+      raise KeyError((product, version))
+    return id
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def _loadId(self, key):
+    connection = self.database.connection()
     try:
-      return self.cache[(product, version)]
-    except KeyError:
-      connection = self.database.connection()
       cursor = connection.cursor()
       sql = """
           select
@@ -39,9 +49,9 @@ class ProductVersionCache(object):
             product_name = %s
             and version_string = %s
           """
-      try:
-        self.cache[(product, version)] = id = db.singleValueSql(cursor, sql, (product, version))
-        return id
-      except Exception:
-        util.reportExceptionAndContinue(self.config['logger'])
-        raise KeyError((product, version))
+      return db.singleValueSql(cursor, sql, key)
+    except Exception:
+      util.reportExceptionAndContinue(self.config['logger'])
+      return None
+    finally:
+      connection.close()
@@ -0,0 +1,112 @@
+"""a bounded, thread safe key to id cache for lookups that are mostly reads"""
+
+from socorro.lib.coalescing import Coalescer
+from socorro.lib.lru_cache import LRUCache
+
+
+#==============================================================================
+class ShardedCache(object):
+    """a cache of values (typically database ids) made of two parts:
+
+    the snapshot - a dict, usually loaded in bulk from the database, that is
+        never changed once it is published.  It is read without a lock and
+        replaced as a whole with 'replace_snapshot'.
+    the shards - LRUCaches, holding at most 'maximum_size' entries between
+        them, for the values found since.  Each has its own lock, so threads
+        looking up different keys rarely wait on each other.  A small cache
+        gets fewer shards so that no shard is smaller than
+        'minimum_shard_size'.
+
+    'get_or_load' coalesces misses (see socorro.lib.coalescing): while one
+    thread runs the loader for a key, other threads asking for the same key
+    wait for its result instead of running the loader themselves."""
+
+    minimum_shard_size = 64
+
+    #--------------------------------------------------------------------------
+    def __init__(self, maximum_size, snapshot=None, number_of_shards=16):
+        self.maximum_size = maximum_size
+        number_of_shards = max(1, min(number_of_shards,
+                                      maximum_size // self.minimum_shard_size))
+        shard_size = -(-maximum_size // number_of_shards)
+        self.shards = [LRUCache(shard_size) for x in range(number_of_shards)]
+        self.snapshot = dict(snapshot or {})
+        self.snapshot_hits = 0
+        self.loads = 0
+        self.coalescer = Coalescer()
+
+    #--------------------------------------------------------------------------
+    @property
+    def coalesced(self):
+        return self.coalescer.waits
+
+    #--------------------------------------------------------------------------
+    def _shard(self, key):
+        return self.shards[hash(key) % len(self.shards)]
+
+    #--------------------------------------------------------------------------
+    def get(self, key, default=None):
+        """return the value for key, or default if it isn't cached"""
+        try:
+            value = self.snapshot[key]
+            self.snapshot_hits += 1
+            return value
+        except KeyError:
+            return self._shard(key).get(key, default)
+
+    #--------------------------------------------------------------------------
+    def put(self, key, value):
+        self._shard(key).put(key, value)
+
+    #--------------------------------------------------------------------------
+    def get_or_load(self, key, loader):
+        """return the cached value for key or, on a miss, the value from
+        'loader(key)', caching it unless it is None.  If the loader raises an
+        exception, threads that were waiting for it run the loader
+        themselves."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        return self.coalescer.run(key, lambda: self._load(key, loader))[0]
+
+    #--------------------------------------------------------------------------
+    def _load(self, key, loader):
+        self.loads += 1
+        value = loader(key)
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    #--------------------------------------------------------------------------
+    def replace_snapshot(self, snapshot):
+        """publish a new snapshot; readers see either the old or the new one
+        in full"""
+        self.snapshot = dict(snapshot)
+
+    #--------------------------------------------------------------------------
+    def clear(self):
+        self.snapshot = {}
+        for a_shard in self.shards:
+            a_shard.clear()
+
+    #--------------------------------------------------------------------------
+    def __contains__(self, key):
+        return key in self.snapshot or key in self._shard(key)
+
+    #--------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.snapshot) + sum(len(x) for x in self.shards)
+
+    #--------------------------------------------------------------------------
+    def statistics(self):
+        """the hit, miss and eviction counters.  The counters are updated
+        without a lock outside of the shards, so under heavy concurrency they
+        are close approximations rather than exact."""
+        return {
+            'hits': self.snapshot_hits + sum(x.hits for x in self.shards),
+            'misses': sum(x.misses for x in self.shards),
+            'evictions': sum(x.evictions for x in self.shards),
+            'coalesced': self.coalesced,
+            'loads': self.loads,
+            'size': len(self),
+        }
@@ -1,5 +1,7 @@
-import collections
+import array
+import datetime as dt
 import functools
+import itertools
 import math
 import threading
 import time
@@ -9,6 +11,14 @@ from socorro.lib.datetimeutil import utc_now
 class UndefinedCounterActionException(Exception):
     pass
 
+#-------------------------------------------------------------------------------
+def sendGauges(statsClient, prefix, values):
+    """send each of the values, a dict, to statsd as the gauge prefix.key;
+    None values are skipped"""
+    for key, value in sorted(values.items()):
+        if value is not None:
+            statsClient.gauge('%s.%s' % (prefix, key), value)
+
 #===============================================================================
 class Statistic(object):
     #---------------------------------------------------------------------------
@@ -60,41 +70,329 @@ class StatsPool(dict):
 
 
 #===============================================================================
-class CounterOverTime(Statistic):
+class RollingCounter(object):
+    """counts, and sums of values, kept in one bucket per minute for the last
+    'historyLengthInMinutes' minutes and the current one.  The current minute
+    is kept in plain attributes, so adding to it is a comparison and an
+    attribute update; when the next minute starts it moves into a ring of
+    arrays indexed by minute.  The writer keeps the totals of the window
+    that ends at its current minute, so a reading in that minute or the next
+    one is O(1); other readings look at each bucket.  A reading covers the
+    completed minutes in the window, not the current one.
+
+    A RollingCounter is written by one thread; other threads may read it.  A
+    minute is either the current one or in the ring, never both."""
     #---------------------------------------------------------------------------
     def __init__(self, historyLengthInMinutes, timeFunction=time.time):
-        super(CounterOverTime, self).__init__()
         self.historyLengthInMinutes = historyLengthInMinutes
-        self.history = collections.deque(maxlen=historyLengthInMinutes)
-        self.currentMinute = 0
-        self.currentCounter = 0
+        self.numberOfBuckets = historyLengthInMinutes + 1
+        self.bucketMinutes = array.array('l', [-1] * self.numberOfBuckets)
+        self.counts = array.array('l', [0] * self.numberOfBuckets)
+        self.sums = array.array('d', [0.0] * self.numberOfBuckets)
+        self.firstMinute = None
+        self.currentMinute = None
+        self.currentCount = 0
+        self.currentSum = 0.0
+        # (count, sum) of the ring's buckets in the window that ends at
+        # currentMinute
+        self.windowTotals = (0, 0.0)
+        # a reading holds until the minute, or what the writer has added,
+        # changes
+        self.readingKey = None
+        self.reading = None
         self.timeFunction = timeFunction
     #---------------------------------------------------------------------------
     def nowMinute(self):
         return int(self.timeFunction()) / 60
     #---------------------------------------------------------------------------
-    def pushOldCounter(self, minute):
-        self.history.append((self.currentMinute, self.currentCounter))
+    def resetBucket(self, index):
+        self.counts[index] = 0
+        self.sums[index] = 0.0
+    #---------------------------------------------------------------------------
+    def resetCurrent(self):
+        self.currentCount = 0
+        self.currentSum = 0.0
+    #---------------------------------------------------------------------------
+    def storeCurrent(self, index):
+        """move the current minute's values into the bucket 'index'"""
+        self.counts[index] = self.currentCount
+        self.sums[index] = self.currentSum
+    #---------------------------------------------------------------------------
+    def loadCurrent(self, index):
+        """take the current minute's values from the bucket 'index'"""
+        self.currentCount = self.counts[index]
+        self.currentSum = self.sums[index]
+    #---------------------------------------------------------------------------
+    def bucketTotals(self, minute):
+        """(count, sum) of the bucket holding 'minute', if the ring has it"""
+        index = minute % self.numberOfBuckets
+        if self.bucketMinutes[index] == minute:
+            return (self.counts[index], self.sums[index])
+        return (0, 0.0)
+    #---------------------------------------------------------------------------
+    def scanWindow(self, now):
+        """(count, sum) of the ring's buckets in the window that ends at
+        'now', by looking at each bucket"""
+        oldest = now - self.historyLengthInMinutes
+        count = 0
+        total = 0.0
+        for minute, aCount, aSum in itertools.izip(self.bucketMinutes,
+                                                   self.counts,
+                                                   self.sums):
+            if oldest <= minute < now:
+                count += aCount
+                total += aSum
+        return (count, total)
+    #---------------------------------------------------------------------------
+    def startMinute(self, minute):
+        """move the current minute into the ring, make 'minute' the current
+        one and bring windowTotals up to date"""
+        previousMinute = self.currentMinute
+        if previousMinute is None:
+            self.firstMinute = minute
+        else:
+            index = previousMinute % self.numberOfBuckets
+            self.storeCurrent(index)
+            self.bucketMinutes[index] = previousMinute
+        index = minute % self.numberOfBuckets
+        if self.bucketMinutes[index] == minute:
+            # the clock went back and came forward again
+            self.loadCurrent(index)
+            self.bucketMinutes[index] = -1
+        else:
+            self.resetCurrent()
+        if previousMinute is not None and minute == previousMinute + 1:
+            count, total = self.windowTotals
+            addedCount, addedSum = self.bucketTotals(previousMinute)
+            evictedCount, evictedSum = self.bucketTotals(
+                previousMinute - self.historyLengthInMinutes)
+            self.windowTotals = (count + addedCount - evictedCount,
+                                 total + addedSum - evictedSum)
+        else:
+            self.windowTotals = self.scanWindow(minute)
         self.currentMinute = minute
-        self.currentCounter = 0
     #---------------------------------------------------------------------------
-    def increment(self,now=None):
+    def addToAnotherMinute(self, value, now):
+        """add a value to a minute that isn't the current one: a late value
+        for a completed minute in the window goes into its bucket, any other
+        minute becomes the current one.  Returns the index of the bucket, or
+        None for the current minute."""
+        if (self.currentMinute is not None and
+            self.currentMinute - self.historyLengthInMinutes <= now <
+            self.currentMinute):
+            index = now % self.numberOfBuckets
+            if self.bucketMinutes[index] != now:
+                self.resetBucket(index)
+                self.bucketMinutes[index] = now
+            self.counts[index] += 1
+            self.sums[index] += value
+            count, total = self.windowTotals
+            self.windowTotals = (count + 1, total + value)
+            self.readingKey = None
+            return index
+        self.startMinute(now)
+        self.currentCount += 1
+        self.currentSum += value
+        return None
+    #---------------------------------------------------------------------------
+    def add(self, value=0.0, now=None):
+        """returns the index of the bucket the value went into, or None for
+        the current minute"""
+        if now is None:
+            now = int(self.timeFunction()) / 60
+        if now == self.currentMinute:
+            self.currentCount += 1
+            self.currentSum += value
+            return None
+        return self.addToAnotherMinute(value, now)
+    #---------------------------------------------------------------------------
+    def increment(self, now=None):
+        """add() for a count without a value"""
+        if now is None:
+            now = int(self.timeFunction()) / 60
+        if now == self.currentMinute:
+            self.currentCount += 1
+        else:
+            self.addToAnotherMinute(0.0, now)
+    #---------------------------------------------------------------------------
+    def windowBuckets(self, now=None):
+        """the indexes of the buckets holding completed minutes in the
+        window"""
         if now is None:
             now = self.nowMinute()
-        if self.currentMinute != now:
-            self.pushOldCounter(now)
-        self.currentCounter += 1
+        oldest = now - self.historyLengthInMinutes
+        return [i for i, minute in enumerate(self.bucketMinutes)
+                  if oldest <= minute < now]
+    #---------------------------------------------------------------------------
+    def currentInWindow(self, currentMinute, now):
+        """True if the writer's current minute, 'currentMinute', is a
+        completed minute in the window that hasn't yet moved into the ring"""
+        return (currentMinute is not None and
+                now - self.historyLengthInMinutes <= currentMinute < now and
+                self.bucketMinutes[currentMinute %
+                                   self.numberOfBuckets] != currentMinute)
     #---------------------------------------------------------------------------
     def read(self, now=None):
+        """returns (count, sum of values) over the window"""
+        if now is None:
+            now = self.nowMinute()
+        currentMinute = self.currentMinute
+        key = (now, currentMinute, self.currentCount)
+        if key != self.readingKey:
+            if now == currentMinute:
+                count, total = self.windowTotals
+            elif currentMinute is not None and now == currentMinute + 1:
+                count, total = self.windowTotals
+                evictedCount, evictedSum = self.bucketTotals(
+                    currentMinute - self.historyLengthInMinutes)
+                count -= evictedCount
+                total -= evictedSum
+            else:
+                count, total = self.scanWindow(now)
+            if self.currentInWindow(currentMinute, now):
+                count += self.currentCount
+                total += self.currentSum
+            self.reading = (count, total)
+            self.readingKey = key
+        return self.reading
+    #---------------------------------------------------------------------------
+    def numberOfMinutes(self, now=None):
+        """the number of completed minutes in the window since the first
+        value was added"""
+        if self.firstMinute is None:
+            return 0
+        if now is None:
+            now = self.nowMinute()
+        return max(0, min(self.historyLengthInMinutes, now - self.firstMinute))
+
+#===============================================================================
+class RollingHistogram(RollingCounter):
+    """a RollingCounter that also keeps a histogram of the values in each
+    minute, so that percentiles over the window, or over several
+    RollingHistograms, can be read without keeping the values themselves.
+
+    The bins grow geometrically from 'smallestValue' by 'binGrowth', so a
+    percentile is within about binGrowth - 1 (10% by default) of the true
+    value.  Values at or below smallestValue share the first bin, values
+    past the last bin share the last one."""
+    smallestValue = 0.001
+    binGrowth = 1.1
+    numberOfBins = 200
+    #---------------------------------------------------------------------------
+    def __init__(self, historyLengthInMinutes, timeFunction=time.time):
+        super(RollingHistogram, self).__init__(historyLengthInMinutes,
+                                               timeFunction)
+        self.histograms = [self.emptyHistogram()
+                           for x in range(self.numberOfBuckets)]
+        self.currentHistogram = self.emptyHistogram()
+        self.logBinGrowth = math.log(self.binGrowth)
+    #---------------------------------------------------------------------------
+    def emptyHistogram(self):
+        return array.array('l', [0] * self.numberOfBins)
+    #---------------------------------------------------------------------------
+    def resetBucket(self, index):
+        super(RollingHistogram, self).resetBucket(index)
+        self.histograms[index] = self.emptyHistogram()
+    #---------------------------------------------------------------------------
+    def resetCurrent(self):
+        super(RollingHistogram, self).resetCurrent()
+        self.currentHistogram = self.emptyHistogram()
+    #---------------------------------------------------------------------------
+    def storeCurrent(self, index):
+        super(RollingHistogram, self).storeCurrent(index)
+        self.histograms[index] = self.currentHistogram
+    #---------------------------------------------------------------------------
+    def loadCurrent(self, index):
+        super(RollingHistogram, self).loadCurrent(index)
+        self.currentHistogram = self.histograms[index]
+    #---------------------------------------------------------------------------
+    def binForValue(self, value):
+        if value <= self.smallestValue:
+            return 0
+        aBin = int(math.log(value / self.smallestValue) / self.logBinGrowth) + 1
+        return min(aBin, self.numberOfBins - 1)
+    #---------------------------------------------------------------------------
+    @classmethod
+    def valueForBin(cls, aBin):
+        """the geometric middle of the bin"""
+        if aBin == 0:
+            return cls.smallestValue
+        return cls.smallestValue * cls.binGrowth ** (aBin - 0.5)
+    #---------------------------------------------------------------------------
+    def add(self, value=0.0, now=None):
+        index = super(RollingHistogram, self).add(value, now)
+        if index is None:
+            self.currentHistogram[self.binForValue(value)] += 1
+        else:
+            self.histograms[index][self.binForValue(value)] += 1
+        return index
+    #---------------------------------------------------------------------------
+    def increment(self, now=None):
+        self.add(0.0, now)
+    #---------------------------------------------------------------------------
+    def addHistogramTo(self, binCounts, now=None):
+        """add the window's bin counts into the list binCounts"""
         if now is None:
             now = self.nowMinute()
-        if self.currentMinute != now:
-            self.pushOldCounter(now)
-        sum = 0
-        for minute, count in self.history:
-            if minute >= now - self.historyLengthInMinutes:
-                sum += count
-        return sum
+        currentMinute = self.currentMinute
+        histograms = [self.histograms[i] for i in self.windowBuckets(now)]
+        if self.currentInWindow(currentMinute, now):
+            histograms.append(self.currentHistogram)
+        for histogram in histograms:
+            for aBin, count in enumerate(histogram):
+                if count:
+                    binCounts[aBin] += count
+        return binCounts
+    #---------------------------------------------------------------------------
+    @classmethod
+    def percentilesOfHistogram(cls, binCounts, percentiles=(50, 95, 99)):
+        """returns a list with the value at each of the percentiles of the
+        merged bin counts, or None for each if there are no values"""
+        total = sum(binCounts)
+        if not total:
+            return [None for x in percentiles]
+        results = []
+        for percentile in percentiles:
+            rank = max(1, int(math.ceil(total * percentile / 100.0)))
+            seen = 0
+            for aBin, count in enumerate(binCounts):
+                seen += count
+                if seen >= rank:
+                    results.append(cls.valueForBin(aBin))
+                    break
+        return results
+    #---------------------------------------------------------------------------
+    def percentiles(self, percentiles=(50, 95, 99), now=None):
+        binCounts = self.addHistogramTo([0] * self.numberOfBins, now)
+        return self.percentilesOfHistogram(binCounts, percentiles)
+
+
+#===============================================================================
+class CounterOverTime(Statistic):
+    """counts events over the last 'historyLengthInMinutes' minutes, an
+    adapter over a RollingCounter"""
+    #---------------------------------------------------------------------------
+    def __init__(self, historyLengthInMinutes, timeFunction=time.time):
+        super(CounterOverTime, self).__init__()
+        self.historyLengthInMinutes = historyLengthInMinutes
+        self.rolling = self.makeRolling(historyLengthInMinutes, timeFunction)
+        self.timeFunction = timeFunction
+    #---------------------------------------------------------------------------
+    @staticmethod
+    def makeRolling(historyLengthInMinutes, timeFunction):
+        return RollingCounter(historyLengthInMinutes, timeFunction)
+    #---------------------------------------------------------------------------
+    def nowMinute(self):
+        return self.rolling.nowMinute()
+    #---------------------------------------------------------------------------
+    def numberOfMinutes(self):
+        return self.rolling.numberOfMinutes()
+    #---------------------------------------------------------------------------
+    def increment(self,now=None):
+        self.rolling.increment(now)
+    #---------------------------------------------------------------------------
+    def read(self, now=None):
+        return self.rolling.read(now)[0]
 
 #===============================================================================
 class CounterPool(StatsPool):
@@ -110,7 +408,10 @@ class CounterPool(StatsPool):
                                           statsInitKwargs)
     #---------------------------------------------------------------------------
     def numberOfMinutes (self):
-        return len(self.values()[0].history)
+        try:
+            return self.values()[0].numberOfMinutes()
+        except IndexError:
+            return 0
     #---------------------------------------------------------------------------
     def read (self):
         return functools.reduce(lambda x, y: x+y.read(), self.values(), 0)
@@ -124,25 +425,36 @@ class CounterPool(StatsPool):
             return 0.0
     #---------------------------------------------------------------------------
     def meanAndStandardDeviation (self):
-        mean = self.average()
-        sum_squares = functools.reduce(lambda x, y: x + (y.read() - mean)**2,
-                                       self.values(),
-                                       0)
+        # read each counter once: both results come from the same readings
+        readings = [x.read() for x in self.values()]
         try:
-            standard_deviation = math.sqrt(sum_squares / len(self))
+            mean = float(sum(readings)) / len(readings)
+            sum_squares = sum((x - mean)**2 for x in readings)
+            standard_deviation = math.sqrt(sum_squares / len(readings))
             return (mean, standard_deviation)
         except ZeroDivisionError:
             return (0.0, 0.0)
     #---------------------------------------------------------------------------
+    def snapshot (self):
+        mean, standard_deviation = self.meanAndStandardDeviation()
+        return {'count': self.read(),
+                'mean': mean,
+                'stddev': standard_deviation}
+    #---------------------------------------------------------------------------
+    def exportToStatsd (self, statsClient, prefix):
+        sendGauges(statsClient, prefix, self.snapshot())
+    #---------------------------------------------------------------------------
     def underPerforming (self):
         mean, stddev = self.meanAndStandardDeviation()
         threshold = mean - stddev
         return [x for x,y in self.iteritems() if y.read() < threshold]
 
 
-import datetime as dt
 #===============================================================================
 class DurationAccumulatorOverTime(CounterOverTime):
+    """accumulates the durations of start/end pairs over the last
+    'historyLengthInMinutes' minutes, an adapter over a RollingHistogram of
+    the durations in seconds"""
     #---------------------------------------------------------------------------
     def __init__(self,
                  historyLengthInMinutes,
@@ -151,17 +463,12 @@ class DurationAccumulatorOverTime(CounterOverTime):
         super(DurationAccumulatorOverTime,
               self).__init__(historyLengthInMinutes,
                              timeFunction)
-        self.timeDeltaAccumulator = dt.timedelta(0)
         self.started = None
         self.datetimeNowFunction = datetimeNowFunction
     #---------------------------------------------------------------------------
-    def pushOldCounter(self, minute):
-        self.history.append((self.currentMinute,
-                             self.currentCounter,
-                             self.timeDeltaAccumulator))
-        self.currentMinute = minute
-        self.timeDeltaAccumulator = dt.timedelta(0)
-        self.currentCounter = 0
+    @staticmethod
+    def makeRolling(historyLengthInMinutes, timeFunction):
+        return RollingHistogram(historyLengthInMinutes, timeFunction)
     #---------------------------------------------------------------------------
     def start(self, starttime=None):
         if starttime:
@@ -174,12 +481,7 @@ class DurationAccumulatorOverTime(CounterOverTime):
             endtime = self.datetimeNowFunction()
         try:
             duration = endtime - self.started
-            if now is None:
-                now = self.nowMinute()
-            if self.currentMinute != now:
-                self.pushOldCounter(now)
-            self.timeDeltaAccumulator += duration
-            self.currentCounter += 1
+            self.rolling.add(duration.total_seconds(), now)
             self.started = None
         except TypeError:
             pass
@@ -188,24 +490,19 @@ class DurationAccumulatorOverTime(CounterOverTime):
         raise UndefinedCounterActionException()
     #---------------------------------------------------------------------------
     def read(self, now=None):
-        if now is None:
-            now = self.nowMinute()
-        if self.currentMinute != now:
-            self.pushOldCounter(now)
-        sum = 0
-        duration_sum = dt.timedelta(0)
-        for minute, count, durations in self.history:
-            if minute >= now - self.historyLengthInMinutes:
-                sum += count
-                duration_sum += durations
-        return (sum, duration_sum)
+        sum, duration_sum = self.rolling.read(now)
+        return (sum, dt.timedelta(seconds=duration_sum))
     #---------------------------------------------------------------------------
     def average(self):
-        sum, duration_sum = self.read()
+        sum, duration_sum = self.rolling.read()
         try:
-            return duration_sum / float(sum)
+            return dt.timedelta(seconds=duration_sum / sum)
         except ZeroDivisionError:
             return 0.0
+    #---------------------------------------------------------------------------
+    def percentiles(self, percentiles=(50, 95, 99), now=None):
+        """the durations, in seconds, at the given percentiles"""
+        return self.rolling.percentiles(percentiles, now)
 
 #===============================================================================
 class DurationAccumulatorPool(CounterPool):
@@ -236,11 +533,29 @@ class DurationAccumulatorPool(CounterPool):
         except ZeroDivisionError:
             return 0.0
     #---------------------------------------------------------------------------
+    def percentiles (self, percentiles=(50, 95, 99)):
+        """the durations, in seconds, at the given percentiles across all the
+        threads' accumulators"""
+        binCounts = [0] * RollingHistogram.numberOfBins
+        for x in self.values():
+            x.rolling.addHistogramTo(binCounts)
+        return RollingHistogram.percentilesOfHistogram(binCounts, percentiles)
+    #---------------------------------------------------------------------------
     def meanAndStandardDeviation (self):
         raise UndefinedCounterActionException()
     #---------------------------------------------------------------------------
     def underPerforming (self):
         raise UndefinedCounterActionException()
+    #---------------------------------------------------------------------------
+    def snapshot (self):
+        """the count, mean and p50/p95/p99 durations, in milliseconds"""
+        count, duration_sum = self.sumDurations()
+        result = {'count': count, 'mean': None}
+        if count:
+            result['mean'] = duration_sum.total_seconds() * 1000.0 / count
+        for name, value in zip(('p50', 'p95', 'p99'), self.percentiles()):
+            result[name] = value if value is None else value * 1000.0
+        return result
 
 #===============================================================================
 class MostRecent(Statistic):
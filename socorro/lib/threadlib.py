@@ -41,6 +41,7 @@
 
 import threading
 import Queue
+import multiprocessing
 import traceback
 import sys
 
@@ -135,3 +136,164 @@ class TaskManagerThread(threading.Thread):
       traceback.print_exc(file=sys.stderr)
       print >>sys.stderr, x
 
+
+
+#====================================
+# P r o c e s s T a s k M a n a g e r
+#====================================
+class ProcessTaskManager(object):
+  """This class is a drop in replacement for the TaskManager that runs the
+  tasks in a set of forked worker processes instead of threads, so that CPU
+  bound tasks are not serialized by the GIL.
+
+  Since the workers are forked, they already hold their own copies of the
+  task functions.  The functions must be given to the constructor in the list
+  'tasks'.  Only the index of the task and its arguments cross the process
+  boundary, so the arguments must be picklable.
+
+  A worker that dies is replaced by a new one the next time a task is
+  queued.  Both the first workers and their replacements are forked from the
+  creating process, so that process must not start any threads of its own:
+  a thread holding a lock at the time of the fork leaves it locked forever in
+  the child.
+  """
+  #----------------
+  # _ _ i n i t _ _
+  #----------------
+  def __init__ (self, numberOfProcesses, tasks, maxQueueSize=0,
+                initializer=None, finalizer=None, quitEvent=None):
+    """Initialize and start all worker processes
+
+    The input parameters:
+        numberOfProcesses - the number of worker processes to fork
+        tasks - the list of functions that may be passed to newTask
+        maxQueueSize - the bound on the task queue, 0 for unbounded
+        initializer - an optional function run in each worker process
+                      before its first task
+        finalizer - an optional function run in each worker process
+                    after its last task
+        quitEvent - an optional multiprocessing.Event shared with the
+                    workers.  Once it is set, by 'quit' or by anything else
+                    holding it, the workers skip the tasks still queued.
+    """
+    self.processList = []
+    self.numberOfProcesses = numberOfProcesses
+    self.tasks = list(tasks)
+    self.initializer = initializer
+    self.finalizer = finalizer
+    if quitEvent is None:
+      quitEvent = multiprocessing.Event()
+    self.quitEvent = quitEvent
+    self.taskQueue = multiprocessing.Queue(maxQueueSize)
+    for x in range(numberOfProcesses):
+      self.processList.append(self.startWorkerProcess())
+
+  #----------------------------------------
+  # s t a r t W o r k e r P r o c e s s
+  #----------------------------------------
+  def startWorkerProcess (self):
+    """Fork and return a new worker process"""
+    if threading.activeCount() > 1:
+      print >>sys.stderr, "forking a worker process while these threads run: %s" % \
+                          ', '.join(t.getName() for t in threading.enumerate()
+                                    if t is not threading.currentThread())
+    newProcess = multiprocessing.Process(target=self.workerProcessMain)
+    newProcess.daemon = True
+    newProcess.start()
+    return newProcess
+
+  #------------------------------------------------
+  # r e s p a w n D e a d P r o c e s s e s
+  #------------------------------------------------
+  def respawnDeadProcesses (self):
+    """Replace the worker processes that have died, unless quitting
+
+    Returns the number of processes replaced.
+    """
+    if self.quitEvent.is_set():
+      return 0
+    numberRespawned = 0
+    for index, process in enumerate(self.processList):
+      if not process.is_alive():
+        print >>sys.stderr, "%s exited with %s - starting a replacement" % \
+                            (process.name, process.exitcode)
+        self.processList[index] = self.startWorkerProcess()
+        numberRespawned += 1
+    return numberRespawned
+
+  #--------------
+  # n e w T a s k
+  #--------------
+  def newTask (self, task, args=None):
+    """Add a task to be executed by a worker process
+
+    task must be one of the functions given to the constructor and args
+    must be picklable.  While the task queue is full, dead workers are
+    replaced every second so that a queue nobody reads can't block forever.
+    """
+    taskTuple = (self.tasks.index(task), args)
+    while True:
+      self.respawnDeadProcesses()
+      try:
+        self.taskQueue.put(taskTuple, True, 1.0)
+        return
+      except Queue.Full:
+        pass
+
+  #------------
+  # q u i t
+  #------------
+  def quit (self):
+    """Tell the worker processes to skip the tasks still queued"""
+    self.quitEvent.set()
+
+  #----------------------------------
+  # w a i t F o r C o m p l e t i o n
+  #----------------------------------
+  def waitForCompletion (self):
+    """Wait for all worker processes to complete their work
+
+    Just like the TaskManager, the workers are told to quit with a task of
+    (None, None), one for each worker process.  Workers that have died are
+    not waited for.
+    """
+    for x in range(self.numberOfProcesses):
+      while [p for p in self.processList if p.is_alive()]:
+        try:
+          self.taskQueue.put((None, None), True, 1.0)
+          break
+        except Queue.Full:
+          pass
+    for p in self.processList:
+      p.join()
+
+  #------------------------------------
+  # w o r k e r P r o c e s s M a i n
+  #------------------------------------
+  def workerProcessMain(self):
+    """The main routine of a worker process.
+
+    The process pulls tasks from the task queue and executes them until it
+    encounters a task with an index of None.  Once the quitEvent is set, the
+    tasks are taken from the queue but not executed.
+    """
+    try:
+      if self.initializer:
+        self.initializer()
+      try:
+        while True:
+          taskIndex, arguments = self.taskQueue.get()
+          if taskIndex is None:
+            break
+          if self.quitEvent.is_set():
+            continue
+          self.tasks[taskIndex](arguments)
+      finally:
+        if self.finalizer:
+          self.finalizer()
+    except KeyboardInterrupt:
+      print >>sys.stderr, "%s caught KeyboardInterrupt" % multiprocessing.current_process().name
+    except Exception, x:
+      print >>sys.stderr, "Something BAD happened in %s:" % multiprocessing.current_process().name
+      traceback.print_exc(file=sys.stderr)
+      print >>sys.stderr, x
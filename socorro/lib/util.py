@@ -4,6 +4,7 @@ import datetime
 import cStringIO
 import threading
 import collections
+import tempfile
 
 import logging
 l = logging.getLogger('webapi')
@@ -212,6 +213,98 @@ class StrCachingIterator(CachingIterator):
     #finally:
     #  self.stopUsingSecondaryCache()
 
+#=================================================================================================================
+class SpoolingStrIterator(object):
+  """ a drop in replacement for StrCachingIterator that doesn't keep the lines it has seen in a list.  The lines are
+      written, already joined with newlines, to a temporary file that stays in memory until it grows beyond
+      maximumMemory bytes and then spills to disk.  Only the limited size secondary cache is kept as a list.
+      'peakMemory' records the most bytes of output held in memory at any one time and 'spooledToDisk' whether the
+      output has spilled.
+  """
+  #-----------------------------------------------------------------------------------------------------------------
+  def __init__(self, anIterator, maximumMemory=1048576):
+    self.theIterator = anIterator
+    self.maximumMemory = maximumMemory
+    self.spool = tempfile.SpooledTemporaryFile(max_size=maximumMemory)
+    self.spoolSize = 0
+    self.spooledToDisk = False
+    self.linesSpooled = 0
+    self.secondaryLimitedSizeCache = collections.deque()
+    self.secondaryCacheMaximumSize = 11
+    self.secondaryCacheBytes = 0
+    self.useSecondary = False
+    self.peakMemory = 0
+  #-----------------------------------------------------------------------------------------------------------------
+  def __iter__(self):
+    for x in self.theIterator:
+      y = repr(x)[1:-3]  #warning expecting a '\n' on the end of every line
+      if self.useSecondary:
+        if len(self.secondaryLimitedSizeCache) == self.secondaryCacheMaximumSize:
+          self.secondaryCacheBytes -= len(self.secondaryLimitedSizeCache.popleft())
+        self.secondaryLimitedSizeCache.append(y)
+        self.secondaryCacheBytes += len(y)
+        self.notePeakMemory()
+      else:
+        self.spoolLine(y)
+      yield y
+  #-----------------------------------------------------------------------------------------------------------------
+  def spoolLine(self, aLine):
+    if self.linesSpooled:
+      self.spool.write('\n')
+      self.spoolSize += 1
+    self.spool.write(aLine)
+    self.spoolSize += len(aLine)
+    self.linesSpooled += 1
+    if not self.spooledToDisk and self.spoolSize > self.maximumMemory:
+      self.spool.rollover()
+      self.spooledToDisk = True
+    self.notePeakMemory()
+  #-----------------------------------------------------------------------------------------------------------------
+  def notePeakMemory(self):
+    memory = self.secondaryCacheBytes
+    if not self.spooledToDisk:
+      memory += self.spoolSize
+    if memory > self.peakMemory:
+      self.peakMemory = memory
+  #-----------------------------------------------------------------------------------------------------------------
+  def useSecondaryCache(self):
+    self.useSecondary = True
+  #-----------------------------------------------------------------------------------------------------------------
+  def stopUsingSecondaryCache(self):
+    self.useSecondary = False
+    for aLine in self.secondaryLimitedSizeCache:
+      self.spoolLine(aLine)
+    self.secondaryCacheBytes = 0
+    self.secondaryLimitedSizeCache = collections.deque()
+  #-----------------------------------------------------------------------------------------------------------------
+  def iterchunks(self, chunkSize=65536):
+    """ read the rest of the lines and yield all of them joined with newlines in pieces of at most chunkSize
+        bytes, read back from the spool one at a time
+    """
+    for x in self:
+      pass
+    self.stopUsingSecondaryCache()
+    self.spool.seek(0)
+    while True:
+      chunk = self.spool.read(chunkSize)
+      if not chunk:
+        break
+      yield chunk
+  #-----------------------------------------------------------------------------------------------------------------
+  def getvalue(self):
+    """ read the rest of the lines and return all of them joined with newlines - the equivalent of
+        '\n'.join(aStrCachingIterator.cache).  Callers that can take the output in pieces should use iterchunks
+        instead, which never holds all of it in memory.
+    """
+    return ''.join(self.iterchunks())
+  #-----------------------------------------------------------------------------------------------------------------
+  def close(self):
+    self.spool.close()
+    try:
+      self.theIterator.close()
+    except AttributeError:
+      pass  # not a file-like object
+
 #-----------------------------------------------------------------------------------------------------------------
 import signal
 # Don't know why this isn't available by importing signal, but not.
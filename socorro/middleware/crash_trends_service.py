@@ -8,6 +8,8 @@ class CrashTrends(DataAPIService):
 
     service_name = "crash_trends"
     uri = "/crashtrends/(.*)"
+    cache_ttl = 3600
+    cache_invalidated_by = ("nightly-builds",)
 
     def __init__(self, config):
         super(CrashTrends, self).__init__(config)
@@ -11,6 +11,7 @@ class CrashesFrequency(DataAPIService):
 
     service_name = "crashes"
     uri = "/crashes/frequency/(.*)"
+    cache_ttl = 300
 
     def __init__(self, config):
         super(CrashesFrequency, self).__init__(config)
@@ -0,0 +1,204 @@
+"""a cache of the responses of the middleware services.
+
+Most of the middleware services answer from tables and materialized views
+that only change when a job refreshes them, yet every request ran its query
+again.  A DataAPIService with a 'cache_ttl' keeps its responses in the
+ResponseCache shared by the whole middleware process, keyed on the service and
+its normalized parameters:
+
+  - the cache holds at most 'responseCacheSize' responses and throws away the
+    least recently used one to make room for a new one.
+  - a response is used for at most 'cache_ttl' seconds.
+  - a response is also thrown away once one of the crontabber jobs named in
+    the service's 'cache_invalidated_by' succeeded again since the response
+    was computed.  The jobs' last successes are read from crontabber's JSON
+    database, 'crontabberDatabase', at most every
+    'responseCacheCheckInterval' seconds.
+  - while a response is being computed, other requests for the same response
+    wait for it rather than running the same query.
+
+'statistics' tells how well the cache does, including the query time that
+it saved."""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from socorro.lib.coalescing import Coalescer
+from socorro.lib.lru_cache import LRUCache
+import socorro.lib.stats as stats
+
+logger = logging.getLogger("webapi")
+
+
+#==============================================================================
+class CrontabberState(object):
+    """the last successes of the crontabber jobs, from the JSON database that
+    crontabber keeps them in"""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, path, check_interval=60, time_function=time.time):
+        self.path = path
+        self.check_interval = check_interval
+        self.time_function = time_function
+        self.lock = threading.Lock()
+        self.checked_at = None
+        self.modified_at = None
+        self.last_successes = {}
+
+    #--------------------------------------------------------------------------
+    def _check(self):
+        now = self.time_function()
+        with self.lock:
+            if (self.checked_at is not None and
+                now - self.checked_at < self.check_interval):
+                return
+            self.checked_at = now
+        try:
+            modified_at = os.stat(self.path).st_mtime
+            if modified_at == self.modified_at:
+                return
+            state_file = open(self.path)
+            try:
+                state = json.load(state_file)
+            finally:
+                state_file.close()
+        except (IOError, OSError, ValueError), x:
+            logger.debug("can't read the crontabber database %s: %s",
+                         self.path, x)
+            return
+        # crontabber writes its dates as strings; they are only compared
+        self.last_successes = dict((app_name, info.get('last_success'))
+                                   for app_name, info in state.items()
+                                   if isinstance(info, dict))
+        self.modified_at = modified_at
+
+    #--------------------------------------------------------------------------
+    def generation(self, app_names):
+        """a value that changes whenever one of the jobs succeeds again"""
+        if not app_names:
+            return None
+        self._check()
+        last_successes = self.last_successes
+        return tuple(last_successes.get(x) for x in app_names)
+
+
+#==============================================================================
+class ResponseCache(object):
+    """the responses, each kept as (expires_at, generation, seconds, value)
+    where 'seconds' is the time it took to compute the value"""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, maximum_size, crontabber_state=None,
+                 time_function=time.time):
+        self.entries = LRUCache(maximum_size)
+        self.crontabber_state = crontabber_state
+        self.time_function = time_function
+        self.coalescer = Coalescer()
+        self.counters_lock = threading.Lock()
+        self.counters = dict.fromkeys(('hits', 'misses', 'coalesced',
+                                       'expired', 'invalidated'), 0)
+        self.saved_seconds = 0.0
+        self.computing_seconds = 0.0
+
+    #--------------------------------------------------------------------------
+    def _generation(self, app_names):
+        if self.crontabber_state is None:
+            return None
+        return self.crontabber_state.generation(app_names)
+
+    #--------------------------------------------------------------------------
+    def _count(self, name, saved_seconds=0.0):
+        with self.counters_lock:
+            self.counters[name] += 1
+            self.saved_seconds += saved_seconds
+
+    #--------------------------------------------------------------------------
+    def _lookup(self, key, generation):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, entry_generation, seconds, value = entry
+        if self.time_function() >= expires_at:
+            self._count('expired')
+            return None
+        if entry_generation != generation:
+            self._count('invalidated')
+            return None
+        self._count('hits', seconds)
+        return value
+
+    #--------------------------------------------------------------------------
+    def get_or_compute(self, key, ttl, app_names, compute):
+        """return the cached response for key or, on a miss, the response from
+        'compute()', caching it for 'ttl' seconds or until one of the
+        crontabber jobs in 'app_names' succeeds again.  If compute raises an
+        exception, nothing is cached and the threads that were waiting for
+        it compute the response themselves."""
+        generation = self._generation(app_names)
+        value = self._lookup(key, generation)
+        if value is not None:
+            return value
+        (value, seconds), shared = self.coalescer.run(
+            key, lambda: self._compute(key, ttl, generation, compute))
+        if shared:
+            self._count('coalesced', seconds)
+        return value
+
+    #--------------------------------------------------------------------------
+    def _compute(self, key, ttl, generation, compute):
+        self._count('misses')
+        start = self.time_function()
+        value = compute()
+        seconds = self.time_function() - start
+        with self.counters_lock:
+            self.computing_seconds += seconds
+        self.entries.put(key, (start + ttl, generation, seconds, value))
+        return value, seconds
+
+    #--------------------------------------------------------------------------
+    def clear(self):
+        self.entries.clear()
+
+    #--------------------------------------------------------------------------
+    def statistics(self):
+        with self.counters_lock:
+            statistics = dict(self.counters)
+            statistics['saved_seconds'] = self.saved_seconds
+            statistics['computing_seconds'] = self.computing_seconds
+        served = (statistics['hits'] + statistics['coalesced'] +
+                  statistics['misses'])
+        statistics['hit_ratio'] = (float(served - statistics['misses']) /
+                                   served if served else 0.0)
+        statistics['size'] = len(self.entries)
+        statistics['evictions'] = self.entries.evictions
+        return statistics
+
+    #--------------------------------------------------------------------------
+    def export_statistics(self, stats_client, prefix):
+        stats.sendGauges(stats_client, prefix, self.statistics())
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+#------------------------------------------------------------------------------
+def get_response_cache(config):
+    """return the response cache that the services of this process share, or
+    None if the configuration turns it off"""
+    global _response_cache
+    maximum_size = config.get('responseCacheSize', 1000)
+    if not maximum_size:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            crontabber_state = None
+            if config.get('crontabberDatabase'):
+                crontabber_state = CrontabberState(
+                    config.crontabberDatabase,
+                    config.get('responseCacheCheckInterval', 60))
+            _response_cache = ResponseCache(maximum_size, crontabber_state)
+        return _response_cache
@@ -0,0 +1,31 @@
+import logging
+
+from socorro.middleware.response_cache import get_response_cache
+from socorro.middleware.service import DataAPIService
+
+logger = logging.getLogger("webapi")
+
+
+class ResponseCacheStatistics(DataAPIService):
+
+    """
+    Return the statistics of the response cache: hits, misses, hit ratio,
+    and the query time it saved.
+    """
+
+    service_name = "response_cache"
+    uri = "/responsecache/statistics/(.*)"
+
+    def __init__(self, config):
+        super(ResponseCacheStatistics, self).__init__(config)
+        logger.debug('ResponseCacheStatistics service __init__')
+
+    def get(self, *args):
+        """
+        Called when a get HTTP request is executed to
+        /responsecache/statistics
+        """
+        response_cache = get_response_cache(self.context)
+        if response_cache is None:
+            return {}
+        return response_cache.statistics()
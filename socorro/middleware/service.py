@@ -2,6 +2,7 @@ import logging
 import sys
 import web
 
+from socorro.middleware.response_cache import get_response_cache
 from socorro.webapi.webapiService import JsonWebServiceBase
 
 logger = logging.getLogger("webapi")
@@ -14,9 +15,15 @@ class DataAPIService(JsonWebServiceBase):
 
     Provide methods for arguments parsing and implementation finding.
 
+    A service whose cache_ttl is set keeps its responses in the response
+    cache for that many seconds, or until one of the crontabber jobs named in
+    cache_invalidated_by succeeds again.
+
     """
 
     service_name = ""
+    cache_ttl = 0
+    cache_invalidated_by = ()
 
     def __init__(self, config):
         """
@@ -27,6 +34,50 @@ class DataAPIService(JsonWebServiceBase):
         """
         super(DataAPIService, self).__init__(config)
         logger.debug('DataAPIService __init__')
+        self.response_cache = None
+        if self.cache_ttl:
+            self.response_cache = get_response_cache(config)
+
+    def get_response(self, *args):
+        """
+        Return the response from the response cache if this service caches
+        its responses, computing it on a miss.
+
+        Requests that force the implementation are not cached.
+
+        """
+        compute = super(DataAPIService, self).get_response
+        if self.response_cache is None:
+            return compute(*args)
+        params = [self.parse_query_string(x) for x in args]
+        if any("force_api_impl" in x for x in params):
+            return compute(*args)
+        key = (self.service_name, self.uri,
+               tuple(self.normalize_params(x) for x in params))
+
+        def compute_whole():
+            body, content_type = compute(*args)
+            if not isinstance(body, basestring):
+                # a streamed response can only be sent once
+                body = "".join(body)
+            return body, content_type
+
+        return self.response_cache.get_or_compute(key, self.cache_ttl,
+                                                  self.cache_invalidated_by,
+                                                  compute_whole)
+
+    def normalize_params(self, params):
+        """
+        Return parameters as a hashable value that is the same for the same
+        parameters in any order.
+
+        """
+        normalized = []
+        for key, value in sorted(params.items()):
+            if isinstance(value, list):
+                value = tuple(value)
+            normalized.append((key, value))
+        return tuple(normalized)
 
     def get_module(self, params):
         """
@@ -5,6 +5,7 @@ class SignatureSummary(DataAPIService):
 
     service_name = "signature_summary"
     uri = "/signaturesummary/(.*)"
+    cache_ttl = 300
 
     def __init__(self, config):
         super(SignatureSummary, self).__init__(config)
@@ -13,6 +13,7 @@ class TCBS(DataAPIService):
 
     service_name = "tcbs"
     uri = "/crashes/signatures/(.*)"
+    cache_ttl = 300
 
     def __init__(self, config):
         """
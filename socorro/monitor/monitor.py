@@ -5,6 +5,8 @@ import psycopg2
 import time
 import signal
 import threading
+import heapq
+import itertools
 
 import logging
 
@@ -52,6 +54,9 @@ class Monitor (object):
     self.standardLoopDelay = config.standardLoopDelay.seconds
     self.cleanupJobsLoopDelay = config.cleanupJobsLoopDelay.seconds
     self.priorityLoopDelay = config.priorityLoopDelay.seconds
+    self.jobBatchSize = config.get('monitorJobBatchSize', 500)
+    # uuids already taken from crash storage whose batch could not be queued - they are queued on the next pass
+    self.uuidsToRetry = []
 
     self.databaseConnectionPool = self.sdb.DatabaseConnectionPool(config, logger)
 
@@ -199,16 +204,6 @@ class Monitor (object):
     except:
       socorro.lib.util.reportExceptionAndContinue(logger)
 
-  #-----------------------------------------------------------------------------------------------------------------
-  @staticmethod
-  def compareSecondOfSequence (x, y):
-    return cmp(x[1], y[1])
-
-  #-----------------------------------------------------------------------------------------------------------------
-  #@staticmethod
-  #def secondOfSequence(x):
-    #return x[1]
-
   #-----------------------------------------------------------------------------------------------------------------
   def jobSchedulerIter(self, aCursor):
     """ This takes a snap shot of the state of the processors as well as the number of jobs assigned to each
@@ -239,17 +234,17 @@ class Monitor (object):
           self.quit = True
           aCursor.connection.rollback()
           socorro.lib.util.reportExceptionAndAbort(logger)
-      listOfProcessorIds = [[aRow[0], aRow[1]] for aRow in aCursor.fetchall()]  #processorId, numberOfAssignedJobs
-      logger.debug("listOfProcessorIds: %s", str(listOfProcessorIds))
-      if not listOfProcessorIds:
+      # a heap of (numberOfAssignedJobs, processorId) keeps the processor with the fewest jobs on top
+      heapOfProcessorIds = [(aRow[1], aRow[0]) for aRow in aCursor.fetchall()]
+      logger.debug("heapOfProcessorIds: %s", str(heapOfProcessorIds))
+      if not heapOfProcessorIds:
         raise Monitor.NoProcessorsRegisteredException("There are no processors registered")
+      heapq.heapify(heapOfProcessorIds)
       while True:
-        logger.debug("sort the list of (processorId, numberOfAssignedJobs) pairs")
-        listOfProcessorIds.sort(Monitor.compareSecondOfSequence)
         # the processor with the fewest jobs is about to be assigned a new job, so increment its count
-        listOfProcessorIds[0][1] += 1
-        logger.debug("yield the processorId which had the fewest jobs: %d", listOfProcessorIds[0][0])
-        yield listOfProcessorIds[0][0]
+        numberOfAssignedJobs, processorId = heapOfProcessorIds[0]
+        heapq.heapreplace(heapOfProcessorIds, (numberOfAssignedJobs + 1, processorId))
+        yield processorId
     except Monitor.NoProcessorsRegisteredException:
       self.quit = True
       socorro.lib.util.reportExceptionAndAbort(logger)
@@ -288,13 +283,124 @@ class Monitor (object):
     return processorIdAssignedToThisJob
 
   #-----------------------------------------------------------------------------------------------------------------
-  def queuePriorityJob (self, databaseCursor, uuid, processorIdSequenceGenerator):
-    processorIdAssignedToThisJob = self.queueJob(databaseCursor, uuid, processorIdSequenceGenerator, priority=1)
-    if processorIdAssignedToThisJob:
-      databaseCursor.execute("insert into priority_jobs_%d (uuid) values ('%s')" % (processorIdAssignedToThisJob, uuid))
-    databaseCursor.execute("delete from priorityjobs where uuid = %s", (uuid,))
-    databaseCursor.connection.commit()
-    return processorIdAssignedToThisJob
+  @staticmethod
+  def insertJobRows (databaseCursor, jobRows):
+    """ insert (pathname, uuid, owner, priority, queuedDateTime) rows into the jobs table with a single statement
+    """
+    databaseCursor.execute("insert into jobs (pathname, uuid, owner, priority, queuedDateTime) values %s" %
+                           ", ".join(["(%s, %s, %s, %s, %s)"] * len(jobRows)),
+                           [x for aJobRow in jobRows for x in aJobRow])
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def queueJobs (self, databaseCursor, uuids, processorIdSequenceGenerator, priority=0):
+    """ assign owners to a batch of uuids and queue them all with one insert and one commit.  If the batch is
+        refused because one of the uuids is already in the queue, the jobs are inserted one at a time so that
+        the rest of them still get queued.
+        returns: a list of (uuid, processorId) pairs for the jobs that were queued
+    """
+    if not uuids:
+      return []
+    now = utc_now()
+    jobRows = [('', uuid, processorIdSequenceGenerator.next(), priority, now) for uuid in uuids]
+    try:
+      Monitor.insertJobRows(databaseCursor, jobRows)
+      databaseCursor.connection.commit()
+    except psycopg2.IntegrityError:
+      databaseCursor.connection.rollback()
+      logger.warning("a batch of %d jobs was refused - queuing them one at a time", len(jobRows))
+      queuedJobs = []
+      for aJobRow in jobRows:
+        try:
+          Monitor.insertJobRows(databaseCursor, [aJobRow])
+          databaseCursor.connection.commit()
+          queuedJobs.append((aJobRow[1], aJobRow[2]))
+        except psycopg2.IntegrityError:
+          databaseCursor.connection.rollback()
+          logger.warning("%s is already in the queue", aJobRow[1])
+      return queuedJobs
+    except:
+      databaseCursor.connection.rollback()
+      raise
+    logger.debug("%d jobs assigned to processors", len(jobRows))
+    return [(x[1], x[2]) for x in jobRows]
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def queueJobBatch (self, databaseCursor, uuids, processorIdSequenceGenerator):
+    """ queue the uuids collected by standardJobAllocationLoop, then honor any pending quit request.  The uuids are
+        already gone from crash storage's queue, so if the batch can't be queued they are kept for the next pass.
+    """
+    try:
+      self.queueJobs(databaseCursor, uuids, processorIdSequenceGenerator)
+      self.quitCheck()
+    except KeyboardInterrupt:
+      logger.debug("inner detects quit")
+      self.quit = True
+      raise
+    except:
+      socorro.lib.util.reportExceptionAndContinue(logger)
+      logger.warning("%d jobs could not be queued - they will be retried on the next pass", len(uuids))
+      self.uuidsToRetry.extend(uuids)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  @staticmethod
+  def insertProcessorPriorityJobs (databaseCursor, processorId, uuids):
+    """ tell a processor about its priority jobs with a single insert into its priority_jobs_N table
+    """
+    databaseCursor.execute("insert into priority_jobs_%d (uuid) values %s" %
+                           (processorId, ", ".join(["(%s)"] * len(uuids))), list(uuids))
+
+  #-----------------------------------------------------------------------------------------------------------------
+  @staticmethod
+  def insertProcessorPriorityJobsOneAtATime (databaseCursor, uuidsByProcessorId):
+    """ used once an insertProcessorPriorityJobs was refused because a processor already had one of the uuids:
+        insert and commit the priority jobs one at a time so that the rest of them still get to their processors
+    """
+    for processorId, uuids in uuidsByProcessorId.iteritems():
+      for uuid in uuids:
+        try:
+          Monitor.insertProcessorPriorityJobs(databaseCursor, processorId, [uuid])
+          databaseCursor.connection.commit()
+        except psycopg2.IntegrityError:
+          databaseCursor.connection.rollback()
+          logger.warning("%s is already a priority job of processor %d", uuid, processorId)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  @staticmethod
+  def deletePriorityJobs (databaseCursor, uuids, priorityTableName="priorityjobs"):
+    databaseCursor.execute("delete from %s where uuid in %%s" % priorityTableName, (tuple(uuids),))
+
+  #-----------------------------------------------------------------------------------------------------------------
+  @staticmethod
+  def groupByProcessor (listOfUuidProcessorIdPairs):
+    """ returns: a mapping of processorId to the list of uuids assigned to it
+    """
+    uuidsByProcessorId = {}
+    for uuid, processorId in listOfUuidProcessorIdPairs:
+      uuidsByProcessorId.setdefault(processorId, []).append(uuid)
+    return uuidsByProcessorId
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def queuePriorityJobs (self, databaseCursor, uuids, processorIdSequenceGenerator):
+    """ queue a batch of priority jobs, then tell each processor about its share with one insert per processor.
+        returns: a list of (uuid, processorId) pairs for the jobs that were queued
+    """
+    queuedJobs = self.queueJobs(databaseCursor, uuids, processorIdSequenceGenerator, priority=1)
+    uuidsByProcessorId = Monitor.groupByProcessor(queuedJobs)
+    try:
+      try:
+        for processorId, uuidsForProcessor in uuidsByProcessorId.iteritems():
+          Monitor.insertProcessorPriorityJobs(databaseCursor, processorId, uuidsForProcessor)
+      except psycopg2.IntegrityError:
+        databaseCursor.connection.rollback()
+        logger.warning("%d priority jobs were refused - inserting them one at a time", len(queuedJobs))
+        Monitor.insertProcessorPriorityJobsOneAtATime(databaseCursor, uuidsByProcessorId)
+      if queuedJobs:
+        Monitor.deletePriorityJobs(databaseCursor, [x[0] for x in queuedJobs])
+      databaseCursor.connection.commit()
+    except:
+      databaseCursor.connection.rollback()
+      raise
+    return queuedJobs
 
   #-----------------------------------------------------------------------------------------------------------------
   def standardJobAllocationLoop(self):
@@ -323,17 +429,16 @@ class Monitor (object):
           logger.debug("beginning index scan")
           try:
             logger.debug("starting destructiveDateWalk")
-            for uuid in crashStorage.newUuids():
-              try:
-                logger.debug("looping: %s", uuid)
-                self.quitCheck()
-                self.queueJob(databaseCursor, uuid, processorIdSequenceGenerator)
-              except KeyboardInterrupt:
-                logger.debug("inner detects quit")
-                self.quit = True
-                raise
-              except:
-                socorro.lib.util.reportExceptionAndContinue(logger)
+            # the uuids are already gone from storage's queue, so a quit request waits for them to be queued
+            uuidBatch = []
+            uuidsToRetry, self.uuidsToRetry = self.uuidsToRetry, []
+            for uuid in itertools.chain(uuidsToRetry, crashStorage.newUuids()):
+              logger.debug("looping: %s", uuid)
+              uuidBatch.append(uuid)
+              if len(uuidBatch) >= self.jobBatchSize or self.quit:
+                self.queueJobBatch(databaseCursor, uuidBatch, processorIdSequenceGenerator)
+                uuidBatch = []
+            self.queueJobBatch(databaseCursor, uuidBatch, processorIdSequenceGenerator)
             logger.debug("ended destructiveDateWalk")
           except hbc.FatalException:
             raise
@@ -369,56 +474,66 @@ class Monitor (object):
 
   #-----------------------------------------------------------------------------------------------------------------
   def lookForPriorityJobsAlreadyInQueue(self, databaseCursor, setOfPriorityUuids):
-    # check for uuids already in the queue
-    for uuid in list(setOfPriorityUuids):
+    # check for uuids already in the queue - one join finds all of them and their owners
+    databaseCursor.execute("select jobs.uuid, jobs.owner from jobs join priorityjobs on jobs.uuid = priorityjobs.uuid")
+    jobsAlreadyInQueue = [(uuid, owner) for uuid, owner in databaseCursor.fetchall() if uuid in setOfPriorityUuids]
+    for prexistingJobOwner, uuids in Monitor.groupByProcessor(jobsAlreadyInQueue).iteritems():
       self.quitCheck()
+      setOfPriorityUuids.difference_update(uuids)
+      if prexistingJobOwner is None:
+        logger.debug("%d priority jobs are waiting for reassignment", len(uuids))
+        continue
+      logger.info("%d priority jobs were already in the queue, assigned to %d", len(uuids), prexistingJobOwner)
       try:
-        prexistingJobOwner = psy.singleValueSql(databaseCursor, "select owner from jobs where uuid = '%s'" % uuid)
-        logger.info("priority job %s was already in the queue, assigned to %d", uuid, prexistingJobOwner)
-        try:
-          databaseCursor.execute("insert into priority_jobs_%d (uuid) values ('%s')" % (prexistingJobOwner, uuid))
-        except psycopg2.ProgrammingError:
-          logger.debug("%s assigned to dead processor %d - wait for reassignment", uuid, prexistingJobOwner)
-          # likely that the job is assigned to a dead processor
-          # skip processing it this time around - by next time hopefully it will have been
-          # re assigned to a live processor
-          databaseCursor.connection.rollback()
-          setOfPriorityUuids.remove(uuid)
-          continue
-        databaseCursor.execute("delete from priorityjobs where uuid = %s", (uuid,))
-        databaseCursor.connection.commit()
-        setOfPriorityUuids.remove(uuid)
-      except psy.SQLDidNotReturnSingleValue:
-        #logger.debug("priority job %s was not already in the queue", uuid)
-        pass
+        Monitor.insertProcessorPriorityJobs(databaseCursor, prexistingJobOwner, uuids)
+      except psycopg2.ProgrammingError:
+        logger.debug("%d priority jobs assigned to dead processor %d - wait for reassignment", len(uuids),
+                     prexistingJobOwner)
+        # likely that the jobs are assigned to a dead processor
+        # skip processing them this time around - by next time hopefully they will have been
+        # re assigned to a live processor
+        databaseCursor.connection.rollback()
+        continue
+      except psycopg2.IntegrityError:
+        databaseCursor.connection.rollback()
+        logger.warning("%d priority jobs were refused - inserting them one at a time", len(uuids))
+        Monitor.insertProcessorPriorityJobsOneAtATime(databaseCursor, {prexistingJobOwner: uuids})
+      Monitor.deletePriorityJobs(databaseCursor, uuids)
+      databaseCursor.connection.commit()
 
   #-----------------------------------------------------------------------------------------------------------------
   def lookForPriorityJobsInDumpStorage(self, databaseCursor, setOfPriorityUuids):
-    # check for jobs in symlink directories
+    # check for jobs in storage, asking about a batch of uuids at a time
     logger.debug("starting lookForPriorityJobsInDumpStorage")
     processorIdSequenceGenerator = None
-    for uuid in list(setOfPriorityUuids):
-      logger.debug("looking for %s", uuid)
-      if self.crashStorePool.crashStorage().uuidInStorage(uuid):
-        logger.info("priority queuing %s", uuid)
-        if not processorIdSequenceGenerator:
-          logger.debug("about to get unbalancedJobScheduler")
-          processorIdSequenceGenerator = self.unbalancedJobSchedulerIter(databaseCursor)
-          logger.debug("unbalancedJobScheduler successfully fetched")
-        processorIdAssignedToThisJob = self.queuePriorityJob(databaseCursor, uuid, processorIdSequenceGenerator)
-        logger.info("%s assigned to %d", uuid, processorIdAssignedToThisJob)
-        setOfPriorityUuids.remove(uuid)
-        databaseCursor.execute("delete from priorityjobs where uuid = %s", (uuid,))
-        databaseCursor.connection.commit()
+    listOfPriorityUuids = list(setOfPriorityUuids)
+    for i in range(0, len(listOfPriorityUuids), self.jobBatchSize):
+      self.quitCheck()
+      uuidsInStorage = self.crashStorePool.crashStorage().uuidsInStorage(listOfPriorityUuids[i:i + self.jobBatchSize])
+      if not uuidsInStorage:
+        continue
+      logger.info("priority queuing %d jobs", len(uuidsInStorage))
+      if not processorIdSequenceGenerator:
+        logger.debug("about to get unbalancedJobScheduler")
+        processorIdSequenceGenerator = self.unbalancedJobSchedulerIter(databaseCursor)
+        logger.debug("unbalancedJobScheduler successfully fetched")
+      for uuid, processorId in self.queuePriorityJobs(databaseCursor, list(uuidsInStorage),
+                                                      processorIdSequenceGenerator):
+        logger.info("%s assigned to %d", uuid, processorId)
+      # any that were refused were queued by someone else in the meantime and will be found in the jobs table
+      # on the next pass
+      setOfPriorityUuids.difference_update(uuidsInStorage)
 
   #-----------------------------------------------------------------------------------------------------------------
   def priorityJobsNotFound(self, databaseCursor, setOfPriorityUuids, priorityTableName="priorityjobs"):
     # we've failed to find the uuids anywhere
+    if not setOfPriorityUuids:
+      return
+    self.quitCheck()
     for uuid in setOfPriorityUuids:
-      self.quitCheck()
       logger.error("priority uuid %s was never found", uuid)
-      databaseCursor.execute("delete from %s where uuid = %s" % (priorityTableName, "%s"), (uuid,))
-      databaseCursor.connection.commit()
+    Monitor.deletePriorityJobs(databaseCursor, setOfPriorityUuids, priorityTableName)
+    databaseCursor.connection.commit()
 
   #-----------------------------------------------------------------------------------------------------------------
   def priorityJobAllocationLoop(self):
@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+"""time indexing processed crashes in a local fake Elastic Search that takes
+a simulated round trip per request: one synchronous request per crash on a
+kept alive connection (as the processor's worker threads submit ooids)
+against handing them to an ElasticSearchBulkIndexer.  Prints the time spent
+by the worker thread and the time until everything was indexed.
+
+usage: timeBulkIndexer.py [roundTripMilliseconds [numberOfCrashes [batchSize]]]"""
+
+import BaseHTTPServer
+import json
+import sys
+import threading
+import time
+
+import socorro.lib.httpclient as httpc
+import socorro.lib.util as sutil
+import socorro.processor.bulk_indexer as bulk
+
+class LatencyHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  wbufsize = -1
+  requests = 0
+  def do_POST(self):
+    body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+    time.sleep(self.server.latency)
+    LatencyHandler.requests += 1
+    if self.path == '/_bulk':
+      items = [{'index': {'ok': True}} for x in body.splitlines()[::2]]
+      response = json.dumps({'took': 1, 'items': items})
+    else:
+      response = '{"ok": true}'
+    self.send_response(200)
+    self.send_header('Content-Length', str(len(response)))
+    self.end_headers()
+    self.wfile.write(response)
+    self.wfile.flush()
+  do_PUT = do_POST
+  def log_message(self, *args):
+    pass
+
+def crashes(numberOfCrashes):
+  for x in range(numberOfCrashes):
+    yield {'uuid': '%026x120504' % x, 'date_processed': '2012-05-04 03:04:05.0',
+           'signature': 'js::GC::Mark%d' % (x % 100), 'dump': 'OS|Windows NT|6.1\n' * 40}
+
+def report(label, numberOfCrashes, workerSeconds, totalSeconds):
+  print "time: %-12s %6d crashes %6d requests worker %8.3fs (%6.3fms per crash) total %8.3fs" % (
+    label, numberOfCrashes, LatencyHandler.requests, workerSeconds, workerSeconds * 1000 / numberOfCrashes,
+    totalSeconds)
+
+def main(roundTripMilliseconds=2.0, numberOfCrashes=2000, batchSize=500):
+  server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), LatencyHandler)
+  server.latency = roundTripMilliseconds / 1000.0
+  serverThread = threading.Thread(target=server.serve_forever)
+  serverThread.daemon = True
+  serverThread.start()
+  port = server.server_address[1]
+  print "%.2fms round trip, batches of %d" % (roundTripMilliseconds, batchSize)
+
+  LatencyHandler.requests = 0
+  client = httpc.HttpClient('127.0.0.1', port, timeout=5, pool=httpc.HttpConnectionPool(1))
+  start = time.time()
+  for crash in crashes(numberOfCrashes):
+    with client:
+      client.post('/queue/tasks/%s' % crash['uuid'], '')
+  seconds = time.time() - start
+  report('per crash', numberOfCrashes, seconds, seconds)
+  client.pool.clear()
+
+  LatencyHandler.requests = 0
+  indexer = bulk.ElasticSearchBulkIndexer('http://127.0.0.1:%d' % port, sutil.SilentFakeLogger(),
+                                          batch_size=batchSize, queue_size=numberOfCrashes)
+  start = time.time()
+  for crash in crashes(numberOfCrashes):
+    indexer.index(crash)
+  workerSeconds = time.time() - start
+  indexer.close()
+  report('bulk', numberOfCrashes, workerSeconds, time.time() - start)
+  server.shutdown()
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((float, int, int), args)])
@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+"""time short-lived threads, like the collector's and the web services', that
+each make one request of a fake crash storage with a simulated connection
+setup and a simulated round trip: each thread keeping a crash storage by its
+name (what every crashStorage call did), and each thread borrowing one from
+the pool.  Prints the time to get through the threads and the crash storage
+connections made and left open.
+
+usage: timeCrashStoragePool.py [connectMilliseconds [roundTripMilliseconds [numberOfThreads [concurrency]]]]"""
+
+import sys
+import threading
+import time
+
+import socorro.lib.util as sutil
+import socorro.storage.crashstorage as cstore
+
+class LatencyCrashStorage(object):
+  connectLatency = 0.0
+  roundTripLatency = 0.0
+  def __init__(self, config):
+    time.sleep(self.connectLatency)
+  def get_meta(self, uuid):
+    time.sleep(self.roundTripLatency)
+    return {'uuid': uuid}
+  def isAlive(self):
+    return True
+  def close(self):
+    pass
+
+def timeThreads(label, pool, request, numberOfThreads, concurrency):
+  start = time.time()
+  for x in range(0, numberOfThreads, concurrency):
+    threads = [threading.Thread(target=request, args=('%030x120504' % y,))
+               for y in range(x, min(x + concurrency, numberOfThreads))]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+  seconds = time.time() - start
+  statistics = pool.statistics()
+  print "time: %-8s %5d threads %8.3fs %7.3fms per thread %5d connects %5d open" % (
+    label, numberOfThreads, seconds, seconds * 1000 / numberOfThreads, statistics['connects'], statistics['open'])
+
+def main(connectMilliseconds=5.0, roundTripMilliseconds=2.0, numberOfThreads=1000, concurrency=10):
+  LatencyCrashStorage.connectLatency = connectMilliseconds / 1000.0
+  LatencyCrashStorage.roundTripLatency = roundTripMilliseconds / 1000.0
+  print "%.2fms connect, %.2fms round trip, %d at a time" % (connectMilliseconds, roundTripMilliseconds, concurrency)
+  config = sutil.DotDict({'logger': sutil.SilentFakeLogger(), 'crashStoragePoolCheckInterval': 0})
+  pool = cstore.CrashStoragePool(config, storageClass=LatencyCrashStorage)
+  timeThreads('kept', pool, lambda uuid: pool.crashStorage().get_meta(uuid), numberOfThreads, concurrency)
+  pool.cleanup()
+  pool = cstore.CrashStoragePool(config, storageClass=LatencyCrashStorage)
+  def borrow(uuid):
+    with pool.borrowed() as crashStorage:
+      crashStorage.get_meta(uuid)
+  timeThreads('borrowed', pool, borrow, numberOfThreads, concurrency)
+  pool.cleanup()
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((float, float, int, int), args)])
@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+"""time writing the dailyUrl csv files for a synthetic day of reports: the way
+dailyUrlDump did it (the whole result fetched at once, the os versions munged
+with regular expressions for every crash, both gzip files written by the
+thread that reads the rows) against the way it does now (fetchmany from a
+named cursor, an OsVersionCache, and a background writer thread per file).
+There is no database here, so each fetch costs a fixed, simulated time.  Each
+run is done in its own child process, whose peak resident size is reported.
+
+usage: timeDailyUrlDump.py [numberOfCrashes [fetchSize [fetchMilliseconds]]]"""
+
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import socorro.cron.dailyUrl as dailyUrl
+import socorro.lib.util as sutil
+from socorro.database.cachedIdAccess import IdCache
+
+import datetime as dt
+
+class RegexIdCache(IdCache):
+  def __init__(self):
+    pass
+
+osVersions = [('Windows NT', '6.1.7601 Service Pack 1'), ('Windows NT', '5.1.2600 Service Pack 3'),
+              ('Mac OS X', '10.7.4 11E53'), ('Linux', '0.0.0 Linux 2.6.35-30-generic #56-Ubuntu SMP i686'),
+              ('Linux', '0.0.0 Linux 3.2.0-24-generic #39-Ubuntu SMP x86_64')]
+
+def crashRows(numberOfCrashes):
+  for x in xrange(numberOfCrashes):
+    osName, osVersion = osVersions[x % len(osVersions)]
+    yield ['js::GC::Mark%d' % (x % 1000), 'http://example.com/%d' % x,
+           'http://crash-stats.mozilla.com/report/index/%026x120504' % x, '201205040304', '201205040305',
+           3600, 'Firefox', '13.0', '20120504030405', '13.0', osName, osVersion,
+           'x86 | GenuineIntel family 6 model 23 stepping 10', '0x0', [700000 + x % 10] if x % 3 else [],
+           None if x % 4 else 'it crashed\twhile I was typing', 120, 'fred@example.com' if x % 7 == 0 else '',
+           12345, 'xul.dll', 'checked', '11.2.202.235', None, 'EXCEPTION_ACCESS_VIOLATION_READ', None,
+           'AdapterVendorID: 0x10de', 86400, None, 'release', '{ec8030f7-c36f-4ad0-9f05-c4ff1f8c6f0d}']
+
+class FakeNamedCursor(object):
+  def __init__(self, numberOfCrashes, latency):
+    self.rows = crashRows(numberOfCrashes)
+    self.latency = latency
+    self.description = [('c%d' % x,) for x in range(30)]
+  def execute(self, sql):
+    pass
+  def fetchmany(self, size):
+    time.sleep(self.latency)
+    return [row for row, x in zip(self.rows, xrange(size))]
+  def fetchall(self):
+    rows = []
+    while True:
+      some = self.fetchmany(10000)
+      if not some:
+        return rows
+      rows.extend(some)
+
+def config(outputPath):
+  conf = sutil.DotDict()
+  conf.day = dt.date(2012, 5, 4)
+  conf.outputPath = outputPath
+  conf.publicOutputPath = outputPath
+  return conf
+
+def processCrashBefore(a_crash_row, id_cache):
+  """process_crash as it was"""
+  column_value_list = []
+  os_name = None
+  for i, x in enumerate(a_crash_row):
+    if x is None:
+      x = r'\N'
+    if i == 10:
+      x = os_name = x.strip()
+    if i == 11:
+      x = id_cache.getAppropriateOsVersion(os_name, x)
+      os_name=None
+    if i == 14:
+      x = ','.join(str(bugid) for bugid in x)
+    if i == 15:
+      x = x.replace('\t',' ');
+    if i == 17:
+      if '@' in x:
+        x='yes'
+      else:
+        x = ''
+    if type(x) == str:
+      x = x.strip().replace('\r','').replace('\n',' | ')
+    column_value_list.append(x)
+  return column_value_list
+
+def before(numberOfCrashes, fetchSize, latency, outputPath):
+  cursor = FakeNamedCursor(numberOfCrashes, latency)
+  idCache = RegexIdCache()
+  with dailyUrl.gzipped_csv_files(config(outputPath), gzip=gzip) as handles:
+    for row in cursor.fetchall():
+      dailyUrl.write_row(handles, processCrashBefore(row, idCache))
+
+def after(numberOfCrashes, fetchSize, latency, outputPath):
+  cursor = FakeNamedCursor(numberOfCrashes, latency)
+  idCache = dailyUrl.OsVersionCache(RegexIdCache())
+  with dailyUrl.gzipped_csv_files(config(outputPath)) as gzippedHandles:
+    with dailyUrl.background_csv_writers(gzippedHandles) as handles:
+      for row in dailyUrl.fetch_rows(cursor, 'select', fetchSize):
+        dailyUrl.write_row(handles, dailyUrl.process_crash(row, idCache))
+
+def timeDump(label, dump, numberOfCrashes, fetchSize, latency):
+  outputPath = tempfile.mkdtemp()
+  pid = os.fork()
+  if pid == 0:
+    dump(numberOfCrashes, fetchSize, latency, outputPath)
+    os._exit(0)
+  start = time.time()
+  status, rusage = os.wait4(pid, 0)[1:]
+  seconds = time.time() - start
+  size = sum(os.path.getsize(os.path.join(outputPath, x)) for x in os.listdir(outputPath))
+  shutil.rmtree(outputPath)
+  print "time: %-7s %8d crashes %10d gzipped bytes %8.3fs cpu %8.3fs peak rss %7.1fMB" % (
+    label, numberOfCrashes, size, seconds, rusage.ru_utime + rusage.ru_stime, rusage.ru_maxrss / 1024.0)
+
+def main(numberOfCrashes=200000, fetchSize=10000, fetchMilliseconds=50.0):
+  latency = fetchMilliseconds / 1000.0
+  print "%d crashes, %.1fms per fetch of %d rows" % (numberOfCrashes, fetchMilliseconds, fetchSize)
+  timeDump('before', before, numberOfCrashes, fetchSize, latency)
+  timeDump('after', after, numberOfCrashes, fetchSize, latency)
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((int, int, float), args)])
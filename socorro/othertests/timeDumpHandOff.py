@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+"""time handing dumps from 50KB to 50MB to a stackwalker through each
+dumpHandOff: a new file in a temporary directory for each dump (what
+dumpPathForUuid always did), a ring of reusable files in a tmpfs directory,
+and anonymous memory files.  The stackwalker is stood in for by reading the
+whole dump back through the pathname, in a child process with
+'readInChild'.  Also prints the bytes that the process sent toward storage
+and the part of them that was cancelled before reaching the disk, from
+/proc/self/io.
+
+usage: timeDumpHandOff.py [temporaryDirectory [tmpfsDirectory [numberOfDumps [readInChild]]]]"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import socorro.processor.dump_handoff as dho
+
+def readBack(pathname, readInChild):
+  if readInChild:
+    subprocess.check_call(['cat', pathname], stdout=open(os.devnull, 'w'))
+  else:
+    dumpFile = open(pathname, 'rb')
+    try:
+      dumpFile.read()
+    finally:
+      dumpFile.close()
+
+def storageWrites():
+  try:
+    counters = dict(line.split(': ') for line in open('/proc/self/io').read().splitlines())
+    return int(counters['write_bytes']), int(counters['cancelled_write_bytes'])
+  except (IOError, KeyError):
+    return 0, 0
+
+def timeHandOff(label, handOff, dump, numberOfDumps, readInChild):
+  writtenBefore, cancelledBefore = storageWrites()
+  start = time.time()
+  for x in range(numberOfDumps):
+    pathname = handOff.put('%030x120504' % x, dump)
+    readBack(pathname, readInChild)
+    handOff.release(pathname)
+  seconds = time.time() - start
+  written, cancelled = storageWrites()
+  print "time: %-6s %8dKB %4d dumps %8.3fs %8.3fms per dump %8dKB written %8dKB cancelled" % (
+    label, len(dump) / 1024, numberOfDumps, seconds, seconds * 1000 / numberOfDumps,
+    (written - writtenBefore) / 1024, (cancelled - cancelledBefore) / 1024)
+
+def main(temporaryDirectory=tempfile.gettempdir(), tmpfsDirectory='/dev/shm', numberOfDumps=50, readInChild=0):
+  print "temporary files in %s, tmpfs ring in %s" % (temporaryDirectory, tmpfsDirectory)
+  for size in (50 * 1024, 500 * 1024, 5 * 1024 * 1024, 50 * 1024 * 1024):
+    dump = os.urandom(size)
+    count = max(1, numberOfDumps * 50 * 1024 / size) if size > 500 * 1024 else numberOfDumps
+    handOffs = [('file', dho.TemporaryFileHandOff(temporaryDirectory)),
+                ('tmpfs', dho.TmpfsRingHandOff(tmpfsDirectory, 1))]
+    try:
+      handOffs.append(('memfd', dho.MemfdHandOff()))
+    except NotImplementedError:
+      print "memfd_create is not available here"
+    for label, handOff in handOffs:
+      timeHandOff(label, handOff, dump, max(count, 5), readInChild)
+      handOff.close()
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((str, str, int, int), args)])
@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+"""count the round trips and time ElasticSearchBase.query over a range of
+days where only some of the daily indexes exist: finding the missing indexes
+one IndexMissingException at a time (what happens while the index catalog
+can't be loaded, and what query always did before it) against resolving the
+range with the index catalog.  There is no Elastic Search here, so each
+request to the fake one costs a fixed, simulated round trip.
+
+usage: timeEsIndexCatalog.py [roundTripMilliseconds [numberOfDays [numberOfQueries]]]"""
+
+import datetime
+import json
+import sys
+import time
+
+import socorro.lib.util as sutil
+from socorro.external.elasticsearch.base import ElasticSearchBase, IndexCatalog
+
+class LatencyElasticSearch(object):
+  """answers like an Elastic Search that has every third daily index"""
+  def __init__(self, existing, latency):
+    self.existing = existing
+    self.latency = latency
+    self.requests = 0
+  def __enter__(self):
+    pass
+  def __exit__(self, *args):
+    pass
+  def get(self, uri):
+    time.sleep(self.latency)
+    self.requests += 1
+    return json.dumps(dict((x, {'aliases': {}}) for x in self.existing))
+  def post(self, uri, data):
+    time.sleep(self.latency)
+    self.requests += 1
+    for index in uri.split('/')[1].split(','):
+      if index not in self.existing:
+        return {'error': {'code': 404, 'reason': 'Not Found',
+                          'data': 'IndexMissingException[[%s] missing]' % index}}
+    return '{"hits": {"total": 0, "hits": []}}'
+
+def timeQueries(label, base, fake, fromDate, toDate, numberOfQueries):
+  start = time.time()
+  for x in range(numberOfQueries):
+    base.query(fromDate, toDate, '{}')
+  seconds = time.time() - start
+  print "time: %-8s %4d queries %6d requests %6.2f per query %8.3fs" % (label, numberOfQueries, fake.requests,
+                                                                        float(fake.requests) / numberOfQueries, seconds)
+
+def main(roundTripMilliseconds=2.0, numberOfDays=30, numberOfQueries=50):
+  latency = roundTripMilliseconds / 1000.0
+  toDate = datetime.date(2012, 5, 31)
+  fromDate = toDate - datetime.timedelta(numberOfDays - 1)
+  existing = set('socorro_%s' % (fromDate + datetime.timedelta(x)).strftime('%y%m%d')
+                 for x in range(0, numberOfDays, 3))
+  print "%.2fms round trip, %d days, %d indexes" % (roundTripMilliseconds, numberOfDays, len(existing))
+  for label, loadable in (('retries', False), ('catalog', True)):
+    context = sutil.DotDict(elasticSearchHostname='', elasticSearchPort=9200)
+    base = ElasticSearchBase(config=context)
+    fake = LatencyElasticSearch(existing, latency)
+    base.http = fake
+    base.index_catalog = IndexCatalog('', 9200)
+    base.index_catalog.http = fake
+    if not loadable:
+      base.index_catalog.refresh = lambda: None
+      base.index_catalog.loaded_at = time.time()
+    timeQueries(label, base, fake, fromDate.isoformat(), toDate.isoformat(), numberOfQueries)
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((float, int, int), args)])
@@ -0,0 +1,70 @@
+#! /usr/bin/env python
+"""time union_scan_with_prefix (16 salted scanners one after another, one row
+per scannerGet) against parallel_union_scan_with_prefix (16 scanners at once,
+scannerGetList batches).  There is no HBase here, so each call on the fake
+Thrift client costs a fixed, simulated round trip.
+
+usage: timeHbaseScan.py [roundTripMilliseconds [rowsPerSalt [batchSize]]]"""
+
+import itertools
+import sys
+import time
+
+import socorro.lib.util as sutil
+import socorro.storage.hbaseClient as hbc
+
+class FakeColumn(object):
+  def __init__(self, value):
+    self.value = value
+
+class FakeRawRow(object):
+  def __init__(self, row):
+    self.row = row
+    self.columns = {'processed_data:json': FakeColumn('{}')}
+
+class LatencyScanningClient(object):
+  def __init__(self, rowsPerSalt, latency):
+    self.rowsPerSalt = rowsPerSalt
+    self.latency = latency
+    self.scanners = {}
+  def scannerOpenWithPrefix(self, table, prefix, columns):
+    time.sleep(self.latency)
+    scanner = len(self.scanners)
+    self.scanners[scanner] = iter(['%s%026x' % (prefix, i) for i in range(self.rowsPerSalt)])
+    return scanner
+  def scannerGet(self, scanner):
+    return self.scannerGetList(scanner, 1)
+  def scannerGetList(self, scanner, numberOfRows):
+    time.sleep(self.latency)
+    return [FakeRawRow(x) for x in itertools.islice(self.scanners[scanner], numberOfRows)]
+  def scannerClose(self, scanner):
+    time.sleep(self.latency)
+
+def makeConnection(rowsPerSalt, latency):
+  conn = hbc.HBaseConnectionForCrashReports.__new__(hbc.HBaseConnectionForCrashReports)
+  conn.logger = sutil.SilentFakeLogger()
+  conn.client = LatencyScanningClient(rowsPerSalt, latency)
+  conn.close = lambda: None
+  return conn
+
+def timeScan(label, rows):
+  start = time.time()
+  count = 0
+  for row in rows:
+    count += 1
+  seconds = time.time() - start
+  print "time: %-10s %7d rows %8.3fs %10.1f rows/sec" % (label, count, seconds, count / seconds)
+
+def main(roundTripMilliseconds=0.2, rowsPerSalt=500, batchSize=100):
+  latency = roundTripMilliseconds / 1000.0
+  print "%.2fms round trip, %d rows per salt, batches of %d" % (roundTripMilliseconds, rowsPerSalt, batchSize)
+  conn = makeConnection(rowsPerSalt, latency)
+  timeScan('serial', conn.union_scan_with_prefix('crash_reports', '120504', ['processed_data:json']))
+  timeScan('parallel', conn.parallel_union_scan_with_prefix('crash_reports', '120504', ['processed_data:json'],
+                                                            batch_size=batchSize,
+                                                            connection_factory=lambda: makeConnection(rowsPerSalt,
+                                                                                                      latency)))
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((float, int, int), args)])
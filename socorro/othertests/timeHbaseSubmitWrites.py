@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+"""count the Thrift round trips and time the writes that put_json_dump makes
+per crash, writing each index row and counter as it comes against buffering
+them with a flush interval.  There is no HBase here, so each call on the fake
+Thrift client costs a fixed, simulated round trip.
+
+usage: timeHbaseSubmitWrites.py [roundTripMilliseconds [numberOfCrashes]]"""
+
+import sys
+import time
+
+import socorro.storage.hbaseClient as hbc
+
+class LatencyThriftClient(object):
+  def __init__(self, latency):
+    self.latency = latency
+  def mutateRow(self, *args):
+    time.sleep(self.latency)
+  def mutateRows(self, *args):
+    time.sleep(self.latency)
+  def atomicIncrement(self, *args):
+    time.sleep(self.latency)
+
+def makeConnection(latency, writeFlushInterval):
+  conn = hbc.HBaseConnectionForCrashReports.__new__(hbc.HBaseConnectionForCrashReports)
+  conn.round_trips = 0
+  conn.client = hbc.ThriftCallCounter(LatencyThriftClient(latency), conn)
+  conn.hbaseThriftExceptions = ()
+  conn.mutationClass = lambda column, value: (column, value)
+  conn.batchMutationClass = lambda row, mutations: (row, mutations)
+  conn.write_flush_interval = writeFlushInterval
+  conn.pending_rows = {}
+  conn.pending_counters = {}
+  conn.last_flush = time.time()
+  return conn
+
+def crashes(numberOfCrashes):
+  for x in range(numberOfCrashes):
+    ooid = '%026x%06d' % (x, 120504)
+    jsonData = {'submitted_timestamp': '2012-05-04T03:%02d:00' % (x / 1000 % 60),
+                'legacy_processing': x % 2}
+    if x % 10 == 0:
+      jsonData['ProcessType'] = 'plugin'
+      jsonData['HangID'] = 'hang%d' % x
+    yield ooid, jsonData
+
+def timeWrites(label, conn, numberOfCrashes):
+  start = time.time()
+  for ooid, jsonData in crashes(numberOfCrashes):
+    conn.put_json_dump(ooid, jsonData, 'dump')
+    conn.flush_pending_writes_if_due()
+  if conn.write_flush_interval is not None:
+    conn.flush_pending_writes()
+  seconds = time.time() - start
+  print "time: %-14s %6d crashes %7d round trips %6.2f per crash %8.3fs" % (label, numberOfCrashes, conn.round_trips,
+                                                                            float(conn.round_trips) / numberOfCrashes,
+                                                                            seconds)
+
+def main(roundTripMilliseconds=0.2, numberOfCrashes=2000):
+  latency = roundTripMilliseconds / 1000.0
+  print "%.2fms round trip" % roundTripMilliseconds
+  timeWrites('unbuffered', makeConnection(latency, None), numberOfCrashes)
+  for interval in (0, 0.1, 1.0):
+    timeWrites('flush %.1fs' % interval, makeConnection(latency, interval), numberOfCrashes)
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((float, int), args)])
@@ -0,0 +1,77 @@
+#! /usr/bin/env python
+"""time HttpClient requests against a local keep-alive HTTP server, opening
+a new connection for every 'with' block against borrowing one from an
+HttpConnectionPool, and count the connections that the server accepted.
+
+usage: timeHttpClient.py [numberOfRequests [numberOfThreads]]"""
+
+import BaseHTTPServer
+import sys
+import threading
+import time
+
+import socorro.lib.httpclient as httpc
+
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  wbufsize = -1 # one send per response, as a real server makes
+  connections = 0
+  def setup(self):
+    BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+    KeepAliveHandler.connections += 1
+  def do_POST(self):
+    self.rfile.read(int(self.headers.get('Content-Length', 0)))
+    body = '{"hits": {"total": 0}}'
+    self.send_response(200)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+    self.wfile.flush()
+  def log_message(self, *args):
+    pass
+
+class ThreadedHTTPServer(BaseHTTPServer.HTTPServer):
+  def process_request(self, request, client_address):
+    thread = threading.Thread(target=self.process_request_thread, args=(request, client_address))
+    thread.daemon = True
+    thread.start()
+  def process_request_thread(self, request, client_address):
+    try:
+      self.finish_request(request, client_address)
+    finally:
+      self.shutdown_request(request)
+
+def timeRequests(label, port, numberOfRequests, numberOfThreads, pool):
+  KeepAliveHandler.connections = 0
+  def worker():
+    client = httpc.HttpClient('127.0.0.1', port, timeout=5, pool=pool)
+    for x in range(numberOfRequests // numberOfThreads):
+      with client:
+        client.post('/socorro_120504/_search', '{"query": {"match_all": {}}}')
+  threads = [threading.Thread(target=worker) for x in range(numberOfThreads)]
+  start = time.time()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  seconds = time.time() - start
+  print "time: %-8s %6d requests %6d connections %8.3fs %8.1f requests/sec" % (label, numberOfRequests,
+                                                                                KeepAliveHandler.connections,
+                                                                                seconds, numberOfRequests / seconds)
+
+def main(numberOfRequests=2000, numberOfThreads=4):
+  server = ThreadedHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+  serverThread = threading.Thread(target=server.serve_forever)
+  serverThread.daemon = True
+  serverThread.start()
+  port = server.server_address[1]
+  timeRequests('new', port, numberOfRequests, numberOfThreads, None)
+  pool = httpc.HttpConnectionPool(maximum_per_host=numberOfThreads)
+  timeRequests('pooled', port, numberOfRequests, numberOfThreads, pool)
+  print pool.statistics()
+  pool.clear()
+  server.shutdown()
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[int(x) for x in args])
@@ -0,0 +1,66 @@
+#! /usr/bin/env python
+"""stress the id caches from many threads at once: a plain dict filled on
+every miss (what cachedIdAccess used to keep) against a ShardedCache, whose
+misses on the same key are coalesced.  There is no database here, so each
+lookup that misses costs a fixed, simulated query.
+
+usage: timeIdCache.py [queryMilliseconds [numberOfThreads [lookupsPerThread [numberOfKeys [cacheSize]]]]]"""
+
+import random
+import sys
+import threading
+import time
+
+from socorro.lib.sharded_cache import ShardedCache
+
+class DictCache(object):
+  """the old way: an unbounded dict, every thread that misses runs its own query"""
+  def __init__(self):
+    self.cache = {}
+    self.loads = 0
+  def get_or_load(self, key, loader):
+    try:
+      return self.cache[key]
+    except KeyError:
+      self.loads += 1
+      self.cache[key] = value = loader(key)
+      return value
+  def statistics(self):
+    return {'loads': self.loads, 'size': len(self.cache), 'evictions': 0}
+
+def keys(numberOfKeys, lookups, seed):
+  """a skewed stream of keys: a few urls are very common, most are rare"""
+  rand = random.Random(seed)
+  return [('domain', 'url%d' % int(numberOfKeys ** rand.random())) for x in range(lookups)]
+
+def timeCache(label, cache, latency, numberOfThreads, lookupsPerThread, numberOfKeys):
+  def loader(key):
+    time.sleep(latency)
+    return hash(key)
+  def work(stream):
+    for key in stream:
+      cache.get_or_load(key, loader)
+  threads = [threading.Thread(target=work, args=(keys(numberOfKeys, lookupsPerThread, x),))
+             for x in range(numberOfThreads)]
+  start = time.time()
+  for aThread in threads:
+    aThread.start()
+  for aThread in threads:
+    aThread.join()
+  seconds = time.time() - start
+  lookups = numberOfThreads * lookupsPerThread
+  statistics = cache.statistics()
+  print "time: %-9s %7d lookups %6d queries %6d cached %6d evicted %8.3fs %10.1f lookups/sec" % (
+    label, lookups, statistics['loads'], statistics['size'], statistics['evictions'], seconds, lookups / seconds)
+
+def main(queryMilliseconds=1.0, numberOfThreads=16, lookupsPerThread=5000, numberOfKeys=4000, cacheSize=4096):
+  latency = queryMilliseconds / 1000.0
+  print "%.2fms query, %d threads, %d lookups each, %d keys, cache size %d" % (queryMilliseconds, numberOfThreads,
+                                                                             lookupsPerThread, numberOfKeys, cacheSize)
+  timeCache('dict', DictCache(), latency, numberOfThreads, lookupsPerThread, numberOfKeys)
+  timeCache('sharded', ShardedCache(cacheSize), latency, numberOfThreads, lookupsPerThread, numberOfKeys)
+  timeCache('sharded/4', ShardedCache(cacheSize / 4), latency, numberOfThreads, lookupsPerThread, numberOfKeys)
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((float, int, int, int, int), args)])
@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+"""time how many jobs per second the processor's main thread can claim from
+the 'jobs' table, one job at a time versus in batches.
+
+usage: timeJobClaim.py [host [dbname [user [password [port]]]]]
+
+The jobs are put into a temporary 'jobs' table that shadows the real one for
+the duration of the benchmark connection, so any database will do."""
+
+import sys
+import time
+
+import socorro.lib.util as sutil
+import socorro.lib.datetimeutil as sdt
+import socorro.database.database as sdb
+import socorro.processor.processor as proc
+
+numberOfJobs = 20000
+batchSizes = [50, 200, 1000]
+
+defaults = ['localhost', 'test', 'test', 'aPassword', 5432]
+arguments = sys.argv[1:] + defaults[len(sys.argv[1:]):]
+config = sutil.DotDict(zip(['databaseHost', 'databaseName', 'databaseUserName',
+                            'databasePassword', 'databasePort'],
+                           arguments))
+config.logger = sutil.FakeLogger()
+
+class FakeThreadManager(object):
+  def newTask(self, task, args=None):
+    pass
+
+class ClaimingProcessor(object):
+  """just enough of a Processor to run its job claiming methods"""
+  def __init__(self, databaseConnectionPool):
+    self.sdb = sdb
+    self.databaseConnectionPool = databaseConnectionPool
+    self.nowFunc = sdt.utc_now
+    self.threadManager = FakeThreadManager()
+    self.processJobWithRetry = None
+  submitJobToThreads = proc.Processor.submitJobToThreads.im_func
+  claimJobBatch = proc.Processor.claimJobBatch.im_func
+  submitJobBatchToThreads = proc.Processor.submitJobBatchToThreads.im_func
+
+def resetJobs(databaseConnectionPool):
+  connection, cursor = databaseConnectionPool.connectionCursorPair()
+  cursor.execute("""create temporary table jobs (
+                      id serial not null primary key,
+                      uuid varchar(50) not null,
+                      owner integer,
+                      priority integer default 0,
+                      queueddatetime timestamp with time zone default now(),
+                      starteddatetime timestamp with time zone)""")
+  cursor.execute("""insert into jobs (uuid, owner)
+                    select 'ooid' || x, 1 from generate_series(1, %s) as x""",
+                 (numberOfJobs,))
+  connection.commit()
+  cursor.execute("select id, uuid, priority from jobs order by id")
+  jobs = cursor.fetchall()
+  connection.commit()
+  return jobs
+
+def dropJobs(databaseConnectionPool):
+  connection, cursor = databaseConnectionPool.connectionCursorPair()
+  cursor.execute("drop table jobs")
+  connection.commit()
+
+def display(seconds, label):
+  print label, 'time: %03.3f' % seconds, \
+        'jobs/sec: %.1f' % (numberOfJobs / seconds)
+
+def oneAtATime(databaseConnectionPool):
+  jobs = resetJobs(databaseConnectionPool)
+  p = ClaimingProcessor(databaseConnectionPool)
+  start = time.time()
+  for aJobTuple in jobs:
+    p.submitJobToThreads(aJobTuple)
+  stop = time.time()
+  dropJobs(databaseConnectionPool)
+  display(stop - start, 'one at a time')
+
+def batched(databaseConnectionPool, batchSize):
+  jobs = resetJobs(databaseConnectionPool)
+  p = ClaimingProcessor(databaseConnectionPool)
+  start = time.time()
+  for i in range(0, len(jobs), batchSize):
+    p.submitJobBatchToThreads(p.claimJobBatch(jobs[i:i + batchSize]))
+  stop = time.time()
+  dropJobs(databaseConnectionPool)
+  display(stop - start, 'batches of %d' % batchSize)
+
+if __name__ == '__main__':
+  databaseConnectionPool = sdb.DatabaseConnectionPool(config, config.logger)
+  try:
+    oneAtATime(databaseConnectionPool)
+    for batchSize in batchSizes:
+      batched(databaseConnectionPool, batchSize)
+  finally:
+    databaseConnectionPool.cleanup()
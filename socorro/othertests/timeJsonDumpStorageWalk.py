@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+"""count the file system calls and time the discovery of new crashes in a
+JsonDumpStorage: walking the date branch symbolic links (the way
+destructiveDateWalk used to) against reading the per day journals.  Each walk
+runs on a fresh copy of the same tree of past crashes.  The first journal
+walk includes the crash recovery check that each JsonDumpStorage makes on its
+first visit to a day; a long running monitor has made it already, as in the
+second.  The idle poll is a second discovery with nothing new.
+
+usage: timeJsonDumpStorageWalk.py [numberOfCrashes [numberOfDays [directory]]]"""
+
+import datetime
+import os
+import shutil
+import sys
+import time
+
+import socorro.lib.JsonDumpStorage as JDS
+import socorro.lib.filesystem as socorro_fs
+import socorro.lib.ooid as socorro_ooid
+import socorro.lib.util as sutil
+from socorro.lib.datetimeutil import UTC
+
+class CountingOs(object):
+  """os, counting the calls made through it and its path module"""
+  def __init__(self):
+    self.calls = 0
+    self.path = CountingPath(self)
+  def __getattr__(self, name):
+    function = getattr(os, name)
+    def counted(*args, **kwargs):
+      self.calls += 1
+      return function(*args, **kwargs)
+    return counted
+
+class CountingPath(object):
+  def __init__(self, counter):
+    self.counter = counter
+  def __getattr__(self, name):
+    function = getattr(os.path, name)
+    def counted(*args, **kwargs):
+      self.counter.calls += 1
+      return function(*args, **kwargs)
+    return counted
+
+def walkDateBranch(storage):
+  """the date branch walk that destructiveDateWalk made before the journals"""
+  for daily in storage.osModule.listdir(storage.root):
+    for dir, dirs, files in storage.osModule.walk(os.sep.join((storage.root, daily, storage.dateName))):
+      for d in dirs:
+        if storage.osModule.path.islink(os.path.join(dir, d)):
+          nameDir = storage.namePath(d)[0]
+          if not storage.osModule.path.isfile(os.path.join(nameDir, d + storage.jsonSuffix)):
+            continue
+          if not storage.osModule.path.isfile(os.path.join(nameDir, d + storage.dumpSuffix)):
+            continue
+          if storage.osModule.path.islink(os.path.join(nameDir, d)):
+            storage.osModule.unlink(os.path.join(nameDir, d))
+            storage.osModule.unlink(os.path.join(dir, d))
+            yield d
+      socorro_fs.cleanEmptySubdirectories(os.path.join(storage.root, daily), dir, storage.osModule)
+
+def makeTree(root, numberOfCrashes, numberOfDays):
+  storage = JDS.JsonDumpStorage(root, logger=sutil.SilentFakeLogger())
+  for x in range(numberOfCrashes):
+    timestamp = datetime.datetime(2012, 5, 1, tzinfo=UTC) + datetime.timedelta(days=x % numberOfDays, seconds=x * 7 % 86400)
+    ooid = socorro_ooid.createNewOoid(timestamp)
+    fj, fd = storage.newEntry(ooid, 'webhead%02d' % (x % 4), timestamp)
+    fj.close()
+    fd.close()
+
+def timeDiscovery(label, pristine, root, discover, walkLabel='walk', journalsChecked=False):
+  shutil.rmtree(root, True)
+  shutil.copytree(pristine, root, symlinks=True)
+  counter = CountingOs()
+  storage = JDS.JsonDumpStorage(root, osModule=counter, logger=sutil.SilentFakeLogger())
+  if journalsChecked:
+    storage.journalsChecked.update(os.listdir(root))
+  for poll in (walkLabel, 'idle poll'):
+    counter.calls = 0
+    start = time.time()
+    count = len(list(discover(storage)))
+    seconds = time.time() - start
+    print "time: %-8s %-10s %6d crashes %8d calls %8.3fs" % (label, poll, count, counter.calls, seconds)
+
+def main(numberOfCrashes=5000, numberOfDays=3, directory='/tmp/timeJsonDumpStorageWalk'):
+  pristine = os.path.join(directory, 'pristine')
+  root = os.path.join(directory, 'root')
+  shutil.rmtree(directory, True)
+  os.makedirs(pristine)
+  makeTree(pristine, numberOfCrashes, numberOfDays)
+  timeDiscovery('symlinks', pristine, root, walkDateBranch)
+  timeDiscovery('journal', pristine, root, lambda storage: storage.destructiveDateWalk(), walkLabel='first walk')
+  timeDiscovery('journal', pristine, root, lambda storage: storage.destructiveDateWalk(), journalsChecked=True)
+  shutil.rmtree(directory, True)
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((int, int, str), args)])
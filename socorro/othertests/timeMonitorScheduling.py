@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+"""time the monitor's job queuing: the old way (sort the processor list for
+every job, one insert and one commit per crash) against the heap scheduler
+with batched inserts.  There is no database here, so each execute and commit
+on the fake cursor costs a fixed, simulated round trip.
+
+usage: timeMonitorScheduling.py [roundTripMilliseconds [numberOfCrashes]]"""
+
+import sys
+import time
+
+import socorro.lib.util as sutil
+import socorro.monitor.monitor as monitor
+
+class LatencyConnection(object):
+  def __init__(self, cursor, latency):
+    self.theCursor = cursor
+    self.latency = latency
+  def cursor(self):
+    return self.theCursor
+  def commit(self):
+    time.sleep(self.latency)
+  def rollback(self):
+    time.sleep(self.latency)
+
+class LatencyCursor(object):
+  def __init__(self, processorLoads, latency):
+    self.connection = LatencyConnection(self, latency)
+    self.processorLoads = processorLoads
+    self.latency = latency
+    self.statements = 0
+  def execute(self, sql, parameters=None):
+    self.statements += 1
+    time.sleep(self.latency)
+  def fetchall(self):
+    return self.processorLoads
+
+def oldJobSchedulerIter(aCursor):
+  """the scheduler as it was: a stable sort of the whole list for every job"""
+  listOfProcessorIds = [[aRow[0], aRow[1]] for aRow in aCursor.fetchall()]
+  while True:
+    listOfProcessorIds.sort(lambda x, y: cmp(x[1], y[1]))
+    listOfProcessorIds[0][1] += 1
+    yield listOfProcessorIds[0][0]
+
+def makeMonitor():
+  m = monitor.Monitor.__new__(monitor.Monitor)
+  m.quit = False
+  m.config = sutil.DotDict(processorCheckInTime="00:05:00")
+  return m
+
+def timeOld(uuids, cursor):
+  m = makeMonitor()
+  scheduler = oldJobSchedulerIter(cursor)
+  for uuid in uuids:
+    m.queueJob(cursor, uuid, scheduler)
+
+def timeNew(uuids, cursor, batchSize=500):
+  m = makeMonitor()
+  scheduler = m.jobSchedulerIter(cursor)
+  for i in range(0, len(uuids), batchSize):
+    m.queueJobs(cursor, uuids[i:i + batchSize], scheduler)
+
+def display(label, numberOfCrashes, cursor, seconds):
+  print "time: %-6s %6d crashes %6d statements %8.3fs %10.1f crashes/sec" % (label, numberOfCrashes,
+                                                                             cursor.statements, seconds,
+                                                                             numberOfCrashes / seconds)
+
+def main(roundTripMilliseconds=0.5, numberOfCrashes=5000):
+  monitor.logger = sutil.SilentFakeLogger()
+  latency = roundTripMilliseconds / 1000.0
+  uuids = ['%032x' % x for x in range(numberOfCrashes)]
+  for numberOfProcessors in (4, 40, 400):
+    processorLoads = [(x, x % 7) for x in range(numberOfProcessors)]
+    print "%d processors, %.2fms round trip" % (numberOfProcessors, roundTripMilliseconds)
+    for label, fn in (('old', timeOld), ('new', timeNew)):
+      cursor = LatencyCursor(processorLoads, latency)
+      start = time.time()
+      fn(uuids, cursor)
+      display(label, numberOfCrashes, cursor, time.time() - start)
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((float, int), args)])
@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+"""time inserting crashes' reports, extensions and plugins_reports rows the old way (a savepoint, the insert and a
+release savepoint per row, with the partition name worked out through mondayPairsIteratorFactory) against
+PartitionedTable.executeOnPartition, which sends a savepoint and the row to a partition it knows about in one round
+trip.  There is no database here, so each round trip costs a fixed, simulated time.
+
+usage: timePartitionInsert.py [roundTripMilliseconds [numberOfCrashes]]"""
+
+import datetime as dt
+import logging
+import sys
+import time
+
+import socorro.database.schema as schema
+
+class LatencyCursor(object):
+  def __init__(self, latency):
+    self.latency = latency
+    self.statements = 0
+    self.description = None
+    self.connection = self
+  def execute(self, sql, parameters=None):
+    time.sleep(self.latency)
+    self.statements += 1
+  def fetchall(self):
+    return []
+  def commit(self):
+    pass
+  def rollback(self):
+    pass
+
+def savepointInsert(table, cursor, row, date_processed):
+  """what PartitionedTable.insert used to do for every row"""
+  dateRangeTuple = schema.mondayPairsIteratorFactory(date_processed, date_processed).next()
+  partitionName = table.partitionCreationParameters(dateRangeTuple)["partitionName"]
+  cursor.execute("savepoint %s" % partitionName)
+  cursor.execute(table.insertSql.replace('TABLENAME', partitionName), row)
+  cursor.execute("release savepoint %s" % partitionName)
+
+def routedInsert(table, cursor, row, date_processed):
+  table.insert(cursor, row, lambda: (cursor.connection, cursor), date_processed=date_processed)
+
+def timeInserts(label, insertFunction, latency, numberOfCrashes):
+  logger = logging.getLogger('timePartitionInsert')
+  tables = [schema.ReportsTable(logger), schema.ExtensionsTable(logger), schema.PluginsReportsTable(logger)]
+  cursor = LatencyCursor(latency)
+  start = time.time()
+  for x in range(numberOfCrashes):
+    date_processed = dt.datetime(2012, 5, 1) + dt.timedelta(minutes=x)
+    for table in tables:
+      insertFunction(table, cursor, (x,), date_processed)
+  seconds = time.time() - start
+  rows = numberOfCrashes * len(tables)
+  print "time: %-10s %6d rows %7d statements %8.3fs %10.1f rows/sec" % (label, rows, cursor.statements, seconds,
+                                                                         rows / seconds)
+
+def main(roundTripMilliseconds=0.2, numberOfCrashes=2000):
+  latency = roundTripMilliseconds / 1000.0
+  print "%.2fms round trip" % roundTripMilliseconds
+  timeInserts('savepoint', savepointInsert, latency, numberOfCrashes)
+  timeInserts('routed', routedInsert, latency, numberOfCrashes)
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((float, int), args)])
@@ -0,0 +1,56 @@
+#! /usr/bin/env python
+"""time storing and reading a processed crash whose dump has the given number
+of frames per thread, as json text (what put_processed_json always wrote) and
+in the compressed format of socorro.storage.processed_crash_format.  Prints
+the stored size and the time to encode, to decode the whole crash, to decode
+it without its dump and to read just its header.
+
+usage: timeProcessedCrashFormat.py [framesPerThread [numberOfThreads [repetitions]]]"""
+
+import sys
+import time
+
+try:
+  import json
+except ImportError:
+  import simplejson as json
+
+import socorro.storage.processed_crash_format as pcf
+
+def processedCrash(framesPerThread, numberOfThreads):
+  dumpLines = ['OS|Windows NT|6.1.7601 Service Pack 1', 'CPU|x86|GenuineIntel family 6 model 23 stepping 10|2',
+               'Crash|EXCEPTION_ACCESS_VIOLATION_READ|0x0|0']
+  dumpLines.extend('Module|module%d.dll|6.1.7601.17514|module%d.pdb|%032X2|0x%08x|0x%08x|0' % (x, x, x, x * 0x10000, x * 0x10000 + 0xffff)
+                   for x in range(150))
+  for thread in range(numberOfThreads):
+    dumpLines.extend('%d|%d|xul.dll|nsFrame::Function%d(nsIFrame*)|hg:hg.mozilla.org/mozilla-central:layout/generic/nsFrame.cpp:%x|%d|0x%x'
+                     % (thread, frame, frame, frame * 7919, frame * 31, frame * 13) for frame in range(framesPerThread))
+  return {'uuid': 'abcdefghijklmnopqrstuvwxyz120504', 'signature': 'nsFrame::Function0(nsIFrame*)',
+          'product': 'Firefox', 'version': '12.0', 'os_name': 'Windows NT', 'success': True,
+          'date_processed': '2012-05-04 03:04:05.123456', 'completeddatetime': '2012-05-04 03:04:06.654321',
+          'addons': [['addon%d@example.com' % x, '1.%d' % x] for x in range(10)],
+          'dump': '\n'.join(dumpLines)}
+
+def timeIt(label, function, stored, repetitions):
+  start = time.time()
+  for x in range(repetitions):
+    function(stored)
+  seconds = time.time() - start
+  print "time: %-22s %8.3fms" % (label, seconds * 1000 / repetitions)
+
+def main(framesPerThread=40, numberOfThreads=20, repetitions=200):
+  crash = processedCrash(framesPerThread, numberOfThreads)
+  storedJson = json.dumps(crash)
+  storedCompressed = pcf.encode(crash)
+  print "%d frames per thread, %d threads: %d bytes of json, %d bytes compressed" % (framesPerThread, numberOfThreads,
+                                                                                     len(storedJson), len(storedCompressed))
+  timeIt('encode json', json.dumps, crash, repetitions)
+  timeIt('encode compressed', pcf.encode, crash, repetitions)
+  for label, stored in (('json', storedJson), ('compressed', storedCompressed)):
+    timeIt('decode %s' % label, pcf.decode, stored, repetitions)
+    timeIt('no dump %s' % label, lambda x: pcf.decode(x, include_dump=False), stored, repetitions)
+    timeIt('header %s' % label, pcf.read_header, stored, repetitions)
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((int, int, int), args)])
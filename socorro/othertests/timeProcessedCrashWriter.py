@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+"""time worker threads that save processed crashes to a fake HBase with a
+simulated round trip per thrift call: each worker thread calling
+put_processed_json itself, reading the processing state first (what
+saveProcessedDumpJson always did), and each worker thread handing its
+processed crash, with the processing state that came with the raw crash, to
+a ProcessedCrashWriter that saves batches with put_processed_jsons.  Prints
+the time the worker threads spent saving and the round trips made.
+
+usage: timeProcessedCrashWriter.py [roundTripMilliseconds [numberOfCrashes [numberOfThreads [batchSize]]]]"""
+
+import sys
+import threading
+import time
+
+import socorro.lib.threadlib as sthr
+import socorro.lib.util as sutil
+import socorro.processor.processed_crash_writer as pcw
+import socorro.storage.hbaseClient as hbc
+
+class ValueObject(object):
+  def __init__(self, value):
+    self.value = value
+
+class RawRow(object):
+  def __init__(self, row, columns):
+    self.row = row
+    self.columns = dict((k, ValueObject(v)) for k, v in columns.items())
+
+class LatencyThriftClient(object):
+  """every call is a round trip, and every crash is still waiting to be processed"""
+  def __init__(self, latency):
+    self.latency = latency
+    self.roundTrips = 0
+    self.lock = threading.Lock()
+  def roundTrip(self):
+    time.sleep(self.latency)
+    self.lock.acquire()
+    try:
+      self.roundTrips += 1
+    finally:
+      self.lock.release()
+  def getRowWithColumns(self, table, row, columns):
+    self.roundTrip()
+    return [RawRow(row, {'flags:processed': 'N', 'timestamps:submitted': '2012-05-04T03:04:05'})]
+  def __getattr__(self, name):
+    return lambda *args: self.roundTrip()
+
+class LatencyConnection(hbc.HBaseConnectionForCrashReports):
+  def __init__(self, client):
+    self.client = client
+    self.logger = sutil.SilentFakeLogger()
+    self.hbaseThriftExceptions = ()
+    self.processed_crash_format = 'json'
+    self.mutationClass = lambda column, value=None, isDelete=False: (column, value, isDelete)
+    self.batchMutationClass = lambda row, mutations: (row, mutations)
+
+class BatchSavingStorage(object):
+  def __init__(self, connection):
+    self.connection = connection
+  def save_processed_batch(self, processedCrashes):
+    self.connection.put_processed_jsons(processedCrashes)
+
+def processedCrash(x):
+  return {'completeddatetime': '2012-05-04T03:05:00', 'signature': 'sig%d' % (x % 10)}
+
+def timeSaves(save, numberOfCrashes, numberOfThreads):
+  taskManager = sthr.TaskManager(numberOfThreads, numberOfThreads * 2)
+  savingSeconds = [0.0]
+  lock = threading.Lock()
+  def job(x):
+    start = time.time()
+    save('%030x120504' % x, processedCrash(x))
+    lock.acquire()
+    try:
+      savingSeconds[0] += time.time() - start
+    finally:
+      lock.release()
+  start = time.time()
+  for x in range(numberOfCrashes):
+    taskManager.newTask(job, x)
+  taskManager.waitForCompletion()
+  return start, savingSeconds[0]
+
+def report(label, client, start, savingSeconds, numberOfCrashes):
+  seconds = time.time() - start
+  print "time: %-12s %5d crashes %8.3fs %7.3fms saving per crash %6d round trips" % (
+    label, numberOfCrashes, seconds, savingSeconds * 1000 / numberOfCrashes, client.roundTrips)
+
+def main(roundTripMilliseconds=2.0, numberOfCrashes=1000, numberOfThreads=4, batchSize=100):
+  latency = roundTripMilliseconds / 1000.0
+  print "%.2fms round trip, %d threads, batches of %d" % (roundTripMilliseconds, numberOfThreads, batchSize)
+  client = LatencyThriftClient(latency)
+  connection = LatencyConnection(client)
+  start, savingSeconds = timeSaves(connection.put_processed_json, numberOfCrashes, numberOfThreads)
+  report('synchronous', client, start, savingSeconds, numberOfCrashes)
+  client = LatencyThriftClient(latency)
+  storage = BatchSavingStorage(LatencyConnection(client))
+  writer = pcw.ProcessedCrashWriter(lambda: storage, sutil.SilentFakeLogger(), batch_size=batchSize)
+  processingState = {'flags:processed': 'N', 'timestamps:submitted': '2012-05-04T03:04:05'}
+  start, savingSeconds = timeSaves(lambda uuid, crash: writer.save(uuid, crash, processingState),
+                                   numberOfCrashes, numberOfThreads)
+  writer.close()
+  report('write-behind', client, start, savingSeconds, numberOfCrashes)
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((float, int, int, int), args)])
@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+"""time the CPU bound part of processing a crash - splitting the stackwalk
+frame lines and normalizing the frame signatures - with worker threads
+(socorro.lib.threadlib.TaskManager) and with worker processes
+(socorro.lib.threadlib.ProcessTaskManager) for an increasing number of
+workers up to the number of cores.
+
+usage: timeProcessorScaling.py [numberOfJobs]"""
+
+import multiprocessing
+import sys
+import time
+
+import socorro.lib.util as sutil
+import socorro.lib.threadlib as sthr
+import socorro.processor.signatureUtilities as sig
+
+numberOfJobs = 2000
+framesPerJob = 200
+
+config = sutil.DotDict()
+config.irrelevantSignatureRegEx = '@0x[0-9a-fA-F]{2,}|@0x[1-9a-fA-F]|KiFastSystemCallRet|RaiseException'
+config.prefixSignatureRegEx = '@0x0|.*abort|.*malloc|.*free|RtlpWaitOnCriticalSection|JS_.*'
+config.signaturesWithLineNumbersRegEx = 'js_Interpret'
+config.signatureSentinels = ['_purecall']
+signatureTool = sig.CSignatureTool(config)
+
+frameLines = ['0|%d|xul.dll|nsTArray<int, 4u>::Foo(T *,int &,char const*)|'
+              'hg:hg.mozilla.org/mozilla-central:dom/base/nsFoo.cpp:abc|%d|0x1f'
+              % (x, x * 10) for x in range(framesPerJob)]
+
+def processOneJob(jobNumber):
+  signatureList = []
+  for line in frameLines:
+    (thread_num, frame_num, module_name, function, source, source_line,
+     instruction) = [sutil.emptyFilter(x) for x in line.split("|")]
+    signatureList.append(signatureTool.normalize_signature(module_name,
+                                                           function,
+                                                           source,
+                                                           source_line,
+                                                           instruction))
+  signatureTool.generate(signatureList[:30], 0, 0)
+
+def display(seconds, label):
+  print label, 'time: %03.3f' % seconds, \
+        'jobs/sec: %.1f' % (numberOfJobs / seconds)
+
+def withThreads(numberOfWorkers):
+  start = time.time()
+  taskManager = sthr.TaskManager(numberOfWorkers, numberOfWorkers * 2)
+  for x in range(numberOfJobs):
+    taskManager.newTask(processOneJob, x)
+  taskManager.waitForCompletion()
+  display(time.time() - start, '%2d threads  ' % numberOfWorkers)
+
+def withProcesses(numberOfWorkers):
+  start = time.time()
+  taskManager = sthr.ProcessTaskManager(numberOfWorkers, [processOneJob],
+                                        numberOfWorkers * 2)
+  for x in range(numberOfJobs):
+    taskManager.newTask(processOneJob, x)
+  taskManager.waitForCompletion()
+  display(time.time() - start, '%2d processes' % numberOfWorkers)
+
+if __name__ == '__main__':
+  if len(sys.argv) > 1:
+    numberOfJobs = int(sys.argv[1])
+  numberOfWorkers = 1
+  while numberOfWorkers <= multiprocessing.cpu_count():
+    withThreads(numberOfWorkers)
+    withProcesses(numberOfWorkers)
+    numberOfWorkers *= 2
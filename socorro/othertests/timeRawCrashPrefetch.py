@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+"""time worker threads that fetch each raw crash from a fake crash storage
+with a simulated round trip per read, then spend a simulated stackwalk on
+it: two reads per job (get_meta then the dump, what processJob always did),
+one read per job with get_raw_crash, and one read per job done ahead by a
+RawCrashPrefetcher.  Prints the time to get through the jobs and how much
+fetch latency the prefetcher hid from the worker threads.
+
+usage: timeRawCrashPrefetch.py [roundTripMilliseconds [stackwalkMilliseconds [numberOfJobs [numberOfThreads [depth]]]]]"""
+
+import sys
+import time
+
+import socorro.lib.threadlib as sthr
+import socorro.lib.util as sutil
+import socorro.processor.raw_crash_prefetcher as rcp
+
+class LatencyCrashStorage(object):
+  def __init__(self, latency):
+    self.latency = latency
+  def get_meta(self, uuid):
+    time.sleep(self.latency)
+    return {'uuid': uuid, 'ProductName': 'Firefox'}
+  def get_raw_dump(self, uuid):
+    time.sleep(self.latency)
+    return 'MDMP' * 50000
+  def get_raw_crash(self, uuid):
+    time.sleep(self.latency)
+    return {'uuid': uuid, 'ProductName': 'Firefox'}, 'MDMP' * 50000, None
+
+def timeJobs(label, fetch, stackwalk, numberOfJobs, numberOfThreads, prefetcher=None):
+  taskManager = sthr.TaskManager(numberOfThreads, numberOfThreads * 2)
+  def job(uuid):
+    jsonDocument, dump, processingState = fetch(uuid)
+    time.sleep(stackwalk)
+  start = time.time()
+  for x in range(numberOfJobs):
+    uuid = '%030x120504' % x
+    if prefetcher is not None:
+      prefetcher.prefetch(uuid)
+    taskManager.newTask(job, uuid)
+  taskManager.waitForCompletion()
+  seconds = time.time() - start
+  print "time: %-10s %5d jobs %8.3fs %7.3fms per job" % (label, numberOfJobs, seconds, seconds * 1000 / numberOfJobs)
+
+def main(roundTripMilliseconds=20.0, stackwalkMilliseconds=50.0, numberOfJobs=200, numberOfThreads=4, depth=8):
+  storage = LatencyCrashStorage(roundTripMilliseconds / 1000.0)
+  stackwalk = stackwalkMilliseconds / 1000.0
+  print "%.2fms round trip, %.2fms stackwalk, %d threads, depth %d" % (roundTripMilliseconds, stackwalkMilliseconds,
+                                                                       numberOfThreads, depth)
+  timeJobs('two reads', lambda uuid: (storage.get_meta(uuid), storage.get_raw_dump(uuid), None), stackwalk,
+           numberOfJobs, numberOfThreads)
+  timeJobs('one read', storage.get_raw_crash, stackwalk, numberOfJobs, numberOfThreads)
+  prefetcher = rcp.RawCrashPrefetcher(lambda: storage, sutil.SilentFakeLogger(), depth=depth)
+  def fetch(uuid):
+    return prefetcher.take(uuid) or storage.get_raw_crash(uuid)
+  timeJobs('prefetch', fetch, stackwalk, numberOfJobs, numberOfThreads, prefetcher)
+  prefetcher.close()
+  statistics = prefetcher.statistics()
+  print "prefetch: %(hits)d hits %(waits)d waits %(misses)d misses, %(hidden_seconds).3fs of %(fetch_seconds).3fs fetching hidden" % statistics
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((float, float, int, int, int), args)])
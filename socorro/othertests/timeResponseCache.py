@@ -0,0 +1,60 @@
+#! /usr/bin/env python
+"""time a middleware service answering a mix of repeated requests from a few
+threads, with and without the response cache.  There is no database here, so
+each query costs a fixed, simulated time.
+
+usage: timeResponseCache.py [queryMilliseconds [numberOfRequests [numberOfDistinctRequests [numberOfThreads]]]]"""
+
+import random
+import sys
+import threading
+import time
+
+import socorro.lib.util as sutil
+import socorro.middleware.response_cache as rc
+from socorro.middleware.service import DataAPIService
+
+class SlowService(DataAPIService):
+  service_name = "tcbs"
+  uri = "/crashes/signatures/(.*)"
+  cache_ttl = 300
+  queries = 0
+  def get(self, *args):
+    params = self.parse_query_string(args[0])
+    time.sleep(self.context.queryLatency)
+    SlowService.queries += 1
+    return {'crashes': [{'signature': 'js::GC::Mark%d' % x, 'count': x} for x in range(300)],
+            'product': params.get('product')}
+
+def timeRequests(label, config, responseCache, numberOfRequests, numberOfDistinctRequests, numberOfThreads):
+  SlowService.queries = 0
+  random.seed(0)
+  requests = ['product/Firefox/version/%d.0/limit/300/' % random.randrange(numberOfDistinctRequests)
+              for x in range(numberOfRequests)]
+  def worker(requests):
+    service = SlowService(config)
+    service.response_cache = responseCache
+    for request in requests:
+      service.get_response(request)
+  threads = [threading.Thread(target=worker, args=(requests[x::numberOfThreads],)) for x in range(numberOfThreads)]
+  start = time.time()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  seconds = time.time() - start
+  print "time: %-8s %6d requests %6d queries %8.3fs %8.1f requests/sec" % (label, numberOfRequests, SlowService.queries,
+                                                                            seconds, numberOfRequests / seconds)
+
+def main(queryMilliseconds=20.0, numberOfRequests=2000, numberOfDistinctRequests=50, numberOfThreads=8):
+  config = sutil.DotDict(queryLatency=queryMilliseconds / 1000.0, responseCacheSize=0)
+  print "%.2fms per query, %d distinct requests, %d threads" % (queryMilliseconds, numberOfDistinctRequests,
+                                                                numberOfThreads)
+  timeRequests('uncached', config, None, numberOfRequests, numberOfDistinctRequests, numberOfThreads)
+  responseCache = rc.ResponseCache(1000)
+  timeRequests('cached', config, responseCache, numberOfRequests, numberOfDistinctRequests, numberOfThreads)
+  print responseCache.statistics()
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((float, int, int, int), args)])
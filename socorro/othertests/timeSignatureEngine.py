@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+"""time signature generation with and without the CSignatureTool caches over
+a corpus of saved stackwalk outputs (the text of 'minidump_stackwalk -m', one
+dump per file) and check that the signatures are identical.
+
+usage: timeSignatureEngine.py [corpusDirectory [passes]]
+
+Without a corpus directory, a synthetic corpus is used."""
+
+import os
+import random
+import sys
+import time
+
+import socorro.lib.util as sutil
+import socorro.processor.signatureUtilities as sig
+
+irrelevantSignatureRegEx = '|'.join([
+  '@0x[0-9a-fA-F]{2,}', '@0x[1-9a-fA-F]', 'ashmem', 'app_process@0x.*',
+  '_CxxThrowException', 'dalvik-heap', 'KiFastSystemCallRet',
+  'libc\.so@.*', 'linux-gate\.so@0x.*', 'MOZ_Assert', 'MOZ_Crash',
+  'mozcrt19.dll@0x.*', '_NSRaiseError', '(Nt|Zw)WaitForSingleObject(Ex)?',
+  '(Nt|Zw)WaitForMultipleObjects(Ex)?', 'RaiseException',
+  'RtlpAdjustHeapLookasideDepth', 'WaitForSingleObjectExImplementation',
+  '_ZdlPv', 'zero',
+  ])
+prefixSignatureRegEx = '|'.join([
+  '@0x0', '.*abort', '_alloca_probe.*', 'arena_.*', '.*calloc', 'cert_.*',
+  'CFRelease', '_chkstk', 'CrashInJS', 'dlmalloc', 'dvm.*', '.*free',
+  'GCGraphBuilder::NoteXPCOMChild', 'huge_dalloc', 'js_.*', 'JS_.*',
+  '.*malloc', 'memcmp', 'memcpy', 'memmove', 'memset', 'moz_xmalloc',
+  'nsCOMPtr.*', 'NS_ABORT_OOM.*', 'NS_DebugBreak.*', 'nsObjCExceptionLogAbort',
+  'nsTArray<.*', 'PR_.*', 'RtlpWaitOnCriticalSection', 'strchr', 'strcmp',
+  'strlen', 'WaitForSingleObject.*',
+  ])
+
+def makeTool(cacheSize):
+  config = sutil.DotDict()
+  config.logger = sutil.SilentFakeLogger()
+  config.irrelevantSignatureRegEx = irrelevantSignatureRegEx
+  config.prefixSignatureRegEx = prefixSignatureRegEx
+  config.signaturesWithLineNumbersRegEx = 'js_Interpret'
+  config.signatureSentinels = ['_purecall',
+                               'Java_org_mozilla_gecko_GeckoAppShell_reportJavaCrash']
+  config.signature_cache_size = cacheSize
+  return sig.CSignatureTool(config)
+
+def crashingThreadFrames(lines):
+  """the frames of the crashing thread from one stackwalk output"""
+  crashedThread = None
+  frames = []
+  lines = iter(lines)
+  for line in lines:
+    line = line.strip()
+    if not line:
+      break
+    values = line.split('|')
+    if values[0] == 'Crash':
+      try:
+        crashedThread = int(values[3])
+      except (IndexError, ValueError):
+        pass
+  for line in lines:
+    values = [sutil.emptyFilter(x) for x in line.strip().split('|')]
+    if len(values) != 7:
+      continue
+    if str(crashedThread) == values[0]:
+      frames.append(values[2:])
+    elif frames:
+      break
+  return crashedThread, frames[:30]
+
+def loadCorpus(directory):
+  corpus = []
+  for name in sorted(os.listdir(directory)):
+    with open(os.path.join(directory, name)) as f:
+      corpus.append(crashingThreadFrames(f))
+  return corpus
+
+def syntheticCorpus(size=5000):
+  r = random.Random(0)
+  functions = ['nsFoo::Bar(int, char*)', 'js_Interpret', 'JS_CallFunction',
+               'arena_dalloc_small', 'je_malloc', 'free', 'KiFastSystemCallRet',
+               'NtWaitForSingleObject', 'RaiseException', 'PR_Lock',
+               'mozilla::dom::Element::SetAttr(int, nsIAtom*, nsAString const&, bool)',
+               'nsTArray<int,4u>::AppendElement(T *)', None]
+  functions.extend('mozilla::SomeClass%d::Method(int)' % x for x in range(300))
+  corpus = []
+  for x in range(size):
+    frames = []
+    for y in range(r.randint(5, 30)):
+      function = r.choice(functions)
+      frames.append(['xul.dll', function,
+                     function and 'hg:hg.mozilla.org/src/File%d.cpp:rev' % y,
+                     function and str(r.randint(1, 2000)),
+                     '0x%x' % r.randint(0, 0xffff)])
+    corpus.append((0, frames))
+  return corpus
+
+def run(tool, corpus, passes):
+  signatures = []
+  start = time.time()
+  for x in range(passes):
+    for crashedThread, frames in corpus:
+      signatureList = [tool.normalize_signature(*f) for f in frames]
+      signatures.append(tool.generate(signatureList, 0, crashedThread))
+  return time.time() - start, signatures
+
+if __name__ == '__main__':
+  if len(sys.argv) > 1:
+    corpus = loadCorpus(sys.argv[1])
+  else:
+    corpus = syntheticCorpus()
+  passes = 3
+  if len(sys.argv) > 2:
+    passes = int(sys.argv[2])
+  uncachedTime, uncachedSignatures = run(makeTool(0), corpus, passes)
+  cachedTool = makeTool(50000)
+  cachedTime, cachedSignatures = run(cachedTool, corpus, passes)
+  assert uncachedSignatures == cachedSignatures, 'the signatures differ!'
+  crashes = len(corpus) * passes
+  print 'uncached time: %03.3f crashes/sec: %.1f' % (uncachedTime, crashes / uncachedTime)
+  print '  cached time: %03.3f crashes/sec: %.1f' % (cachedTime, crashes / cachedTime)
+  print 'function cache hits: %d misses: %d evictions: %d' % (
+    cachedTool.normalized_function_cache.hits,
+    cachedTool.normalized_function_cache.misses,
+    cachedTool.normalized_function_cache.evictions)
@@ -0,0 +1,89 @@
+#! /usr/bin/env python
+"""time the per-thread counters in socorro.lib.stats: increments, and
+CounterPool.meanAndStandardDeviation across many threads' counters, for the
+old deque of per-minute tuples (walked on every read, twice per counter in
+meanAndStandardDeviation) against the RollingCounter ring of arrays.  The
+reads are timed twice: within one minute, where a RollingCounter answers
+from its last reading, and each in a new minute after every counter has
+been incremented, where nothing is cached.
+
+usage: timeStats.py [historyLengthInMinutes [numberOfThreads [incrementsPerMinute]]]"""
+
+import collections
+import math
+import sys
+import time
+
+import socorro.lib.stats as stats
+import socorro.lib.util as sutil
+
+class DequeCounterOverTime(object):
+  """the old CounterOverTime"""
+  def __init__(self, historyLengthInMinutes, timeFunction):
+    self.historyLengthInMinutes = historyLengthInMinutes
+    self.history = collections.deque(maxlen=historyLengthInMinutes)
+    self.currentMinute = 0
+    self.currentCounter = 0
+    self.timeFunction = timeFunction
+  def nowMinute(self):
+    return int(self.timeFunction()) / 60
+  def pushOldCounter(self, minute):
+    self.history.append((self.currentMinute, self.currentCounter))
+    self.currentMinute = minute
+    self.currentCounter = 0
+  def increment(self, now=None):
+    if now is None:
+      now = self.nowMinute()
+    if self.currentMinute != now:
+      self.pushOldCounter(now)
+    self.currentCounter += 1
+  def read(self, now=None):
+    if now is None:
+      now = self.nowMinute()
+    if self.currentMinute != now:
+      self.pushOldCounter(now)
+    return sum(count for minute, count in self.history if minute >= now - self.historyLengthInMinutes)
+
+def oldMeanAndStandardDeviation(pool):
+  """the old CounterPool.meanAndStandardDeviation, reading every counter twice"""
+  mean = float(sum(x.read() for x in pool.values())) / len(pool)
+  return mean, math.sqrt(sum((x.read() - mean) ** 2 for x in pool.values()) / len(pool))
+
+def timeCounters(label, statsClass, meanFunction, historyLengthInMinutes, numberOfThreads, incrementsPerMinute):
+  clock = [0]
+  config = sutil.DotDict({'logger': sutil.SilentFakeLogger()})
+  pool = stats.CounterPool(config, statsClass, (historyLengthInMinutes,), {'timeFunction': lambda: clock[0]})
+  start = time.time()
+  for minute in range(historyLengthInMinutes + 1):
+    clock[0] = minute * 60
+    for thread in range(numberOfThreads):
+      counter = pool.getStat(thread)
+      for x in range(incrementsPerMinute):
+        counter.increment()
+  incrementSeconds = time.time() - start
+  start = time.time()
+  for x in range(1000):
+    result = meanFunction(pool)
+  readSeconds = time.time() - start
+  uncachedReadSeconds = 0.0
+  for x in range(1000):
+    clock[0] += 60
+    for counter in pool.values():
+      counter.increment()
+    start = time.time()
+    meanFunction(pool)
+    uncachedReadSeconds += time.time() - start
+  print "time: %-8s increments %8.3fs  1000 x meanAndStandardDeviation %8.3fs, each in a new minute %8.3fs  %s" % (
+    label, incrementSeconds, readSeconds, uncachedReadSeconds, result)
+
+def main(historyLengthInMinutes=60, numberOfThreads=32, incrementsPerMinute=200):
+  print "%d minutes of history, %d threads, %d increments per minute each" % (historyLengthInMinutes,
+                                                                             numberOfThreads, incrementsPerMinute)
+  timeCounters('deque', DequeCounterOverTime, oldMeanAndStandardDeviation, historyLengthInMinutes,
+               numberOfThreads, incrementsPerMinute)
+  timeCounters('rolling', stats.CounterOverTime, stats.CounterPool.meanAndStandardDeviation, historyLengthInMinutes,
+               numberOfThreads, incrementsPerMinute)
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[int(x) for x in args])
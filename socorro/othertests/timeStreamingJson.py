@@ -0,0 +1,66 @@
+#! /usr/bin/env python
+"""time sending a report/list result and measure the peak memory it takes:
+fetching every row, building the whole hits list and dumping it at once (as
+JsonWebServiceBase.GET did) against streaming the hits from a generator with
+stream_json.  There is no database here, so each batch of rows costs a fixed,
+simulated fetch time.  Each run is done in its own child process, whose peak
+resident size is reported.
+
+usage: timeStreamingJson.py [numberOfRows [fetchSize [fetchMilliseconds]]]"""
+
+import datetime
+import json
+import os
+import sys
+import time
+
+import socorro.external.postgresql.report as report
+import socorro.webapi.webapiService as webapi
+
+def rows(numberOfRows, fetchSize, latency):
+  date = datetime.datetime(2012, 5, 4, 3, 4, 5)
+  for x in xrange(numberOfRows):
+    if x % fetchSize == 0:
+      time.sleep(latency)
+    yield (date, 10.0, 'comment %d' % x, '%026x120504' % x, 'Firefox', '13.0', '20120504030405',
+           'js::GC::Mark%d' % (x % 100), 'http://example.com/%d' % x, 'Windows NT', '6.1.7601 Service Pack 1',
+           'x86', 'GenuineIntel family 6 model 23 stepping 10', '0x0', 'EXCEPTION_ACCESS_VIOLATION_READ',
+           3600, 86400, None, None, date, None)
+
+def whole(numberOfRows, fetchSize, latency):
+  hits = [report.Report.format_row(x) for x in list(rows(numberOfRows, fetchSize, latency))]
+  yield json.dumps({'total': numberOfRows, 'hits': hits})
+
+def streamed(numberOfRows, fetchSize, latency):
+  hits = (report.Report.format_row(x) for x in rows(numberOfRows, fetchSize, latency))
+  return webapi.stream_json({'total': numberOfRows, 'hits': hits})
+
+def timeResponse(label, respond, numberOfRows, fetchSize, latency):
+  read, write = os.pipe()
+  pid = os.fork()
+  if pid == 0:
+    os.close(read)
+    start = time.time()
+    firstByte = None
+    size = 0
+    for chunk in respond(numberOfRows, fetchSize, latency):
+      if firstByte is None:
+        firstByte = time.time() - start
+      size += len(chunk)
+    os.write(write, "%f %f %d" % (firstByte, time.time() - start, size))
+    os._exit(0)
+  os.close(write)
+  firstByte, seconds, size = os.read(read, 100).split()
+  os.close(read)
+  status, rusage = os.wait4(pid, 0)[1:]
+  print "time: %-8s %8d rows %10d bytes first byte %8.3fs total %8.3fs peak rss %7.1fMB" % (
+    label, numberOfRows, int(size), float(firstByte), float(seconds), rusage.ru_maxrss / 1024.0)
+
+def main(numberOfRows=100000, fetchSize=1000, fetchMilliseconds=5.0):
+  latency = fetchMilliseconds / 1000.0
+  for label, respond in (('whole', whole), ('streamed', streamed)):
+    timeResponse(label, respond, numberOfRows, fetchSize, latency)
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  main(*[f(x) for f, x in zip((int, int, float), args)])
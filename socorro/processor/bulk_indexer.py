@@ -0,0 +1,164 @@
+"""an asynchronous stage that indexes processed crashes in Elastic Search with
+_bulk requests.
+
+The processor's worker threads hand processed crashes to 'index', which puts
+them on a bounded queue and returns, so Elastic Search's latency is no longer
+part of the time taken by a job.  A single indexing thread takes them off the
+queue and sends them in _bulk requests of at most 'batch_size' documents or
+'batch_bytes' bytes, waiting no more than 'flush_interval' seconds to fill a
+batch.  Documents that Elastic Search rejects are sent again one at a time.
+
+When Elastic Search can't be reached, a batch is written as a spill file in
+'spill_directory' and sent again later, as socorro.lib.batching_stage
+describes.  A spill file holds the body of a _bulk request."""
+
+import json
+import time
+import urlparse
+
+import socorro.lib.batching_stage as batching
+import socorro.lib.httpclient as httpc
+
+
+#==============================================================================
+class ElasticSearchUnavailable(Exception):
+    pass
+
+
+#==============================================================================
+class ElasticSearchBulkIndexer(batching.BatchingStage):
+    """the indexing stage and its thread"""
+
+    spill_prefix = 'bulk'
+    item_name = 'documents for Elastic Search'
+    counter_names = ('indexed', 'retried', 'failed')
+    expected_failures = (ElasticSearchUnavailable,)
+
+    #--------------------------------------------------------------------------
+    def __init__(self, url, logger, index_prefix='socorro_',
+                 doc_type='crash_reports', batch_size=500,
+                 batch_bytes=5 * 1024 * 1024, flush_interval=5.0,
+                 queue_size=5000, spill_directory=None, maximum_retries=3,
+                 timeout=30, time_function=time.time):
+        """constructor for the stage.  Its thread is started right away.
+
+        Parameters:
+            url - the Elastic Search server, 'http://host:port'
+            logger - a logger object
+            index_prefix - the daily index of a crash is this prefix followed
+                           by the yymmdd of its date_processed
+            doc_type - the Elastic Search type of the documents
+            batch_size - the largest number of documents in a _bulk request
+            batch_bytes - the largest size of a _bulk request, give or take
+                          one document
+            flush_interval - the number of seconds that a document may wait
+                             for its batch to fill up
+            queue_size - the number of crashes that may wait for the indexing
+                         thread before 'index' blocks
+            spill_directory - where batches go while Elastic Search can't be
+                              reached (None to drop them)
+            maximum_retries - the number of times a rejected document is sent
+                              again on its own
+            timeout - the socket timeout for the requests, in seconds"""
+        parts = urlparse.urlsplit(url)
+        self.http = httpc.HttpClient(parts.hostname, parts.port or 9200,
+                                     timeout=timeout,
+                                     pool=httpc.HttpConnectionPool(1))
+        self.index_prefix = index_prefix
+        self.doc_type = doc_type
+        self.maximum_retries = maximum_retries
+        super(ElasticSearchBulkIndexer, self).__init__(
+            logger, batch_size, flush_interval, queue_size,
+            spill_directory=spill_directory, batch_bytes=batch_bytes,
+            time_function=time_function)
+
+    #--------------------------------------------------------------------------
+    def index(self, processed_crash):
+        """queue a processed crash, a dict whose dates are already strings,
+        for indexing.  This blocks only while the queue is full."""
+        date = processed_crash['date_processed']
+        index = '%s%s%s%s' % (self.index_prefix, date[2:4], date[5:7],
+                              date[8:10])
+        source = json.dumps(processed_crash)
+        self._put((index, processed_crash['uuid'], source))
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """send what is still queued and stop the indexing thread"""
+        super(ElasticSearchBulkIndexer, self).close()
+        self.http.pool.clear()
+
+    #--------------------------------------------------------------------------
+    def _item_bytes(self, item):
+        return len(item[2])
+
+    #--------------------------------------------------------------------------
+    def _bulk_body(self, batch):
+        lines = []
+        for index, doc_id, source in batch:
+            lines.append(json.dumps({'index': {'_index': index,
+                                               '_type': self.doc_type,
+                                               '_id': doc_id}}))
+            lines.append(source)
+        lines.append('')
+        return '\n'.join(lines)
+
+    #--------------------------------------------------------------------------
+    def _request(self, method, uri, body):
+        try:
+            with self.http:
+                response = getattr(self.http, method)(uri, body)
+        except Exception, x:
+            raise ElasticSearchUnavailable(str(x))
+        if isinstance(response, dict):
+            if response['error']['code'] >= 500:
+                raise ElasticSearchUnavailable(response['error']['reason'])
+            return None
+        return response
+
+    #--------------------------------------------------------------------------
+    def _process_batch(self, batch):
+        """send a batch, then retry the documents that were rejected one at a
+        time.  ElasticSearchUnavailable is raised if the _bulk request
+        fails."""
+        response = self._request('post', '/_bulk', self._bulk_body(batch))
+        self._count('batches')
+        if response is None:
+            rejected = batch
+        else:
+            results = json.loads(response)['items']
+            rejected = [item for item, result in zip(batch, results)
+                        if 'error' in result.values()[0]]
+        self._count('indexed', len(batch) - len(rejected))
+        for item in rejected:
+            self._retry(item)
+
+    #--------------------------------------------------------------------------
+    def _retry(self, item):
+        index, doc_id, source = item
+        uri = '/%s/%s/%s' % (index, self.doc_type, doc_id)
+        for attempt in range(self.maximum_retries):
+            self._count('retried')
+            try:
+                if self._request('put', uri, source) is not None:
+                    self._count('indexed')
+                    return
+            except ElasticSearchUnavailable:
+                self._spill([item])
+                return
+        self.logger.error('Elastic Search rejected %s %d times', doc_id,
+                          self.maximum_retries + 1)
+        self._count('failed')
+
+    #--------------------------------------------------------------------------
+    def _spill_text(self, batch):
+        return self._bulk_body(batch)
+
+    #--------------------------------------------------------------------------
+    def _parse_spill(self, text):
+        lines = text.splitlines()
+        batch = []
+        for action, source in zip(lines[::2], lines[1::2]):
+            target = json.loads(action)['index']
+            batch.append((target['_index'], target['_id'], source))
+        return batch
@@ -0,0 +1,188 @@
+"""hands the dumps that the processor fetched to the stackwalker.
+
+The stackwalker only takes the pathname of a dump, so a dump fetched from
+HBase used to be written to a new file in temporaryFileSystemStoragePath and
+unlinked after the stackwalk: a disk write, a create and an unlink per crash.
+The dumpHandOff option picks how the dump gets a pathname instead:
+
+  - 'file', TemporaryFileHandOff: that new file, as always.
+  - 'tmpfs', TmpfsRingHandOff: a ring of files in a tmpfs directory,
+    dumpHandOffDirectory, one per worker thread at most, that are rewritten
+    in place for every dump and never unlinked while the processor runs.
+  - 'memfd', MemfdHandOff: an anonymous memory file from memfd_create (Linux
+    only) that the stackwalker opens through /proc/<pid>/fd/<fd>.  Nothing is
+    written to any filesystem.  The files are close-on-exec, so a process
+    started by another thread doesn't keep another thread's dump open.
+
+minidump_stackwalk seeks around in the dump, so it can't read it from an
+anonymous pipe.
+
+Storages whose dumps already are local files (the local filesystem and NFS)
+keep handing their own pathnames to the stackwalker whatever the mode."""
+
+import logging
+import os
+import os.path
+import Queue
+import shutil
+import tempfile
+
+logger = logging.getLogger("processor")
+
+MFD_CLOEXEC = 1
+
+try:
+    import ctypes
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _memfd_create = _libc.memfd_create
+    _memfd_create.argtypes = [ctypes.c_char_p, ctypes.c_uint]
+    _memfd_create.restype = ctypes.c_int
+except (ImportError, OSError, AttributeError):
+    _memfd_create = None
+
+
+#------------------------------------------------------------------------------
+def _write_all(file_descriptor, data):
+    view = buffer(data)
+    while view:
+        view = view[os.write(file_descriptor, view):]
+
+
+#==============================================================================
+class TemporaryFileHandOff(object):
+    """writes each dump to a new file in 'directory' and unlinks it once the
+    stackwalker is done with it"""
+
+    in_memory = False
+
+    #--------------------------------------------------------------------------
+    def __init__(self, directory):
+        self.directory = directory
+
+    #--------------------------------------------------------------------------
+    def put(self, uuid, dump):
+        """return a pathname that the stackwalker can read the dump from"""
+        pathname = os.path.join(self.directory, "%s.dump" % uuid)
+        dump_file = open(pathname, "wb")
+        try:
+            dump_file.write(dump)
+        finally:
+            dump_file.close()
+        return pathname
+
+    #--------------------------------------------------------------------------
+    def release(self, pathname):
+        """the stackwalker is done with the dump at pathname"""
+        try:
+            os.unlink(pathname)
+        except OSError:
+            logger.debug('%s was already gone', pathname)
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        pass
+
+
+#==============================================================================
+class TmpfsRingHandOff(object):
+    """rewrites one of 'number_of_slots' files in a directory of its own,
+    made in 'directory', for each dump.  'put' waits for a free file when
+    they are all in use, so there should be a slot per worker thread."""
+
+    in_memory = True
+
+    #--------------------------------------------------------------------------
+    def __init__(self, directory, number_of_slots):
+        self.directory = tempfile.mkdtemp(prefix='socorro-dumps-',
+                                          dir=directory)
+        self.free = Queue.Queue()
+        for x in range(number_of_slots):
+            self.free.put(os.path.join(self.directory, 'slot%d.dump' % x))
+        self.files = {}
+
+    #--------------------------------------------------------------------------
+    def put(self, uuid, dump):
+        """return a pathname that the stackwalker can read the dump from"""
+        pathname = self.free.get()
+        try:
+            slot_file = self.files.get(pathname)
+            if slot_file is None:
+                slot_file = self.files[pathname] = open(pathname, "w+b")
+            slot_file.seek(0)
+            slot_file.write(dump)
+            slot_file.truncate()
+            slot_file.flush()
+        except:
+            self.free.put(pathname)
+            raise
+        return pathname
+
+    #--------------------------------------------------------------------------
+    def release(self, pathname):
+        """the stackwalker is done with the dump at pathname"""
+        self.free.put(pathname)
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        for slot_file in self.files.values():
+            slot_file.close()
+        self.files = {}
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+#==============================================================================
+class MemfdHandOff(object):
+    """puts each dump in an anonymous memory file that the stackwalker opens
+    through /proc"""
+
+    in_memory = True
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        if _memfd_create is None:
+            raise NotImplementedError("memfd_create is not available here")
+        self.file_descriptors = {}
+
+    #--------------------------------------------------------------------------
+    def put(self, uuid, dump):
+        """return a pathname that the stackwalker can read the dump from"""
+        file_descriptor = _memfd_create(str(uuid), MFD_CLOEXEC)
+        if file_descriptor < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number))
+        try:
+            _write_all(file_descriptor, dump)
+        except:
+            os.close(file_descriptor)
+            raise
+        # the stackwalker may not be our child, so not '/proc/self/fd'
+        pathname = '/proc/%d/fd/%d' % (os.getpid(), file_descriptor)
+        self.file_descriptors[pathname] = file_descriptor
+        return pathname
+
+    #--------------------------------------------------------------------------
+    def release(self, pathname):
+        """the stackwalker is done with the dump at pathname"""
+        os.close(self.file_descriptors.pop(pathname))
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        for file_descriptor in self.file_descriptors.values():
+            os.close(file_descriptor)
+        self.file_descriptors = {}
+
+
+#------------------------------------------------------------------------------
+def create_dump_hand_off(config):
+    """return the dump hand off that config's dumpHandOff names"""
+    mode = config.get('dumpHandOff', 'file')
+    if mode == 'file':
+        return TemporaryFileHandOff(config.temporaryFileSystemStoragePath)
+    if mode == 'tmpfs':
+        return TmpfsRingHandOff(config.get('dumpHandOffDirectory',
+                                           '/dev/shm'),
+                                max(1, config.get('numberOfThreads', 1)))
+    if mode == 'memfd':
+        return MemfdHandOff()
+    raise ValueError("dumpHandOff must be 'file', 'tmpfs' or 'memfd', not %r"
+                     % mode)
@@ -11,6 +11,7 @@ import logging
 logger = logging.getLogger("processor")
 
 import socorro.lib.util
+import socorro.processor.stackwalker as stackwalker
 
 import processor
 
@@ -29,19 +30,53 @@ class ProcessorWithExternalBreakpad (processor.Processor):
     assert "crashingThreadTailFrameThreshold" in config, "crashingThreadTailFrameThreshold is missing from the configuration"
     assert "stackwalkCommandLine" in config, "stackwalkCommandLine is missing from the configuration"
 
-    #preprocess the breakpad_stackwalk command line
+    self.commandLine = self.preprocessCommandLine(config.stackwalkCommandLine)
+
+    # with a stackwalkerPoolSize, dumps go to a pool of long-lived stackwalker processes speaking the protocol
+    # described in socorro.processor.stackwalker.  Otherwise, the one-shot stackwalkCommandLine is used for every dump.
+    self.stackwalkerPool = None
+    if config.get('stackwalkerPoolSize', 0):
+      assert "stackwalkServerCommandLine" in config, "stackwalkServerCommandLine is missing from the configuration"
+      if not config.stackwalkServerCommandLine:
+        raise ValueError('stackwalkerPoolSize needs a stackwalkServerCommandLine that speaks the protocol in socorro.processor.stackwalker')
+      serverCommandLine = self.preprocessCommandLine(config.stackwalkServerCommandLine)
+      serverCommandLine = serverCommandLine.replace("SYMBOL_PATHS", self.symbolPaths())
+      self.stackwalkerPool = stackwalker.StackwalkerPool(config, serverCommandLine, self.statsd, self.statsd_prefix)
+
+#-----------------------------------------------------------------------------------------------------------------
+  def preprocessCommandLine(self, commandLineTemplate):
+    """ convert a stackwalk command line template from the configuration into a string with only the
+          DUMPFILEPATHNAME and SYMBOL_PATHS placeholders left in it
+    """
     stripParensRE = re.compile(r'\$(\()(\w+)(\))')
     toPythonRE = re.compile(r'\$(\w+)')
     # Canonical form of $(param) is $param. Convert any that are needed
-    tmp = stripParensRE.sub(r'$\2',config.stackwalkCommandLine)
+    tmp = stripParensRE.sub(r'$\2',commandLineTemplate)
     # Convert canonical $dumpfilePathname to DUMPFILEPATHNAME
     tmp = tmp.replace('$dumpfilePathname','DUMPFILEPATHNAME')
     # Convert canonical $processorSymbolsPathnameList to SYMBOL_PATHS
     tmp = tmp.replace('$processorSymbolsPathnameList','SYMBOL_PATHS')
     # finally, convert any remaining $param to pythonic %(param)s
     tmp = toPythonRE.sub(r'%(\1)s',tmp)
-    self.commandLine = tmp % config
+    return tmp % self.config
 
+#-----------------------------------------------------------------------------------------------------------------
+  def symbolPaths(self):
+    if type(self.config.processorSymbolsPathnameList) is list:
+      return ' '.join(['"%s"' % x for x in self.config.processorSymbolsPathnameList])
+    return ' '.join(['"%s"' % x for x in self.config.processorSymbolsPathnameList.split()])
+
+#-----------------------------------------------------------------------------------------------------------------
+  def cleanup(self):
+    super(ProcessorWithExternalBreakpad, self).cleanup()
+    if self.stackwalkerPool:
+      self.stackwalkerPool.cleanup()
+
+#-----------------------------------------------------------------------------------------------------------------
+  def cleanupWorkerProcess(self):
+    super(ProcessorWithExternalBreakpad, self).cleanupWorkerProcess()
+    if self.stackwalkerPool:
+      self.stackwalkerPool.cleanup()
 
 #-----------------------------------------------------------------------------------------------------------------
   def invokeBreakpadStackdump(self, dumpfilePathname):
@@ -52,16 +87,23 @@ class ProcessorWithExternalBreakpad (processor.Processor):
             dumpfilePathname: the complete pathname of the dumpfile to be analyzed
     """
     #logger.debug("analyzing %s", dumpfilePathname)
-    if type(self.config.processorSymbolsPathnameList) is list:
-      symbol_path = ' '.join(['"%s"' % x for x in self.config.processorSymbolsPathnameList])
-    else:
-      symbol_path = ' '.join(['"%s"' % x for x in self.config.processorSymbolsPathnameList.split()])
+    if self.stackwalkerPool:
+      stackwalkerOutput = self.stackwalkerPool.invoke(dumpfilePathname)
+      return (self.spoolingIterator(stackwalkerOutput), stackwalkerOutput)
+    symbol_path = self.symbolPaths()
     #commandline = '"%s" %s "%s" %s 2>/dev/null' % (self.config.minidump_stackwalkPathname, "-m", dumpfilePathname, symbol_path)
     newCommandLine = self.commandLine.replace("DUMPFILEPATHNAME", dumpfilePathname)
     newCommandLine = newCommandLine.replace("SYMBOL_PATHS", symbol_path)
     #logger.info("invoking: %s", newCommandLine)
-    subprocessHandle = subprocess.Popen(newCommandLine, shell=True, stdout=subprocess.PIPE)
-    return (socorro.lib.util.StrCachingIterator(subprocessHandle.stdout), subprocessHandle)
+    subprocessHandle = subprocess.Popen(newCommandLine, shell=True, stdout=subprocess.PIPE, close_fds=True)
+    return (self.spoolingIterator(subprocessHandle.stdout), subprocessHandle)
+
+#-----------------------------------------------------------------------------------------------------------------
+  def spoolingIterator(self, stackwalkOutput):
+    """ wrap the lines of stackwalk output in an iterator that keeps a copy of them for the 'dump' field without
+          holding more than stackwalkOutputMemoryLimit bytes of them in memory
+    """
+    return socorro.lib.util.SpoolingStrIterator(stackwalkOutput, self.config.get('stackwalkOutputMemoryLimit', 1048576))
 
 #-----------------------------------------------------------------------------------------------------------------
   def doBreakpadStackDumpAnalysis (self, reportId, uuid, dumpfilePathname, isHang, java_stack_trace, databaseCursor, date_processed, processorErrorMessages):
@@ -83,6 +125,7 @@ class ProcessorWithExternalBreakpad (processor.Processor):
             processorErrorMessages
     """
     #logger.debug('doBreakpadStackDumpAnalysis')
+    stackwalkStartTime = time.time()
     dumpAnalysisLineIterator, subprocessHandle = self.invokeBreakpadStackdump(dumpfilePathname)
     dumpAnalysisLineIterator.secondaryCacheMaximumSize = self.config.crashingThreadTailFrameThreshold + 1
     try:
@@ -94,14 +137,13 @@ class ProcessorWithExternalBreakpad (processor.Processor):
         lowercaseModules = True
       evenMoreReportValuesAsDict = self.analyzeFrames(reportId, isHang, java_stack_trace, lowercaseModules, dumpAnalysisLineIterator, databaseCursor, date_processed, crashedThread, processorErrorMessages)
       additionalReportValuesAsDict.update(evenMoreReportValuesAsDict)
-      for x in dumpAnalysisLineIterator:
-        pass  #need to spool out the rest of the stream so the cache doesn't get truncated
-      dumpAnalysisAsString = ('\n'.join(dumpAnalysisLineIterator.cache))
-      additionalReportValuesAsDict["dump"] = dumpAnalysisAsString
+      additionalReportValuesAsDict["dump"] = dumpAnalysisLineIterator.getvalue()
+      self.statsd.gauge(self.statsd_prefix + '.stackwalk.peak_memory', dumpAnalysisLineIterator.peakMemory)
     finally:
-      dumpAnalysisLineIterator.theIterator.close() #this is really a handle to a file-like object - got to close it
+      dumpAnalysisLineIterator.close() #closes the spool and the handle to the stackwalk output
     # is the return code from the invocation important?  Uncomment, if it is...
     returncode = subprocessHandle.wait()
+    self.statsd.timing(self.statsd_prefix + '.stackwalk', int((time.time() - stackwalkStartTime) * 1000))
     if returncode is not None and returncode != 0:
       processorErrorMessages.append("%s failed with return code %s when processing dump %s" %(self.config.minidump_stackwalkPathname, subprocessHandle.returncode, uuid))
       additionalReportValuesAsDict['success'] = False
@@ -0,0 +1,101 @@
+"""an asynchronous stage that saves processed crashes to the crash storage in
+batches.
+
+Saving a processed crash to HBase took a read of the crash's processing
+state and five writes, all on the worker thread.  The processor's worker
+threads now hand processed crashes to 'save', which puts them on a bounded
+queue and returns.  A single writer thread takes them off the queue and
+saves them with the crash storage's 'save_processed_batch', at most
+'batch_size' at a time, waiting no more than 'flush_interval' seconds to
+fill a batch.  The processing state that came with the raw crash (see
+get_raw_crash) goes along, so HBase only reads the states that nobody had.
+Once a batch is saved, the writer thread hands it to 'saved_function': the
+processor completes the crashes' jobs only then.
+
+When a batch can't be saved, it is written as a spill file in
+'spill_directory' and saved again later, as socorro.lib.batching_stage
+describes."""
+
+import json
+import time
+
+import socorro.lib.batching_stage as batching
+
+
+#==============================================================================
+class ProcessedCrashWriter(batching.BatchingStage):
+    """the writing stage and its thread"""
+
+    spill_prefix = 'processed'
+    item_name = 'processed crashes'
+    counter_names = ('saved',)
+
+    #--------------------------------------------------------------------------
+    def __init__(self, storage_function, logger, batch_size=100,
+                 flush_interval=1.0, queue_size=1000, spill_directory=None,
+                 saved_function=None, time_function=time.time):
+        """constructor for the stage.  Its thread is started right away.
+
+        Parameters:
+            storage_function - called by the writer thread to get the crash
+                               storage that it saves with
+            logger - a logger object
+            batch_size - the largest number of processed crashes saved at
+                         once
+            flush_interval - the number of seconds that a processed crash
+                             may wait for its batch to fill up
+            queue_size - the number of processed crashes that may wait for
+                         the writer thread before 'save' blocks
+            spill_directory - where batches go while they can't be saved
+                              (None to drop them)
+            saved_function - called by the writer thread with each batch
+                             once it is saved.  If it raises, the batch is
+                             spilled and saved again."""
+        self.storage_function = storage_function
+        self.saved_function = saved_function
+        self.crash_storage = None
+        self.saving_seconds = 0.0
+        super(ProcessedCrashWriter, self).__init__(
+            logger, batch_size, flush_interval, queue_size,
+            spill_directory=spill_directory, time_function=time_function)
+
+    #--------------------------------------------------------------------------
+    def save(self, uuid, processed_crash, processing_state=None):
+        """queue a processed crash, a dict whose dates are already strings,
+        with the processing state that came with its raw crash.  This
+        blocks only while the queue is full."""
+        self._put((uuid, processed_crash, processing_state))
+
+    #--------------------------------------------------------------------------
+    def statistics(self):
+        statistics = super(ProcessedCrashWriter, self).statistics()
+        with self.counters_lock:
+            statistics['saving_seconds'] = self.saving_seconds
+        return statistics
+
+    #--------------------------------------------------------------------------
+    def _process_batch(self, batch):
+        """save a batch, raising whatever the crash storage raises"""
+        if self.crash_storage is None:
+            self.crash_storage = self.storage_function()
+        start = self.time_function()
+        self.crash_storage.save_processed_batch(batch)
+        with self.counters_lock:
+            self.saving_seconds += self.time_function() - start
+            self.counters['batches'] += 1
+            self.counters['saved'] += len(batch)
+        if self.saved_function is not None:
+            self.saved_function(batch)
+
+    #--------------------------------------------------------------------------
+    def _spill_text(self, batch):
+        return ''.join(json.dumps(item) + '\n' for item in batch)
+
+    #--------------------------------------------------------------------------
+    def _parse_spill(self, text):
+        batch = []
+        for line in text.splitlines():
+            if line.strip():
+                uuid, processed_crash, processing_state = json.loads(line)
+                batch.append((str(uuid), processed_crash, processing_state))
+        return batch
@@ -1,14 +1,16 @@
 import datetime
 from operator import itemgetter
 import logging
+import multiprocessing
 import os
 import os.path
 import re
 import signal
+import socket
 import threading
 import time
 import urllib
-import urllib2
+import urlparse
 from statsd import StatsClient
 
 logger = logging.getLogger("processor")
@@ -16,6 +18,8 @@ logger = logging.getLogger("processor")
 import socorro.database.schema as sch
 
 import socorro.lib.util as sutil
+import socorro.lib.stats as stats
+import socorro.lib.httpclient as httpc
 import socorro.lib.threadlib as sthr
 import socorro.lib.ConfigurationManager as scm
 import socorro.lib.JsonDumpStorage as jds
@@ -26,6 +30,10 @@ import socorro.storage.crashstorage as cstore
 import socorro.storage.hbaseClient as hbc
 import socorro.processor.signatureUtilities as sig
 import socorro.processor.registration as reg
+import socorro.processor.raw_crash_prefetcher as rcp
+import socorro.processor.dump_handoff as dho
+import socorro.processor.bulk_indexer as bulk
+import socorro.processor.processed_crash_writer as pcw
 
 from socorro.lib.datetimeutil import utc_now, UTC
 
@@ -116,9 +124,10 @@ class Processor(object):
                                                   storageClass=config.hbaseStorageClass)
 
     self.sdb = sdb
+    self.cstore = cstore
     self.os = os
     self.nowFunc = nowFunc
-    self.databaseConnectionPool = sdb.DatabaseConnectionPool(config, config.logger)
+    self.databaseConnectionPool = sdb.DatabaseConnectionPool(config, config.logger, countStatements=True)
     self.processorLoopTime = config.processorLoopTime.seconds
     self.config = config
     self.quit = False
@@ -154,18 +163,127 @@ class Processor(object):
     # remain queued in the database until the last minute.  This allows some external process to change the priority of a job by changing
     # the 'priority' column of the 'jobs' table for the particular record in the database.  If the threadManager were allowed to suck all
     # the pending jobs from the database, then the job priority could not be changed by an external process.
-    logger.info("starting worker threads")
-    self.threadManager = sthr.TaskManager(self.config.numberOfThreads, self.config.numberOfThreads * 2)
+    # In batched claim mode (processorJobClaimBatchSize > 0), the main thread claims whole batches of jobs with a
+    # single statement.  processorJobPrefetchDepth then lets the task queue hold more than a starved amount of work so
+    # that the worker threads never wait on the main thread's database round trips.
+    self.jobClaimBatchSize = self.config.get('processorJobClaimBatchSize', 0)
+    # With numberOfProcesses, jobs are processed by forked worker processes rather than threads.  The processes are
+    # not forked until 'start' so that they inherit a completely constructed instance of any subclass.  Dead workers
+    # are replaced by forking the main process again, so in this mode the main process starts no helper threads: the
+    # bulk indexer, prefetcher and processed crash writer run in the workers and the main process never borrows a
+    # crash storage connection, which would start the pool's checker thread.
+    self.numberOfProcesses = self.config.get('numberOfProcesses', 0)
+    self.sthr = sthr
+    # shared with the worker processes so that a quit seen by any process stops them all, see requestQuit
+    self.workerQuitEvent = None
+    if self.numberOfProcesses:
+      self.threadManager = None
+    else:
+      taskQueueSize = self.config.get('processorJobPrefetchDepth', 0) or self.config.numberOfThreads * 2
+      logger.info("starting worker threads")
+      self.threadManager = sthr.TaskManager(self.config.numberOfThreads, taskQueueSize)
     logger.info("I am processor #%d", self.processorId)
     logger.info("my priority jobs table is called: '%s'", self.priorityJobsTableName)
     self.priority_job_set = set()
 
+    # keep-alive connections for the submissions to Elastic Search, one per worker thread at most
+    self.elasticSearchPool = httpc.HttpConnectionPool(maximum_per_host=max(1, self.config.numberOfThreads))
+    # worker processes start their own bulk indexer
+    self.bulkIndexer = None
+    if not self.numberOfProcesses:
+      self.bulkIndexer = self.createBulkIndexer()
+    # the raw crashes of queued jobs are fetched ahead of the worker threads.  Worker processes don't share the
+    # main process' memory, so they keep fetching the raw crashes themselves.
+    self.rawCrashPrefetcher = None
+    if not self.numberOfProcesses:
+      self.rawCrashPrefetcher = self.createRawCrashPrefetcher()
+    # how dumps get a pathname for the stackwalker, see socorro.processor.dump_handoff.  Worker processes make their
+    # own.
+    self.dumpHandOff = dho.create_dump_hand_off(self.config)
+    # worker processes start their own processed crash writer
+    self.processedCrashWriter = None
+    if not self.numberOfProcesses:
+      self.processedCrashWriter = self.createProcessedCrashWriter()
+    # how long the worker threads take over their jobs, exported with checkin.  Worker processes have no checkin.
+    self.jobDurations = None
+    if not self.numberOfProcesses:
+      self.jobDurations = stats.DurationAccumulatorPool(config)
+
     self.statsd = StatsClient(config.statsdHost,
                               config.statsdPort,
                               config.statsdPrefix)
     statsd_processor_name = self.get_statsd_processor_name()
     self.statsd_prefix = 'socorro.processors.' + statsd_processor_name
 
+  #--------------------------------------------------------------------------
+  def createBulkIndexer(self):
+    """ return the stage that indexes processed crashes in Elastic Search, or None if no elasticSearchBulkIndexUrl
+        is configured
+    """
+    url = self.config.get('elasticSearchBulkIndexUrl', '')
+    if not url:
+      return None
+    return bulk.ElasticSearchBulkIndexer(url, logger,
+                                         batch_size=self.config.get('elasticSearchBulkSize', 500),
+                                         flush_interval=self.config.get('elasticSearchBulkFlushInterval', 5),
+                                         queue_size=self.config.get('elasticSearchBulkQueueSize', 5000),
+                                         spill_directory=self.config.get('elasticSearchSpillDirectory', '') or None)
+
+  #--------------------------------------------------------------------------
+  def createProcessedCrashWriter(self):
+    """ return the stage that saves processed crashes to the crash storage in batches behind the worker threads, or
+        None if processedCrashWriteBatchSize is 0.  Its jobs are completed once their crashes are saved, so a batch
+        that can't be saved must wait in processedCrashSpillDirectory: there is no writer without one.
+    """
+    batchSize = self.config.get('processedCrashWriteBatchSize', 0)
+    if not batchSize:
+      return None
+    spillDirectory = self.config.get('processedCrashSpillDirectory', '')
+    if not spillDirectory:
+      raise ValueError('processedCrashWriteBatchSize needs a processedCrashSpillDirectory')
+    return pcw.ProcessedCrashWriter(lambda: self.crashStorePool.crashStorage(threading.currentThread().getName()),
+                                    logger,
+                                    batch_size=batchSize,
+                                    flush_interval=self.config.get('processedCrashWriteFlushInterval', 1.0),
+                                    queue_size=self.config.get('processedCrashWriteQueueSize', 1000),
+                                    spill_directory=spillDirectory,
+                                    saved_function=self.processedCrashesSaved)
+
+  #--------------------------------------------------------------------------
+  def processedCrashesSaved(self, batch):
+    """ run by the processed crash writer's thread once a batch of (uuid, processed crash, processing state) is
+        saved: the jobs still waiting for their crashes are completed, and those crashes go to Elastic Search.  A
+        job that failed was completed when it failed.  If this raises, the writer saves the batch again later.
+    """
+    databaseConnection, databaseCursor = self.databaseConnectionPool.connectionCursorPair()
+    completed = []
+    try:
+      for uuid, processedCrash, processingState in batch:
+        databaseCursor.execute("update jobs set completeddatetime = %s, success = %s where uuid = %s and success is null",
+                               (processedCrash.get('completeddatetime'), processedCrash.get('success'), uuid))
+        if databaseCursor.rowcount:
+          completed.append((uuid, processedCrash))
+      databaseConnection.commit()
+    except:
+      databaseConnection.rollback()
+      raise
+    for uuid, processedCrash in completed:
+      self.submitToElasticSearch(uuid, processedCrash)
+
+  #--------------------------------------------------------------------------
+  def createRawCrashPrefetcher(self):
+    """ return the stage that fetches the raw crashes of queued jobs before the worker threads get to them, or None
+        if rawCrashPrefetchDepth is 0
+    """
+    depth = self.config.get('rawCrashPrefetchDepth', 0)
+    if not depth:
+      return None
+    return rcp.RawCrashPrefetcher(lambda: self.crashStorePool.crashStorage(threading.currentThread().getName()),
+                                  logger,
+                                  depth=depth,
+                                  memory_budget=self.config.get('rawCrashPrefetchMemoryBudget', 64 * 1024 * 1024),
+                                  number_of_threads=self.config.get('rawCrashPrefetchThreads', 2))
+
   #--------------------------------------------------------------------------
   def registration(self):
     self.registration_agent = reg.ProcessorRegistrationAgent(self.config,
@@ -176,6 +294,17 @@ class Processor(object):
   #--------------------------------------------------------------------------
   def checkin(self):
     self.registration_agent.checkin()
+    self.crashStorePool.export_statistics(self.statsd, self.statsd_prefix + '.crash_storage')
+    self.elasticSearchPool.export_statistics(self.statsd, self.statsd_prefix + '.elasticsearch_http')
+    if self.bulkIndexer is not None:
+      self.bulkIndexer.export_statistics(self.statsd, self.statsd_prefix + '.elasticsearch_bulk')
+    if self.rawCrashPrefetcher is not None:
+      self.rawCrashPrefetcher.export_statistics(self.statsd, self.statsd_prefix + '.raw_crash_prefetch')
+    if self.processedCrashWriter is not None:
+      self.processedCrashWriter.export_statistics(self.statsd, self.statsd_prefix + '.processed_crash_writer')
+    if self.jobDurations is not None:
+      # the count, mean and p50/p95/p99 in milliseconds of the jobs done in the last five minutes
+      self.jobDurations.exportToStatsd(self.statsd, self.statsd_prefix + '.job_duration')
 
   #--------------------------------------------------------------------------
   @sdb.db_transaction_retry_wrapper
@@ -225,9 +354,98 @@ class Processor(object):
     self.config.logger.info('done loading rules: %s',
                             str(self.json_transform_rule_system.rules))
 
+  #-----------------------------------------------------------------------------
+  def startWorkerProcesses(self):
+    """ fork the worker processes that replace the worker threads in multiprocess mode.  The main process
+        continues to register, check in and claim jobs; each worker process gets its own database connections
+        and crash storage.
+    """
+    taskQueueSize = self.config.get('processorJobPrefetchDepth', 0) or self.numberOfProcesses * 2
+    logger.info("starting %d worker processes", self.numberOfProcesses)
+    self.workerQuitEvent = multiprocessing.Event()
+    self.threadManager = self.sthr.ProcessTaskManager(self.numberOfProcesses,
+                                                      [self.processJobWithRetry,
+                                                       self.processPriorityJobWithRetry],
+                                                      taskQueueSize,
+                                                      initializer=self.initializeWorkerProcess,
+                                                      finalizer=self.cleanupWorkerProcess,
+                                                      quitEvent=self.workerQuitEvent)
+
+  #-----------------------------------------------------------------------------
+  def initializeWorkerProcess(self):
+    """ run at the start of each worker process.  The connections inherited from the main process belong to it:
+        they are set aside, never used and never closed, since closing them would end the main process' sessions.
+    """
+    self.inheritedConnectionPools = (self.databaseConnectionPool, self.crashStorePool)
+    self.databaseConnectionPool = self.sdb.DatabaseConnectionPool(self.config, self.config.logger,
+                                                               countStatements=True)
+    self.crashStorePool = self.cstore.CrashStoragePool(self.config,
+                                                       storageClass=self.config.hbaseStorageClass)
+    self.elasticSearchPool = httpc.HttpConnectionPool(maximum_per_host=1)
+    self.bulkIndexer = self.createBulkIndexer()
+    self.dumpHandOff = dho.create_dump_hand_off(self.config)
+    self.processedCrashWriter = self.createProcessedCrashWriter()
+
+  #-----------------------------------------------------------------------------
+  def cleanupWorkerProcess(self):
+    """ run at the end of each worker process
+    """
+    if self.processedCrashWriter is not None:
+      self.processedCrashWriter.close()
+    self.databaseConnectionPool.cleanup()
+    self.crashStorePool.cleanup()
+    self.elasticSearchPool.clear()
+    if self.bulkIndexer is not None:
+      self.bulkIndexer.close()
+    self.dumpHandOff.close()
+
+  #-----------------------------------------------------------------------------
+  def partitionCursorPair(self):
+    """ the alternateCursorFunction given to the partitioned tables: a connection of this thread's own for creating
+        partitions, so that doing so never commits or rolls back the transaction that the crash is inserted in
+    """
+    return self.databaseConnectionPool.connectionCursorPair('%s-partitions' % threading.currentThread().getName())
+
+  #-----------------------------------------------------------------------------
+  def assurePartitions(self, date_processed):
+    """ make sure of the partitions that a job for date_processed inserts into before the job's transaction writes
+        anything: a new partition may need locks that the job's own uncommitted rows would hold (the foreign key of a
+        plugins_reports partition waits on a plugins row that the job inserted)
+    """
+    for aTable in (self.reportsTable, self.extensionsTable, self.pluginsReportsTable):
+      if not sch.partitionWasCreated(aTable.partitionNameForDate(date_processed)):
+        aTable.assurePartitions(date_processed, self.partitionCursorPair)
+
+  #-----------------------------------------------------------------------------
+  def queueJob(self, aJobTuple):
+    """ hand a job to the worker threads or processes.  Worker processes have their own copy of
+        priority_job_set, so priority jobs are sent to them as a different task.
+    """
+    if self.numberOfProcesses and aJobTuple[1] in self.priority_job_set:
+      self.priority_job_set.remove(aJobTuple[1])
+      self.threadManager.newTask(self.processPriorityJobWithRetry, aJobTuple)
+    else:
+      if self.rawCrashPrefetcher is not None:
+        self.rawCrashPrefetcher.prefetch(aJobTuple[1])
+      self.threadManager.newTask(self.processJobWithRetry, aJobTuple)
+
+  #-----------------------------------------------------------------------------
+  def quitRequested(self):
+    """ True once this process or, in multiprocess mode, any of the processes has asked to quit
+    """
+    return self.quit or (self.workerQuitEvent is not None and self.workerQuitEvent.is_set())
+
+  #-----------------------------------------------------------------------------
+  def requestQuit(self):
+    """ ask every thread and worker process to quit
+    """
+    self.quit = True
+    if self.workerQuitEvent is not None:
+      self.workerQuitEvent.set()
+
   #-----------------------------------------------------------------------------
   def quitCheck(self):
-    if self.quit:
+    if self.quitRequested():
       raise KeyboardInterrupt
 
   #-----------------------------------------------------------------------------
@@ -249,6 +467,10 @@ class Processor(object):
     logger.info("waiting for threads to stop")
     self.threadManager.waitForCompletion()
     logger.info("all threads stopped")
+    if self.rawCrashPrefetcher is not None:
+      self.rawCrashPrefetcher.close()
+    if self.processedCrashWriter is not None:
+      self.processedCrashWriter.close()
 
     databaseConnection, databaseCursor = self.databaseConnectionPool.connectionCursorPair()
     try:
@@ -272,6 +494,10 @@ class Processor(object):
     # we're done - kill all the threads' database connections
     self.databaseConnectionPool.cleanup()
     self.crashStorePool.cleanup()
+    self.elasticSearchPool.clear()
+    if self.bulkIndexer is not None:
+      self.bulkIndexer.close()
+    self.dumpHandOff.close()
 
     logger.debug("done with work")
 
@@ -295,9 +521,115 @@ class Processor(object):
       (self.nowFunc(), aJobTuple[0]))
     #logger.info("queuing job %d, %s, %s",
                 #aJobTuple[0], aJobTuple[2],  aJobTuple[1])
-    self.threadManager.newTask(self.processJobWithRetry, aJobTuple)
+    self.queueJob(aJobTuple)
     #self.threadManager.newTask(self.processJob, aJobTuple)
 
+  #-----------------------------------------------------------------------------
+  def claimJobBatch(self, aJobTupleList):
+    """
+    Marks all the jobs in aJobTupleList as started with a single statement.
+    Returns the list of job tuples, in their original order, that were actually
+    claimed.  Jobs that have vanished from the 'jobs' table in the meantime
+    (reassigned or deleted by the monitor) are dropped.
+    """
+    if not aJobTupleList:
+      return []
+    claimedIdList = self.sdb.transaction_execute_with_retry(
+      self.databaseConnectionPool,
+      "update jobs set starteddatetime = %s where id = any(%s) returning id",
+      (self.nowFunc(), [x[0] for x in aJobTupleList]))
+    claimedIds = set(x[0] for x in claimedIdList)
+    return [x for x in aJobTupleList if x[0] in claimedIds]
+
+  #-----------------------------------------------------------------------------
+  def submitJobBatchToThreads(self, aJobTupleList):
+    for aJobTuple in aJobTupleList:
+      self.queueJob(aJobTuple)
+
+  #-----------------------------------------------------------------------------
+  def newPriorityJobsBatch (self):
+    """
+    Returns a list of JobTuples pulled from the 'jobs' table for all the jobs
+    found in this process' priority jobs table.  The priority jobs table is
+    drained with a single delete rather than one delete per uuid.
+    """
+    getPriorityJobsSql =  "select" \
+                       "    j.id," \
+                       "    pj.uuid," \
+                       "    1," \
+                       "    j.starteddatetime " \
+                       "from" \
+                       "    jobs j right join %s pj on j.uuid = pj.uuid" \
+                       % self.priorityJobsTableName
+    deletePriorityJobsSql = "delete from %s where uuid = any(%%s)" %  \
+                            self.priorityJobsTableName
+    fullJobsList = self.sdb.transaction_execute_with_retry(
+      self.databaseConnectionPool,
+      getPriorityJobsSql)
+    if not fullJobsList:
+      return []
+    self.sdb.transaction_execute_with_retry(self.databaseConnectionPool,
+                                            deletePriorityJobsSql,
+                                            ([x[1] for x in fullJobsList],))
+    priorityJobsList = []
+    for aFullJobTuple in fullJobsList:
+      if aFullJobTuple[0] is None:
+        logger.debug("the priority job %s was never found", aFullJobTuple[1])
+      elif not aFullJobTuple[3]: # else the job already started via normal channels
+        priorityJobsList.append((aFullJobTuple[0],aFullJobTuple[1],aFullJobTuple[2],))
+    return priorityJobsList
+
+  #-----------------------------------------------------------------------------
+  def newNormalJobsBatch (self, limit):
+    """
+    Returns a list of at most 'limit' job tuples pulled from the 'jobs' table
+    for which the owner is this process and the started datetime is null.
+    """
+    getNormalJobSql = "select"  \
+                    "    j.id,"  \
+                    "    j.uuid,"  \
+                    "    priority "  \
+                    "from"  \
+                    "    jobs j "  \
+                    "where"  \
+                    "    j.owner = %d"  \
+                    "    and j.starteddatetime is null "  \
+                    "order by queueddatetime"  \
+                    "  limit %d" % (self.processorId, limit)
+    return self.sdb.transaction_execute_with_retry(self.databaseConnectionPool,
+                                                   getNormalJobSql)
+
+  #-----------------------------------------------------------------------------
+  def incomingJobBatchStream(self):
+    """
+       The batched counterpart of incomingJobStream.  Yields non-empty lists of
+       job tuples that have already been claimed (their starteddatetime set).
+       Priority jobs always lead the batch; the remainder of the batch is
+       filled with normal jobs.  If there are no jobs at all, sleep
+       self.processorLoopTime seconds and try again.
+    """
+    while (True):
+      self.quitCheck()
+      self.checkin()
+      aJobBatch = self.newPriorityJobsBatch()
+      priorityUuids = set(x[1] for x in aJobBatch)
+      if len(aJobBatch) < self.jobClaimBatchSize:
+        for aJobTuple in self.newNormalJobsBatch(self.jobClaimBatchSize - len(aJobBatch)):
+          if aJobTuple[1] in priorityUuids:
+            logger.debug("Skipping already seen job %s", aJobTuple[1])
+          else:
+            aJobBatch.append(aJobTuple)
+      aJobBatch = self.claimJobBatch(aJobBatch)
+      if aJobBatch:
+        for aJobTuple in aJobBatch:
+          if aJobTuple[1] in priorityUuids:
+            self.priority_job_set.add(aJobTuple[1])
+        logger.debug("incomingJobBatchStream yielding %d jobs (%d priority)", len(aJobBatch), len(priorityUuids))
+        yield aJobBatch
+      else:
+        logger.info("no jobs to do - sleeping %d seconds", self.processorLoopTime)
+        self.responsiveSleep(self.processorLoopTime)
+
   #-----------------------------------------------------------------------------
   def newPriorityJobsIter (self):
     """
@@ -416,17 +748,26 @@ class Processor(object):
     # load once per process and cache in memory
     self.loadProductIdMap()
 
+    if self.numberOfProcesses:
+      self.startWorkerProcesses()
+
     sqlErrorCounter = 0
     while (True):
       try:
-        #get a job
-        for aJobTuple in self.incomingJobStream():
-          self.quitCheck()
-          #logger.debug("start got: %s", aJobTuple[1])
-          self.submitJobToThreads(aJobTuple)
+        if self.jobClaimBatchSize:
+          #get a batch of already claimed jobs
+          for aJobTupleList in self.incomingJobBatchStream():
+            self.quitCheck()
+            self.submitJobBatchToThreads(aJobTupleList)
+        else:
+          #get a job
+          for aJobTuple in self.incomingJobStream():
+            self.quitCheck()
+            #logger.debug("start got: %s", aJobTuple[1])
+            self.submitJobToThreads(aJobTuple)
       except KeyboardInterrupt:
         logger.info("quit request detected")
-        self.quit = True
+        self.requestQuit()
         break
     self.cleanup()
 
@@ -445,12 +786,27 @@ class Processor(object):
         del aDict[aForbiddenKey]
 
   #-----------------------------------------------------------------------------------------------------------------
-  def saveProcessedDumpJson (self, aReportRecordAsDict, threadLocalCrashStorage):
+  def saveProcessedDumpJson (self, aReportRecordAsDict, threadLocalCrashStorage, processingState=None):
+    """ save the processed crash, or hand it to the processed crash writer.  processingState is the one that
+        get_raw_crash returned with the raw crash, if any.
+    """
     #date_processed = aReportRecordAsDict["date_processed"]
     Processor.sanitizeDict(aReportRecordAsDict)
     Processor.convertDatesInDictToString(aReportRecordAsDict)
     uuid = aReportRecordAsDict["uuid"]
-    threadLocalCrashStorage.save_processed(uuid, aReportRecordAsDict)
+    if self.processedCrashWriter is not None:
+      self.processedCrashWriter.save(uuid, aReportRecordAsDict, processingState)
+    else:
+      threadLocalCrashStorage.save_processed(uuid, aReportRecordAsDict)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def submitToElasticSearch(self, uuid, aReportRecordAsDict):
+    """ hand a saved processed crash to the bulk indexer, or submit its uuid to Elastic Search
+    """
+    if self.bulkIndexer is not None:
+      self.bulkIndexer.index(aReportRecordAsDict)
+    else:
+      self.submitOoidToElasticSearch(uuid)
 
   #-----------------------------------------------------------------------------------------------------------------
   ok = 0
@@ -469,9 +825,16 @@ class Processor(object):
   #-----------------------------------------------------------------------------------------------------------------
   def processJobWithRetry(self, jobTuple):
     backoffGenerator = self.backoffSecondsGenerator()
+    jobDuration = None
+    if self.jobDurations is not None:
+      jobDuration = self.jobDurations.getStat()
     try:
       while True:
+        if jobDuration is not None:
+          jobDuration.start()
         result = self.processJob(jobTuple)
+        if result == Processor.ok and jobDuration is not None:
+          jobDuration.end()
         #self.logger.debug('task complete: %d', result)
         if result in (Processor.ok, Processor.quit):
           return
@@ -481,6 +844,11 @@ class Processor(object):
     except KeyboardInterrupt:
       return
 
+  #-----------------------------------------------------------------------------------------------------------------
+  def processPriorityJobWithRetry(self, jobTuple):
+    self.priority_job_set.add(jobTuple[1])
+    self.processJobWithRetry(jobTuple)
+
   #-----------------------------------------------------------------------------------------------------------------
   def processJob (self, jobTuple):
     """ This function is run only by a worker thread.
@@ -491,7 +859,7 @@ class Processor(object):
           jobTuple: a tuple containing up to three items: the jobId (the primary key from the jobs table), the
               jobUuid (a unique string with the json file basename minus the extension) and the priority (an integer)
     """
-    if self.quit:
+    if self.quitRequested():
       return Processor.quit
     threadName = threading.currentThread().getName()
 
@@ -507,22 +875,32 @@ class Processor(object):
       sutil.reportExceptionAndContinue(logger, loggingLevel=logging.CRITICAL)
       return Processor.criticalError
     except Exception:
-      self.quit = True
+      self.requestQuit()
       sutil.reportExceptionAndContinue(logger, loggingLevel=logging.CRITICAL)
       return Processor.quit
 
+    sdb.resetStatementCount()
     try:
       self.quitCheck()
       self.statsd.incr(self.statsd_prefix + '.jobs')
       newReportRecordAsDict = {}
       processorErrorMessages = []
+      processingState = None
       jobId, jobUuid, jobPriority = jobTuple
       logger.info("starting job: %s", jobUuid)
       startedDateTime = self.nowFunc()
       threadLocalCursor.execute("update jobs set starteddatetime = %s where id = %s", (startedDateTime, jobId))
       threadLocalDatabaseConnection.commit()
 
-      jsonDocument = threadLocalCrashStorage.get_meta(jobUuid)
+      dump = None
+      if self.rawCrashPrefetcher is not None:
+        # one read for both the json and the dump, usually done ahead by the prefetcher
+        rawCrash = self.rawCrashPrefetcher.take(jobUuid)
+        if rawCrash is None:
+          rawCrash = threadLocalCrashStorage.get_raw_crash(jobUuid)
+        jsonDocument, dump, processingState = rawCrash
+      else:
+        jsonDocument = threadLocalCrashStorage.get_meta(jobUuid)
 
       self.config.logger.debug('about to apply rules')
       self.json_transform_rule_system.apply_all_rules(jsonDocument, self)
@@ -533,6 +911,7 @@ class Processor(object):
       except KeyError:
         date_processed = ooid.dateFromOoid(jobUuid)
 
+      self.assurePartitions(date_processed)
       newReportRecordAsDict = self.insertReportIntoDatabase(threadLocalCursor, jobUuid, jsonDocument, date_processed, processorErrorMessages)
 
       if jobUuid in self.priority_job_set:
@@ -559,9 +938,18 @@ class Processor(object):
         crashProcessAsDict = self.insertCrashProcess(threadLocalCursor, reportId, jsonDocument, date_processed, processorErrorMessages)
         newReportRecordAsDict.update( crashProcessAsDict )
 
+      # dumps that are local files already, or that the storage writes to temporaryFileSystemStoragePath itself,
+      # are read by the stackwalker where they are.  The others go through the dump hand off.
+      useStoragePath = dump is None and (not self.dumpHandOff.in_memory or threadLocalCrashStorage.hasLocalDumpFiles)
+      dumpfilePathname = None
       try:
-        dumpfilePathname = threadLocalCrashStorage.dumpPathForUuid(jobUuid,
-                                                                   self.config.temporaryFileSystemStoragePath)
+        if useStoragePath:
+          dumpfilePathname = threadLocalCrashStorage.dumpPathForUuid(jobUuid,
+                                                                     self.config.temporaryFileSystemStoragePath)
+        else:
+          if dump is None:
+            dump = threadLocalCrashStorage.get_raw_dump(jobUuid)
+          dumpfilePathname = self.dumpHandOff.put(jobUuid, dump)
         #logger.debug('about to doBreakpadStackDumpAnalysis')
         isHang = 'hangid' in newReportRecordAsDict and bool(newReportRecordAsDict['hangid'])
         # hangType values: -1 if old style hang with hangid and Hang not present
@@ -572,11 +960,13 @@ class Processor(object):
         newReportRecordAsDict.update(additionalReportValuesAsDict)
       finally:
         newReportRecordAsDict["completeddatetime"] = completedDateTime = self.nowFunc()
-        threadLocalCrashStorage.cleanUpTempDumpStorage(jobUuid, self.config.temporaryFileSystemStoragePath)
+        if useStoragePath:
+          threadLocalCrashStorage.cleanUpTempDumpStorage(jobUuid, self.config.temporaryFileSystemStoragePath)
+        elif dumpfilePathname is not None:
+          self.dumpHandOff.release(dumpfilePathname)
 
       #logger.debug('finished a job - cleanup')
       #finished a job - cleanup
-      threadLocalCursor.execute("update jobs set completeddatetime = %s, success = %s where id = %s", (completedDateTime, newReportRecordAsDict['success'], jobId))
       # Bug 519703: Collect setting for topmost source filename(s), addon compatibility check override, flash version
       reportsSql = """
       update reports set
@@ -612,10 +1002,15 @@ class Processor(object):
       newReportRecordAsDict['processor_notes'] = processor_notes
       infoTuple = (newReportRecordAsDict['signature'], processor_notes, startedDateTime, completedDateTime, newReportRecordAsDict["success"], newReportRecordAsDict["truncated"], topmost_filenames, addons_checked, flash_version)
       #logger.debug("Updated report %s (%s): %s", reportId, jobUuid, str(infoTuple))
+      # the job succeeds only once its crash is saved: here, or by the processed crash writer, which then completes
+      # the job and submits the crash itself (see processedCrashesSaved)
+      self.saveProcessedDumpJson(newReportRecordAsDict, threadLocalCrashStorage, processingState)
+      if self.processedCrashWriter is None:
+        threadLocalCursor.execute("update jobs set completeddatetime = %s, success = %s where id = %s", (completedDateTime, newReportRecordAsDict['success'], jobId))
       threadLocalCursor.execute(reportsSql, infoTuple)
       threadLocalDatabaseConnection.commit()
-      self.saveProcessedDumpJson(newReportRecordAsDict, threadLocalCrashStorage)
-      self.submitOoidToElasticSearch(jobUuid)
+      if self.processedCrashWriter is None:
+        self.submitToElasticSearch(jobUuid, newReportRecordAsDict)
       if newReportRecordAsDict["success"]:
         logger.info("succeeded and committed: %s", jobUuid)
       else:
@@ -624,7 +1019,7 @@ class Processor(object):
       return Processor.ok
     except (KeyboardInterrupt, SystemExit):
       logger.info("quit request detected")
-      self.quit = True
+      self.requestQuit()
       return Processor.quit
     except DuplicateEntryException, x:
       logger.warning("duplicate entry: %s", jobUuid)
@@ -653,11 +1048,14 @@ class Processor(object):
       try:
         threadLocalCursor.execute("update reports set started_datetime = timestamp with time zone %s, completed_datetime = timestamp with time zone %s, success = False, processor_notes = %s where id = %s and date_processed = timestamp with time zone %s", (startedDateTime, self.nowFunc(), message, reportId, date_processed))
         threadLocalDatabaseConnection.commit()
-        self.saveProcessedDumpJson(newReportRecordAsDict, threadLocalCrashStorage)
+        self.saveProcessedDumpJson(newReportRecordAsDict, threadLocalCrashStorage, processingState)
       except Exception, x:
         sutil.reportExceptionAndContinue(logger)
         threadLocalDatabaseConnection.rollback()
       return Processor.ok
+    finally:
+      # together with the '.jobs' counter, this gives the number of statements per crash
+      self.statsd.incr(self.statsd_prefix + '.sql_statements', sdb.statementCount())
 
   #-----------------------------------------------------------------------------------------------------------------
   @staticmethod
@@ -754,7 +1152,7 @@ class Processor(object):
       return {}
     try:
       #logger.debug("inserting for %s, %s", uuid, str(date_processed))
-      self.reportsTable.insert(threadLocalCursor, newReportRecordAsTuple, self.databaseConnectionPool.connectionCursorPair, date_processed=date_processed)
+      newReportRecordAsDict["id"] = self.reportsTable.insertReturningId(threadLocalCursor, newReportRecordAsTuple, self.partitionCursorPair, date_processed=date_processed)
     except sdb.db_module.IntegrityError, x:
       #logger.debug("psycopg2.IntegrityError %s", str(x))
       logger.debug("replacing record that already exsited: %s", uuid)
@@ -763,10 +1161,8 @@ class Processor(object):
       #previousTrialWasSuccessful = self.sdb.singleValueSql(threadLocalCursor, "select success from reports where uuid = '%s' and date_processed = timestamp with time zone '%s'" % (uuid, date_processed))
       #if previousTrialWasSuccessful:
         #raise DuplicateEntryException(uuid)
-      threadLocalCursor.execute("delete from reports where uuid = '%s' and date_processed = timestamp with time zone '%s'" % (uuid, date_processed))
       processorErrorMessages.append("INFO: This record is a replacement for a previous record with the same uuid")
-      self.reportsTable.insert(threadLocalCursor, newReportRecordAsTuple, self.databaseConnectionPool.connectionCursorPair, date_processed=date_processed)
-    newReportRecordAsDict["id"] = self.sdb.singleValueSql(threadLocalCursor, "select id from reports where uuid = '%s' and date_processed = timestamp with time zone '%s'" % (uuid, date_processed))
+      newReportRecordAsDict["id"] = self.reportsTable.replace(threadLocalCursor, newReportRecordAsTuple, date_processed=date_processed)
 
     return newReportRecordAsDict
 
@@ -776,6 +1172,7 @@ class Processor(object):
     if not addon_string: return []
     listOfAddonsForInput = [x.split(":") for x in addon_string.split(',')]
     listOfAddonsForOutput = []
+    extensionRows = []
     for i, addon_tuple in enumerate(listOfAddonsForInput):
       try:
         raw_addon_id, raw_addon_version = addon_tuple
@@ -785,8 +1182,9 @@ class Processor(object):
         raw_addon_version = ''
       addon_id = urllib.unquote(raw_addon_id)
       addon_version = urllib.unquote(raw_addon_version)
-      self.extensionsTable.insert(threadLocalCursor, (reportId, date_processed, i, addon_id[:100], addon_version), self.databaseConnectionPool.connectionCursorPair, date_processed=date_processed)
+      extensionRows.append((reportId, date_processed, i, addon_id[:100], addon_version))
       listOfAddonsForOutput.append((addon_id, addon_version))
+    self.extensionsTable.insertMany(threadLocalCursor, extensionRows, self.partitionCursorPair, date_processed=date_processed)
     return listOfAddonsForOutput
   
   #-----------------------------------------------------------------------------------------------------------------
@@ -820,21 +1218,16 @@ class Processor(object):
       crashProcesOutputDict.pluginVersion = pluginVersion
 
       try:
-        pluginId = self.sdb.singleRowSql(threadLocalCursor,
-                                         'select id from plugins '
-                                         'where filename = %s '
-                                         'and name = %s',
-                                         (pluginFilename, pluginName))
+        pluginId = self.sdb.singleValueSql(threadLocalCursor,
+                                           'select id from plugins '
+                                           'where filename = %s '
+                                           'and name = %s',
+                                           (pluginFilename, pluginName))
         #logger.debug('%s/%s already exists in the database',
                       #pluginFilename, pluginName)
-      except sdb.SQLDidNotReturnSingleRow, x:
-        self.pluginsTable.insert(threadLocalCursor,
-                                 (pluginFilename, pluginName))
-        pluginId = self.sdb.singleRowSql(threadLocalCursor,
-                                         'select id from plugins '
-                                         'where filename = %s '
-                                         'and name = %s',
-                                         (pluginFilename, pluginName))
+      except sdb.SQLDidNotReturnSingleValue, x:
+        pluginId = self.pluginsTable.insert(threadLocalCursor,
+                                            (pluginFilename, pluginName))
         #logger.debug('%s/%s inserted into the database',
                       #pluginFilename, pluginName)
 
@@ -844,7 +1237,7 @@ class Processor(object):
                                          pluginId,
                                          date_processed,
                                          pluginVersion),
-                                        self.databaseConnectionPool.connectionCursorPair,
+                                        self.partitionCursorPair,
                                         date_processed=date_processed)
       except sdb.db_module.IntegrityError, x:
         logger.error("psycopg2.IntegrityError %s", str(x))
@@ -867,18 +1260,24 @@ class Processor(object):
 
 
   #-----------------------------------------------------------------------------------------------------------------
-  def submitOoidToElasticSearch (self, ooid, urllib2=urllib2):
+  def submitOoidToElasticSearch (self, ooid):
     try:
       if self.config.elasticSearchOoidSubmissionUrl:
         #import poster
         import socorro.storage.hbaseClient as hbc
-        dummy_form_data = {}
         row_id = hbc.ooid_to_row_id(ooid)
-        url = self.config.elasticSearchOoidSubmissionUrl % row_id
-        request = urllib2.Request(url, dummy_form_data)
+        url = urlparse.urlsplit(self.config.elasticSearchOoidSubmissionUrl % row_id)
+        path = url.path
+        if url.query:
+          path = '%s?%s' % (path, url.query)
+        http = httpc.HttpClient(url.hostname, url.port or 80, timeout=2, pool=self.elasticSearchPool)
         try:
-          urllib2.urlopen(request, timeout=2).read()
-        except urllib2.socket.timeout:
+          with http:
+            response = http.post(path, '')
+          if isinstance(response, dict):
+            logger.critical('Submition to Elastic Search failed for %s: %s %s',
+                            ooid, response['error']['code'], response['error']['reason'])
+        except socket.timeout:
           logger.critical('%s may not have been submitted to Elastic Search',
                           ooid)
           sutil.reportExceptionAndContinue(logger, logging.CRITICAL,
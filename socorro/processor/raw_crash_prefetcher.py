@@ -0,0 +1,216 @@
+"""fetches the raw crashes of queued jobs before the worker threads get to
+them.
+
+The processor's main thread queues jobs well ahead of the worker threads.
+As it queues each one, it tells the RawCrashPrefetcher, whose threads fetch
+the json and the dump of the crash in a single read with the crash storage's
+'get_raw_crash'.  When a worker thread starts the job, 'take' hands it the
+raw crash, so the fetch happened while the worker was busy with earlier
+jobs.
+
+At most 'depth' raw crashes are fetched or being fetched at a time, and no
+new fetch starts while the raw crashes waiting for their workers take more
+than 'memory_budget' bytes.  A raw crash that no worker took within
+'maximum_age' seconds is thrown away to make room."""
+
+import collections
+import threading
+import time
+
+import socorro.lib.stats as stats
+import socorro.lib.util as sutil
+
+
+#==============================================================================
+class _Entry(object):
+    """a raw crash being fetched or waiting for its worker"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.raw_crash = None
+        self.size = 0
+        self.fetch_seconds = 0.0
+        self.fetched_at = None
+
+
+#==============================================================================
+class RawCrashPrefetcher(object):
+
+    #--------------------------------------------------------------------------
+    def __init__(self, storage_function, logger, depth=8,
+                 memory_budget=64 * 1024 * 1024, number_of_threads=2,
+                 maximum_age=300, time_function=time.time):
+        """constructor for the prefetcher.  Its threads are started right
+        away.
+
+        Parameters:
+            storage_function - called by each prefetch thread to get the
+                               crash storage that it fetches with
+            logger - a logger object
+            depth - the largest number of raw crashes that are fetched or
+                    waiting for their worker at a time
+            memory_budget - no fetch starts while the raw crashes waiting
+                            for their worker take more bytes than this
+            number_of_threads - the number of prefetch threads
+            maximum_age - the number of seconds after which a raw crash that
+                          no worker took is thrown away"""
+        self.storage_function = storage_function
+        self.logger = logger
+        self.depth = depth
+        self.memory_budget = memory_budget
+        self.maximum_age = maximum_age
+        self.time_function = time_function
+        self.condition = threading.Condition()
+        self.pending = collections.deque()
+        self.entries = {}
+        self.bytes_held = 0
+        self.stopping = False
+        self.counters = dict.fromkeys(('requested', 'fetched', 'failed',
+                                       'hits', 'waits', 'misses',
+                                       'expired'), 0)
+        self.fetch_seconds = 0.0
+        self.hidden_seconds = 0.0
+        self.threads = []
+        for x in range(number_of_threads):
+            thread = threading.Thread(target=self._run,
+                                      name='RawCrashPrefetcher-%d' % x)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    #--------------------------------------------------------------------------
+    def prefetch(self, uuid):
+        """ask for the raw crash of a job that was just queued"""
+        with self.condition:
+            self.pending.append(uuid)
+            self.counters['requested'] += 1
+            self.condition.notify()
+
+    #--------------------------------------------------------------------------
+    def take(self, uuid):
+        """return what the crash storage's get_raw_crash returned for uuid,
+        (json document, dump, processing state), waiting for it if it is
+        being fetched, or None if it wasn't prefetched or its fetch failed.
+        The raw crash is handed out only once."""
+        with self.condition:
+            entry = self.entries.get(uuid)
+            if entry is None:
+                try:
+                    # not started yet: the worker is better off fetching it
+                    self.pending.remove(uuid)
+                except ValueError:
+                    pass
+                self.counters['misses'] += 1
+                return None
+            waited = not entry.done.is_set()
+        start = self.time_function()
+        entry.done.wait()
+        waited_seconds = self.time_function() - start
+        with self.condition:
+            if self.entries.get(uuid) is entry:
+                self._remove(uuid, entry)
+            if entry.raw_crash is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['waits' if waited else 'hits'] += 1
+            self.hidden_seconds += max(0.0,
+                                       entry.fetch_seconds - waited_seconds)
+        return entry.raw_crash
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """stop the prefetch threads and throw away what they fetched"""
+        with self.condition:
+            self.stopping = True
+            self.pending.clear()
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+        with self.condition:
+            for uuid, entry in self.entries.items():
+                self._remove(uuid, entry)
+
+    #--------------------------------------------------------------------------
+    def statistics(self):
+        with self.condition:
+            statistics = dict(self.counters)
+            statistics['fetch_seconds'] = self.fetch_seconds
+            statistics['hidden_seconds'] = self.hidden_seconds
+            statistics['held'] = len(self.entries)
+            statistics['bytes_held'] = self.bytes_held
+            statistics['pending'] = len(self.pending)
+        return statistics
+
+    #--------------------------------------------------------------------------
+    def export_statistics(self, stats_client, prefix):
+        stats.sendGauges(stats_client, prefix, self.statistics())
+
+    #--------------------------------------------------------------------------
+    def _remove(self, uuid, entry):
+        del self.entries[uuid]
+        self.bytes_held -= entry.size
+        self.condition.notify_all()
+
+    #--------------------------------------------------------------------------
+    def _expire(self):
+        """throw away the raw crashes that waited too long for a worker"""
+        too_old = self.time_function() - self.maximum_age
+        for uuid, entry in self.entries.items():
+            if entry.fetched_at is not None and entry.fetched_at < too_old:
+                self._remove(uuid, entry)
+                self.counters['expired'] += 1
+
+    #--------------------------------------------------------------------------
+    def _has_room(self):
+        return (len(self.entries) < self.depth and
+                self.bytes_held < self.memory_budget)
+
+    #--------------------------------------------------------------------------
+    def _next_uuid(self):
+        """wait for a uuid to fetch and room for it, register its entry and
+        return both, or (None, None) when the prefetcher is closed"""
+        with self.condition:
+            while True:
+                if self.stopping:
+                    return None, None
+                if self.pending and not self._has_room():
+                    self._expire()
+                if self.pending and self._has_room():
+                    uuid = self.pending.popleft()
+                    if uuid in self.entries:
+                        continue
+                    entry = self.entries[uuid] = _Entry()
+                    return uuid, entry
+                self.condition.wait(1.0)
+
+    #--------------------------------------------------------------------------
+    def _run(self):
+        crash_storage = None
+        while True:
+            uuid, entry = self._next_uuid()
+            if uuid is None:
+                break
+            start = self.time_function()
+            try:
+                if crash_storage is None:
+                    crash_storage = self.storage_function()
+                raw_crash = crash_storage.get_raw_crash(uuid)
+            except Exception:
+                # the worker fetches it again and deals with the error
+                self.logger.debug('prefetching %s failed', uuid)
+                sutil.reportExceptionAndContinue(self.logger,
+                                                 showTraceback=False)
+                raw_crash = None
+            seconds = self.time_function() - start
+            with self.condition:
+                entry.fetch_seconds = seconds
+                entry.fetched_at = self.time_function()
+                if raw_crash is None:
+                    self.counters['failed'] += 1
+                else:
+                    entry.raw_crash = raw_crash
+                    self.counters['fetched'] += 1
+                    self.fetch_seconds += seconds
+                    if self.entries.get(uuid) is entry:
+                        entry.size = len(raw_crash[1])
+                        self.bytes_held += entry.size
+            entry.done.set()
@@ -1,5 +1,7 @@
 import re
 
+from socorro.lib.lru_cache import LRUCache
+
 
 #==============================================================================
 class SignatureTool (object):
@@ -35,6 +37,14 @@ class CSignatureTool (SignatureTool):
                       1: "chromehang"
                     }
 
+    # the possible outcomes of classifying a frame signature
+    RELEVANT, IRRELEVANT, PREFIX = 0, 1, 2
+
+    # patterns that cannot safely be combined into one alternation: numbered
+    # or named backreferences, conditional groups and inline flags, which
+    # apply to the whole pattern
+    uncombinable_re = re.compile(r'\\[1-9]|\(\?P=|\(\?\(|\(\?[iLmsux]')
+
     #--------------------------------------------------------------------------
     def __init__(self, config):
         super(CSignatureTool, self).__init__(config)
@@ -48,6 +58,64 @@ class CSignatureTool (SignatureTool):
         self.fixupComma = re.compile(r',(?! )')
         self.fixupInteger = re.compile(r'(<|, )(\d+)([uUlL]?)([^\w])')
 
+        # the same function names turn up in crash after crash, so both the
+        # cleaned up function names and the irrelevant/prefix classification
+        # of frame signatures are remembered in bounded caches
+        cache_size = config.setdefault('signature_cache_size', 50000)
+        self.normalized_function_cache = LRUCache(cache_size)
+        self.classification_cache = LRUCache(cache_size)
+        self.combined_signature_regex = self._combine_regexes(
+            self.irrelevantSignatureRegEx,
+            self.prefixSignatureRegEx
+        )
+        self.plain_sentinels = frozenset(
+            x for x in self.config.signatureSentinels if type(x) != tuple
+        )
+        self.conditional_sentinels = [
+            x for x in self.config.signatureSentinels if type(x) == tuple
+        ]
+
+    #--------------------------------------------------------------------------
+    def _combine_regexes(self, irrelevant_regex, prefix_regex):
+        """return a single regular expression that tells whether a signature
+        is irrelevant (matched by the 'irrelevant' group) or a prefix (matched
+        by the 'prefix' group).  Since the irrelevant alternative is tried
+        first, the outcome is the same as trying the two original expressions
+        in turn.  Returns None if the expressions can't be combined safely."""
+        for a_regex in (irrelevant_regex, prefix_regex):
+            if a_regex.flags or self.uncombinable_re.search(a_regex.pattern):
+                return None
+        try:
+            return re.compile('(?P<irrelevant>%s)|(?P<prefix>%s)'
+                              % (irrelevant_regex.pattern,
+                                 prefix_regex.pattern))
+        except re.error:
+            return None
+
+    #--------------------------------------------------------------------------
+    def classify_signature(self, signature):
+        """return one of RELEVANT, IRRELEVANT or PREFIX for a frame
+        signature"""
+        classification = self.classification_cache.get(signature)
+        if classification is not None:
+            return classification
+        if self.combined_signature_regex is not None:
+            match = self.combined_signature_regex.match(signature)
+            if match is None:
+                classification = self.RELEVANT
+            elif match.group('irrelevant') is not None:
+                classification = self.IRRELEVANT
+            else:
+                classification = self.PREFIX
+        elif self.irrelevantSignatureRegEx.match(signature):
+            classification = self.IRRELEVANT
+        elif self.prefixSignatureRegEx.match(signature):
+            classification = self.PREFIX
+        else:
+            classification = self.RELEVANT
+        self.classification_cache.put(signature, classification)
+        return classification
+
     #--------------------------------------------------------------------------
     def normalize_signature(self, module_name, function, source, source_line,
                             instruction):
@@ -58,14 +126,11 @@ class CSignatureTool (SignatureTool):
         if function:
             if self.signaturesWithLineNumbersRegEx.match(function):
                 function = "%s:%s" % (function, source_line)
-            # Remove spaces before all stars, ampersands, and commas
-            function = self.fixupSpace.sub('', function)
-            # Ensure a space after commas
-            function = self.fixupComma.sub(', ', function)
-            # normalize template signatures with manifest const integers to
-            #'int': Bug 481445
-            function = self.fixupInteger.sub(r'\1int\4', function)
-            return function
+            signature = self.normalized_function_cache.get(function)
+            if signature is None:
+                signature = self._normalize_function(function)
+                self.normalized_function_cache.put(function, signature)
+            return signature
         #if source is not None and source_line is not None:
         if source and source_line:
             filename = source.rstrip('/\\')
@@ -78,6 +143,18 @@ class CSignatureTool (SignatureTool):
             module_name = ''  # might have been None
         return '%s@%s' % (module_name, instruction)
 
+    #--------------------------------------------------------------------------
+    def _normalize_function(self, function):
+        """the uncached clean up of a function name"""
+        # Remove spaces before all stars, ampersands, and commas
+        function = self.fixupSpace.sub('', function)
+        # Ensure a space after commas
+        function = self.fixupComma.sub(', ', function)
+        # normalize template signatures with manifest const integers to
+        #'int': Bug 481445
+        function = self.fixupInteger.sub(r'\1int\4', function)
+        return function
+
     #--------------------------------------------------------------------------
     def _do_generate(self,
                      source_list,
@@ -93,24 +170,22 @@ class CSignatureTool (SignatureTool):
         """
         signature_notes = []
         # shorten source_list to the first signatureSentinel
-        sentinel_locations = []
-        for a_sentinel in self.config.signatureSentinels:
-            if type(a_sentinel) == tuple:
-                a_sentinel, condition_fn = a_sentinel
-                if not condition_fn(source_list):
-                    continue
-            try:
-                sentinel_locations.append(source_list.index(a_sentinel))
-            except ValueError:
-                pass
-        if sentinel_locations:
-            source_list = source_list[min(sentinel_locations):]
+        sentinels = self.plain_sentinels
+        for a_sentinel, condition_fn in self.conditional_sentinels:
+            if condition_fn(source_list):
+                sentinels = sentinels.union((a_sentinel,))
+        if sentinels:
+            for index, aSignature in enumerate(source_list):
+                if aSignature in sentinels:
+                    source_list = source_list[index:]
+                    break
         newSignatureList = []
         for aSignature in source_list:
-            if self.irrelevantSignatureRegEx.match(aSignature):
+            classification = self.classify_signature(aSignature)
+            if classification == self.IRRELEVANT:
                 continue
             newSignatureList.append(aSignature)
-            if not self.prefixSignatureRegEx.match(aSignature):
+            if classification != self.PREFIX:
                 break
         if hang_type:
             newSignatureList.insert(0, self.hang_prefixes[hang_type])
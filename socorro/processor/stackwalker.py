@@ -0,0 +1,328 @@
+"""a pool of long-lived stackwalker processes.
+
+Instead of starting a shell and a fresh minidump_stackwalk for every crash,
+the processor can keep a fixed number of stackwalker processes running and
+hand them dump pathnames over a pipe.  Each worker speaks a simple line
+protocol:
+
+    processor -> worker:  the pathname of a dump followed by a newline
+    worker -> processor:  the normal 'minidump_stackwalk -m' output for that
+                          dump, followed by a single line of the form
+                          <END_OF_OUTPUT>|<returncode>
+
+A worker is recycled after it has done a maximum number of dumps, if it dies,
+or if it takes longer than a timeout to finish a single dump.
+
+The pool pays off only with a stackwalker that speaks the protocol itself
+and keeps its symbols loaded from one dump to the next; none ships with
+socorro, so stackwalkServerCommandLine has no default.  'serve' speaks the
+worker's side of the protocol for a stackwalker that handles one dump per
+run, such as minidump_stackwalk itself, and scripts/stackwalkServer.py runs
+it.  That still starts the stackwalker, and loads its symbols, for every
+dump: it saves only the shell, and is there to test the pool with."""
+
+import os
+import shlex
+import subprocess
+import threading
+import Queue
+
+import socorro.lib.util as sutil
+
+END_OF_OUTPUT = '__STACKWALK_END_OF_OUTPUT__'
+DUMP_PLACEHOLDER = 'DUMPFILEPATHNAME'
+
+
+#------------------------------------------------------------------------------
+def serve(command, input_stream, output_stream, subprocess_module=subprocess):
+    """the worker's side of the protocol.  'command' is the argument list of a
+    stackwalker that handles one dump per run, with DUMP_PLACEHOLDER standing
+    for the pathname of the dump.  It is run for each pathname read from
+    'input_stream' until the end of it."""
+    devnull = open(os.devnull, 'w')
+    try:
+        for line in iter(input_stream.readline, ''):
+            pathname = line.rstrip('\n')
+            if not pathname:
+                continue
+            arguments = [pathname if x == DUMP_PLACEHOLDER else x
+                         for x in command]
+            last_line = '\n'
+            try:
+                process = subprocess_module.Popen(
+                    arguments, stdout=subprocess_module.PIPE, stderr=devnull,
+                    close_fds=True)
+            except OSError:
+                returncode = 127
+            else:
+                for last_line in iter(process.stdout.readline, ''):
+                    output_stream.write(last_line)
+                returncode = process.wait()
+            if not last_line.endswith('\n'):
+                output_stream.write('\n')
+            output_stream.write('%s|%d\n' % (END_OF_OUTPUT, returncode))
+            output_stream.flush()
+    finally:
+        devnull.close()
+
+
+#------------------------------------------------------------------------------
+def _find_program(name):
+    """True if 'name' is an executable file, found on the PATH if it has no
+    directory"""
+    if os.path.dirname(name):
+        return os.access(name, os.X_OK) and os.path.isfile(name)
+    for directory in os.environ.get('PATH', os.defpath).split(os.pathsep):
+        candidate = os.path.join(directory, name)
+        if os.access(candidate, os.X_OK) and os.path.isfile(candidate):
+            return True
+    return False
+
+
+#==============================================================================
+class StackwalkerWorker(object):
+    """a single long-lived stackwalker process"""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, command_line, maximum_jobs, timeout, logger,
+                 subprocess_module=subprocess):
+        """constructor for a worker.  The process isn't started until the
+        first dump is given to it.
+
+        Parameters:
+            command_line - the fully expanded command that starts a stackwalker
+                           speaking the protocol described above
+            maximum_jobs - the number of dumps after which the process is
+                           replaced with a fresh one (0 for no limit)
+            timeout - the number of seconds that a single dump may take before
+                      the process is killed (0 for no limit)
+            logger - a logger object"""
+        self.command_line = command_line
+        self.maximum_jobs = maximum_jobs
+        self.timeout = timeout
+        self.logger = logger
+        self.subprocess_module = subprocess_module
+        self.process = None
+        self.job_counter = 0
+        self.watchdog = None
+        self.timed_out = False
+
+    #--------------------------------------------------------------------------
+    def is_usable(self):
+        """True if the running process may be given another dump"""
+        if self.process is None or self.process.poll() is not None:
+            return False
+        return not self.maximum_jobs or self.job_counter < self.maximum_jobs
+
+    #--------------------------------------------------------------------------
+    def start(self):
+        self.logger.debug('starting stackwalker: %s', self.command_line)
+        self.process = self.subprocess_module.Popen(
+            shlex.split(self.command_line),
+            stdin=self.subprocess_module.PIPE,
+            stdout=self.subprocess_module.PIPE,
+            stderr=open(os.devnull, 'w'),
+            close_fds=True)
+        self.job_counter = 0
+
+    #--------------------------------------------------------------------------
+    def stop(self):
+        """shut down the process, forcibly if necessary"""
+        self.cancel_watchdog()
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except IOError:
+            pass
+        try:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.wait()
+        except OSError:
+            pass
+        self.process = None
+
+    #--------------------------------------------------------------------------
+    def kill(self):
+        """called by the watchdog timer when a dump is taking too long.  The
+        reader of the output will see an end of file."""
+        process = self.process
+        if process is None:
+            return
+        self.timed_out = True
+        self.logger.warning('stackwalker %s timed out - killing it',
+                            process.pid)
+        try:
+            process.kill()
+        except OSError:
+            pass
+
+    #--------------------------------------------------------------------------
+    def cancel_watchdog(self):
+        if self.watchdog is not None:
+            self.watchdog.cancel()
+            self.watchdog = None
+
+    #--------------------------------------------------------------------------
+    def submit(self, dump_pathname):
+        """send a dump to the process, replacing the process first if it
+        should no longer be used."""
+        if not self.is_usable():
+            self.stop()
+            self.start()
+        self.job_counter += 1
+        self.timed_out = False
+        if self.timeout:
+            self.watchdog = threading.Timer(self.timeout, self.kill)
+            self.watchdog.daemon = True
+            self.watchdog.start()
+        self.process.stdin.write('%s\n' % dump_pathname)
+        self.process.stdin.flush()
+
+    #--------------------------------------------------------------------------
+    def readline(self):
+        return self.process.stdout.readline()
+
+    #--------------------------------------------------------------------------
+    def returncode_at_end_of_file(self):
+        """the process went away before finishing its output.  Reap it and
+        return its exit status."""
+        self.cancel_watchdog()
+        returncode = self.process.wait()
+        self.process = None
+        if returncode == 0:
+            # a clean exit in the middle of a dump is still a failure
+            returncode = -1
+        return returncode
+
+
+#==============================================================================
+class StackwalkerOutput(object):
+    """the output of a stackwalker worker for a single dump.  It is iterable
+    over the lines of the output (newlines included) and doubles as the
+    'subprocess handle' expected by the processor: 'wait' returns the return
+    code of the stackwalk.  Once the output is closed, the worker goes back
+    to the pool."""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, worker, release_func):
+        self.worker = worker
+        self.release_func = release_func
+        self.returncode = None
+        self.released = False
+
+    #--------------------------------------------------------------------------
+    def __iter__(self):
+        while self.returncode is None:
+            line = self.worker.readline()
+            if not line:
+                self.returncode = self.worker.returncode_at_end_of_file()
+                break
+            if line.startswith(END_OF_OUTPUT):
+                self.worker.cancel_watchdog()
+                try:
+                    self.returncode = int(line.rstrip().split('|')[1])
+                except (IndexError, ValueError):
+                    self.returncode = -1
+                break
+            yield line
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """spool out any unread output so that the worker is ready for its
+        next dump, then give it back to the pool"""
+        for x in self:
+            pass
+        if not self.released:
+            self.released = True
+            self.release_func(self.worker)
+
+    #--------------------------------------------------------------------------
+    def wait(self):
+        self.close()
+        return self.returncode
+
+
+#==============================================================================
+class StackwalkerPool(object):
+    """a fixed set of StackwalkerWorkers shared by the processor's threads"""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config, command_line, statsd=None, statsd_prefix='',
+                 worker_class=StackwalkerWorker):
+        """constructor for the pool.
+
+        Parameters:
+            config - dict-like object containing key/value pairs.  From the
+                     config, this class uses the keys:
+                         logger
+                         stackwalkerPoolSize - the number of workers
+                         stackwalkerMaximumJobs - dumps per worker process
+                         stackwalkerTimeout - seconds allowed for one dump
+            command_line - the fully expanded command to start a worker
+            statsd - an optional StatsClient to report worker recycling
+            statsd_prefix - the prefix for the statsd counter names
+
+        A command line that is empty, or whose program can't be found, raises
+        ValueError here rather than failing with the first dump."""
+        arguments = shlex.split(command_line)
+        if not arguments:
+            raise ValueError('the stackwalker pool has no command line')
+        if not _find_program(arguments[0]):
+            raise ValueError('the stackwalker %s is not an executable file' %
+                             arguments[0])
+        self.config = config
+        self.logger = config.logger
+        self.statsd = statsd
+        self.statsd_prefix = statsd_prefix
+        self.workers = []
+        self.idle_workers = Queue.Queue()
+        for x in range(config.stackwalkerPoolSize):
+            worker = worker_class(command_line,
+                                  config.get('stackwalkerMaximumJobs', 0),
+                                  config.get('stackwalkerTimeout', 0),
+                                  self.logger)
+            self.workers.append(worker)
+            self.idle_workers.put(worker)
+
+    #--------------------------------------------------------------------------
+    def invoke(self, dump_pathname):
+        """give a dump to the next idle worker, waiting for one if they are
+        all busy.  Returns a StackwalkerOutput."""
+        worker = self.idle_workers.get()
+        try:
+            if worker.process is not None and not worker.is_usable():
+                self._incr('.stackwalker.recycled')
+            worker.submit(dump_pathname)
+        except (IOError, OSError):
+            # the worker died between dumps - try once with a fresh process
+            sutil.reportExceptionAndContinue(self.logger)
+            self._incr('.stackwalker.recycled')
+            try:
+                worker.stop()
+                worker.submit(dump_pathname)
+            except Exception:
+                worker.stop()
+                self.idle_workers.put(worker)
+                raise
+        return StackwalkerOutput(worker, self._release)
+
+    #--------------------------------------------------------------------------
+    def _release(self, worker):
+        if worker.timed_out:
+            self._incr('.stackwalker.timeouts')
+        self.idle_workers.put(worker)
+
+    #--------------------------------------------------------------------------
+    def _incr(self, name):
+        if self.statsd is not None:
+            self.statsd.incr(self.statsd_prefix + name)
+
+    #--------------------------------------------------------------------------
+    def cleanup(self):
+        for worker in self.workers:
+            try:
+                worker.stop()
+            except Exception:
+                sutil.reportExceptionAndContinue(self.logger)
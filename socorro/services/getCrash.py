@@ -34,10 +34,10 @@ class GetCrash(webapi.JsonServiceBase):
     convertedArgs = webapi.typeConversion([dataTypeOptions,str], args)
     parameters = util.DotDict(zip(['datatype','uuid'], convertedArgs))
     logger.debug("GetCrash get %s", parameters)
-    self.crashStorage = self.crashStoragePool.crashStorage()
     function_name = datatype_function_associations[parameters.datatype]
     function = self.__getattribute__(function_name)
-    return function(parameters.uuid)
+    with self.crashStoragePool.borrowed() as self.crashStorage:
+      return function(parameters.uuid)
 
   def fetchProcessed(self, uuid):
     try:
@@ -14,6 +14,7 @@ except ImportError:
 
 
 import socorro.lib.ooid as ooid
+import socorro.lib.stats as stats
 import socorro.lib.util as sutil
 import socorro.lib.JsonDumpStorage as jds
 import socorro.lib.ver_tools as vtl
@@ -21,12 +22,14 @@ import socorro.lib.ver_tools as vtl
 import socorro.storage.hbaseClient as hbc
 
 import os
+import sys
 import time as tm
 import re
 import random
 import logging
 import threading
 import base64
+import contextlib
 logger = logging.getLogger("collector")
 
 compiledRegularExpressionType = type(re.compile(''))
@@ -54,6 +57,10 @@ class UuidNotFoundException(Exception):
 class NotImplementedException(Exception):
   pass
 
+#=================================================================================================================
+class CrashStoragePoolTimeout(Exception):
+  pass
+
 #=================================================================================================================
 #class RepeatableStreamReader(object):
   ##-----------------------------------------------------------------------------------------------------------------
@@ -210,6 +217,10 @@ class CrashStorageSystem(object):
   def close (self):
     pass
   #-----------------------------------------------------------------------------------------------------------------
+  def isAlive (self):
+    """ True if the storage still answers, see CrashStoragePool.checkConnections """
+    return True
+  #-----------------------------------------------------------------------------------------------------------------
   def makeJsonDictFromForm (self, form, tm=tm):
     names = [name for name in form.keys() if name != self.config.dumpField]
     jsonDict = sutil.DotDict()
@@ -221,6 +232,10 @@ class CrashStorageSystem(object):
     jsonDict.timestamp = tm.time()
     return jsonDict
   #-----------------------------------------------------------------------------------------------------------------
+  # True when the dumps already are files that the processor can read: dumpPathForUuid returns where they are rather
+  # than writing a temporary copy
+  hasLocalDumpFiles = False
+  #-----------------------------------------------------------------------------------------------------------------
   NO_ACTION = 0
   OK = 1
   DISCARDED = 2
@@ -236,12 +251,27 @@ class CrashStorageSystem(object):
   def save_processed (self, uuid, jsonData):
     return CrashStorageSystem.NO_ACTION
   #-----------------------------------------------------------------------------------------------------------------
+  def save_processed_batch (self, processedCrashes):
+    """ the batched form of save_processed for a list of (uuid, jsonData, processingState) tuples, where
+        processingState is what get_raw_crash returned or None.  Subclasses that can write many processed crashes in
+        one request should override this.
+    """
+    for uuid, jsonData, processingState in processedCrashes:
+      self.save_processed(uuid, jsonData)
+  #-----------------------------------------------------------------------------------------------------------------
   def get_meta (self, uuid):
     raise NotImplementedException("get_meta is not implemented")
   #-----------------------------------------------------------------------------------------------------------------
   def get_raw_dump (self, uuid):
     raise NotImplementedException("get_raw_crash is not implemented")
   #-----------------------------------------------------------------------------------------------------------------
+  def get_raw_crash (self, uuid):
+    """ return (jsonDocument, dump, processingState) for uuid.  processingState is whatever the storage needs to save
+        the processed crash without reading the raw crash's state again, or None.  Subclasses that can read them in
+        one request should override this.
+    """
+    return self.get_meta(uuid), self.get_raw_dump(uuid), None
+  #-----------------------------------------------------------------------------------------------------------------
   def get_raw_dump_base64(self,uuid):
     raise NotImplementedException("get_raw_dump_base64 is not implemented")
   #-----------------------------------------------------------------------------------------------------------------
@@ -257,15 +287,35 @@ class CrashStorageSystem(object):
   def uuidInStorage (self, uuid):
     return False
   #-----------------------------------------------------------------------------------------------------------------
+  def uuidsInStorage (self, uuids):
+    """ the batched form of uuidInStorage: returns the set of the uuids that are in storage.  Subclasses that can
+        look up many uuids in one request should override this.
+    """
+    return set(x for x in uuids if self.uuidInStorage(x))
+  #-----------------------------------------------------------------------------------------------------------------
   def newUuids(self):
     raise StopIteration
 
 
+#-----------------------------------------------------------------------------------------------------------------
+def processingStateFromRow(row):
+  """ the columns of an hbase crash_reports row that put_processed_json would otherwise read again, or None if
+      the row doesn't have them all
+  """
+  try:
+    return {'flags:processed': row['flags:processed'], 'timestamps:submitted': row['timestamps:submitted']}
+  except KeyError:
+    return None
+
 #=================================================================================================================
 class CrashStorageSystemForHBase(CrashStorageSystem):
   def __init__ (self, config, configPrefix='', hbaseClient=hbc, jsonDumpStorage=jds):
     super(CrashStorageSystemForHBase, self).__init__(config)
     self.logger.info('connecting to hbase')
+    # index rows and counters are buffered when an interval is given, see HBaseConnectionForCrashReports
+    writeFlushInterval = config.get('hbaseWriteFlushInterval', None)
+    # how processed crashes are written, see HBaseConnectionForCrashReports
+    processedCrashFormat = config.get('hbaseProcessedCrashFormat', 'json')
     if not configPrefix:
       assert "hbaseHost" in config, "hbaseHost is missing from the configuration"
       assert "hbasePort" in config, "hbasePort is missing from the configuration"
@@ -274,7 +324,9 @@ class CrashStorageSystemForHBase(CrashStorageSystem):
                 config.hbaseHost,
                 config.hbasePort,
                 config.hbaseTimeout,
-                logger=self.logger)
+                logger=self.logger,
+                write_flush_interval=writeFlushInterval,
+                processed_crash_format=processedCrashFormat)
     else:
       hbaseHost = '%s%s' % (configPrefix, 'HbaseHost')
       assert hbaseHost in config, "%s is missing from the configuration" % hbaseHost
@@ -286,20 +338,46 @@ class CrashStorageSystemForHBase(CrashStorageSystem):
                 config[hbaseHost],
                 config[hbasePort],
                 config[hbaseTimeout],
-                logger=self.logger)
+                logger=self.logger,
+                write_flush_interval=writeFlushInterval,
+                processed_crash_format=processedCrashFormat)
     retry_exceptions_list = list(self.hbaseConnection.hbaseThriftExceptions)
     retry_exceptions_list.append(hbaseClient.NoConnectionException)
     self.exceptionsEligibleForRetry = tuple(retry_exceptions_list)
 
   #-----------------------------------------------------------------------------------------------------------------
   def close (self):
-    self.hbaseConnection.close()
+    try:
+      self.hbaseConnection.flush_pending_writes(number_of_retries=2)
+    finally:
+      self.hbaseConnection.close()
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def isAlive (self):
+    try:
+      self.hbaseConnection.describe_table('crash_reports', number_of_retries=0)
+      return True
+    except Exception:
+      return False
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def putJsonDump (self, uuid, jsonData, dump):
+    """ save a crash in hbase then, if writes are buffered and it is time, flush them.  The crash is safely
+        stored even if the flush fails - the buffered writes are kept for the next try.
+    """
+    roundTripsBefore = self.hbaseConnection.round_trips
+    self.hbaseConnection.put_json_dump(uuid, jsonData, dump, number_of_retries=2)
+    try:
+      self.hbaseConnection.flush_pending_writes_if_due(number_of_retries=2)
+    except Exception:
+      sutil.reportExceptionAndContinue(self.logger)
+    self.logger.debug('%s - %d hbase round trips', uuid, self.hbaseConnection.round_trips - roundTripsBefore)
 
   #-----------------------------------------------------------------------------------------------------------------
   def save_raw (self, uuid, jsonData, dump, currentTimestamp=None):
     try:
       jsonDataAsString = json.dumps(jsonData)
-      self.hbaseConnection.put_json_dump(uuid, jsonData, dump, number_of_retries=2)
+      self.putJsonDump(uuid, jsonData, dump)
       self.logger.info('saved - %s', uuid)
       return CrashStorageSystem.OK
     except self.exceptionsEligibleForRetry:
@@ -313,6 +391,10 @@ class CrashStorageSystemForHBase(CrashStorageSystem):
   def save_processed (self, uuid, jsonData):
     self.hbaseConnection.put_processed_json(uuid, jsonData, number_of_retries=2)
 
+  #-----------------------------------------------------------------------------------------------------------------
+  def save_processed_batch (self, processedCrashes):
+    self.hbaseConnection.put_processed_jsons(processedCrashes, number_of_retries=2)
+
   #-----------------------------------------------------------------------------------------------------------------
   def get_meta (self, uuid):
     return self.hbaseConnection.get_json(uuid, number_of_retries=2)
@@ -321,6 +403,11 @@ class CrashStorageSystemForHBase(CrashStorageSystem):
   def get_raw_dump (self, uuid):
     return self.hbaseConnection.get_dump(uuid, number_of_retries=2)
 
+  #-----------------------------------------------------------------------------------------------------------------
+  def get_raw_crash (self, uuid):
+    row = self.hbaseConnection.get_raw_report(uuid, number_of_retries=2)
+    return json.loads(row['meta_data:json']), row['raw_data:dump'], processingStateFromRow(row)
+
   #-----------------------------------------------------------------------------------------------------------------
   def get_raw_dump_base64 (self, uuid):
     dump = self.get_raw_dump(uuid, number_of_retries=2)
@@ -334,6 +421,10 @@ class CrashStorageSystemForHBase(CrashStorageSystem):
   def uuidInStorage (self, uuid):
     return self.hbaseConnection.acknowledge_ooid_as_legacy_priority_job(uuid, number_of_retries=2)
 
+  #-----------------------------------------------------------------------------------------------------------------
+  def uuidsInStorage (self, uuids):
+    return self.hbaseConnection.acknowledge_ooids_as_legacy_priority_jobs(uuids, number_of_retries=2)
+
   #-----------------------------------------------------------------------------------------------------------------
   def dumpPathForUuid(self, uuid, basePath):
     dumpPath = ("%s/%s.dump" % (basePath, uuid)).replace('//', '/')
@@ -379,6 +470,14 @@ class DualHbaseCrashStorageSystem(CrashStorageSystemForHBase):
     except hbc.OoidNotFoundException:
       return self.fallbackHBase.get_raw_dump(uuid)
 
+  #-----------------------------------------------------------------------------------------------------------------
+  def get_raw_crash (self, uuid):
+    try:
+      row = self.hbaseConnection.get_raw_report(uuid, number_of_retries=2)
+      return json.loads(row['meta_data:json']), row['raw_data:dump'], processingStateFromRow(row)
+    except hbc.OoidNotFoundException:
+      return self.fallbackHBase.get_raw_crash(uuid)
+
   #-----------------------------------------------------------------------------------------------------------------
   def get_processed (self, uuid):
     try:
@@ -414,7 +513,7 @@ class CollectorCrashStorageSystemForHBase(CrashStorageSystemForHBase):
   def save_raw (self, uuid, jsonData, dump, currentTimestamp):
     try:
       jsonDataAsString = json.dumps(jsonData)
-      self.hbaseConnection.put_json_dump(uuid, jsonData, dump, number_of_retries=2)
+      self.putJsonDump(uuid, jsonData, dump)
       return CrashStorageSystem.OK
     except Exception, x:
       sutil.reportExceptionAndContinue(self.logger)
@@ -437,6 +536,7 @@ class CollectorCrashStorageSystemForHBase(CrashStorageSystemForHBase):
 
 #=================================================================================================================
 class CrashStorageSystemForLocalFS(CrashStorageSystem):
+  hasLocalDumpFiles = True
   #-----------------------------------------------------------------------------------------------------------------
   def __init__ (self, config):
     super(CrashStorageSystemForLocalFS, self).__init__(config)
@@ -530,6 +630,14 @@ class CrashStorageSystemForLocalFS(CrashStorageSystem):
       dumpFile.close()
     return dumpBinary
 
+  #-----------------------------------------------------------------------------------------------------------------
+  def dumpPathForUuid(self, uuid, ignoredBasePath):
+    return self.localFS.getDump(uuid)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def cleanUpTempDumpStorage(self, uuid, ignoredBasePath):
+    pass
+
   #-----------------------------------------------------------------------------------------------------------------
   def newUuids(self):
     return self.localFS.destructiveDateWalk()
@@ -544,6 +652,7 @@ class CrashStorageSystemForLocalFS(CrashStorageSystem):
 
 #=================================================================================================================
 class CrashStorageSystemForNFS(CrashStorageSystem):
+  hasLocalDumpFiles = True
   #-----------------------------------------------------------------------------------------------------------------
   def __init__ (self, config):
     super(CrashStorageSystemForNFS, self).__init__(config)
@@ -612,6 +721,15 @@ class CrashStorageSystemForNFS(CrashStorageSystem):
       jsonFile.close()
     return jsonDocument
 
+  #-----------------------------------------------------------------------------------------------------------------
+  def get_raw_crash (self, uuid):
+    dumpFile = open(self.dumpPathForUuid(uuid, None))
+    try:
+      dump = dumpFile.read()
+    finally:
+      dumpFile.close()
+    return self.get_raw(uuid), dump, None
+
   #-----------------------------------------------------------------------------------------------------------------
   def jsonPathForUuidInJsonDumpStorage(self, uuid):
     try:
@@ -658,37 +776,298 @@ class CrashStorageSystemForNFS(CrashStorageSystem):
 
 #=================================================================================================================
 class CrashStoragePool(dict):
+  """ crash storage connections for many threads.  A thread either keeps one for as long as it lives, by name
+      (crashStorage), or borrows one for a while (acquire and release, or borrowed).  At most maximumSize are open
+      at once (0 for no limit): beyond that, threads wait for one to be released, and acquire raises
+      CrashStoragePoolTimeout after acquireTimeout seconds (0 to wait for as long as it takes).  A thread checking
+      the pool every checkInterval seconds takes back the connections kept by threads that have ended, closes the
+      ones left idle for longer than maximumIdle seconds and replaces the idle ones that fail isAlive.  A kept
+      connection is in use whenever its thread wants, so its thread checks it instead, in crashStorage, at most
+      every checkInterval seconds.  After a connection can't be made, the next attempt waits for a backoff that
+      doubles with each failure, up to maximumBackoff seconds.
+  """
   #-----------------------------------------------------------------------------------------------------------------
-  def __init__(self, config, storageClass=CrashStorageSystemForHBase):
+  def __init__(self, config, storageClass=CrashStorageSystemForHBase, timeFunction=tm.time, sleepFunction=tm.sleep):
     super(CrashStoragePool, self).__init__()
     self.config = config
     self.logger = config.logger
     self.storageClass = storageClass
+    self.maximumSize = config.get('crashStoragePoolMaximumSize', 0)
+    self.maximumIdle = config.get('crashStoragePoolMaximumIdle', 300)
+    self.checkInterval = config.get('crashStoragePoolCheckInterval', 60)
+    self.maximumBackoff = config.get('crashStoragePoolMaximumBackoff', 60)
+    self.acquireTimeout = config.get('crashStoragePoolAcquireTimeout', 60)
+    self.timeFunction = timeFunction
+    self.sleepFunction = sleepFunction
+    self.lock = threading.Condition()
+    self.idle = []    # (crash storage, time released), the most recently released last
+    self.owners = {}  # name -> the thread that keeps the crash storage, or None if the name isn't a thread's
+    self.checkedAt = {}  # name -> when the kept crash storage was made or last checked
+    self.open = 0
+    self.backoff = 0
+    self.retryAt = 0
+    self.counters = dict.fromkeys(('connects', 'connect_failures', 'reconnects', 'failed_checks', 'evicted',
+                                   'reclaimed', 'waits', 'timeouts'), 0)
+    self.waitSeconds = 0.0
+    self.checker = None
+    self.stopping = threading.Event()
     self.logger.debug("creating crashStorePool")
 
   #-----------------------------------------------------------------------------------------------------------------
   def crashStorage(self, name=None):
-    """Like connecionCursorPairNoTest, but test that the specified connection actually works"""
+    """ the crash storage kept by the named thread (the current thread by default), made on first use.  When the
+        named thread asks for it, it isn't in use, so it is checked then if it's due.
+    """
     if name is None:
       name = threading.currentThread().getName()
-    if name not in self:
-      self.logger.debug("creating crashStore for %s", name)
-      self[name] = c = self.storageClass(self.config)
-      return c
+    current = threading.currentThread()
+    kept = None
+    with self.lock:
+      if name in self:
+        kept = self[name]
+        if (not self.checkInterval or self.owners[name] is not current or
+            self.timeFunction() - self.checkedAt[name] < self.checkInterval):
+          return kept
+        self.checkedAt[name] = self.timeFunction()
+    if kept is not None:
+      return self._checkKept(name, kept)
+    self.logger.debug("creating crashStore for %s", name)
+    c = self.acquire()
+    with self.lock:
+      if name not in self:
+        self[name] = c
+        self.owners[name] = current if current.getName() == name else None
+        self.checkedAt[name] = self.timeFunction()
+        return c
+    # another thread of the same name got there first
+    self.release(c)
     return self[name]
 
+  #-----------------------------------------------------------------------------------------------------------------
+  def _checkKept(self, name, crashStorage):
+    """ the named thread's crash storage, replaced if it fails isAlive """
+    if crashStorage.isAlive():
+      return crashStorage
+    self.logger.warning("the crashStore of %s failed its check, reconnecting", name)
+    with self.lock:
+      self.counters['failed_checks'] += 1
+    self._close(crashStorage)
+    try:
+      crashStorage = self._connect()
+    except Exception:
+      with self.lock:
+        del self[name]
+        del self.owners[name]
+        del self.checkedAt[name]
+      self._forget()
+      raise
+    with self.lock:
+      self.counters['reconnects'] += 1
+      self[name] = crashStorage
+    return crashStorage
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def acquire(self):
+    """ a crash storage that no other thread is using, the most recently released idle one or a new one.  Raises
+        CrashStoragePoolTimeout when none is released within acquireTimeout seconds.
+    """
+    self._startChecker()
+    with self.lock:
+      waitStart = None
+      crashStorage = None
+      while True:
+        if self.idle:
+          crashStorage, releasedAt = self.idle.pop()
+          break
+        if not self.maximumSize or self.open < self.maximumSize:
+          self.open += 1
+          break
+        if waitStart is None:
+          self.counters['waits'] += 1
+          waitStart = self.timeFunction()
+          # the condition waits by the real clock
+          deadline = tm.time() + self.acquireTimeout
+        if not self.acquireTimeout:
+          self.lock.wait()
+          continue
+        remaining = deadline - tm.time()
+        if remaining <= 0:
+          self.counters['timeouts'] += 1
+          self.waitSeconds += self.timeFunction() - waitStart
+          raise CrashStoragePoolTimeout('no crash storage was released within %s seconds; all %d are in use' %
+                                        (self.acquireTimeout, self.maximumSize))
+        self.lock.wait(remaining)
+      if waitStart is not None:
+        self.waitSeconds += self.timeFunction() - waitStart
+    if crashStorage is None:
+      try:
+        crashStorage = self._connect()
+      except Exception:
+        self._forget()
+        raise
+    return crashStorage
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def release(self, crashStorage, reusable=True):
+    """ give back a crash storage from acquire.  One that isn't reusable, after a connection error, is closed """
+    if not reusable:
+      self._close(crashStorage)
+      self._forget()
+      return
+    with self.lock:
+      self.idle.append((crashStorage, self.timeFunction()))
+      self.lock.notify()
+
+  #-----------------------------------------------------------------------------------------------------------------
+  @contextlib.contextmanager
+  def borrowed(self):
+    """ a crash storage for the body of a with statement, for threads that shouldn't keep one """
+    crashStorage = self.acquire()
+    try:
+      yield crashStorage
+    except Exception:
+      txClass, tx, txtb = sys.exc_info()
+      connectionErrors = (hbc.FatalException,) + tuple(getattr(crashStorage, 'exceptionsEligibleForRetry', ()))
+      self.release(crashStorage, reusable=not isinstance(tx, connectionErrors))
+      raise txClass, tx, txtb
+    self.release(crashStorage)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def _connect(self):
+    """ a new crash storage, made no sooner than the backoff after a failure allows """
+    with self.lock:
+      delay = self.retryAt - self.timeFunction()
+    if delay > 0:
+      self.sleepFunction(delay)
+    try:
+      crashStorage = self.storageClass(self.config)
+    except Exception:
+      with self.lock:
+        self.counters['connect_failures'] += 1
+        self.backoff = min(self.maximumBackoff, self.backoff * 2 or 1)
+        self.retryAt = self.timeFunction() + self.backoff
+      raise
+    with self.lock:
+      self.counters['connects'] += 1
+      self.backoff = 0
+      self.retryAt = 0
+    return crashStorage
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def _close(self, crashStorage):
+    try:
+      crashStorage.close()
+    except Exception:
+      sutil.reportExceptionAndContinue(self.logger)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def _forget(self, number=1):
+    with self.lock:
+      self.open -= number
+      self.lock.notify_all()
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def _startChecker(self):
+    if not self.checkInterval or self.checker is not None:
+      return
+    with self.lock:
+      if self.checker is None:
+        self.checker = threading.Thread(target=self._runChecker, name='CrashStoragePoolChecker')
+        self.checker.daemon = True
+        self.checker.start()
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def _runChecker(self):
+    while True:
+      self.stopping.wait(self.checkInterval)
+      if self.stopping.isSet():
+        return
+      try:
+        self.checkConnections()
+      except Exception:
+        sutil.reportExceptionAndContinue(self.logger)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def checkConnections(self):
+    """ one pass of the checking thread """
+    now = self.timeFunction()
+    with self.lock:
+      for name, owner in self.owners.items():
+        if owner is not None and not owner.isAlive():
+          self.logger.debug("taking back the crashStore of %s", name)
+          self.idle.append((self.pop(name), now))
+          del self.owners[name]
+          del self.checkedAt[name]
+          self.counters['reclaimed'] += 1
+      expired = [x for x, releasedAt in self.idle if now - releasedAt > self.maximumIdle]
+      checking = [x for x in self.idle if now - x[1] <= self.maximumIdle]
+      self.idle = []
+      self.counters['evicted'] += len(expired)
+    for crashStorage in expired:
+      self._close(crashStorage)
+    if expired:
+      self._forget(len(expired))
+    checked = []
+    for crashStorage, releasedAt in checking:
+      if crashStorage.isAlive():
+        checked.append((crashStorage, releasedAt))
+        continue
+      self.logger.warning("a crashStore failed its check, reconnecting")
+      with self.lock:
+        self.counters['failed_checks'] += 1
+      self._close(crashStorage)
+      try:
+        checked.append((self._connect(), now))
+      except Exception:
+        sutil.reportExceptionAndContinue(self.logger, showTraceback=False)
+        self._forget()
+        continue
+      with self.lock:
+        self.counters['reconnects'] += 1
+    with self.lock:
+      self.idle = sorted(self.idle + checked, key=lambda x: x[1])
+      self.lock.notify_all()
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def statistics(self):
+    with self.lock:
+      statistics = dict(self.counters)
+      statistics['wait_seconds'] = self.waitSeconds
+      statistics['open'] = self.open
+      statistics['idle'] = len(self.idle)
+      statistics['kept'] = len(self)
+    return statistics
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def export_statistics(self, stats_client, prefix):
+    stats.sendGauges(stats_client, prefix, self.statistics())
+
   #-----------------------------------------------------------------------------------------------------------------
   def cleanup (self):
-    for name, crashStore in self.iteritems():
+    self.stopping.set()
+    if self.checker is not None and self.checker is not threading.currentThread():
+      self.checker.join()
+    with self.lock:
+      crashStores = self.items() + [('idle', x) for x, releasedAt in self.idle]
+      self.clear()
+      self.owners.clear()
+      self.checkedAt.clear()
+      self.idle = []
+    for name, crashStore in crashStores:
       try:
         crashStore.close()
         self.logger.debug("crashStore for %s closed", name)
       except:
         sutil.reportExceptionAndContinue(self.logger)
+    if crashStores:
+      self._forget(len(crashStores))
 
   #-----------------------------------------------------------------------------------------------------------------
   def remove (self, name):
-    crashStorage = self[name]
-    crashStorage.close()
-    del self[name]
+    with self.lock:
+      crashStorage = self.pop(name)
+      self.owners.pop(name, None)
+      self.checkedAt.pop(name, None)
+    self._close(crashStorage)
+    self._forget()
 
@@ -3,6 +3,7 @@ try:
   import json
 except ImportError:
   import simplejson as json
+import atexit
 import itertools
 import os
 import sys
@@ -12,6 +13,9 @@ import threading
 import time
 import tarfile
 import random
+import Queue
+import cStringIO
+import weakref
 
 import socket
 
@@ -19,9 +23,10 @@ from thrift import Thrift  #get Thrift modue
 from thrift.transport import TSocket, TTransport #get modules
 from thrift.protocol import TBinaryProtocol #get module
 from hbase import ttypes #get module
-from hbase.Hbase import Client, ColumnDescriptor, Mutation #get classes from module
+from hbase.Hbase import Client, ColumnDescriptor, Mutation, BatchMutation #get classes from module
 
 import socorro.lib.util as utl
+import socorro.storage.processed_crash_format as pcf
 
 class HBaseClientException(Exception):
   pass
@@ -212,6 +217,22 @@ def row_id_to_ooid(row_id):
   except Exception, x:
     raise BadOoidException(x)
 
+class ThriftCallCounter(object):
+  """
+  A stand in for a Thrift client that passes every call through to the real client.  Each call is
+  a round trip to the Thrift server and is counted in the owning connection's 'round_trips'.
+  """
+  def __init__(self, client, connection):
+    self.client = client
+    self.connection = connection
+
+  def __getattr__(self, name):
+    method = getattr(self.client, name)
+    def f(*args, **kwargs):
+      self.connection.round_trips += 1
+      return method(*args, **kwargs)
+    return f
+
 class HBaseConnection(object):
   """
   Base class for hbase connections.  Supplies methods for a few basic
@@ -247,6 +268,7 @@ class HBaseConnection(object):
                                   socket.timeout,
                                   socket.error
                                  )
+    self.round_trips = 0
 
     try:
       self.make_connection(timeout=self.timeout)
@@ -271,7 +293,7 @@ class HBaseConnection(object):
         # Wrap in a protocol
         self.protocol = self.protocolModule.TBinaryProtocol(self.transport)
         # Create a client to use the protocol encoder
-        self.client = self.clientClass(self.protocol)
+        self.client = ThriftCallCounter(self.clientClass(self.protocol), self)
         # Connect!
         self.transport.open()
         self.badConnection = False
@@ -290,6 +312,21 @@ class HBaseConnection(object):
     """
     self.transport.close()
 
+  def clone(self):
+    """
+    Open another connection to the same server, for work that runs alongside this connection
+    """
+    return self.__class__(self.host, self.port, self.timeout,
+                          thrift=self.thriftModule,
+                          tsocket=self.tsocketModule,
+                          ttrans=self.transportModule,
+                          protocol=self.protocolModule,
+                          ttp=self.ttypesModule,
+                          client=self.clientClass,
+                          column=self.columnClass,
+                          mutation=self.mutationClass,
+                          logger=self.logger)
+
   def _make_rows_nice(self,client_result_object):
     """
     Apply _make_row_nice to multiple rows
@@ -314,10 +351,25 @@ class HBaseConnection(object):
     """
     return self._make_rows_nice(self.client.getRow(table_name, row_id))
 
+# the connections with buffered writes, flushed at exit in case their owners never close them (mod_wsgi)
+_buffering_connections = weakref.WeakSet()
+
+def _flush_buffering_connections():
+  for connection in list(_buffering_connections):
+    try:
+      connection.flush_pending_writes(number_of_retries=1)
+    except Exception:
+      utl.reportExceptionAndContinue(connection.logger)
+
+atexit.register(_flush_buffering_connections)
+
 class HBaseConnectionForCrashReports(HBaseConnection):
   """
   A subclass of the HBaseConnection class providing more crash report specific methods
   """
+  # the index tables that the monitor reads as the processing queue
+  queue_index_tables = ('crash_reports_index_unprocessed_flag', 'crash_reports_index_legacy_unprocessed_flag')
+
   def __init__(self,
                host,
                port,
@@ -330,10 +382,33 @@ class HBaseConnectionForCrashReports(HBaseConnection):
                client=Client,
                column=ColumnDescriptor,
                mutation=Mutation,
-               logger=utl.SilentFakeLogger()):
+               logger=utl.SilentFakeLogger(),
+               batch_mutation=BatchMutation,
+               write_flush_interval=None,
+               processed_crash_format='json'):
+    """
+    With a write_flush_interval (in seconds), index rows and metrics counters are buffered rather
+    than written with each crash: rows are grouped per table for mutateRows and counter increments
+    are summed.  The rows of the queue_index_tables are the exception: they are always written with
+    the crash, so a crash is never stored without being queued for processing.  Callers send the
+    buffered writes with flush_pending_writes, or flush_pending_writes_if_due after each crash.
+    Whatever is still buffered when the interpreter exits is flushed then.
+    The processed_crash_format is how processed crashes are written to processed_data:json, either
+    'json' text or 'compressed' (see socorro.storage.processed_crash_format).  Both are read.
+    """
+    if processed_crash_format not in ('json', 'compressed'):
+      raise ValueError('unknown processed crash format: %s' % processed_crash_format)
     super(HBaseConnectionForCrashReports,self).__init__(host,port,timeout,thrift,tsocket,ttrans,
                                                         protocol,ttp,client,column,
                                                         mutation,logger)
+    self.batchMutationClass = batch_mutation
+    self.write_flush_interval = write_flush_interval
+    self.processed_crash_format = processed_crash_format
+    self.pending_rows = {}      # table name -> {row id: mutation list}
+    self.pending_counters = {}  # (table name, row id, column) -> amount
+    self.last_flush = time.time()
+    if write_flush_interval is not None:
+      _buffering_connections.add(self)
 
   def _make_row_nice(self,client_row_object):
     """
@@ -392,40 +467,62 @@ class HBaseConnectionForCrashReports(HBaseConnection):
   @optional_retry_wrapper
   def get_raw_report(self,ooid):
     """
-    Return the json and dump for a given ooid
+    Return the json and dump for a given ooid, along with the columns of its processing state
+    (see get_report_processing_state) since they come with the same read.
     If the ooid doesn't exist, raise not found
     """
     row_id = ooid_to_row_id(ooid)
-    listOfRawRows = self.client.getRowWithColumns('crash_reports',row_id,['meta_data:json', 'raw_data:dump'])
+    listOfRawRows = self.client.getRowWithColumns('crash_reports',row_id,
+        ['meta_data:json', 'raw_data:dump', 'flags:processed', 'timestamps:submitted'])
     #return self._make_row_nice(listOfRawRows[0]) if listOfRawRows else []
     if listOfRawRows:
       return self._make_row_nice(listOfRawRows[0])
     else:
       raise OoidNotFoundException(ooid)
 
-  @optional_retry_wrapper
-  def get_processed_json_as_string (self,ooid):
-    """
-    Return the cooked json (jsonz) for a given ooid as a string
-    If the ooid doesn't exist, return an empty string.
-    """
+  def _get_stored_processed_crash(self,ooid):
     row_id = ooid_to_row_id(ooid)
     listOfRawRows = self.client.getRowWithColumns('crash_reports',row_id,['processed_data:json'])
-    #return listOfRawRows[0].columns["processed_data:json"].value if listOfRawRows else ""
     if listOfRawRows:
       return listOfRawRows[0].columns["processed_data:json"].value
     else:
       raise OoidNotFoundException(ooid)
 
+  @optional_retry_wrapper
+  def get_processed_json_as_string (self,ooid):
+    """
+    Return the cooked json (jsonz) for a given ooid as a string
+    If the ooid doesn't exist, return an empty string.
+    """
+    return pcf.to_json(self._get_stored_processed_crash(ooid))
+
   #@optional_retry_wrapper
-  def get_processed_json(self,ooid, number_of_retries=2):
+  def get_processed_json(self,ooid, number_of_retries=2, include_dump=True):
     """
-    Return the cooked json (jsonz) for a given ooid as a json object
+    Return the cooked json (jsonz) for a given ooid as a json object.  Without include_dump, a
+    compressed processed crash's dump isn't inflated and is left out.
     If the ooid doesn't exist, return an empty string.
     """
-    jsonColumnOfRow = self.get_processed_json_as_string(ooid, number_of_retries=number_of_retries)
-    json_data = json.loads(jsonColumnOfRow)
-    return json_data
+    stored = self.get_stored_processed_crash(ooid, number_of_retries=number_of_retries)
+    return pcf.decode(stored, include_dump=include_dump)
+
+  @optional_retry_wrapper
+  def get_stored_processed_crash(self,ooid):
+    """
+    Return the processed_data:json column for a given ooid as it is stored, either json text or
+    compressed (see socorro.storage.processed_crash_format)
+    If the ooid doesn't exist, raise not found
+    """
+    return self._get_stored_processed_crash(ooid)
+
+  @optional_retry_wrapper
+  def get_processed_header(self,ooid):
+    """
+    Return a few fields of the cooked json for a given ooid, its signature, product, version and
+    dates (see processed_crash_format.HEADER_FIELDS), without inflating a compressed processed crash
+    If the ooid doesn't exist, raise not found
+    """
+    return pcf.read_header(self._get_stored_processed_crash(ooid))
 
   @optional_retry_wrapper
   def get_report_processing_state(self,ooid):
@@ -443,6 +540,21 @@ class HBaseConnectionForCrashReports(HBaseConnection):
     else:
       raise OoidNotFoundException(ooid)
 
+  @optional_retry_wrapper
+  def get_report_processing_states(self,ooids):
+    """
+    Return a mapping of ooid to processing state (see get_report_processing_state).  The Thrift
+    API has no multi-row get, so each row is read with its own getRowWithColumns, all on this
+    connection.  Ooids that don't exist are left out of the mapping.
+    """
+    states = {}
+    for ooid in ooids:
+      listOfRawRows = self.client.getRowWithColumns('crash_reports', ooid_to_row_id(ooid),
+          ['flags:processed', 'flags:legacy_processing', 'timestamps:submitted', 'timestamps:processed'])
+      if listOfRawRows:
+        states[ooid] = self._make_row_nice(listOfRawRows[0])
+    return states
+
   def export_jsonz_for_date(self,date,path):
     """
     Iterates through all rows for a given date and dumps the processed_data:json out as a jsonz file.
@@ -460,40 +572,32 @@ class HBaseConnectionForCrashReports(HBaseConnection):
         except IOError,x:
           raise
         try:
-          json.dump(row['processed_data:json'],file_handle)
+          json.dump(pcf.to_json(row['processed_data:json']),file_handle)
         finally:
           file_handle.close()
 
   def export_jsonz_tarball_for_date(self,date,path,tarball_name):
     """
-    Iterates through all rows for a given date and dumps the processed_data:json out as a jsonz file.
-    The implementation opens up 16 scanners (one for each leading hex character of the salt)
-    one at a time and returns all of the rows matching
+    Iterates through all rows for a given date and adds the processed_data:json to the tarball as a
+    jsonz file.  The 16 salted scanners run in parallel (see parallel_union_scan_with_prefix) and the
+    jsonz files are made in memory - path is no longer used for temporary files.
     """
+    rows = self.parallel_union_scan_with_prefix('crash_reports', date, ['processed_data:json'])
     tf = tarfile.open(tarball_name, 'w:gz')
     try:
-      for i, row in enumerate(self.limited_iteration(self.union_scan_with_prefix('crash_reports', date, ['processed_data:json']),10)):
+      for i, row in enumerate(self.limited_iteration(rows,10)):
         #if i > 10: break
         ooid = row_id_to_ooid(row['_rowkey'])
         if row['processed_data:json']:
-          file_name = os.path.join(path, ooid+'.jsonz')
-          file_handle = None
-          try:
-            file_handle = gzip.open(file_name,'w',9)
-          except IOError,x:
-            raise
-          try:
-            json.dump(row['processed_data:json'],file_handle)
-          finally:
-            file_handle.close()
-          tf.add(file_name, os.path.join(ooid[:2], ooid[2:4], ooid +'.jsonz'))
-          os.unlink(file_name)
+          add_jsonz_to_tarball(tf, ooid, json.dumps(pcf.to_json(row['processed_data:json'])))
     finally:
+      rows.close()
       tf.close()
 
   def export_jsonz_tarball_for_ooids(self,path,tarball_name):
     """
-    Creates jsonz files for each ooid passed in on stdin and puts them all in a tarball
+    Creates jsonz files for each ooid passed in on stdin and puts them all in a tarball.
+    The jsonz files are made in memory - path is no longer used for temporary files.
     """
     tf = tarfile.open(tarball_name, 'w')
     try:
@@ -506,17 +610,7 @@ class HBaseConnectionForCrashReports(HBaseConnection):
           except OoidNotFoundException, e:
             self.logger.debug('OoidNotFound (No processed_data:json?): %s', ooid)
             continue
-          file_name = os.path.join(path, ooid+'.jsonz')
-          try:
-            file_handle = gzip.open(file_name,'w',9)
-          except IOError,x:
-            raise
-          try:
-            file_handle.write(json)
-          finally:
-            file_handle.close()
-          tf.add(file_name, os.path.join(ooid[:2], ooid[2:4], ooid +'.jsonz'))
-          os.unlink(file_name)
+          add_jsonz_to_tarball(tf, ooid, json)
         else:
           self.logger.debug('Skipping...')
     finally:
@@ -536,6 +630,71 @@ class HBaseConnectionForCrashReports(HBaseConnection):
       for rowkey,row in salted_scanner_iterable(self.logger,self.client,self._make_row_nice,salted_prefix,scanner):
         yield row
 
+  def parallel_union_scan_with_prefix(self,table,prefix,columns,batch_size=100,connection_factory=None):
+    """
+    Yields the same unordered rows as union_scan_with_prefix, but the 16 salted scanners run at the
+    same time, each in a thread of its own on a connection of its own (from connection_factory,
+    by default a clone of this connection), fetching batch_size rows per request.  Closing the
+    generator, or letting go of it, stops the scanners.
+    """
+    if connection_factory is None:
+      connection_factory = self.clone
+    batches = Queue.Queue(32)
+    stopping = threading.Event()
+
+    def put(item):
+      while not stopping.isSet():
+        try:
+          batches.put(item, True, 0.5)
+          return True
+        except Queue.Full:
+          pass
+      return False
+
+    def scan(salted_prefix):
+      connection = None
+      try:
+        connection = connection_factory()
+        scanner = connection.client.scannerOpenWithPrefix(table, salted_prefix, columns)
+        self.logger.debug('Scanner %s generated', salted_prefix)
+        try:
+          raw_rows = connection.client.scannerGetList(scanner, batch_size)
+          while raw_rows and put(('rows', [connection._make_row_nice(x) for x in raw_rows])):
+            raw_rows = connection.client.scannerGetList(scanner, batch_size)
+        finally:
+          connection.client.scannerClose(scanner)
+        self.logger.debug('Scanner %s exhausted', salted_prefix)
+        put(('done', salted_prefix))
+      except Exception:
+        put(('error', sys.exc_info()))
+      if connection is not None:
+        try:
+          connection.close()
+        except Exception:
+          pass
+
+    scanners = [threading.Thread(target=scan, args=("%s%s" % (salt,prefix),), name='scanner_%s' % salt)
+                for salt in '0123456789abcdef']
+    for a_scanner in scanners:
+      a_scanner.setDaemon(True)
+      a_scanner.start()
+    try:
+      running = len(scanners)
+      while running:
+        try:
+          kind, value = batches.get(True, 1.0)
+        except Queue.Empty:
+          continue
+        if kind == 'rows':
+          for row in value:
+            yield row
+        elif kind == 'done':
+          running -= 1
+        else:
+          raise value[0], value[1], value[2]
+    finally:
+      stopping.set()
+
   def merge_scan_with_prefix(self,table,prefix,columns):
     #TODO: Need assertion that columns is array containing at least one string
     """
@@ -596,26 +755,91 @@ class HBaseConnectionForCrashReports(HBaseConnection):
     except OoidNotFoundException:
       return False
 
+  @optional_retry_wrapper
+  def acknowledge_ooids_as_legacy_priority_jobs (self, ooids):
+    """
+    The batched form of acknowledge_ooid_as_legacy_priority_job.  Returns the set of ooids that exist
+    and takes them out of the legacy processing index with one mutateRows, adjusting the queue size
+    counter just once.
+    """
+    states = self.get_report_processing_states(ooids)
+    if states:
+      self.client.mutateRows('crash_reports_index_legacy_unprocessed_flag',
+                             [self.batchMutationClass(row=guid_to_timestamped_row_id(ooid, state['timestamps:submitted']),
+                                                      mutations=[self.mutationClass(isDelete=True, column="ids:ooid")])
+                              for ooid, state in sorted(states.iteritems())])
+      self.client.atomicIncrement('metrics','crash_report_queue','counters:current_legacy_unprocessed_size',
+                                  -len(states))
+    return set(states)
+
   @optional_retry_wrapper
   def delete_from_legacy_processing_index(self, index_row_key):
     self.client.deleteAllRow('crash_reports_index_legacy_unprocessed_flag', index_row_key)
     self.client.atomicIncrement('metrics','crash_report_queue','counters:current_legacy_unprocessed_size',-1)
 
+  def _mutate_row(self,table_name,row_id,mutations):
+    """
+    mutateRow, or add the mutations to the buffer when writes are buffered
+    """
+    if self.write_flush_interval is None:
+      self.client.mutateRow(table_name,row_id,mutations)
+    else:
+      self.pending_rows.setdefault(table_name,{}).setdefault(row_id,[]).extend(mutations)
+
+  def _atomic_increment(self,table_name,row_id,column,amount):
+    """
+    atomicIncrement, or add the amount to the buffered counter when writes are buffered
+    """
+    if self.write_flush_interval is None:
+      self.client.atomicIncrement(table_name,row_id,column,amount)
+    else:
+      key = (table_name,row_id,column)
+      self.pending_counters[key] = self.pending_counters.get(key,0) + amount
+
+  @optional_retry_wrapper
+  def flush_pending_writes(self):
+    """
+    Send the buffered rows with one mutateRows per table and one atomicIncrement per distinct
+    counter.  Each table or counter leaves the buffer only once it has been sent, so a failure
+    keeps the rest for the next try and an increment is never sent twice.
+    """
+    for table_name in self.pending_rows.keys():
+      rows = self.pending_rows[table_name]
+      self.client.mutateRows(table_name,[self.batchMutationClass(row=r,mutations=m)
+                                         for r,m in rows.iteritems()])
+      del self.pending_rows[table_name]
+    for key in self.pending_counters.keys():
+      table_name, row_id, column = key
+      if self.pending_counters[key]:
+        self.client.atomicIncrement(table_name,row_id,column,self.pending_counters[key])
+      del self.pending_counters[key]
+    self.last_flush = time.time()
+
+  def flush_pending_writes_if_due(self,number_of_retries=1):
+    if self.write_flush_interval is None or not (self.pending_rows or self.pending_counters):
+      return
+    if time.time() - self.last_flush >= self.write_flush_interval:
+      self.flush_pending_writes(number_of_retries=number_of_retries)
+
   @optional_retry_wrapper
   def put_crash_report_indices(self,ooid,timestamp,indices):
     row_id = guid_to_timestamped_row_id(ooid,timestamp)
     for index_name in indices:
-      self.client.mutateRow(index_name,row_id,[self.mutationClass(column="ids:ooid",value=ooid)])
+      mutations = [self.mutationClass(column="ids:ooid",value=ooid)]
+      if index_name in self.queue_index_tables:
+        self.client.mutateRow(index_name,row_id,mutations)
+      else:
+        self._mutate_row(index_name,row_id,mutations)
 
   @optional_retry_wrapper
   def put_crash_report_hang_indices(self,ooid,hang_id,process_type,timestamp):
     ooid_column_name = "ids:ooid:"+process_type
-    self.client.mutateRow('crash_reports_index_hang_id_submitted_time',
-                          guid_to_timestamped_row_id(hang_id,timestamp),
-                          [self.mutationClass(column=ooid_column_name,value=ooid)])
-    self.client.mutateRow('crash_reports_index_hang_id',
-                          hang_id,
-                          [self.mutationClass(column=ooid_column_name,value=ooid)])
+    self._mutate_row('crash_reports_index_hang_id_submitted_time',
+                     guid_to_timestamped_row_id(hang_id,timestamp),
+                     [self.mutationClass(column=ooid_column_name,value=ooid)])
+    self._mutate_row('crash_reports_index_hang_id',
+                     hang_id,
+                     [self.mutationClass(column=ooid_column_name,value=ooid)])
 
   @optional_retry_wrapper
   def update_metrics_counters_for_submit(self, submitted_timestamp,
@@ -639,13 +863,13 @@ class HBaseConnectionForCrashReports(HBaseConnection):
         counterIncrementList.append("counters:submitted_oop_%s_crash_reports" % process_type)
 
     if add_to_unprocessed_queue:
-      self.client.atomicIncrement('metrics','crash_report_queue','counters:current_unprocessed_size',1)
+      self._atomic_increment('metrics','crash_report_queue','counters:current_unprocessed_size',1)
       if legacy_processing == 0:
-        self.client.atomicIncrement('metrics','crash_report_queue','counters:current_legacy_unprocessed_size',1)
+        self._atomic_increment('metrics','crash_report_queue','counters:current_legacy_unprocessed_size',1)
 
     for rowkey in timeLevels:
       for column in counterIncrementList:
-        self.client.atomicIncrement('metrics',rowkey,column,1)
+        self._atomic_increment('metrics',rowkey,column,1)
 
   @optional_retry_wrapper
   def put_json_dump(self, ooid, json_data, dump, add_to_unprocessed_queue = True):
@@ -732,21 +956,10 @@ class HBaseConnectionForCrashReports(HBaseConnection):
 
     self.put_crash_report_indices(ooid,submitted_timestamp,indices)
 
-  @optional_retry_wrapper
-  def put_processed_json(self,ooid,processed_json):
+  def _processed_row_mutations(self,ooid,processed_json):
     """
-    Create a crash report from the cooked json output of the processor
+    Return the crash_reports mutations for a processed crash and the row key of its signature index row
     """
-    row_id = ooid_to_row_id(ooid)
-
-    processing_state = self.get_report_processing_state(ooid)
-    submitted_timestamp = processing_state.get('timestamps:submitted', processed_json.get('date_processed','unknown'))
-
-    if 'N' == processing_state.get('flags:processed', '?'):
-      index_row_key = guid_to_timestamped_row_id(ooid, submitted_timestamp)
-      self.client.atomicIncrement('metrics','crash_report_queue','counters:current_unprocessed_size',-1)
-      self.client.deleteAllRow('crash_reports_index_unprocessed_flag', index_row_key)
-
     processed_timestamp = processed_json['completeddatetime']
 
     if 'signature' in processed_json:
@@ -760,15 +973,74 @@ class HBaseConnectionForCrashReports(HBaseConnection):
     mutationList = []
     mutationList.append(self.mutationClass(column="timestamps:processed",value=processed_timestamp))
     mutationList.append(self.mutationClass(column="processed_data:signature",value=signature))
-    mutationList.append(self.mutationClass(column="processed_data:json",value=json.dumps(processed_json)))
+    if self.processed_crash_format == 'compressed':
+      stored_processed_json = pcf.encode(processed_json)
+    else:
+      stored_processed_json = json.dumps(processed_json)
+    mutationList.append(self.mutationClass(column="processed_data:json",value=stored_processed_json))
     mutationList.append(self.mutationClass(column="flags:processed",value="Y"))
+    return mutationList, signature + ooid
+
+  @optional_retry_wrapper
+  def put_processed_json(self,ooid,processed_json,processing_state=None):
+    """
+    Create a crash report from the cooked json output of the processor.  The processing state
+    (see get_report_processing_state) is read first unless the caller already has it.
+    """
+    row_id = ooid_to_row_id(ooid)
+
+    if processing_state is None:
+      processing_state = self.get_report_processing_state(ooid)
+    submitted_timestamp = processing_state.get('timestamps:submitted', processed_json.get('date_processed','unknown'))
+
+    if 'N' == processing_state.get('flags:processed', '?'):
+      index_row_key = guid_to_timestamped_row_id(ooid, submitted_timestamp)
+      self.client.atomicIncrement('metrics','crash_report_queue','counters:current_unprocessed_size',-1)
+      self.client.deleteAllRow('crash_reports_index_unprocessed_flag', index_row_key)
+
+    mutationList, sig_ooid_idx_row_key = self._processed_row_mutations(ooid, processed_json)
 
     self.client.mutateRow('crash_reports',row_id,mutationList)
 
-    sig_ooid_idx_row_key = signature + ooid
     self.client.mutateRow('crash_reports_index_signature_ooid', sig_ooid_idx_row_key,
                           [self.mutationClass(column="ids:ooid",value=ooid)])
 
+  @optional_retry_wrapper
+  def put_processed_jsons(self,processed_crashes):
+    """
+    The batched form of put_processed_json for a list of (ooid, processed_json, processing_state) tuples.
+    The processing states that are None are read (see get_report_processing_states), the crash rows, the signature
+    index rows and the unprocessed flag index deletions are sent with one mutateRows each, and the
+    unprocessed queue counter is adjusted once.  The counter goes last, so a retry of the whole batch
+    never adjusts it twice.
+    """
+    unknown_ooids = [ooid for ooid, processed_json, processing_state in processed_crashes
+                     if processing_state is None]
+    read_states = {}
+    if unknown_ooids:
+      read_states = self.get_report_processing_states(unknown_ooids)
+    crash_rows = []
+    signature_rows = []
+    unprocessed_flag_rows = []
+    for ooid, processed_json, processing_state in processed_crashes:
+      if processing_state is None:
+        processing_state = read_states.get(ooid, {})
+      submitted_timestamp = processing_state.get('timestamps:submitted', processed_json.get('date_processed','unknown'))
+      if 'N' == processing_state.get('flags:processed', '?'):
+        unprocessed_flag_rows.append(self.batchMutationClass(
+          row=guid_to_timestamped_row_id(ooid, submitted_timestamp),
+          mutations=[self.mutationClass(isDelete=True, column="ids:ooid")]))
+      mutationList, sig_ooid_idx_row_key = self._processed_row_mutations(ooid, processed_json)
+      crash_rows.append(self.batchMutationClass(row=ooid_to_row_id(ooid), mutations=mutationList))
+      signature_rows.append(self.batchMutationClass(row=sig_ooid_idx_row_key,
+                                                    mutations=[self.mutationClass(column="ids:ooid",value=ooid)]))
+    self.client.mutateRows('crash_reports', crash_rows)
+    self.client.mutateRows('crash_reports_index_signature_ooid', signature_rows)
+    if unprocessed_flag_rows:
+      self.client.mutateRows('crash_reports_index_unprocessed_flag', unprocessed_flag_rows)
+      self.client.atomicIncrement('metrics','crash_report_queue','counters:current_unprocessed_size',
+                                  -len(unprocessed_flag_rows))
+
   def export_sampled_crashes_tarball_for_dates(self,sample_size,dates,path,tarball_name):
     """
     Iterates through all rows for given dates and dumps json and dump for N random crashes.
@@ -816,6 +1088,22 @@ class HBaseConnectionForCrashReports(HBaseConnection):
     finally:
       tf.close()
 
+def add_jsonz_to_tarball(tf, ooid, json_string):
+  """
+  Gzip json_string in memory and add it to the tarball as the ooid's .jsonz file
+  """
+  buffer = cStringIO.StringIO()
+  gzip_file = gzip.GzipFile(ooid + '.jsonz', 'w', 9, buffer)
+  try:
+    gzip_file.write(json_string)
+  finally:
+    gzip_file.close()
+  tar_info = tarfile.TarInfo(os.path.join(ooid[:2], ooid[2:4], ooid + '.jsonz'))
+  tar_info.size = buffer.tell()
+  tar_info.mtime = time.time()
+  buffer.seek(0)
+  tf.addfile(tar_info, buffer)
+
 def salted_scanner_iterable(logger,client,make_row_nice,salted_prefix,scanner):
   """
   Generator based iterable that runs over an HBase scanner
@@ -851,6 +1139,7 @@ if __name__=="__main__":
       get_processed_json ooid
       get_report_processing_state ooid
       union_scan_with_prefix table prefix columns [limit]
+      parallel_union_scan_with_prefix table prefix columns [limit]
       merge_scan_with_prefix table prefix columns [limit]
       put_json_dump ooid json dump
       put_json_dump_from_files ooid json_path dump_path
@@ -928,6 +1217,18 @@ if __name__=="__main__":
     for row in connection.limited_iteration(connection.union_scan_with_prefix(args[0],args[1],columns),limit):
       ppjson(row)
 
+  elif cmd == 'parallel_union_scan_with_prefix':
+    if len(args) < 3:
+      usage()
+      sys.exit(1)
+    columns = args[2].split(',')
+    if len(args) > 3:
+      limit = int(args[3])
+    else:
+      limit = 10
+    for row in connection.limited_iteration(connection.parallel_union_scan_with_prefix(args[0],args[1],columns),limit):
+      ppjson(row)
+
   elif cmd == 'merge_scan_with_prefix':
     if len(args) < 3:
       usage()
@@ -0,0 +1,152 @@
+"""a versioned, compressed storage format for processed crashes.
+
+A processed crash used to be stored as the text of json.dumps, and every
+reader parsed all of it, including its 'dump' - the stackwalker output that
+is most of the document.  An encoded processed crash is
+
+    MAGIC, a version byte, the length of the header (4 bytes, big endian),
+    the header, then the frames
+
+The header is a small JSON object that is never compressed.  It holds the
+fields of the crash named in HEADER_FIELDS and, for each frame, its name,
+offset, length and codec.  The 'document' frame is the processed crash
+without its 'dump' and the 'dump' frame is the dump text, both compressed
+with zlib.  The header is read without inflating anything, and the dump is
+inflated only for readers that ask for it.
+
+Values that don't start with MAGIC are taken to be the old JSON text, so
+every function here also reads the rows stored before this format."""
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+import struct
+import zlib
+
+MAGIC = '\x00SPC'
+VERSION = 1
+HEADER_FIELDS = ('uuid', 'signature', 'product', 'version', 'os_name',
+                 'date_processed', 'completeddatetime', 'success')
+
+_prefix = struct.Struct('>4sBI')
+
+
+#==============================================================================
+class ProcessedCrashFormatError(ValueError):
+    pass
+
+
+#------------------------------------------------------------------------------
+def is_encoded(value):
+    """True if 'value' is in this format rather than the old JSON text"""
+    return value.startswith(MAGIC)
+
+
+#------------------------------------------------------------------------------
+def encode(processed_crash, compression_level=6):
+    """return a processed crash, a dict whose dates are already strings, in
+    this format"""
+    document = dict(processed_crash)
+    dump = document.pop('dump', None)
+    frames = [('document', json.dumps(document))]
+    if dump is not None:
+        if isinstance(dump, unicode):
+            dump = dump.encode('utf-8')
+        frames.append(('dump', dump))
+    header = dict((x, processed_crash[x]) for x in HEADER_FIELDS
+                  if x in processed_crash)
+    header['frames'] = []
+    compressed_frames = []
+    offset = 0
+    for name, data in frames:
+        compressed = zlib.compress(data, compression_level)
+        header['frames'].append([name, offset, len(compressed), 'zlib'])
+        compressed_frames.append(compressed)
+        offset += len(compressed)
+    header_text = json.dumps(header)
+    return ''.join([_prefix.pack(MAGIC, VERSION, len(header_text)),
+                    header_text] + compressed_frames)
+
+
+#------------------------------------------------------------------------------
+def _split(value):
+    """return the header of an encoded value and the offset of its
+    frames"""
+    try:
+        magic, version, header_length = _prefix.unpack_from(value)
+    except struct.error:
+        raise ProcessedCrashFormatError('truncated processed crash')
+    if version != VERSION:
+        raise ProcessedCrashFormatError(
+            'unknown processed crash format version %d' % version)
+    start = _prefix.size + header_length
+    return json.loads(value[_prefix.size:start]), start
+
+
+#------------------------------------------------------------------------------
+def _frame(value, header, start, name):
+    """return the inflated frame 'name', or None if there is none"""
+    for frame_name, offset, length, codec in header['frames']:
+        if frame_name == name:
+            if codec != 'zlib':
+                raise ProcessedCrashFormatError('unknown codec %s' % codec)
+            begin = start + offset
+            try:
+                return zlib.decompress(value[begin:begin + length])
+            except zlib.error, x:
+                raise ProcessedCrashFormatError(str(x))
+    return None
+
+
+#------------------------------------------------------------------------------
+def read_header(value):
+    """return the HEADER_FIELDS of a stored processed crash without inflating
+    its frames (the old JSON text has to be parsed whole)"""
+    if not is_encoded(value):
+        document = json.loads(value)
+        return dict((x, document[x]) for x in HEADER_FIELDS if x in document)
+    header, start = _split(value)
+    del header['frames']
+    return header
+
+
+#------------------------------------------------------------------------------
+def read_dump(value):
+    """return the 'dump' of a stored processed crash, or None if it has
+    none"""
+    if not is_encoded(value):
+        return json.loads(value).get('dump')
+    header, start = _split(value)
+    dump = _frame(value, header, start, 'dump')
+    if dump is not None:
+        dump = dump.decode('utf-8')
+    return dump
+
+
+#------------------------------------------------------------------------------
+def decode(value, include_dump=True):
+    """return a stored processed crash as a dict.  Without 'include_dump', the
+    dump frame isn't inflated and the dict has no 'dump' - get it later with
+    read_dump."""
+    if not is_encoded(value):
+        processed_crash = json.loads(value)
+        if not include_dump:
+            processed_crash.pop('dump', None)
+        return processed_crash
+    header, start = _split(value)
+    processed_crash = json.loads(_frame(value, header, start, 'document'))
+    if include_dump:
+        dump = _frame(value, header, start, 'dump')
+        if dump is not None:
+            processed_crash['dump'] = dump.decode('utf-8')
+    return processed_crash
+
+
+#------------------------------------------------------------------------------
+def to_json(value):
+    """return a stored processed crash as JSON text, as it would have been
+    stored before this format"""
+    if not is_encoded(value):
+        return value
+    return json.dumps(decode(value))
@@ -0,0 +1,60 @@
+##
+## Copy this file to commonconfig.py
+##  - then fix the values to match your test environment
+##
+
+#---------------------------------------------------------------------------
+# Relational Database Section
+
+import socorro.lib.ConfigurationManager as cm
+databaseHost = cm.Option()
+databaseHost.doc = 'the hostname of the database servers'
+databaseHost.default = 'localhost'
+
+databaseName = cm.Option()
+databaseName.doc = 'the name of the database within the server'
+databaseName.default = 'integration_test'
+
+oldDatabaseName = cm.Option()
+oldDatabaseName.doc = 'the name of the old, deprecated test database within the server'
+oldDatabaseName.default = 'test'
+
+databaseUserName = cm.Option()
+databaseUserName.doc = 'the user name for the database servers'
+databaseUserName.default = 'breakpad_rw'
+
+databasePassword = cm.Option()
+databasePassword.doc = 'the password for the database user'
+databasePassword.default = 'aPassword'
+
+#---------------------------------------------------------------------------
+# HBase storage system
+
+hbaseHost = cm.Option()
+hbaseHost.doc = 'Hostname for hbase hadoop cluster. May be a VIP or load balancer'
+hbaseHost.default = 'localhost'
+
+hbasePort = cm.Option()
+hbasePort.doc = 'hbase port number'
+hbasePort.default = 9090
+
+hbaseTimeout = cm.Option()
+hbaseTimeout.doc = 'timeout in milliseconds for an HBase connection'
+hbaseTimeout.default = 5000
+
+
+#---------------------------------------------------------------------------
+# statsd config
+
+statsdHost = cm.Option()
+statsdHost.doc = ''
+statsdHost.default = ''
+
+statsdPort = cm.Option()
+statsdPort.doc = ''
+statsdPort.default = 8125
+
+statsdPrefix = cm.Option()
+statsdPrefix.doc = ''
+statsdPrefix.default = ''
+
@@ -184,6 +184,133 @@ def test_setup_query_parameters_2():
     exp.assert_expected(result.ver_phrase, "")
 
 
+#-------------------------------------------------------------------------------
+def test_process_crash_copied_bug_list():
+    """test_process_crash_copied_bug_list - a bug list as COPY writes it"""
+    id_cache = exp.DummyObjectWithExpectations()
+    id_cache.expect('getAppropriateOsVersion', ('Windows NT', '4.0'), {}, 'XXX')
+    row = list(raw_row)
+    row[14] = '{1234,5678}'
+    result = dailyUrl.process_crash(row, id_cache)
+    exp.assert_expected(result, exp_row)
+
+#-------------------------------------------------------------------------------
+def test_os_version_cache():
+    """test_os_version_cache - each os name and version is munged once"""
+    id_cache = exp.DummyObjectWithExpectations()
+    id_cache.expect('getAppropriateOsVersion',
+                    ('Linux', '0.0.0 Linux 2.6.35 i686'), {}, '2.6.35 i686')
+    id_cache.expect('getAppropriateOsVersion', ('Windows NT', '6.1'), {},
+                    '6.1')
+    os_version_cache = dailyUrl.OsVersionCache(id_cache)
+    for x in range(3):
+        exp.assert_expected(os_version_cache.getAppropriateOsVersion(
+                              'Linux', '0.0.0 Linux 2.6.35 i686'),
+                            '2.6.35 i686')
+        exp.assert_expected(os_version_cache.getAppropriateOsVersion(
+                              'Windows NT', '6.1'),
+                            '6.1')
+
+#-------------------------------------------------------------------------------
+class FakeCsvWriter(object):
+    def __init__(self, failure=None):
+        self.rows = []
+        self.failure = failure
+    def writerows(self, rows):
+        if self.failure:
+            raise self.failure
+        self.rows.extend(rows)
+
+#-------------------------------------------------------------------------------
+def test_background_csv_writers():
+    """test_background_csv_writers - both files get every row in order"""
+    private_writer = FakeCsvWriter()
+    public_writer = FakeCsvWriter()
+    with dailyUrl.background_csv_writers((private_writer, public_writer),
+                                         batch_size=3) as handles:
+        for x in range(10):
+            dailyUrl.write_row(handles, [x, 'http://xyz.com'] + range(15) +
+                                        ['fred@mozilla.com'])
+    exp.assert_expected([x[0] for x in private_writer.rows], range(10))
+    exp.assert_expected([x[0] for x in public_writer.rows], range(10))
+    exp.assert_expected(private_writer.rows[0][1], 'http://xyz.com')
+    exp.assert_expected(public_writer.rows[0][1], 'URL (removed)')
+    exp.assert_expected(private_writer.rows[0][17], 'fred@mozilla.com')
+    exp.assert_expected(public_writer.rows[0][17], '')
+
+    with dailyUrl.background_csv_writers((private_writer, None)) as handles:
+        assert handles[1] is None
+
+#-------------------------------------------------------------------------------
+def test_background_csv_writer_failure():
+    """test_background_csv_writer_failure - close raises the writer's error"""
+    a_writer = dailyUrl.BackgroundCsvWriter(FakeCsvWriter(IOError('full')),
+                                            'test', batch_size=1,
+                                            queue_size=1)
+    for x in range(5):
+        a_writer.writerow([x])
+    try:
+        a_writer.close()
+    except IOError:
+        pass
+    else:
+        assert False, 'close should raise the IOError'
+
+#-------------------------------------------------------------------------------
+class FakeNamedCursor(object):
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetches = 0
+    def execute(self, sql):
+        self.sql = sql
+    def fetchmany(self, size):
+        self.fetches += 1
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+#-------------------------------------------------------------------------------
+def test_fetch_rows():
+    """test_fetch_rows - rows come fetch_size at a time"""
+    cursor = FakeNamedCursor(range(7))
+    rows = dailyUrl.fetch_rows(cursor, 'select', 3)
+    exp.assert_expected(rows.next(), 0)
+    exp.assert_expected(cursor.fetches, 1)
+    exp.assert_expected(list(rows), range(1, 7))
+    exp.assert_expected(cursor.fetches, 4)
+
+#-------------------------------------------------------------------------------
+class FakeCopyCursor(object):
+    def __init__(self, text):
+        self.text = text
+    def copy_expert(self, sql, a_file):
+        self.sql = sql
+        for x in range(0, len(self.text), 5):
+            a_file.write(self.text[x:x + 5])
+
+#-------------------------------------------------------------------------------
+def test_copy_rows():
+    """test_copy_rows - rows are read from COPY output"""
+    cursor = FakeCopyCursor('signature\turl\n'
+                            'xyz\t\\N\n'
+                            '"a\tb"\t"two\nlines"\n')
+    rows = list(dailyUrl.copy_rows(cursor, 'select 1'))
+    exp.assert_expected(rows, [['signature', 'url'],
+                               ['xyz', '\\N'],
+                               ['a\tb', 'two\nlines']])
+    exp.assert_expected(cursor.sql, dailyUrl.copy_sql % 'select 1')
+
+#-------------------------------------------------------------------------------
+class FakeDescribedCursor(FakeNamedCursor):
+    description = [('signature',), ('url',)]
+
+#-------------------------------------------------------------------------------
+class FakeConnection(object):
+    def __init__(self, named_cursor):
+        self.named_cursor = named_cursor
+    def cursor(self, name):
+        assert name == 'dailyUrlDump'
+        return self.named_cursor
+
 #-------------------------------------------------------------------------------
 def test_dailyUrlDump():
     """test_dailyUrlDump - test the thing that ropes them all together"""
@@ -191,6 +318,7 @@ def test_dailyUrlDump():
     conf.day = dt.date(2011, 1, 25)
     conf.product = 'Firefloozy,Thunderthigh'
     conf.version = ''
+    conf.fetchSize = 2
     sql_param = sutil.DotDict()
     sql_param.now_str = "2011-01-26"
     sql_param.yesterday_str = "2011-01-25"
@@ -207,27 +335,29 @@ def test_dailyUrlDump():
     fake_database_pool = exp.DummyObjectWithExpectations()
     fake_database_module.expect('DatabaseConnectionPool',
                                 (conf, fake_logger), {}, fake_database_pool)
-    fake_database_connection = exp.DummyObjectWithExpectations()
+    named_cursor = FakeDescribedCursor([1, 2, 3])
+    fake_database_connection = FakeConnection(named_cursor)
     fake_database_cursor = exp.DummyObjectWithExpectations()
     fake_database_pool.expect('connectionCursorPair', (), {},
                               (fake_database_connection, fake_database_cursor))
     def fake_gzipped_file_context_manager(config):
         yield (1, 2)
+    fake_gzipped_file_context_manager = dailyUrl.contextlib.contextmanager(
+                                          fake_gzipped_file_context_manager)
+    def fake_background_csv_writers(handles):
+        assert handles == (1, 2)
+        yield (3, 4)
+    fake_background_csv_writers = dailyUrl.contextlib.contextmanager(
+                                    fake_background_csv_writers)
     fake_IdCache = exp.DummyObjectWithExpectations()
     fake_IdCache.expect('__call__', (fake_database_cursor,), {}, 'id_cache')
-    fake_database_module.expect('execute', (fake_database_cursor, expected_sql),
-                                {}, [1,2,3])
-    fake_write_row = exp.DummyObjectWithExpectations()
-    fake_database_cursor.expect('description', returnValue=['col','col2'])
-    fake_write_row.expect('__call__', ((1,2), ['col','col2']), {})
-
-    fake_process_crash = exp.DummyObjectWithExpectations()
-    fake_process_crash.expect('__call__', (1, fake_IdCache), {}, [1, 1, 1])
-    fake_write_row.expect('__call__', ((1,2), [1, 1, 1]), {})
-    fake_process_crash.expect('__call__', (2, fake_IdCache), {}, [2, 2, 2])
-    fake_write_row.expect('__call__', ((1,2), [2, 2, 2]), {})
-    fake_process_crash.expect('__call__', (3, fake_IdCache), {}, [3, 3, 3])
-    fake_write_row.expect('__call__', ((1,2), [3, 3, 3]), {})
+    written = []
+    def fake_write_row(handles, row):
+        written.append((handles, row))
+    processed = []
+    def fake_process_crash(crash_row, id_cache):
+        processed.append(id_cache.id_cache)
+        return [crash_row] * 3
 
     fake_database_pool.expect('cleanup', (), {})
 
@@ -237,7 +367,28 @@ def test_dailyUrlDump():
                           IdCache=fake_IdCache,
                           write_row=fake_write_row,
                           process_crash=fake_process_crash,
-                          logger=fake_logger)
-
-
+                          logger=fake_logger,
+                          background_csv_writers=fake_background_csv_writers)
+    exp.assert_expected(named_cursor.sql, expected_sql)
+    exp.assert_expected(named_cursor.fetches, 3)
+    exp.assert_expected(written, [((3, 4), ['signature', 'url']),
+                                  ((3, 4), [1, 1, 1]),
+                                  ((3, 4), [2, 2, 2]),
+                                  ((3, 4), [3, 3, 3])])
+    exp.assert_expected(processed, ['id_cache'] * 3)
 
+#-------------------------------------------------------------------------------
+def test_buffered_gzip_file():
+    """test_buffered_gzip_file - writes reach the gzip file in blocks"""
+    fake_gzip_module = exp.DummyObjectWithExpectations()
+    fake_gzip_file_handle = exp.DummyObjectWithExpectations()
+    fake_gzip_module.expect('open', ('./x.csv.gz', 'w'), {},
+                            fake_gzip_file_handle)
+    fake_gzip_file_handle.expect('write', ('abcdef',), {})
+    fake_gzip_file_handle.expect('write', ('gh',), {})
+    fake_gzip_file_handle.expect('close', (), {})
+    a_file = dailyUrl.BufferedGzipFile('./x.csv.gz', 'w', buffer_size=5,
+                                       gzip=fake_gzip_module)
+    for x in ('abc', 'def', 'gh'):
+        a_file.write(x)
+    a_file.close()
@@ -14,6 +14,7 @@ import dbTestconfig as testConfig
 from   socorro.unittest.testlib.testDB import TestDB
 import socorro.unittest.testlib.util as tutil
 import socorro.lib.ConfigurationManager as configurationManager
+from socorro.lib.sharded_cache import ShardedCache
 
 class Me: # Class 'Me' is just a way to say 'global' once per method
   pass
@@ -164,53 +165,37 @@ class TestCachedIdAccess:
     cursor = self.connection.cursor()
     tidc = cia.IdCache(cursor)
     assert None != cia.productIdCache, 'But %s'%(cia.productIdCache)
-    assert None != cia.productIdCount, 'But %s'%(cia.productIdCount)
     assert None != cia.uriIdCache, 'But %s'%(cia.uriIdCache)
-    assert None != cia.uriIdCount, 'But %s'%(cia.uriIdCount)
     assert None != cia.osIdCache, 'But %s'%(cia.osIdCache)
-    assert None != cia.osIdCount, 'But %s'%(cia.osIdCount)
     cia.clearCache()
     assert None == cia.productIdCache, 'But %s'%(cia.productIdCache)
-    assert None == cia.productIdCount, 'But %s'%(cia.productIdCount)
     assert None == cia.uriIdCache, 'But %s'%(cia.uriIdCache)
-    assert None == cia.uriIdCount, 'But %s'%(cia.uriIdCount)
     assert None == cia.osIdCache, 'But %s'%(cia.osIdCache)
-    assert None == cia.osIdCount, 'But %s'%(cia.osIdCount)
     tidc.initializeCache()
     assert None != cia.productIdCache, 'But %s'%(cia.productIdCache)
-    assert None != cia.productIdCount, 'But %s'%(cia.productIdCount)
     assert None != cia.uriIdCache, 'But %s'%(cia.uriIdCache)
-    assert None != cia.uriIdCount, 'But %s'%(cia.uriIdCount)
     assert None != cia.osIdCache, 'But %s'%(cia.osIdCache)
-    assert None != cia.osIdCount, 'But %s'%(cia.osIdCount)
 
-  def testShrinkIdCache(self):
-    idCache = dict((x,x) for x in range(7))
-    idCount = dict((x,10-x) for x in range(7))
-    # expect the first half of the map
-    expectCache = dict((x,x) for x in range(4))
-    expectCount = dict((x,1) for x in range(4))
-    gotCache, gotCount = cia.shrinkIdCache(idCache,idCount)
-    assert expectCache == gotCache, 'Expect %s, got %s'%(expectCache,gotCache)
-    assert expectCount == gotCount, 'Expect %s, got %s'%(expectCount,gotCount)
-    # expect the same if the key to save is already in the saved part
-    gotCache, gotCount = cia.shrinkIdCache(idCache,idCount,oneKeyToSave=2)
-    assert expectCache == gotCache, 'Expect %s, got %s'%(expectCache,gotCache)
-    assert expectCount == gotCount, 'Expect %s, got %s'%(expectCount,gotCount)
-    # expect the key and its count if key to save would have been discarded
-    gotCache, gotCount = cia.shrinkIdCache(idCache,idCount,oneKeyToSave=5)
-    expectCache[5] = 5
-    expectCount[5] = 1
-    assert expectCache == gotCache, 'Expect %s, got %s'%(expectCache,gotCache)
-    assert expectCount == gotCount, 'Expect %s, got %s'%(expectCount,gotCount)
-    # expect reverse, just to be sure
-    idCount = dict((x,10+x) for x in range(7))
-    expectCache = dict((x,x) for x in range(3,7))
-    expectCount = dict((x,1) for x in range(3,7))
-    gotCache, gotCount = cia.shrinkIdCache(idCache,idCount)
-    assert expectCache == gotCache, 'Expect %s, got %s'%(expectCache,gotCache)
-    assert expectCount == gotCount, 'Expect %s, got %s'%(expectCount,gotCount)
-    assert_raises(KeyError,cia.shrinkIdCache,idCache,idCount,99)
+  def testInitializeIdCacheIsBounded(self):
+    cursor = self.connection.cursor()
+    cursor.execute("DELETE FROM osdims")
+    cursor.executemany("INSERT INTO osdims (os_name,os_version) VALUES (%s,%s)",[('os',str(x)) for x in range(10)])
+    self.connection.commit()
+    try:
+      idCache = cia.initializeIdCache(('os_name','os_version',),'id','osdims',cursor,4)
+      assert 4 == len(idCache), 'But %s'%(len(idCache))
+      for x in range(6,10):
+        assert ('os',str(x)) in idCache, 'But %s'%(idCache.snapshot)
+      # keys found later are bounded and evicted least recently used first
+      for x in range(10,20):
+        idCache.put(('os',str(x)),x)
+      assert 8 == len(idCache), 'But %s'%(len(idCache))
+      assert ('os','19') in idCache
+      assert ('os','10') not in idCache
+      assert 6 == idCache.statistics()['evictions']
+    finally:
+      cursor.execute("DELETE FROM osdims")
+      self.connection.commit()
 
   def testAssureAndGetId(self):
     createSql = """CREATE TABLE moolah (
@@ -256,11 +241,10 @@ class TestCachedIdAccess:
       # - the database gets each (and only) new key
       # - the ids are as expected
       idCache = None
-      idCount = None
       idSet = set()
       rowCount = 0
       for v in ktests:
-        id = idc.assureAndGetId(v[0],'moolah',getSqlk,putSqlk,idCache,idCount)
+        id = idc.assureAndGetId(v[0],'moolah',getSqlk,putSqlk,idCache)
         if not id in idSet:
           rowCount += 1
         idSet.add(id)
@@ -270,7 +254,6 @@ class TestCachedIdAccess:
         self.connection.commit()
         assert (v[1],v[0][0],v[0][1], None) in data
         assert len(data) == rowCount
-      assert idCache == idCount
       assert idCache == None
 
       cursor.execute(delSql)
@@ -279,18 +262,16 @@ class TestCachedIdAccess:
       # test with key and full cache:
       # - know the id from the cache
       # - the database isn't updated
-      idCache = {('n','o'):23, ('nn','oo'):24, ('nn','o'):25}
-      idCount = {('n','o'):5, ('nn','oo'):10, ('nn','o'):10}
-      testIdCount = {('n','o'):5, ('nn','oo'):10, ('nn','o'):10}
+      idCache = ShardedCache(10, snapshot={('n','o'):23, ('nn','oo'):24, ('nn','o'):25})
       for v in ktests:
-        id = idc.assureAndGetId(v[0],'moolah',getSqlk,putSqlk,idCache,idCount)
+        id = idc.assureAndGetId(v[0],'moolah',getSqlk,putSqlk,idCache)
         assert idCache.get(v[0]) == id
-        testIdCount[v[0]] += 1
         cursor.execute(countSql)
         self.connection.commit()
         count = cursor.fetchone()
         assert 0 == count[0]
-      assert testIdCount == idCount
+      assert 0 == idCache.statistics()['misses']
+      assert 0 == idCache.statistics()['loads']
 
       cursor.execute(dropSql)
       cursor.execute(createSql)
@@ -298,22 +279,20 @@ class TestCachedIdAccess:
       # test with key and initially empty cache:
       idSet = set()
       rowCount = 0
-      idCache = {}
-      idCount = {('n','o'):5, ('nn','oo'):10, ('nn','o'):10}
-      testIdCount = {('n','o'):0, ('nn','oo'):0, ('nn','o'):0}
+      idCache = ShardedCache(10)
       for v in ktests:
-        id = idc.assureAndGetId(v[0],'moolah',getSqlk,putSqlk,idCache,idCount)
+        id = idc.assureAndGetId(v[0],'moolah',getSqlk,putSqlk,idCache)
         if not id in idSet:
           rowCount += 1
         idSet.add(id)
         assert idCache.get(v[0]) == id
         assert v[1] == id
-        testIdCount[v[0]] += 1
         cursor.execute(countSql)
         self.connection.commit()
         count = cursor.fetchone()
         assert rowCount == count[0]
-      assert testIdCount == idCount
+      assert 3 == idCache.statistics()['misses']
+      assert 3 == idCache.statistics()['loads']
 
       cursor.execute(dropSql)
       cursor.execute(createSql)
@@ -321,18 +300,16 @@ class TestCachedIdAccess:
       # test with dictKey and full cache:
       # - know the id from the cache
       # - the database isn't updated
-      idCache = {('n','o'):23, ('nn','oo'):24, ('nn','o'):25}
-      idCount = {('n','o'):5, ('nn','oo'):10, ('nn','o'):10}
-      testIdCount = {('n','o'):5, ('nn','oo'):10, ('nn','o'):10}
+      idCache = ShardedCache(10, snapshot={('n','o'):23, ('nn','oo'):24, ('nn','o'):25})
       for v in dtests:
-        id = idc.assureAndGetId(v[0],'moolah',getSqld,putSqld,idCache,idCount,dkey=v[1])
+        id = idc.assureAndGetId(v[0],'moolah',getSqld,putSqld,idCache,dkey=v[1])
         assert idCache.get(v[0]) == id
-        testIdCount[v[0]] += 1
         cursor.execute(countSql)
         self.connection.commit()
         count = cursor.fetchone()
         assert 0 == count[0]
-      assert testIdCount == idCount
+      assert 0 == idCache.statistics()['misses']
+      assert 0 == idCache.statistics()['loads']
 
       cursor.execute(dropSql)
       cursor.execute(createSql)
@@ -340,22 +317,20 @@ class TestCachedIdAccess:
       # test with dictKey and initially empty cache:
       idSet = set()
       rowCount = 0
-      idCache = {}
-      idCount = {('n','o'):5, ('nn','oo'):10, ('nn','o'):10}
-      testIdCount = {('n','o'):0, ('nn','oo'):0, ('nn','o'):0}
+      idCache = ShardedCache(10)
       for v in dtests:
-        id = idc.assureAndGetId(v[0],'moolah',getSqld,putSqld,idCache,idCount,dkey=v[1])
+        id = idc.assureAndGetId(v[0],'moolah',getSqld,putSqld,idCache,dkey=v[1])
         if not id in idSet:
           rowCount += 1
         idSet.add(id)
         assert idCache.get(v[0]) == id
         assert v[2] == id
-        testIdCount[v[0]] += 1
         cursor.execute(countSql)
         self.connection.commit()
         count = cursor.fetchone()
         assert rowCount == count[0]
-      assert testIdCount == idCount
+      assert 3 == idCache.statistics()['misses']
+      assert 3 == idCache.statistics()['loads']
 
     finally:
       # teardown
@@ -370,7 +345,6 @@ class TestCachedIdAccess:
     count = cursor.fetchone()[0]
     assert 0 == count, 'but got %s'%count
     assert None == cia.uriIdCache, 'but got %s'%cia.uriIdCache
-    assert None == cia.uriIdCount, 'but got %s'%cia.uriIdCount
     idc = cia.IdCache(cursor,truncateUrlLength=12)
     testUrls = [
       ('', None, ''),
@@ -407,10 +381,8 @@ class TestCachedIdAccess:
       assert rowCount == data[0], 'Expected %s, got %s'%(rowCount,data[0])
     if not cia.maxUriIdCacheLength:
       assert None == cia.uriIdCache
-      assert None == cia.uriIdCount
     else:
       assert rowCount == len(cia.uriIdCache)
-      assert rowCount == len(cia.uriIdCount)
     cursor.execute('select url from urldims')
     cursor.connection.rollback()
     for i in cursor.fetchall():
@@ -423,7 +395,6 @@ class TestCachedIdAccess:
     count = cursor.fetchone()[0]
     assert 0 == count, 'but got %s'%count
     assert None == cia.uriIdCache
-    assert None == cia.uriIdCount
     cia.maxUriIdCacheLength = 30
     idc = cia.IdCache(cursor,truncateUrlLength=13)
     testUrls = [
@@ -460,10 +431,8 @@ class TestCachedIdAccess:
       assert rowCount == data[0], 'Expected %s, got %s'%(rowCount,data[0])
     if not cia.maxUriIdCacheLength:
       assert None == cia.uriIdCache
-      assert None == cia.uriIdCount
     else:
       assert rowCount == len(cia.uriIdCache)
-      assert rowCount == len(cia.uriIdCount)
     cursor.execute('select url from urldims')
     cursor.connection.rollback()
     for i in cursor.fetchall():
@@ -476,10 +445,8 @@ class TestCachedIdAccess:
     count = cursor.fetchone()[0]
     assert 0 == count, 'but got %s'%count
     assert None == cia.productIdCache, 'but got %s'%cia.productIdCache
-    assert None == cia.productIdCount, 'but got %s'%cia.productIdCount
     idc = cia.IdCache(cursor)
-    assert {} == cia.productIdCache
-    assert {} == cia.productIdCount
+    assert 0 == len(cia.productIdCache)
     testProducts = [
       (('','3.0.9',''), None,),
       (('','3.0.9','1.9'), None,),
@@ -509,10 +476,8 @@ class TestCachedIdAccess:
     count = cursor.fetchone()[0]
     assert 0 == count, 'but got %s'%count
     assert None == cia.osIdCache, 'but got %s'%cia.osIdCache
-    assert None == cia.osIdCount, 'but got %s'%cia.osIdCount
     idc = cia.IdCache(cursor)
-    assert {} == cia.osIdCache
-    assert {} == cia.osIdCount
+    assert 0 == len(cia.osIdCache)
     testOss = [
       (('Windows NT',''),1),
       (('Windows NT','5.1.2600 SP2'),2),
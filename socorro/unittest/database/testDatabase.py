@@ -65,6 +65,22 @@ class TestSingleCursor(psycopg2.extensions.cursor):
     return self.result
 
 
+class TestConnectionPoolWithoutDatabase(unittest.TestCase):
+  """the connection pool tests that never connect to the database"""
+  def setUp(self):
+    self.logger = TestingLogger()
+
+  def testConnectionPoolCountStatements(self):
+    class FakeConnection(object):
+      def cursor(self, **kwargs):
+        return kwargs
+    cp = db.DatabaseConnectionPool(config, self.logger)
+    cp['counted'] = FakeConnection()
+    assert {} == cp.connectionCursorPair('counted')[1]
+    cp = db.DatabaseConnectionPool(config, self.logger, countStatements=True)
+    cp['counted'] = FakeConnection()
+    assert {'cursor_factory': db.CountingCursor} == cp.connectionCursorPair('counted')[1]
+
 class TestDatabase(unittest.TestCase):
   def setUp(self):
     self.logger = TestingLogger()
@@ -208,6 +208,132 @@ def testTwoPartitionCreatedFunctions():
   assert schema.partitionWasCreated('woo')
   assert not schema.partitionWasCreated('foo')
 
+class RecordingCursor:
+  def __init__(self, result=None, tables=(), failures=0):
+    self.executed = []
+    self.result = result
+    self.tables = tables
+    self.failures = failures
+    self.description = None
+    self.connection = RecordingConnection()
+  def execute(self, sql, parameters=None):
+    self.executed.append((sql, parameters))
+    if self.failures and 'insert' in sql:
+      self.failures -= 1
+      raise psycopg2.ProgrammingError('relation does not exist')
+    self.description = None
+    if self.result is not None and 'returning' in sql:
+      self.description = [('id',)]
+  def fetchall(self):
+    if 'pg_class' in self.executed[-1][0]:
+      return [(x,) for x in self.tables]
+    return self.result
+
+class RecordingConnection:
+  def __init__(self):
+    self.commits = 0
+  def commit(self):
+    self.commits += 1
+  def rollback(self):
+    pass
+
+def testInsertManyAndReturningId():
+  """
+  testInsertManyAndReturningId():
+   - check that several rows go to a known partition in one statement, with its savepoint in the same round trip,
+     and that the reports insert and replacement return the new id
+  """
+  logger = me.logger
+  date_processed = dt.datetime(2011, 2, 15, 1, 0, 0)
+  schema.markPartitionCreated('extensions_20110214')
+  schema.markPartitionCreated('reports_20110214')
+  extensions = schema.ExtensionsTable(logger=logger)
+  cursor = RecordingCursor()
+  rows = [(1, date_processed, 0, 'a', '1.0'), (1, date_processed, 1, 'b', '2.0')]
+  assert [] == extensions.insertMany(cursor, rows, None, date_processed=date_processed)
+  assert 1 == len(cursor.executed), cursor.executed
+  sql, parameters = cursor.executed[0]
+  assert ('savepoint extensions_20110214; '
+          'insert into extensions_20110214 (report_id, date_processed, extension_key, extension_id, extension_version) '
+          'values (%s, %s, %s, %s, %s), (%s, %s, %s, %s, %s)') == sql, sql
+  assert [x for aRow in rows for x in aRow] == parameters
+  cursor = RecordingCursor()
+  assert [] == extensions.insertMany(cursor, [], None, date_processed=date_processed)
+  assert [] == cursor.executed
+
+  reports = schema.ReportsTable(logger=logger)
+  row = tuple(range(len(reports.columns)))
+  cursor = RecordingCursor([(17,)])
+  assert 17 == reports.insertReturningId(cursor, row, None, date_processed=date_processed)
+  sql, parameters = cursor.executed[0]
+  assert sql.startswith('savepoint reports_20110214; insert into reports_20110214') and sql.endswith(' returning id'), sql
+  assert row == parameters
+  cursor = RecordingCursor([(18,)])
+  assert 18 == reports.replace(cursor, row, date_processed=date_processed)
+  assert 1 == len(cursor.executed), cursor.executed
+  sql, parameters = cursor.executed[0]
+  assert sql.startswith('delete from reports_20110214 where uuid = %s and date_processed = %s; '
+                        'insert into reports_20110214'), sql
+  assert (0, date_processed) + row == parameters
+
+def testInsertIntoNewPartition():
+  """
+  testInsertIntoNewPartition():
+   - check that the first insert into an unknown week finds the existing partitions, creates the missing ones for
+     that week and the weeks ahead, and that later inserts into those weeks go straight to the partition
+  """
+  logger = me.logger
+  date_processed = dt.datetime(2011, 3, 2, 1, 0, 0)
+  altCursor = RecordingCursor(tables=['reports_20110228', 'plugins_reports_20110228'])
+  cursor = RecordingCursor()
+  pluginsReports = schema.PluginsReportsTable(logger=logger)
+  pluginsReports.insert(cursor, (1, 2, date_processed, '1.0'), lambda: (altCursor.connection, altCursor),
+                        date_processed=date_processed)
+  assert 1 == len(cursor.executed), cursor.executed
+  assert cursor.executed[0][0].startswith('savepoint plugins_reports_20110228; insert into plugins_reports_20110228'), \
+         cursor.executed[0][0]
+  assert not cursor.connection.commits
+  created = [sql for sql, parameters in altCursor.executed if 'CREATE TABLE' in sql]
+  assert 4 == len(created), created
+  for partitionName in ('reports_20110307', 'reports_20110314', 'plugins_reports_20110307',
+                        'plugins_reports_20110314'):
+    assert schema.partitionWasCreated(partitionName), partitionName
+    assert [x for x in created if 'CREATE TABLE %s ' % partitionName in x], partitionName
+  altCursor.executed = []
+  cursor = RecordingCursor()
+  later = dt.datetime(2011, 3, 15, 1, 0, 0)
+  pluginsReports.insert(cursor, (1, 2, later, '1.0'), None, date_processed=later)
+  assert 1 == len(cursor.executed), cursor.executed
+  assert cursor.executed[0][0].startswith('savepoint plugins_reports_20110314; insert into plugins_reports_20110314'), \
+         cursor.executed[0][0]
+
+def testInsertIntoVanishedPartition():
+  """
+  testInsertIntoVanishedPartition():
+   - check that a known partition that has gone away is created again on the alternate connection and the insert
+     retried, without committing the caller's transaction
+  """
+  logger = me.logger
+  date_processed = dt.datetime(2011, 4, 6, 1, 0, 0)
+  schema.markPartitionCreated('reports_20110404')
+  schema.markPartitionCreated('plugins_reports_20110404')
+  altCursor = RecordingCursor(tables=['reports_20110404', 'reports_20110411', 'reports_20110418',
+                                      'plugins_reports_20110411', 'plugins_reports_20110418'])
+  cursor = RecordingCursor(failures=1)
+  pluginsReports = schema.PluginsReportsTable(logger=logger)
+  pluginsReports.insert(cursor, (1, 2, date_processed, '1.0'), lambda: (altCursor.connection, altCursor),
+                        date_processed=date_processed)
+  statements = [sql for sql, parameters in cursor.executed]
+  assert 3 == len(statements), statements
+  assert statements[0].startswith('savepoint plugins_reports_20110404; insert into plugins_reports_20110404 '), statements
+  assert 'rollback to plugins_reports_20110404; release savepoint plugins_reports_20110404;' == statements[1], statements
+  assert statements[2].startswith('insert into plugins_reports_20110404 '), statements
+  assert not cursor.connection.commits
+  created = [sql for sql, parameters in altCursor.executed if 'CREATE TABLE' in sql]
+  assert 1 == len(created) and 'CREATE TABLE plugins_reports_20110404 ' in created[0], created
+  assert altCursor.executed[0][0].startswith('set statement_timeout'), altCursor.executed[0]
+  assert 'reset statement_timeout' == altCursor.executed[-1][0], altCursor.executed[-1]
+
 def testConnectToDatabase():
   """
   testConnectToDatabase():
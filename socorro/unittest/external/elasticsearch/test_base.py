@@ -1,6 +1,8 @@
+import calendar
+import json
 import unittest
 
-from socorro.external.elasticsearch.base import ElasticSearchBase
+from socorro.external.elasticsearch.base import ElasticSearchBase, IndexCatalog
 
 import socorro.lib.search_common as scommon
 import socorro.lib.util as util
@@ -12,6 +14,98 @@ def setup_module():
     testutil.nosePrintModule(__file__)
 
 
+#==============================================================================
+class FakeHttpClient(object):
+    """Records the requests made and answers them from 'responses', a dict
+    of lists of responses by URI."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+    def get(self, uri):
+        self.requests.append(uri)
+        return self.responses[uri].pop(0)
+
+    def post(self, uri, data):
+        return self.get(uri)
+
+
+#==============================================================================
+class TestIndexCatalog(unittest.TestCase):
+    """Test the IndexCatalog class. """
+
+    #--------------------------------------------------------------------------
+    def get_catalog(self, responses, now=(2012, 5, 10, 0, 0, 0)):
+        self.now = float(calendar.timegm(now))
+        catalog = IndexCatalog("", 9200, ttl=60,
+                               time_function=lambda: self.now)
+        catalog.http = FakeHttpClient({"/_aliases": responses})
+        return catalog
+
+    #--------------------------------------------------------------------------
+    def test_existing(self):
+        aliases = {
+            "socorro_120501": {"aliases": {}},
+            "socorro_120502_v2": {"aliases": {"socorro_120502": {}}},
+        }
+        catalog = self.get_catalog([json.dumps(aliases)])
+        days = ["socorro_120501", "socorro_120502", "socorro_120503"]
+        self.assertEqual(catalog.existing(days),
+                         ["socorro_120501", "socorro_120502"])
+        self.assertEqual(catalog.existing(days),
+                         ["socorro_120501", "socorro_120502"])
+        self.assertEqual(len(catalog.http.requests), 1)
+
+        catalog.forget("socorro_120501")
+        self.assertEqual(catalog.existing(days), ["socorro_120502"])
+
+    #--------------------------------------------------------------------------
+    def test_daily_index_created_since_the_load(self):
+        catalog = self.get_catalog([json.dumps({"socorro_120502": {}})],
+                                   now=(2012, 5, 3, 12, 0, 0))
+        days = ["socorro_120501", "socorro_120502", "socorro_120503",
+                "socorro_120504"]
+        self.assertEqual(catalog.existing(days),
+                         ["socorro_120502", "socorro_120503",
+                          "socorro_120504"])
+        self.assertEqual(catalog.existing(["socorro_other"]), [])
+
+        # until a query finds it missing
+        catalog.forget("socorro_120503")
+        self.assertEqual(catalog.existing(days),
+                         ["socorro_120502", "socorro_120504"])
+        self.assertEqual(len(catalog.http.requests), 1)
+
+    #--------------------------------------------------------------------------
+    def test_refresh(self):
+        catalog = self.get_catalog([
+            json.dumps({"socorro_120501": {}}),
+            json.dumps({"socorro_120501": {}, "socorro_120502": {}}),
+        ])
+        days = ["socorro_120501", "socorro_120502"]
+        self.assertEqual(catalog.existing(days), ["socorro_120501"])
+        self.now += 61
+        catalog.refresh_in_background = catalog.refresh
+        self.assertEqual(catalog.existing(days), days)
+        self.assertEqual(len(catalog.http.requests), 2)
+
+    #--------------------------------------------------------------------------
+    def test_unavailable(self):
+        error = {"error": {"code": 500, "reason": "oops", "data": ""}}
+        catalog = self.get_catalog([error])
+        days = ["socorro_120501", "socorro_120502"]
+        self.assertEqual(catalog.existing(days), days)
+        self.assertEqual(catalog.existing(days), days)
+        self.assertEqual(len(catalog.http.requests), 1)
+
+
 #==============================================================================
 class TestElasticSearchBase(unittest.TestCase):
     """Test ElasticSearchBase class. """
@@ -225,3 +319,31 @@ class TestElasticSearchBase(unittest.TestCase):
         search_mode = "random_unexisting_mode"
         newterms = ElasticSearchBase.prepare_terms(terms, search_mode)
         self.assertEqual(newterms, terms)
+
+    #--------------------------------------------------------------------------
+    def test_query_skips_missing_indexes(self):
+        base = ElasticSearchBase(config=self.get_dummy_context())
+        base.index_catalog = IndexCatalog("", 9200)
+        base.index_catalog.http = FakeHttpClient({
+            "/_aliases": [json.dumps({"socorro_120502": {}})]
+        })
+        base.http = FakeHttpClient({
+            "/socorro_120502/_search": ['{"hits": {}}']
+        })
+        result = base.query("2012-05-01", "2012-05-03", "{}")
+        self.assertEqual(result, ('{"hits": {}}', "text/json"))
+        self.assertEqual(base.http.requests, ["/socorro_120502/_search"])
+
+        # an index that went missing since the catalog was loaded
+        base.http = FakeHttpClient({
+            "/socorro_120502/_search": [{
+                "error": {
+                    "code": 404,
+                    "reason": "Not Found",
+                    "data": "IndexMissingException[[socorro_120502] missing]"
+                }
+            }]
+        })
+        result = base.query("2012-05-01", "2012-05-03", "{}")
+        self.assertEqual(result, ("{}", "text/json"))
+        self.assertEqual(base.index_catalog.existing(["socorro_120502"]), [])
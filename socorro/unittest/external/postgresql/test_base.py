@@ -11,6 +11,38 @@ def setup_module():
     testutil.nosePrintModule(__file__)
 
 
+#==============================================================================
+class FakeNamedCursor(object):
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetches = []
+
+    def execute(self, sql, params):
+        self.sql = sql
+
+    def fetchmany(self, size):
+        self.fetches.append(size)
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+#==============================================================================
+class FakeConnection(object):
+
+    def __init__(self, rows):
+        self.cursors = {}
+        self.rows = rows
+        self.closed = False
+
+    def cursor(self, name=None):
+        self.cursors[name] = FakeNamedCursor(self.rows)
+        return self.cursors[name]
+
+    def close(self):
+        self.closed = True
+
+
 #==============================================================================
 class TestPostgreSQLBase(unittest.TestCase):
     """Test PostgreSQLBase class. """
@@ -517,3 +549,27 @@ class TestPostgreSQLBase(unittest.TestCase):
 
         self.assertEqual(version_where, version_where_exp)
         self.assertEqual(sql_params, sql_params_exp)
+
+    #--------------------------------------------------------------------------
+    def test_stream_query(self):
+        """Test PostgreSQLBase.stream_query()."""
+        config = self.get_dummy_context()
+        config.streamingFetchSize = 2
+        pgbase = self.get_instance(config)
+        pgbase.connection = FakeConnection([(1,), (2,), (3,)])
+
+        rows = pgbase.stream_query("test", "SELECT 1", {})
+        self.assertEqual({}, pgbase.connection.cursors)
+        self.assertEqual((1,), rows.next())
+        cursor = pgbase.connection.cursors["test"]
+        self.assertEqual([2], cursor.fetches)
+        self.assertEqual([(2,), (3,)], list(rows))
+        self.assertEqual([2, 2, 2], cursor.fetches)
+        self.assertTrue(pgbase.connection.closed)
+
+        # the connection is closed when the generator is
+        pgbase.connection = FakeConnection([(1,), (2,), (3,)])
+        rows = pgbase.stream_query("test", "SELECT 1", {})
+        rows.next()
+        rows.close()
+        self.assertTrue(pgbase.connection.closed)
@@ -324,6 +324,36 @@ class TestJsonDumpStorage(unittest.TestCase):
       seenids.append(id)
     assert [] == seenids
 
+  def testDestructiveDateWalkSkipsCurrentSlot(self):
+    storage = JDS.JsonDumpStorage(self.testDir,**self.initKwargs[0])
+    ooid = '0bba61c5-dfc3-43e7-dead-8afd%s' % utc_now().strftime('%Y%m%d')
+    fj,fd = storage.newEntry(ooid,timestamp=utc_now())
+    fj.close()
+    fd.close()
+    assert [] == list(storage.destructiveDateWalk())
+    assert os.path.islink(os.path.join(storage.namePath(ooid)[0],ooid))
+
+  def testDestructiveDateWalkReadsJournalOnce(self):
+    createJDS.createTestSet(createJDS.jsonFileData,self.initKwargs[0],self.testDir)
+    storage = JDS.JsonDumpStorage(self.testDir,**self.initKwargs[0])
+    assert set(createJDS.jsonFileData.keys()) == set(storage.destructiveDateWalk())
+    assert [] == list(storage.destructiveDateWalk())
+    ooid = '0bba61c5-dfc3-43e7-dead-8afd20081225'
+    fj,fd = storage.newEntry(ooid,timestamp=datetime.datetime(2008,12,25,6,0,tzinfo=UTC))
+    fj.close()
+    fd.close()
+    assert [ooid] == list(storage.destructiveDateWalk())
+    assert not os.path.exists(os.path.join(storage.root,'20081225',storage.journalName))
+
+  def testDestructiveDateWalkRecoversUnjournaledLinks(self):
+    createJDS.createTestSet(createJDS.jsonFileData,self.initKwargs[1],self.testDir)
+    for daily in os.listdir(self.testDir):
+      os.unlink(os.path.join(self.testDir,daily,'journal'))
+    storage = JDS.JsonDumpStorage(self.testDir,**self.initKwargs[1])
+    assert set(createJDS.jsonFileData.keys()) == set(storage.destructiveDateWalk())
+    for daily in os.listdir(storage.root):
+      assert not storage.dateName in os.listdir(os.path.join(storage.root,daily)), 'Expected all date subdirs to be gone, but %s'%daily
+
   def testRemove(self):
     createJDS.createTestSet(createJDS.jsonFileData,self.initKwargs[2],self.testDir)
     storage = JDS.JsonDumpStorage(self.testDir,**self.initKwargs[2])
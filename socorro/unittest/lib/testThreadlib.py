@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import time
+
+import socorro.lib.threadlib as sthr
+
+
+class ProcessRecorder(object):
+    """records the tasks it was given in files named for the worker pid"""
+    def __init__(self, directory):
+        self.directory = directory
+        self.pid = None
+
+    def initializer(self):
+        self.pid = os.getpid()
+
+    def record(self, args):
+        with open(os.path.join(self.directory, str(self.pid)), 'a') as f:
+            f.write('%s %s\n' % args)
+
+    def finalizer(self):
+        with open(os.path.join(self.directory, 'done.%d' % self.pid), 'w'):
+            pass
+
+    def results(self):
+        results = []
+        for name in os.listdir(self.directory):
+            if not name.startswith('done.'):
+                results.extend(open(os.path.join(self.directory,
+                                                 name)).read().split())
+        return results
+
+
+def testTaskManager():
+    results = []
+    tm = sthr.TaskManager(2, 4)
+    for x in range(10):
+        tm.newTask(results.append, x)
+    tm.waitForCompletion()
+    assert sorted(results) == range(10), results
+
+
+def testProcessTaskManager():
+    directory = tempfile.mkdtemp()
+    try:
+        recorder = ProcessRecorder(directory)
+        tm = sthr.ProcessTaskManager(3, [recorder.record], 4,
+                                     initializer=recorder.initializer,
+                                     finalizer=recorder.finalizer)
+        for x in range(20):
+            tm.newTask(recorder.record, ('task', x))
+        tm.waitForCompletion()
+        results = recorder.results()
+        expected = ['task'] * 20 + [str(x) for x in range(20)]
+        assert sorted(results) == sorted(expected), results
+        assert recorder.pid is None, 'the tasks ran in this process'
+        done = [x for x in os.listdir(directory) if x.startswith('done.')]
+        assert len(done) == 3, done
+        for p in tm.processList:
+            assert not p.is_alive()
+    finally:
+        shutil.rmtree(directory)
+
+
+def testProcessTaskManagerUnknownTask():
+    tm = sthr.ProcessTaskManager(1, [])
+    try:
+        try:
+            tm.newTask(len, 'abc')
+            assert False, 'an unregistered task must be rejected'
+        except ValueError:
+            pass
+    finally:
+        tm.waitForCompletion()
+
+
+def testProcessTaskManagerRespawnsDeadWorkers():
+    directory = tempfile.mkdtemp()
+    try:
+        recorder = ProcessRecorder(directory)
+        tm = sthr.ProcessTaskManager(1, [recorder.record, os._exit], 4,
+                                     initializer=recorder.initializer)
+        deadProcess = tm.processList[0]
+        tm.newTask(os._exit, 3)
+        deadProcess.join(5)
+        assert deadProcess.exitcode == 3
+        for x in range(4):
+            tm.newTask(recorder.record, ('task', x))
+        assert tm.processList[0] is not deadProcess
+        assert tm.processList[0].is_alive()
+        tm.waitForCompletion()
+        expected = ['task'] * 4 + [str(x) for x in range(4)]
+        assert sorted(recorder.results()) == sorted(expected)
+    finally:
+        shutil.rmtree(directory)
+
+
+def testProcessTaskManagerQuit():
+    directory = tempfile.mkdtemp()
+    try:
+        recorder = ProcessRecorder(directory)
+        tm = sthr.ProcessTaskManager(1, [recorder.record, time.sleep], 10,
+                                     initializer=recorder.initializer)
+        tm.newTask(time.sleep, 0.5)
+        for x in range(5):
+            tm.newTask(recorder.record, ('task', x))
+        tm.quit()
+        tm.waitForCompletion()
+        assert recorder.results() == [], 'queued tasks ran after quit'
+        tm.newTask(recorder.record, ('task', 9))
+        assert not tm.processList[0].is_alive(), 'respawned while quitting'
+    finally:
+        shutil.rmtree(directory)
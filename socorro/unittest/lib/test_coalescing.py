@@ -0,0 +1,50 @@
+import threading
+import unittest
+
+from socorro.lib.coalescing import Coalescer
+
+
+class TestCoalescer(unittest.TestCase):
+
+    def test_waiters_share_the_leaders_value(self):
+        coalescer = Coalescer()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def function():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'value'
+
+        results = []
+
+        def run():
+            results.append(coalescer.run('a', function))
+
+        leader = threading.Thread(target=run)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=run) for x in range(2)]
+        for a_thread in followers:
+            a_thread.start()
+        while coalescer.waits < 2:
+            release.wait(0.01)
+        release.set()
+        for a_thread in [leader] + followers:
+            a_thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('value', False)] +
+                                          [('value', True)] * 2)
+        self.assertEqual(coalescer.pending, {})
+
+    def test_failure_is_not_shared(self):
+        coalescer = Coalescer()
+
+        def function():
+            raise IOError('lost the database')
+
+        self.assertRaises(IOError, coalescer.run, 'a', function)
+        self.assertEqual(coalescer.pending, {})
+        self.assertEqual(coalescer.run('a', lambda: 1), (1, False))
@@ -0,0 +1,139 @@
+import httplib
+import threading
+import unittest
+
+import socorro.lib.httpclient as httpc
+import socorro.unittest.testlib.util as testutil
+
+
+#------------------------------------------------------------------------------
+def setup_module():
+    testutil.nosePrintModule(__file__)
+
+
+#==============================================================================
+class FakeResponse(object):
+
+    def __init__(self, status=200, reason="OK", body="{}"):
+        self.status = status
+        self.reason = reason
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+#==============================================================================
+class FakeConnection(object):
+    """Stands in for PooledHTTPConnection. 'failures' are raised, one per
+    request, before any response is returned."""
+
+    def __init__(self, pool, host, port, timeout=None):
+        self.pool = pool
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.requests = 0
+        self.sent = []
+        self.failures = []
+        self.closed = 0
+
+    def request(self, method, url, body=None, headers={}):
+        self.sent.append((method, url, body))
+
+    def getresponse(self):
+        if self.failures:
+            raise self.failures.pop(0)
+        return FakeResponse()
+
+    def close(self):
+        self.closed += 1
+
+
+#==============================================================================
+class TestHttpConnectionPool(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def test_connections_are_reused(self):
+        pool = httpc.HttpConnectionPool(connection_class=FakeConnection)
+        client = httpc.HttpClient("es", 9200, pool=pool)
+        for x in range(3):
+            with client:
+                self.assertEqual("{}", client.get("/_status"))
+        other = httpc.HttpClient("es", 9201, pool=pool)
+        with other:
+            other.get("/_status")
+        stats = pool.statistics()
+        self.assertEqual(4, stats["requests"])
+        self.assertEqual(2, stats["reused"])
+        self.assertEqual(2, stats["open"])
+        self.assertEqual(2, stats["idle"])
+
+    #--------------------------------------------------------------------------
+    def test_maximum_per_host(self):
+        pool = httpc.HttpConnectionPool(maximum_per_host=1,
+                                        connection_class=FakeConnection)
+        first = pool.acquire("es", 9200)
+        acquired = []
+        waiter = threading.Thread(
+            target=lambda: acquired.append(pool.acquire("es", 9200)))
+        waiter.start()
+        waiter.join(0.1)
+        self.assertEqual([], acquired)
+        pool.release(first)
+        waiter.join()
+        self.assertEqual([first], acquired)
+        self.assertEqual(1, pool.statistics()["waits"])
+
+    #--------------------------------------------------------------------------
+    def test_failed_block_discards_the_connection(self):
+        pool = httpc.HttpConnectionPool(connection_class=FakeConnection)
+        client = httpc.HttpClient("es", 9200, pool=pool)
+        try:
+            with client:
+                connection = client.conn
+                raise ValueError("oops")
+        except ValueError:
+            pass
+        self.assertEqual(1, connection.closed)
+        stats = pool.statistics()
+        self.assertEqual(0, stats["open"])
+        self.assertEqual(1, stats["discarded"])
+
+    #--------------------------------------------------------------------------
+    def test_stale_connection_is_retried_once(self):
+        pool = httpc.HttpConnectionPool(connection_class=FakeConnection)
+        client = httpc.HttpClient("es", 9200, pool=pool)
+        with client:
+            client.get("/first")
+            client.conn.failures.append(httplib.BadStatusLine(""))
+            self.assertEqual("{}", client.post("/second", "data"))
+            self.assertEqual(1, client.conn.closed)
+            self.assertEqual(3, len(client.conn.sent))
+
+        # a new connection that fails is not retried
+        client.conn = pool.acquire("es", 9201)
+        client.conn.failures.append(httplib.BadStatusLine(""))
+        self.assertRaises(httplib.BadStatusLine, client.get, "/third")
+
+    #--------------------------------------------------------------------------
+    def test_clear_and_export(self):
+        pool = httpc.HttpConnectionPool(connection_class=FakeConnection)
+        connection = pool.acquire("es", 9200)
+        pool.release(connection)
+        pool.clear()
+        self.assertEqual(1, connection.closed)
+
+        class FakeStatsClient(object):
+            def __init__(self):
+                self.gauges = {}
+
+            def gauge(self, name, value):
+                self.gauges[name] = value
+
+        stats_client = FakeStatsClient()
+        pool.export_statistics(stats_client, "es")
+        self.assertEqual(0, stats_client.gauges["es.open"])
+        self.assertEqual(0, stats_client.gauges["es.idle"])
+        self.assertEqual(0, stats_client.gauges["es.connects"])
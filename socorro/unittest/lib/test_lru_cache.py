@@ -0,0 +1,50 @@
+import unittest
+
+from socorro.lib.lru_cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_and_put(self):
+        cache = LRUCache(3)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('a', 17), 17)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), 2)
+        self.assertTrue('a' in cache)
+        self.assertFalse('c' in cache)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 2)
+
+    def test_eviction_order(self):
+        cache = LRUCache(3)
+        for key in 'abc':
+            cache.put(key, key.upper())
+        cache.get('a')  # 'b' is now the least recently used
+        cache.put('d', 'D')
+        self.assertEqual(cache.keys(), ['c', 'a', 'd'])
+        self.assertEqual(cache.evictions, 1)
+        cache.put('c', 'CC')  # replacing is a use too
+        cache.put('e', 'E')
+        self.assertEqual(cache.keys(), ['d', 'c', 'e'])
+        self.assertEqual(cache.get('c'), 'CC')
+        self.assertEqual(cache.evictions, 2)
+        self.assertEqual(len(cache), 3)
+
+    def test_zero_size(self):
+        cache = LRUCache(0)
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(len(cache), 0)
+
+    def test_clear(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.keys(), [])
+        cache.put('b', 2)
+        self.assertEqual(cache.keys(), ['b'])
@@ -0,0 +1,121 @@
+import threading
+import unittest
+
+from socorro.lib.sharded_cache import ShardedCache
+
+
+class TestShardedCache(unittest.TestCase):
+
+    def test_snapshot_and_shards(self):
+        cache = ShardedCache(128, snapshot={'a': 1}, number_of_shards=4)
+        self.assertEqual(len(cache.shards), 2)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('b'), 2)
+        self.assertTrue('a' in cache)
+        self.assertTrue('b' in cache)
+        self.assertEqual(len(cache), 2)
+        statistics = cache.statistics()
+        self.assertEqual(statistics['hits'], 2)
+        self.assertEqual(statistics['misses'], 1)
+        cache.replace_snapshot({'c': 3})
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('c'), 3)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_bounded(self):
+        cache = ShardedCache(4, snapshot={'a': 1})
+        for x in range(10):
+            cache.put(x, x)
+        self.assertEqual(len(cache), 5)
+        self.assertEqual([x for x in range(10) if x in cache], [6, 7, 8, 9])
+        self.assertEqual(cache.statistics()['evictions'], 6)
+
+    def test_get_or_load(self):
+        cache = ShardedCache(10)
+        loaded = []
+
+        def loader(key):
+            loaded.append(key)
+            if key != 'missing':
+                return key.upper()
+
+        self.assertEqual(cache.get_or_load('a', loader), 'A')
+        self.assertEqual(cache.get_or_load('a', loader), 'A')
+        self.assertEqual(cache.get_or_load('missing', loader), None)
+        self.assertEqual(cache.get_or_load('missing', loader), None)
+        self.assertEqual(loaded, ['a', 'missing', 'missing'])
+        self.assertEqual(cache.statistics()['loads'], 3)
+
+    def test_concurrent_misses_are_coalesced(self):
+        cache = ShardedCache(10)
+        started = threading.Event()
+        release = threading.Event()
+        loaded = []
+
+        def slow_loader(key):
+            loaded.append(key)
+            started.set()
+            release.wait(5)
+            return 17
+
+        results = []
+
+        def look_up():
+            results.append(cache.get_or_load('a', slow_loader))
+
+        leader = threading.Thread(target=look_up)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=look_up) for x in range(4)]
+        for a_thread in followers:
+            a_thread.start()
+        while cache.coalesced < 4:
+            release.wait(0.01)
+        release.set()
+        for a_thread in [leader] + followers:
+            a_thread.join(5)
+        self.assertEqual(results, [17] * 5)
+        self.assertEqual(loaded, ['a'])
+        self.assertEqual(cache.statistics()['coalesced'], 4)
+
+    def test_failed_load_is_retried_by_waiters(self):
+        cache = ShardedCache(10)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def loader(key):
+            calls.append(key)
+            if len(calls) == 1:
+                started.set()
+                release.wait(5)
+                raise IOError('lost the database')
+            return 42
+
+        errors = []
+        results = []
+
+        def leader():
+            try:
+                cache.get_or_load('a', loader)
+            except IOError, x:
+                errors.append(x)
+
+        leader_thread = threading.Thread(target=leader)
+        leader_thread.start()
+        started.wait(5)
+        follower = threading.Thread(
+            target=lambda: results.append(cache.get_or_load('a', loader))
+        )
+        follower.start()
+        while cache.coalesced < 1:
+            release.wait(0.01)
+        release.set()
+        leader_thread.join(5)
+        follower.join(5)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(results, [42])
+        self.assertEqual(cache.get('a'), 42)
@@ -0,0 +1,146 @@
+import datetime as dt
+import random
+import unittest
+
+import socorro.lib.stats as stats
+import socorro.lib.util as sutil
+
+
+class FakeClock(object):
+    def __init__(self, seconds=0):
+        self.seconds = seconds
+
+    def __call__(self):
+        return self.seconds
+
+
+class FakeStatsClient(object):
+    def __init__(self):
+        self.gauges = []
+
+    def gauge(self, name, value):
+        self.gauges.append((name, value))
+
+
+def config():
+    return sutil.DotDict({'logger': sutil.SilentFakeLogger()})
+
+
+class TestRollingCounter(unittest.TestCase):
+
+    def test_window(self):
+        counter = stats.RollingCounter(3)
+        counter.add(1.0, now=10)
+        counter.add(2.0, now=10)
+        counter.add(4.0, now=11)
+        # the current minute isn't in the window
+        self.assertEqual(counter.read(now=11), (2, 3.0))
+        self.assertEqual(counter.read(now=12), (3, 7.0))
+        # a late value for a completed minute isn't hidden by the last reading
+        counter.add(8.0, now=11)
+        self.assertEqual(counter.read(now=12), (4, 15.0))
+        self.assertEqual(counter.read(now=14), (2, 12.0))
+        self.assertEqual(counter.read(now=15), (0, 0.0))
+        self.assertEqual(counter.numberOfMinutes(now=12), 2)
+        self.assertEqual(counter.numberOfMinutes(now=40), 3)
+
+    def test_buckets_are_reused(self):
+        counter = stats.RollingCounter(2)
+        for minute in range(100):
+            counter.add(now=minute)
+        self.assertEqual(len(counter.counts), 3)
+        self.assertEqual(counter.read(now=100), (2, 0.0))
+
+    def test_readings_match_the_values_added(self):
+        rng = random.Random(4)
+        for history in (0, 1, 3):
+            counter = stats.RollingCounter(history)
+            histogram = stats.RollingHistogram(history)
+            added = []
+            current = 100
+            for x in range(500):
+                current += rng.choice((0, 0, 0, 0, 1, 1, 2, 9))
+                # now and then a late value for a minute in the window
+                minute = current - rng.choice([0] * 8 + range(history + 1))
+                value = rng.randint(1, 5)
+                counter.add(value, now=minute)
+                histogram.add(value, now=minute)
+                added.append((minute, value))
+                for now in (current, current + 1, current + 2):
+                    window = [v for m, v in added if now - history <= m < now]
+                    self.assertEqual(counter.read(now=now),
+                                     (len(window), float(sum(window))))
+                    self.assertEqual(
+                        sum(histogram.addHistogramTo([0] * 200, now)),
+                        len(window))
+
+
+class TestRollingHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = stats.RollingHistogram(5)
+        for x in range(1, 101):
+            histogram.add(x / 100.0, now=1)
+        self.assertEqual(histogram.percentiles(now=1), [None, None, None])
+        p50, p95, p99 = histogram.percentiles(now=2)
+        self.assertAlmostEqual(p50, 0.50, delta=0.05)
+        self.assertAlmostEqual(p95, 0.95, delta=0.1)
+        self.assertAlmostEqual(p99, 0.99, delta=0.1)
+
+    def test_extreme_values(self):
+        histogram = stats.RollingHistogram(5)
+        histogram.add(0.0, now=1)
+        histogram.add(10 ** 9, now=1)
+        self.assertEqual(histogram.percentiles((1, 100), now=2),
+                         [histogram.smallestValue,
+                          histogram.valueForBin(histogram.numberOfBins - 1)])
+
+
+class TestCounterPool(unittest.TestCase):
+
+    def test_read_and_mean_and_standard_deviation(self):
+        clock = FakeClock(600)
+        pool = stats.CounterPool(config(),
+                                 statsInitKwargs={'timeFunction': clock})
+        for name, count in (('a', 2), ('b', 4)):
+            for x in range(count):
+                pool.getStat(name).increment()
+        clock.seconds += 60
+        self.assertEqual(pool.read(), 6)
+        self.assertEqual(pool.numberOfMinutes(), 1)
+        self.assertEqual(pool.meanAndStandardDeviation(), (3.0, 1.0))
+        self.assertEqual(pool.underPerforming(), [])
+        statsClient = FakeStatsClient()
+        pool.exportToStatsd(statsClient, 'submitter.submitted')
+        self.assertEqual(statsClient.gauges,
+                         [('submitter.submitted.count', 6),
+                          ('submitter.submitted.mean', 3.0),
+                          ('submitter.submitted.stddev', 1.0)])
+
+
+class TestDurationAccumulatorPool(unittest.TestCase):
+
+    def test_durations(self):
+        clock = FakeClock(600)
+        pool = stats.DurationAccumulatorPool(
+            config(),
+            statsInitKwargs={'timeFunction': clock}
+        )
+        start = dt.datetime(2012, 5, 4)
+        for name in ('a', 'b'):
+            accumulator = pool.getStat(name)
+            for milliseconds in range(10, 110, 10):
+                accumulator.start(start)
+                accumulator.end(start + dt.timedelta(milliseconds=milliseconds))
+        clock.seconds += 60
+        self.assertEqual(pool.sumDurations(), (20, dt.timedelta(seconds=1.1)))
+        self.assertEqual(pool.read(), dt.timedelta(milliseconds=55))
+        self.assertEqual(pool.getStat('a').average(),
+                         dt.timedelta(milliseconds=55))
+        snapshot = pool.snapshot()
+        self.assertEqual(snapshot['count'], 20)
+        self.assertAlmostEqual(snapshot['mean'], 55.0)
+        self.assertAlmostEqual(snapshot['p50'], 50.0, delta=5)
+        self.assertAlmostEqual(snapshot['p99'], 100.0, delta=10)
+        self.assertRaises(stats.UndefinedCounterActionException,
+                          pool.getStat('a').increment)
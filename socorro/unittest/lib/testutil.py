@@ -125,6 +125,37 @@ class TestUtil(unittest.TestCase):
     assert(ci.secondaryCacheMaximumSize == len(ci.secondaryLimitedSizeCache))
     assert(ci.secondaryLimitedSizeCache[-1] == max - 1)
 
+  def testSpoolingStrIterator(self):
+    data = ['line %d \\ "x"\n' % x for x in range(100)]
+    for maximumMemory in (1048576, 100):
+      # read part way, truncate the middle, then read the rest - as the processor does
+      expected = util.StrCachingIterator(iter(data))
+      si = util.SpoolingStrIterator(iter(data), maximumMemory)
+      for anIterator in (expected, si):
+        anIterator.secondaryCacheMaximumSize = 5
+        for lineNumber, line in enumerate(anIterator):
+          if lineNumber == 10:
+            break
+        anIterator.useSecondaryCache()
+        for lineNumber, line in enumerate(anIterator):
+          if lineNumber == 50:
+            break
+        anIterator.stopUsingSecondaryCache()
+      for x in expected:
+        pass
+      assert '\n'.join(expected.cache) == si.getvalue()
+      if maximumMemory == 100:
+        assert si.spooledToDisk
+        assert si.peakMemory <= 100 + 5 * len(expected.cache[0]), si.peakMemory
+      else:
+        assert not si.spooledToDisk
+        assert si.peakMemory == len(si.getvalue())
+      chunks = list(si.iterchunks(64))
+      assert '\n'.join(expected.cache) == ''.join(chunks)
+      assert max(len(x) for x in chunks) == 64
+      si.close()
+    assert '' == util.SpoolingStrIterator(iter([])).getvalue()
+
   def testSignalNameFromNumber(self):
     assert 'SIG_UNKNOWN' == util.signalNameFromNumberMap.get(1000,'SIG_UNKNOWN'), '...but got %s'%util.signalNameFromNumber(1000)
     assert 'SIGTERM' == util.signalNameFromNumberMap.get(15), '...but got %s'%util.signalNameFromNumber(15)
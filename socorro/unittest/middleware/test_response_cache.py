@@ -0,0 +1,214 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import socorro.middleware.response_cache as rc
+import socorro.middleware.service as serv
+import socorro.lib.util as util
+import socorro.unittest.testlib.util as testutil
+
+
+#------------------------------------------------------------------------------
+def setup_module():
+    testutil.nosePrintModule(__file__)
+
+
+#==============================================================================
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+#==============================================================================
+class CountingService(serv.DataAPIService):
+
+    service_name = "counting"
+    uri = "/counting/(.*)"
+    cache_ttl = 60
+
+    def __init__(self, config, response_cache):
+        super(CountingService, self).__init__(config)
+        self.response_cache = response_cache
+        self.calls = []
+
+    def get(self, *args):
+        params = self.parse_query_string(args[0])
+        self.calls.append(params)
+        return {"calls": len(self.calls)}
+
+
+#==============================================================================
+class TestResponseCache(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tempdir = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.tempdir, 'crontabbers.json')
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    #--------------------------------------------------------------------------
+    def _write_state(self, last_success, mtime):
+        state = {'nightly-builds': {'last_success': last_success,
+                                    'error_count': 0}}
+        with open(self.state_path, 'w') as f:
+            json.dump(state, f)
+        os.utime(self.state_path, (mtime, mtime))
+
+    #--------------------------------------------------------------------------
+    def test_hits_and_expiry(self):
+        cache = rc.ResponseCache(10, time_function=self.clock)
+        computed = []
+
+        def compute():
+            computed.append(1)
+            self.clock.now += 2
+            return ('body', 'application/json')
+
+        self.assertEqual(('body', 'application/json'),
+                         cache.get_or_compute('a', 60, (), compute))
+        self.assertEqual(('body', 'application/json'),
+                         cache.get_or_compute('a', 60, (), compute))
+        self.assertEqual(1, len(computed))
+        self.clock.now += 60
+        cache.get_or_compute('a', 60, (), compute)
+        self.assertEqual(2, len(computed))
+
+        statistics = cache.statistics()
+        self.assertEqual(1, statistics['hits'])
+        self.assertEqual(2, statistics['misses'])
+        self.assertEqual(1, statistics['expired'])
+        self.assertEqual(2.0, statistics['saved_seconds'])
+        self.assertEqual(4.0, statistics['computing_seconds'])
+        self.assertAlmostEqual(1.0 / 3, statistics['hit_ratio'])
+
+    #--------------------------------------------------------------------------
+    def test_least_recently_used_is_evicted(self):
+        cache = rc.ResponseCache(2, time_function=self.clock)
+        for key in ('a', 'b', 'a', 'c'):
+            cache.get_or_compute(key, 60, (), lambda: key)
+        self.assertEqual(['a', 'c'], sorted(cache.entries.keys()))
+        self.assertEqual(1, cache.statistics()['evictions'])
+
+    #--------------------------------------------------------------------------
+    def test_invalidated_when_the_job_succeeds_again(self):
+        self._write_state('2012-05-04 00:00:00.0', 100)
+        state = rc.CrontabberState(self.state_path, check_interval=10,
+                                   time_function=self.clock)
+        cache = rc.ResponseCache(10, state, time_function=self.clock)
+        computed = []
+
+        def compute():
+            computed.append(1)
+            return 'body'
+
+        jobs = ('nightly-builds',)
+        cache.get_or_compute('a', 3600, jobs, compute)
+        cache.get_or_compute('a', 3600, jobs, compute)
+        self.assertEqual(1, len(computed))
+
+        # not read again before the check interval is over
+        self._write_state('2012-05-05 00:00:00.0', 200)
+        cache.get_or_compute('a', 3600, jobs, compute)
+        self.assertEqual(1, len(computed))
+
+        self.clock.now += 10
+        cache.get_or_compute('a', 3600, jobs, compute)
+        self.assertEqual(2, len(computed))
+        self.assertEqual(1, cache.statistics()['invalidated'])
+
+        # a response that doesn't depend on a job is kept
+        cache.get_or_compute('b', 3600, (), compute)
+        self._write_state('2012-05-06 00:00:00.0', 300)
+        self.clock.now += 10
+        cache.get_or_compute('b', 3600, (), compute)
+        self.assertEqual(3, len(computed))
+
+    #--------------------------------------------------------------------------
+    def test_missing_crontabber_database(self):
+        state = rc.CrontabberState(self.state_path, time_function=self.clock)
+        self.assertEqual((None,), state.generation(('nightly-builds',)))
+
+    #--------------------------------------------------------------------------
+    def test_concurrent_misses_are_coalesced(self):
+        cache = rc.ResponseCache(10)
+        started = threading.Event()
+        release = threading.Event()
+        computed = []
+
+        def compute():
+            computed.append(1)
+            started.set()
+            release.wait(5)
+            return 'body'
+
+        results = []
+
+        def request():
+            results.append(cache.get_or_compute('a', 60, (), compute))
+
+        leader = threading.Thread(target=request)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=request) for x in range(3)]
+        for follower in followers:
+            follower.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        self.assertEqual(['body'] * 4, results)
+        self.assertEqual(1, len(computed))
+        statistics = cache.statistics()
+        self.assertEqual(1, statistics['misses'])
+        self.assertEqual(3, statistics['coalesced'] + statistics['hits'])
+
+    #--------------------------------------------------------------------------
+    def test_failures_are_not_cached(self):
+        cache = rc.ResponseCache(10)
+
+        def compute():
+            raise ValueError('no database')
+
+        self.assertRaises(ValueError, cache.get_or_compute, 'a', 60, (),
+                          compute)
+        self.assertEqual(0, len(cache.entries))
+        self.assertEqual({}, cache.coalescer.pending)
+
+
+#==============================================================================
+class TestCachedService(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def test_key_is_service_and_normalized_params(self):
+        service = CountingService(util.DotDict(), rc.ResponseCache(10))
+        first = service.get_response("product/Firefox/versions/13.0+14.0/")
+        second = service.get_response("versions/13.0+14.0/product/Firefox")
+        self.assertEqual(('{"calls": 1}', 'application/json'), first)
+        self.assertEqual(first, second)
+        service.get_response("product/Thunderbird/")
+        self.assertEqual(2, len(service.calls))
+
+    #--------------------------------------------------------------------------
+    def test_forced_implementation_is_not_cached(self):
+        service = CountingService(util.DotDict(), rc.ResponseCache(10))
+        service.get_response("product/Firefox/force_api_impl/postgresql/")
+        service.get_response("product/Firefox/force_api_impl/postgresql/")
+        self.assertEqual(2, len(service.calls))
+
+    #--------------------------------------------------------------------------
+    def test_cache_turned_off(self):
+        config = util.DotDict()
+        config.responseCacheSize = 0
+        self.assertEqual(None, rc.get_response_cache(config))
@@ -0,0 +1,103 @@
+import itertools
+import unittest
+
+from socorro.lib.util import DotDict
+from socorro.unittest.monitor.testMonitorScheduling import (FakeCursor,
+                                                            get_monitor)
+
+
+class FakePriorityCrashStorage(object):
+    def __init__(self, uuids_in_storage):
+        self.uuids_in_storage = set(uuids_in_storage)
+        self.requests = []
+
+    def uuidsInStorage(self, uuids):
+        self.requests.append(list(uuids))
+        return self.uuids_in_storage.intersection(uuids)
+
+
+class TestMonitorPriorityJobs(unittest.TestCase):
+
+    def test_lookForPriorityJobsAlreadyInQueue(self):
+        m = get_monitor()
+        cursor = FakeCursor(rows=[('a', 1), ('b', 1), ('c', 2), ('d', None),
+                                  ('e', 3), ('x', 1)],
+                            missing_tables=('priority_jobs_3',))
+        priority_uuids = set('abcdef')
+        m.lookForPriorityJobsAlreadyInQueue(cursor, priority_uuids)
+        # 'f' isn't in the queue, 'd' is waiting to be reassigned and 'e'
+        # belongs to a dead processor
+        self.assertEqual(priority_uuids, set('f'))
+        statements = sorted(cursor.executed[1:])
+        self.assertEqual(statements, [
+            ('delete from priorityjobs where uuid in %s', (('a', 'b'),)),
+            ('delete from priorityjobs where uuid in %s', (('c',),)),
+            ('insert into priority_jobs_1 (uuid) values (%s), (%s)',
+             ['a', 'b']),
+            ('insert into priority_jobs_2 (uuid) values (%s)', ['c']),
+        ])
+        self.assertEqual(cursor.connection.commits, 2)
+        self.assertEqual(cursor.connection.rollbacks, 1)
+
+    def test_lookForPriorityJobsAlreadyInQueue_duplicates(self):
+        m = get_monitor()
+        cursor = FakeCursor(rows=[('a', 1), ('b', 1), ('c', 1)],
+                            duplicates=('b',))
+        priority_uuids = set('abc')
+        m.lookForPriorityJobsAlreadyInQueue(cursor, priority_uuids)
+        self.assertEqual(priority_uuids, set())
+        self.assertEqual(cursor.executed[1:], [
+            ('insert into priority_jobs_1 (uuid) values (%s)', ['a']),
+            ('insert into priority_jobs_1 (uuid) values (%s)', ['c']),
+            ('delete from priorityjobs where uuid in %s', (('a', 'b', 'c'),)),
+        ])
+        self.assertEqual(cursor.connection.commits, 3)
+        self.assertEqual(cursor.connection.rollbacks, 2)
+
+    def test_queuePriorityJobs_duplicates(self):
+        m = get_monitor()
+        m.queueJobs = lambda cursor, uuids, scheduler, priority: zip(
+            uuids, [1, 2, 1])
+        # processor 1 already has 'c'
+        cursor = FakeCursor(duplicates=('c',))
+        result = m.queuePriorityJobs(cursor, ['a', 'b', 'c'], None)
+        self.assertEqual(result, [('a', 1), ('b', 2), ('c', 1)])
+        inserts = sorted(x for x in cursor.executed
+                         if x[0].startswith('insert'))
+        self.assertEqual(inserts, [
+            ('insert into priority_jobs_1 (uuid) values (%s)', ['a']),
+            ('insert into priority_jobs_2 (uuid) values (%s)', ['b']),
+        ])
+        self.assertEqual(cursor.executed[-1],
+                         ('delete from priorityjobs where uuid in %s',
+                          (('a', 'b', 'c'),)))
+
+    def test_lookForPriorityJobsInDumpStorage(self):
+        m = get_monitor()
+        storage = FakePriorityCrashStorage('abcd')
+        m.crashStorePool = DotDict(crashStorage=lambda: storage)
+        m.unbalancedJobSchedulerIter = lambda cursor: itertools.cycle([1, 2])
+        cursor = FakeCursor()
+        priority_uuids = set('abcde')
+        m.lookForPriorityJobsInDumpStorage(cursor, priority_uuids)
+        self.assertEqual(priority_uuids, set('e'))
+        # monitorJobBatchSize is 3
+        self.assertEqual([len(x) for x in storage.requests], [3, 2])
+        inserts = [x for x in cursor.executed
+                   if x[0].startswith('insert into priority_jobs_')]
+        self.assertEqual(sorted(itertools.chain(*[x[1] for x in inserts])),
+                         list('abcd'))
+        self.assertTrue(len(inserts) <= 4)
+        self.assertEqual(cursor.connection.commits, 4)
+
+    def test_priorityJobsNotFound(self):
+        m = get_monitor()
+        cursor = FakeCursor()
+        m.priorityJobsNotFound(cursor, set())
+        self.assertEqual(cursor.executed, [])
+        m.priorityJobsNotFound(cursor, set('ab'))
+        self.assertEqual(len(cursor.executed), 1)
+        sql, parameters = cursor.executed[0]
+        self.assertEqual(sql, 'delete from priorityjobs where uuid in %s')
+        self.assertEqual(sorted(parameters[0]), ['a', 'b'])
+        self.assertEqual(cursor.connection.commits, 1)
@@ -0,0 +1,170 @@
+import datetime
+import itertools
+import unittest
+
+import psycopg2
+
+import socorro.monitor.monitor as monitor
+from socorro.lib.util import DotDict, SilentFakeLogger
+
+
+class FakeConnection(object):
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor(object):
+    """records the statements; raises IntegrityError for any insert that
+    includes one of the 'duplicates' and ProgrammingError for any statement
+    that mentions one of the 'missing_tables'"""
+    def __init__(self, rows=(), duplicates=(), missing_tables=()):
+        self.connection = FakeConnection(self)
+        self.executed = []
+        self.rows = list(rows)
+        self.duplicates = duplicates
+        self.missing_tables = missing_tables
+
+    def execute(self, sql, parameters=None):
+        if [x for x in self.duplicates if x in (parameters or ())]:
+            raise psycopg2.IntegrityError('duplicate key')
+        if [x for x in self.missing_tables if x in sql]:
+            raise psycopg2.ProgrammingError('relation does not exist')
+        self.executed.append((sql, parameters))
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnectionPool(object):
+    def __init__(self, *args):
+        self.cursor = FakeCursor()
+
+    def connection(self):
+        return self.cursor.connection
+
+    def cleanup(self):
+        pass
+
+
+class FakeCrashStorage(object):
+    def __init__(self, uuids):
+        self.uuids = uuids
+
+    def newUuids(self):
+        for x in self.uuids:
+            yield x
+
+
+def get_monitor(uuids=()):
+    config = DotDict()
+    for x in monitor.Monitor._config_requirements:
+        config[x] = None
+    config.standardLoopDelay = datetime.timedelta(seconds=1)
+    config.cleanupJobsLoopDelay = datetime.timedelta(seconds=1)
+    config.priorityLoopDelay = datetime.timedelta(seconds=1)
+    config.monitorJobBatchSize = 3
+    fake_sdb = DotDict()
+    fake_sdb.DatabaseConnectionPool = FakeConnectionPool
+    fake_sdb.CannotConnectToDatabase = psycopg2.OperationalError
+    fake_cstore = DotDict()
+    fake_cstore.CrashStoragePool = lambda config: DotDict(
+        crashStorage=lambda: FakeCrashStorage(uuids),
+        cleanup=lambda: None)
+    fake_signal = DotDict()
+    fake_signal.signal = lambda *args: None
+    fake_signal.SIGTERM = fake_signal.SIGHUP = None
+    return monitor.Monitor(config, logger=SilentFakeLogger(), sdb=fake_sdb,
+                           cstore=fake_cstore, signal=fake_signal)
+
+
+class TestMonitorScheduling(unittest.TestCase):
+
+    def test_jobSchedulerIter_least_loaded_first(self):
+        m = get_monitor()
+        cursor = FakeCursor(rows=[(1, 5), (2, 0), (3, 2)])
+        scheduler = m.jobSchedulerIter(cursor)
+        assigned = [scheduler.next() for x in range(9)]
+        self.assertEqual(assigned, [2, 2, 2, 3, 2, 3, 2, 3, 1])
+
+    def test_queueJobs_one_statement(self):
+        m = get_monitor()
+        cursor = FakeCursor()
+        result = m.queueJobs(cursor, ['a', 'b', 'c'], iter([7, 8, 7]))
+        self.assertEqual(result, [('a', 7), ('b', 8), ('c', 7)])
+        self.assertEqual(len(cursor.executed), 1)
+        sql, parameters = cursor.executed[0]
+        self.assertEqual(sql.count('(%s, %s, %s, %s, %s)'), 3)
+        self.assertEqual(parameters[:4], ['', 'a', 7, 0])
+        self.assertEqual(parameters[5:9], ['', 'b', 8, 0])
+        self.assertEqual(cursor.connection.commits, 1)
+        self.assertEqual(m.queueJobs(cursor, [], iter([])), [])
+        self.assertEqual(len(cursor.executed), 1)
+
+    def test_queueJobs_falls_back_to_one_at_a_time(self):
+        m = get_monitor()
+        cursor = FakeCursor(duplicates=('b',))
+        result = m.queueJobs(cursor, ['a', 'b', 'c'], itertools.cycle([7]))
+        self.assertEqual(result, [('a', 7), ('c', 7)])
+        self.assertEqual(len(cursor.executed), 2)
+        self.assertEqual(cursor.connection.commits, 2)
+        self.assertEqual(cursor.connection.rollbacks, 2)
+
+    def test_standardJobAllocationLoop_batches(self):
+        uuids = ['u%d' % x for x in range(7)]
+        m = get_monitor(uuids)
+        m.cleanUpDeadProcessors = lambda cursor: None
+        m.jobSchedulerIter = lambda cursor: itertools.cycle([1, 2])
+        batches = []
+
+        def fake_queueJobs(cursor, uuids, scheduler):
+            batches.append(list(uuids))
+        m.queueJobs = fake_queueJobs
+
+        def fake_sleep(seconds):
+            raise KeyboardInterrupt
+        m.responsiveSleep = fake_sleep
+        self.assertRaises(KeyboardInterrupt, m.standardJobAllocationLoop)
+        self.assertEqual(batches, [uuids[:3], uuids[3:6], uuids[6:]])
+        self.assertTrue(m.quit)
+
+    def test_standardJobAllocationLoop_retries_failed_batches(self):
+        uuids = ['u%d' % x for x in range(4)]
+        m = get_monitor()
+        storage = DotDict(newUuids=lambda: iter([uuids.pop(0)
+                                                 for x in list(uuids)]))
+        m.crashStorePool = DotDict(crashStorage=lambda: storage)
+        m.cleanUpDeadProcessors = lambda cursor: None
+        m.jobSchedulerIter = lambda cursor: itertools.cycle([1])
+        batches = []
+
+        def fake_queueJobs(cursor, uuids, scheduler):
+            batches.append(list(uuids))
+            if len(batches) == 1:
+                raise psycopg2.OperationalError('connection lost')
+        m.queueJobs = fake_queueJobs
+        sleeps = []
+
+        def fake_sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                raise KeyboardInterrupt
+        m.responsiveSleep = fake_sleep
+        self.assertRaises(KeyboardInterrupt, m.standardJobAllocationLoop)
+        self.assertEqual(batches, [['u0', 'u1', 'u2'], ['u3'],
+                                   ['u0', 'u1', 'u2'], []])
+        self.assertEqual(m.uuidsToRetry, [])
@@ -0,0 +1,160 @@
+import BaseHTTPServer
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import socorro.processor.bulk_indexer as bulk
+from socorro.lib.util import SilentFakeLogger
+
+
+class FakeElasticSearchHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """records the requests it gets in the server's 'requests' list.  _bulk
+    items whose _id is in the server's 'rejected' set get an error, and so do
+    PUTs of a document whose _id is in its 'always_rejected' set.  Every
+    request gets a 503 while the server's 'down' is True."""
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        server.requests.append((method, self.path, body))
+        if server.down:
+            self._respond(503, 'unavailable')
+        elif self.path == '/_bulk':
+            items = []
+            for line in body.splitlines()[::2]:
+                target = json.loads(line)['index']
+                result = dict(target, ok=True)
+                if target['_id'] in (server.rejected |
+                                     server.always_rejected):
+                    result = dict(target, error='MapperParsingException')
+                items.append({'index': result})
+            self._respond(200, json.dumps({'took': 1, 'items': items}))
+        elif self.path.split('/')[-1] in server.always_rejected:
+            self._respond(400, 'MapperParsingException')
+        else:
+            self._respond(201, '{"ok": true}')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def log_message(self, *args):
+        pass
+
+
+def crash(number, date='2012-05-04 03:04:05.0'):
+    return {'uuid': 'uuid%d' % number, 'date_processed': date,
+            'signature': 'sig%d' % number}
+
+
+class TestElasticSearchBulkIndexer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                FakeElasticSearchHandler)
+        self.server.requests = []
+        self.server.rejected = set()
+        self.server.always_rejected = set()
+        self.server.down = False
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.spill_directory = tempfile.mkdtemp()
+        self.indexers = []
+
+    def tearDown(self):
+        for indexer in self.indexers:
+            if indexer.thread.is_alive():
+                indexer.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.spill_directory)
+
+    def _get_indexer(self, **kwargs):
+        kwargs.setdefault('flush_interval', 60)
+        kwargs.setdefault('spill_directory', self.spill_directory)
+        indexer = bulk.ElasticSearchBulkIndexer(self.url, SilentFakeLogger(),
+                                                **kwargs)
+        self.indexers.append(indexer)
+        return indexer
+
+    def _bulk_ids(self):
+        ids = []
+        for method, path, body in self.server.requests:
+            if path == '/_bulk':
+                ids.append([json.loads(x)['index']['_id']
+                            for x in body.splitlines()[::2]])
+        return ids
+
+    def test_batches_by_size(self):
+        indexer = self._get_indexer(batch_size=3)
+        for x in range(7):
+            indexer.index(crash(x))
+        indexer.close()
+        self.assertEqual([['uuid0', 'uuid1', 'uuid2'],
+                          ['uuid3', 'uuid4', 'uuid5'],
+                          ['uuid6']], self._bulk_ids())
+        method, path, body = self.server.requests[0]
+        lines = body.splitlines()
+        self.assertEqual({'index': {'_index': 'socorro_120504',
+                                    '_type': 'crash_reports',
+                                    '_id': 'uuid0'}}, json.loads(lines[0]))
+        self.assertEqual(crash(0), json.loads(lines[1]))
+        statistics = indexer.statistics()
+        self.assertEqual(7, statistics['indexed'])
+        self.assertEqual(3, statistics['batches'])
+
+    def test_batches_by_time(self):
+        indexer = self._get_indexer(batch_size=100, flush_interval=0.05)
+        indexer.index(crash(1))
+        indexer.index(crash(2))
+        indexer.thread.join(0.5)
+        self.assertEqual([['uuid1', 'uuid2']], self._bulk_ids())
+
+    def test_rejected_items_are_retried_alone(self):
+        self.server.rejected.add('uuid1')
+        self.server.always_rejected.add('uuid2')
+        indexer = self._get_indexer(batch_size=3, maximum_retries=2)
+        for x in range(3):
+            indexer.index(crash(x))
+        indexer.close()
+        self.assertEqual([('PUT', '/socorro_120504/crash_reports/uuid1'),
+                          ('PUT', '/socorro_120504/crash_reports/uuid2'),
+                          ('PUT', '/socorro_120504/crash_reports/uuid2')],
+                         [(x[0], x[1]) for x in self.server.requests[1:]])
+        statistics = indexer.statistics()
+        self.assertEqual(2, statistics['indexed'])
+        self.assertEqual(3, statistics['retried'])
+        self.assertEqual(1, statistics['failed'])
+        self.assertEqual(0, statistics['spilled'])
+
+    def test_spill_while_unavailable_and_replay(self):
+        self.server.down = True
+        indexer = self._get_indexer(batch_size=2, flush_interval=0.05)
+        for x in range(4):
+            indexer.index(crash(x))
+        indexer.close()
+        self.assertEqual(2, len(os.listdir(self.spill_directory)))
+        self.assertEqual(4, indexer.statistics()['spilled'])
+
+        self.server.down = False
+        self.server.requests = []
+        indexer = self._get_indexer(batch_size=2, flush_interval=0.05)
+        indexer.thread.join(0.5)
+        self.assertEqual([['uuid0', 'uuid1'], ['uuid2', 'uuid3']],
+                         self._bulk_ids())
+        self.assertEqual([], os.listdir(self.spill_directory))
+        self.assertEqual(4, indexer.statistics()['replayed'])
@@ -0,0 +1,99 @@
+import fcntl
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import socorro.lib.util as sutil
+import socorro.processor.dump_handoff as dho
+
+
+def read(pathname):
+    dump_file = open(pathname, 'rb')
+    try:
+        return dump_file.read()
+    finally:
+        dump_file.close()
+
+
+class TestDumpHandOff(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_temporary_file(self):
+        hand_off = dho.TemporaryFileHandOff(self.directory)
+        pathname = hand_off.put('uuid1', 'MDMP dump')
+        self.assertEqual(os.path.join(self.directory, 'uuid1.dump'), pathname)
+        self.assertEqual('MDMP dump', read(pathname))
+        hand_off.release(pathname)
+        self.assertFalse(os.path.exists(pathname))
+        # already gone
+        hand_off.release(pathname)
+
+    def test_tmpfs_ring_reuses_its_files(self):
+        hand_off = dho.TmpfsRingHandOff(self.directory, 2)
+        first = hand_off.put('uuid1', 'a much longer dump')
+        second = hand_off.put('uuid2', 'second')
+        self.assertNotEqual(first, second)
+        self.assertEqual('a much longer dump', read(first))
+        inode = os.stat(first).st_ino
+        hand_off.release(first)
+        third = hand_off.put('uuid3', 'short')
+        self.assertEqual(first, third)
+        self.assertEqual(inode, os.stat(third).st_ino)
+        self.assertEqual('short', read(third))
+        hand_off.release(second)
+        hand_off.release(third)
+        hand_off.close()
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_tmpfs_ring_waits_for_a_free_file(self):
+        hand_off = dho.TmpfsRingHandOff(self.directory, 1)
+        first = hand_off.put('uuid1', 'one')
+        taken = []
+        thread = threading.Thread(
+            target=lambda: taken.append(hand_off.put('uuid2', 'two')))
+        thread.start()
+        thread.join(0.1)
+        self.assertEqual([], taken)
+        hand_off.release(first)
+        thread.join(5)
+        self.assertEqual([first], taken)
+        self.assertEqual('two', read(first))
+        hand_off.close()
+
+    def test_memfd(self):
+        try:
+            hand_off = dho.MemfdHandOff()
+        except NotImplementedError:
+            return
+        dump = 'MDMP' * 100000
+        pathname = hand_off.put('uuid1', dump)
+        self.assertTrue(pathname.startswith('/proc/%d/fd/' % os.getpid()))
+        file_descriptor = hand_off.file_descriptors[pathname]
+        self.assertTrue(fcntl.fcntl(file_descriptor, fcntl.F_GETFD) &
+                        fcntl.FD_CLOEXEC)
+        self.assertEqual(dump, read(pathname))
+        self.assertEqual([], os.listdir(self.directory))
+        hand_off.release(pathname)
+        self.assertFalse(os.path.exists(pathname))
+        hand_off.close()
+
+    def test_create_dump_hand_off(self):
+        config = sutil.DotDict()
+        config.temporaryFileSystemStoragePath = self.directory
+        self.assertTrue(isinstance(dho.create_dump_hand_off(config),
+                                   dho.TemporaryFileHandOff))
+        config.dumpHandOff = 'tmpfs'
+        config.dumpHandOffDirectory = self.directory
+        config.numberOfThreads = 3
+        hand_off = dho.create_dump_hand_off(config)
+        self.assertEqual(3, hand_off.free.qsize())
+        hand_off.close()
+        config.dumpHandOff = 'pipe'
+        self.assertRaises(ValueError, dho.create_dump_hand_off, config)
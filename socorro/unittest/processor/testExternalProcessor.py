@@ -68,3 +68,110 @@ class TestProcessorWithExternalBreakpad(unittest.TestCase):
         moduleData[4] = 'yyy'  # debugId (see above)
         version = proc.getVersionIfFlashModule(moduleData)
         self.assertEqual(version, '9.0')
+
+    def test_preprocessCommandLine(self):
+        config = DotDict()
+        config.minidump_stackwalkPathname = '/bin/stackwalk'
+        config.processorSymbolsPathnameList = '/a /b'
+        proc = Abused_ProcessorWithExternalBreakpad(config)
+        command_line = proc.preprocessCommandLine(
+          '$(minidump_stackwalkPathname) -m $dumpfilePathname '
+          '$processorSymbolsPathnameList'
+        )
+        self.assertEqual(command_line,
+                         '/bin/stackwalk -m DUMPFILEPATHNAME SYMBOL_PATHS')
+        self.assertEqual(proc.symbolPaths(), '"/a" "/b"')
+
+    def test_invokeBreakpadStackdump_with_pool(self):
+        config = DotDict()
+        proc = Abused_ProcessorWithExternalBreakpad(config)
+
+        class FakePool(object):
+            def invoke(self, dump_pathname):
+                self.dump_pathname = dump_pathname
+                return ['line 1\n', 'line 2\n']
+
+        proc.stackwalkerPool = FakePool()
+        iterator, handle = proc.invokeBreakpadStackdump('/tmp/x.dump')
+        self.assertEqual(proc.stackwalkerPool.dump_pathname, '/tmp/x.dump')
+        self.assertEqual(list(iterator), ['line 1', 'line 2'])
+        self.assertEqual(handle, ['line 1\n', 'line 2\n'])
+
+    def test_doBreakpadStackDumpAnalysis_spools_dump(self):
+        import StringIO
+        import socorro.lib.util as sutil
+        import socorro.processor.signatureUtilities as sig
+
+        header = ['OS|Windows NT|6.1.7601 Service Pack 1\n',
+                  'CPU|x86|GenuineIntel family 6|2\n',
+                  'Crash|EXCEPTION_ACCESS_VIOLATION_READ|0x0|1\n',
+                  'Module|xul.dll|1.0|xul.pdb|ABC|0x1|0x2|1\n',
+                  '\n']
+        frames = ['0|%d|ntdll.dll|KiFastSystemCallRet|||0x%x\n' % (x, x)
+                  for x in range(3)]
+        frames.extend('1|%d|xul.dll|nsFoo::Bar%d(int *)|hg:foo.cpp:abc|%d|0x1\n'
+                      % (x, x, x) for x in range(40))
+        frames.extend('2|%d|xul.dll|nsOther::Thread|||0x%x\n' % (x, x)
+                      for x in range(3))
+        output = header + frames
+
+        config = DotDict()
+        config.logger = sutil.SilentFakeLogger()
+        config.crashingThreadFrameThreshold = 20
+        config.crashingThreadTailFrameThreshold = 5
+        config.minidump_stackwalkPathname = '/bin/stackwalk'
+        config.stackwalkOutputMemoryLimit = 200
+        config.irrelevantSignatureRegEx = 'KiFastSystemCallRet'
+        config.prefixSignatureRegEx = '@0x0'
+        config.signaturesWithLineNumbersRegEx = 'js_Interpret'
+        config.signatureSentinels = []
+        proc = Abused_ProcessorWithExternalBreakpad(config)
+        proc.c_signature_tool = sig.CSignatureTool(config)
+
+        class FakeStatsd(object):
+            def __init__(self):
+                self.gauges = {}
+
+            def gauge(self, name, value):
+                self.gauges[name] = value
+
+            def timing(self, name, value):
+                pass
+
+        proc.statsd = FakeStatsd()
+        proc.statsd_prefix = 'prefix'
+
+        class FakeHandle(object):
+            returncode = 0
+
+            def wait(self):
+                return 0
+
+        iterators = []
+
+        def fake_invoke(dumpfilePathname):
+            iterators.append(proc.spoolingIterator(StringIO.StringIO(
+                ''.join(output))))
+            return iterators[-1], FakeHandle()
+        proc.invokeBreakpadStackdump = fake_invoke
+
+        class FakeCursor(object):
+            def execute(self, sql, parameters):
+                pass
+
+        notes = []
+        result = proc.doBreakpadStackDumpAnalysis(1, 'uuid', '/tmp/x.dump',
+                                                  0, None, FakeCursor(),
+                                                  'date', notes)
+        # the crashing thread is cut after its first 21 frames, keeping the
+        # last 6 lines read, which include the first frame of the next thread
+        expected = ([x[:-1] for x in header] +
+                    [x[:-1] for x in frames[:24]] +
+                    [x[:-1] for x in frames[38:]])
+        self.assertEqual(result['dump'], '\n'.join(expected))
+        self.assertTrue(result['truncated'])
+        self.assertEqual(result['crashedThread'], 1)
+        self.assertEqual(result['signature'], 'nsFoo::Bar0(int*)')
+        self.assertTrue(iterators[0].spool.closed)
+        peak = proc.statsd.gauges['prefix.stackwalk.peak_memory']
+        self.assertTrue(0 < peak < len(result['dump']))
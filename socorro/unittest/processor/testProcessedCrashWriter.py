@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import socorro.processor.processed_crash_writer as pcw
+from socorro.lib.util import SilentFakeLogger
+
+
+class FakeCrashStorage(object):
+    """records the batches it saves, and raises while 'down' is set"""
+
+    def __init__(self):
+        self.batches = []
+        self.down = False
+        self.lock = threading.Lock()
+
+    def save_processed_batch(self, batch):
+        if self.down:
+            raise IOError('HBase is down')
+        with self.lock:
+            self.batches.append(list(batch))
+
+    def saved_uuids(self):
+        with self.lock:
+            return sorted(x[0] for batch in self.batches for x in batch)
+
+
+def wait_for(predicate, timeout=5):
+    end = time.time() + timeout
+    while not predicate() and time.time() < end:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestProcessedCrashWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = FakeCrashStorage()
+        self.spill_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_directory)
+
+    def _writer(self, **kwargs):
+        kwargs.setdefault('spill_directory', self.spill_directory)
+        writer = pcw.ProcessedCrashWriter(lambda: self.storage,
+                                          SilentFakeLogger(), **kwargs)
+        self.addCleanup(writer.close)
+        return writer
+
+    def test_batches_by_size(self):
+        writer = self._writer(batch_size=3, flush_interval=60)
+        for x in range(6):
+            writer.save('uuid%d' % x, {'x': x}, {'flags:processed': 'N'})
+        self.assertTrue(wait_for(lambda: len(self.storage.batches) == 2))
+        self.assertEqual([3, 3], [len(x) for x in self.storage.batches])
+        self.assertEqual(('uuid0', {'x': 0}, {'flags:processed': 'N'}),
+                         self.storage.batches[0][0])
+        statistics = writer.statistics()
+        self.assertEqual(6, statistics['queued'])
+        self.assertEqual(6, statistics['saved'])
+        self.assertEqual(2, statistics['batches'])
+
+    def test_batches_by_time(self):
+        writer = self._writer(batch_size=100, flush_interval=0.05)
+        writer.save('uuid0', {})
+        self.assertTrue(wait_for(lambda: len(self.storage.batches) == 1))
+        self.assertEqual([('uuid0', {}, None)], self.storage.batches[0])
+
+    def test_close_saves_what_is_queued(self):
+        writer = self._writer(batch_size=100, flush_interval=60)
+        writer.save('uuid0', {})
+        writer.save('uuid1', {})
+        writer.close()
+        self.assertFalse(writer.thread.is_alive())
+        self.assertEqual(['uuid0', 'uuid1'], self.storage.saved_uuids())
+
+    def test_spill_while_unavailable_and_replay(self):
+        self.storage.down = True
+        writer = self._writer(batch_size=2, flush_interval=0.05)
+        for x in range(4):
+            writer.save('uuid%d' % x, {'x': x}, None)
+        self.assertTrue(wait_for(
+            lambda: writer.statistics()['spilled'] == 4))
+        self.assertEqual(2, len(os.listdir(self.spill_directory)))
+        self.storage.down = False
+        self.assertTrue(wait_for(
+            lambda: writer.statistics()['replayed'] == 4))
+        self.assertEqual(['uuid0', 'uuid1', 'uuid2', 'uuid3'],
+                         self.storage.saved_uuids())
+        self.assertEqual([], os.listdir(self.spill_directory))
+        self.assertEqual(type(''), type(self.storage.batches[0][0][0]))
+
+    def test_spill_files_left_by_an_earlier_run(self):
+        self.storage.down = True
+        writer = self._writer(batch_size=1)
+        writer.save('uuid0', {})
+        writer.close()
+        self.storage.down = False
+        writer = self._writer()
+        self.assertTrue(wait_for(
+            lambda: writer.statistics()['replayed'] == 1))
+        self.assertEqual(['uuid0'], self.storage.saved_uuids())
+
+    def test_unreadable_spill_file_is_set_aside(self):
+        open(os.path.join(self.spill_directory, 'processed-1.json'),
+             'w').write('{not json\n')
+        writer = self._writer(flush_interval=0.05)
+        self.assertTrue(wait_for(lambda: os.listdir(self.spill_directory) ==
+                                 ['processed-1.json.bad']))
+        writer.save('uuid0', {})
+        self.assertTrue(wait_for(lambda: self.storage.saved_uuids() ==
+                                 ['uuid0']))
+
+    def test_saved_function(self):
+        saved = []
+        failures = [IOError('the jobs could not be completed')]
+
+        def saved_function(batch):
+            if failures:
+                raise failures.pop()
+            saved.append([x[0] for x in batch])
+        writer = self._writer(batch_size=2, flush_interval=0.05,
+                              saved_function=saved_function)
+        writer.save('uuid0', {})
+        writer.save('uuid1', {})
+        # the first time, the batch is spilled and saved again
+        self.assertTrue(wait_for(lambda: saved == [['uuid0', 'uuid1']]))
+        self.assertEqual(2, writer.statistics()['spilled'])
+        self.assertEqual(['uuid0', 'uuid0', 'uuid1', 'uuid1'],
+                         self.storage.saved_uuids())
+
+    def test_dropped_without_a_spill_directory(self):
+        self.storage.down = True
+        writer = self._writer(batch_size=2, spill_directory=None)
+        writer.save('uuid0', {})
+        writer.save('uuid1', {})
+        self.assertTrue(wait_for(
+            lambda: writer.statistics()['dropped'] == 2))
+        self.assertEqual(0, writer.statistics()['spilled'])
@@ -1,5 +1,6 @@
 import socorro.unittest.testlib.expectations as exp
 import socorro.lib.util as sutil
+import socorro.lib.stats as stats
 import socorro.processor.processor as proc
 import socorro.database.database as sdb
 import socorro.storage.hbaseClient as hbc
@@ -11,6 +12,8 @@ from socorro.lib.datetimeutil import utc_now, UTC
 import socorro.unittest.testlib.util as testutil
 
 import datetime as dt
+import multiprocessing
+import multiprocessing.synchronize
 import threading as thr
 
 def setup_module():
@@ -82,7 +85,8 @@ def createExecutionContext ():
     c.fakeDatabaseConnectionPool = exp.DummyObjectWithExpectations()
     c.fakeDatabaseModule = exp.DummyObjectWithExpectations()
     c.fakeDatabaseModule.expect('DatabaseConnectionPool', (config, c.logger),
-                                {}, c.fakeDatabaseConnectionPool)
+                                {'countStatements': True},
+                                c.fakeDatabaseConnectionPool)
 
     c.fakeSignalModule = exp.DummyObjectWithExpectations()
     c.fakeSignalModule.expect('signal', (1, proc.Processor.respondToSIGTERM),
@@ -130,6 +134,9 @@ def getMockedProcessorAndContext():
         def checkin(self):
             pass
 
+        def assurePartitions(self, date_processed):
+            pass
+
     p = MockedProcessor(c.config,
                         sdb=c.fakeDatabaseModule,
                         cstore=c.fakeCrashStorageModule,
@@ -352,6 +359,78 @@ def testSubmitJobToThreads():
                                {})
     p.submitJobToThreads(fakeJobTuple)
 
+def testQueueJobWithWorkerProcesses():
+    """testQueueJobWithWorkerProcesses: priority jobs are a separate task"""
+    p, c = getMockedProcessorAndContext()
+    p.numberOfProcesses = 2
+    p.priority_job_set.add('ooid2')
+    c.fakeThreadManager.expect('newTask',
+                               (p.processJobWithRetry, (1, 'ooid1', 0)),
+                               {})
+    c.fakeThreadManager.expect('newTask',
+                               (p.processPriorityJobWithRetry,
+                                (2, 'ooid2', 1)),
+                               {})
+    p.queueJob((1, 'ooid1', 0))
+    p.queueJob((2, 'ooid2', 1))
+    assert 'ooid2' not in p.priority_job_set
+
+class AnyMultiprocessingEvent(object):
+    def __eq__(self, other):
+        return isinstance(other, multiprocessing.synchronize.Event)
+
+def testStartWorkerProcesses():
+    """testStartWorkerProcesses: fork workers with their own connections"""
+    p, c = getMockedProcessorAndContext()
+    p.numberOfProcesses = 3
+    fakeProcessTaskManager = exp.DummyObjectWithExpectations()
+    c.fakeThreadModule.expect('ProcessTaskManager',
+                              (3,
+                               [p.processJobWithRetry,
+                                p.processPriorityJobWithRetry],
+                               6),
+                              {'initializer': p.initializeWorkerProcess,
+                               'finalizer': p.cleanupWorkerProcess,
+                               'quitEvent': AnyMultiprocessingEvent()},
+                              fakeProcessTaskManager)
+    p.startWorkerProcesses()
+    assert p.threadManager is fakeProcessTaskManager
+
+    newDatabaseConnectionPool = exp.DummyObjectWithExpectations()
+    newCrashStoragePool = exp.DummyObjectWithExpectations()
+    c.fakeDatabaseModule.expect('DatabaseConnectionPool', (c.config, c.logger),
+                                {'countStatements': True},
+                                newDatabaseConnectionPool)
+    c.fakeCrashStorageModule.expect('CrashStoragePool', (c.config,),
+                                    {'storageClass':
+                                       cstore.CrashStorageSystemForHBase},
+                                    newCrashStoragePool)
+    p.initializeWorkerProcess()
+    assert p.databaseConnectionPool is newDatabaseConnectionPool
+    assert p.crashStorePool is newCrashStoragePool
+    assert p.inheritedConnectionPools == (c.fakeDatabaseConnectionPool,
+                                          c.fakeCrashStoragePool)
+    newDatabaseConnectionPool.expect('cleanup', (), {})
+    newCrashStoragePool.expect('cleanup', (), {})
+    p.cleanupWorkerProcess()
+
+def testQuitSharedWithWorkerProcesses():
+    """testQuitSharedWithWorkerProcesses: a quit in any process stops all"""
+    p, c = getMockedProcessorAndContext()
+    assert not p.quitRequested()
+    p.workerQuitEvent = multiprocessing.Event()
+    p.workerQuitEvent.set()
+    assert p.quitRequested()
+    try:
+        p.quitCheck()
+        assert False, 'the quit set by another process was missed'
+    except KeyboardInterrupt:
+        pass
+    p.workerQuitEvent = multiprocessing.Event()
+    p.requestQuit()
+    assert p.quit
+    assert p.workerQuitEvent.is_set()
+
 def priorityQuery(c, returnValues):
     c.fakeDatabaseModule.expect('transaction_execute_with_retry',
                                 (c.fakeDatabaseConnectionPool,
@@ -471,6 +550,99 @@ def testIncomingJobStream():
         r = i.next()
         assert r == e, 'expected\n%s\nbut got\n%s' % (e, r)
 
+def testClaimJobBatch():
+    """testClaimJobBatch: one update for a whole batch of jobs"""
+    p, c = getMockedProcessorAndContext()
+    jobs = [(15,'ooid1',1), (16,'ooid2',1), (17,'ooid3',1)]
+    now = dt.datetime(2011, 2, 15, tzinfo=UTC)
+    c.fakeNowFunc.expect('__call__', (), {}, now)
+    c.fakeDatabaseModule.expect('transaction_execute_with_retry',
+                                (c.fakeDatabaseConnectionPool,
+                                 "update jobs set starteddatetime = %s where "
+                                 "id = any(%s) returning id",
+                                 (now, [15, 16, 17])),
+                                 {},
+                                 [(17,), (15,)])
+    r = p.claimJobBatch(jobs)
+    e = [(15,'ooid1',1), (17,'ooid3',1)]
+    assert r == e, 'expected\n%s\nbut got\n%s' % (e, r)
+    assert p.claimJobBatch([]) == []
+
+def testNewPriorityJobsBatch():
+    """testNewPriorityJobsBatch: one bulk delete of the priority jobs"""
+    p, c = getMockedProcessorAndContext()
+    priorityJobsList1 = [(15,'ooid1',1,None),
+                         (16,'ooid2',1,dt.datetime(2011,1,1, tzinfo=UTC)),
+                         (None,'ooid3',1,None)]
+    priorityQuery(c, priorityJobsList1)
+    c.fakeDatabaseModule.expect('transaction_execute_with_retry',
+                                (c.fakeDatabaseConnectionPool,
+                                 "delete from fred where uuid = any(%s)",
+                                 (['ooid1', 'ooid2', 'ooid3'],)),
+                                 {})
+    r = p.newPriorityJobsBatch()
+    e = [(15, 'ooid1', 1)]
+    assert r == e, 'expected\n%s\nbut got\n%s' % (e, r)
+    priorityQuery(c, [])
+    r = p.newPriorityJobsBatch()
+    assert r == [], 'expected\n[]\nbut got\n%s' % r
+
+def testIncomingJobBatchStream():
+    """testIncomingJobBatchStream: priority jobs lead each claimed batch"""
+    p, c = getMockedProcessorAndContext()
+    p.jobClaimBatchSize = 3
+    priorityBatches = [[], [('P','P',1)], []]
+    normalBatches = [[(1,1,1), (2,2,1), (3,3,1)], [('P','P',1), (4,4,1)], []]
+    limits = []
+    p.newPriorityJobsBatch = lambda: priorityBatches.pop(0)
+    def newNormalJobsBatch(limit):
+        limits.append(limit)
+        return normalBatches.pop(0)
+    p.newNormalJobsBatch = newNormalJobsBatch
+    p.claimJobBatch = lambda jobs: [x for x in jobs if x[0] != 2]
+    sleeps = []
+    def fakeSleep(seconds):
+        sleeps.append(seconds)
+        raise KeyboardInterrupt
+    p.responsiveSleep = fakeSleep
+    p.checkin = nothing
+    i = p.incomingJobBatchStream()
+    r = i.next()
+    e = [(1,1,1), (3,3,1)]
+    assert r == e, 'expected\n%s\nbut got\n%s' % (e, r)
+    r = i.next()
+    e = [('P','P',1), (4,4,1)]
+    assert r == e, 'expected\n%s\nbut got\n%s' % (e, r)
+    assert 'P' in p.priority_job_set
+    assert limits == [3, 2], limits
+    try:
+        i.next()
+        assert False, 'expected a sleep when there are no jobs'
+    except KeyboardInterrupt:
+        pass
+    assert sleeps == [30], sleeps
+
+def testStartBatched():
+    """testStartBatched: mainthread in batched claim mode"""
+    p, c = getMockedProcessorAndContext()
+    p.jobClaimBatchSize = 2
+    p.loadProductIdMap = nothing
+    def fakeIncomingJobBatchStream():
+        yield [(1,1,1), (2,2,1)]
+        yield [(3,3,1)]
+        raise KeyboardInterrupt
+    p.incomingJobBatchStream = fakeIncomingJobBatchStream
+    def fakeNewTask(task, args):
+        assert task == p.processJobWithRetry
+        submitted.append(args)
+    submitted = []
+    p.threadManager = sutil.DotDict({'newTask': fakeNewTask})
+    p.incomingJobStream = None # must not be used in batched mode
+    p.cleanup = nothing
+    p.start()
+    e = [(1,1,1), (2,2,1), (3,3,1)]
+    assert submitted == e, 'expected\n%s\nbut got\n%s' % (e, submitted)
+
 def testStart():
     """testStart: mainthread"""
     p, c = getMockedProcessorAndContext()
@@ -618,6 +790,21 @@ def testProcessJobWithRetry2():
     fakeProcessJob.expect('__call__', (fakeJobTuple,), {},
                           proc.Processor.quit)
 
+def testProcessJobWithRetryJobDurations():
+    """testProcessJobWithRetryJobDurations: only the jobs that are done are timed"""
+    p, c = getMockedProcessorAndContext()
+    clock = [600.0]
+    p.jobDurations = stats.DurationAccumulatorPool(c.config, statsInitKwargs={'timeFunction': lambda: clock[0]})
+    results = [proc.Processor.ok, proc.Processor.quit]
+    p.processJob = lambda jobTuple: results.pop(0)
+    p.processJobWithRetry((1, 'uuid1', 0))
+    p.processJobWithRetry((2, 'uuid2', 0))
+    # a reading covers the completed minutes
+    clock[0] += 60
+    snapshot = p.jobDurations.snapshot()
+    assert snapshot['count'] == 1, snapshot
+    assert snapshot['p50'] is not None and snapshot['p99'] is not None, snapshot
+
 def testProcessJob01():
     """testProcessJob01: immeditate quit"""
     p, c = getMockedProcessorAndContext()
@@ -795,7 +982,7 @@ def testProcessJob06():
     c.fakeConnection.expect('commit', (), {}, None)
     fakeSaveProcessedDumpJson = exp.DummyObjectWithExpectations()
     fakeSaveProcessedDumpJson.expect('__call__',
-                                     (new_report_record, c.fakeCrashStorage),
+                                     (new_report_record, c.fakeCrashStorage, None),
                                      {})
     p.saveProcessedDumpJson = fakeSaveProcessedDumpJson
 
@@ -934,7 +1121,7 @@ def testProcessJob07():
             'ReleaseChannel': 'release',
            }
     fakeSaveProcessedDumpJson.expect('__call__',
-                                     (nrr, c.fakeCrashStorage),
+                                     (nrr, c.fakeCrashStorage, None),
                                      #(new_report_record, c.fakeCrashStorage),
                                      #({}, c.fakeCrashStorage),
                                      {})
@@ -1084,7 +1271,7 @@ def testProcessJobProductIdOverride():
             'ReleaseChannel': 'release',
            }
     fakeSaveProcessedDumpJson.expect('__call__',
-                                     (nrr, c.fakeCrashStorage),
+                                     (nrr, c.fakeCrashStorage, None),
                                      #(new_report_record, c.fakeCrashStorage),
                                      #({}, c.fakeCrashStorage),
                                      {})
@@ -1093,6 +1280,60 @@ def testProcessJobProductIdOverride():
     e = proc.Processor.ok
     assert r == e, 'expected\n%s\nbut got\n%s' % (e, r)
 
+def testAssurePartitions():
+  """testAssurePartitions: the partitions a job inserts into that this process hasn't seen are made sure of"""
+  p, c = getMockedProcessorAndContext()
+  date_processed = dt.datetime(2011, 2, 15, 1, 0, 0, tzinfo=UTC)
+  assured = []
+  class FakeTable(object):
+    def __init__(self, partitionName):
+      self.partitionName = partitionName
+    def partitionNameForDate(self, date):
+      return self.partitionName
+    def assurePartitions(self, date, alternateCursorFunction):
+      assured.append((self.partitionName, date, alternateCursorFunction))
+  # names of their own: other tests leave real partition names in the module's history
+  sch.markPartitionCreated('testAssurePartitions_reports')
+  try:
+    p.reportsTable = FakeTable('testAssurePartitions_reports')
+    p.extensionsTable = FakeTable('testAssurePartitions_extensions')
+    p.pluginsReportsTable = FakeTable('testAssurePartitions_plugins_reports')
+    proc.Processor.assurePartitions(p, date_processed)
+  finally:
+    sch.forgetPartitionCreated('testAssurePartitions_reports')
+  assert [x[0] for x in assured] == ['testAssurePartitions_extensions', 'testAssurePartitions_plugins_reports'], assured
+  assert all(x[1] == date_processed and x[2] == p.partitionCursorPair for x in assured), assured
+
+def testProcessedCrashesSaved():
+  """testProcessedCrashesSaved: the jobs of a saved batch are completed and their crashes submitted"""
+  p, c = getMockedProcessorAndContext()
+  c.fakeDatabaseConnectionPool.expect('connectionCursorPair', (), {},
+                                      (c.fakeConnection, c.fakeCursor))
+  sql = "update jobs set completeddatetime = %s, success = %s where uuid = %s and success is null"
+  c.fakeCursor.expect('execute', (sql, ('2011-02-15 01:01:00.0', True, 'uuid1')), {})
+  c.fakeCursor.expect('rowcount', None, None, 1)
+  # a job that failed was completed when it failed
+  c.fakeCursor.expect('execute', (sql, (None, None, 'uuid2')), {})
+  c.fakeCursor.expect('rowcount', None, None, 0)
+  c.fakeConnection.expect('commit', (), {}, None)
+  submitted = []
+  p.submitToElasticSearch = lambda uuid, processedCrash: submitted.append(uuid)
+  p.processedCrashesSaved([('uuid1', {'completeddatetime': '2011-02-15 01:01:00.0', 'success': True}, None),
+                           ('uuid2', {}, None)])
+  assert ['uuid1'] == submitted
+
+def testProcessedCrashWriterNeedsASpillDirectory():
+  """testProcessedCrashWriterNeedsASpillDirectory: without one, a batch that can't be saved would be lost"""
+  p, c = getMockedProcessorAndContext()
+  assert p.processedCrashWriter is None
+  c.config.processedCrashWriteBatchSize = 10
+  try:
+    p.createProcessedCrashWriter()
+  except ValueError:
+    pass
+  else:
+    assert False, 'expected ValueError'
+
 def testGetJsonOrWarn():
     """testGetJsonOrWarn: several invocations"""
     message_list = []
@@ -1175,26 +1416,18 @@ def testInsertReportIntoDatabase01():
     date_processed = dt.datetime(2011,2,15,1,0,0, tzinfo=UTC)
     json_doc = sample_meta_json
     error_list = []
-    c.fakeDatabaseConnectionPool.expect('connectionCursorPair', None, None,
-                                        17)
     fakeReportsTable = exp.DummyObjectWithExpectations()
     fakeReportsTable.expect('columns',
                             None,
                             None,
                             sch.ReportsTable(logger=c.logger).columns)
-    fakeReportsTable.expect('insert',
+    fakeReportsTable.expect('insertReturningId',
                             (c.fakeCursor,
                              expected_report_tuple,
-                             17,),
-                            { 'date_processed': date_processed })
+                             p.partitionCursorPair,),
+                            { 'date_processed': date_processed },
+                            234)
     p.reportsTable = fakeReportsTable
-    c.fakeDatabaseModule.expect('singleValueSql',
-                                (c.fakeCursor,
-                                 "select id from reports where uuid = "
-                                 "'ooid1' and date_processed = timestamp "
-                                 "with time zone '2011-02-15 01:00:00+00:00'"),
-                                {},
-                                234)
 
     r = p.insertReportIntoDatabase(c.fakeCursor,
                                    ooid1,
@@ -1204,6 +1437,45 @@ def testInsertReportIntoDatabase01():
     e = expected_report_dict
     assert r == e, 'expected\n%s\nbut got\n%s' % (e, r)
 
+def testInsertReportIntoDatabase02():
+    """testInsertReportIntoDatabase02: replacing an existing report"""
+    p, c = getMockedProcessorAndContext()
+    ooid1 = 'ooid1'
+    date_processed = dt.datetime(2011,2,15,1,0,0, tzinfo=UTC)
+    json_doc = sample_meta_json
+    error_list = []
+    fakeReportsTable = exp.DummyObjectWithExpectations()
+    fakeReportsTable.expect('columns',
+                            None,
+                            None,
+                            sch.ReportsTable(logger=c.logger).columns)
+    fakeReportsTable.expect('insertReturningId',
+                            (c.fakeCursor,
+                             expected_report_tuple,
+                             p.partitionCursorPair,),
+                            { 'date_processed': date_processed },
+                            None,
+                            sdb.db_module.IntegrityError())
+    c.fakeCursor.expect('connection', None, None, c.fakeConnection)
+    c.fakeConnection.expect('rollback', (), {})
+    fakeReportsTable.expect('replace',
+                            (c.fakeCursor,
+                             expected_report_tuple),
+                            { 'date_processed': date_processed },
+                            234)
+    p.reportsTable = fakeReportsTable
+
+    r = p.insertReportIntoDatabase(c.fakeCursor,
+                                   ooid1,
+                                   json_doc,
+                                   date_processed,
+                                   error_list)
+    e = expected_report_dict
+    assert r == e, 'expected\n%s\nbut got\n%s' % (e, r)
+    e = ["INFO: This record is a replacement for a previous record with the "
+         "same uuid"]
+    assert error_list[-1:] == e, 'expected\n%s\nbut got\n%s' % (e, error_list)
+
 def testInsertAdddonsIntoDatabase1():
     """testInsertAdddonsIntoDatabase1: no addons"""
     p, c = getMockedProcessorAndContext()
@@ -1231,61 +1503,35 @@ def testInsertAdddonsIntoDatabase2():
                      "%7B972ce4c6-7e08-4474-a285-3208198ce6fd%7D:3.5.3")
     date_processed = dt.datetime(2011,2,15,1,0,0, tzinfo=UTC)
     error_list = []
-    c.fakeDatabaseConnectionPool.expect('connectionCursorPair', None, None,
-                                        17)
-    c.fakeDatabaseConnectionPool.expect('connectionCursorPair', None, None,
-                                        17)
-    c.fakeDatabaseConnectionPool.expect('connectionCursorPair', None, None,
-                                        17)
-    c.fakeDatabaseConnectionPool.expect('connectionCursorPair', None, None,
-                                        17)
-    c.fakeDatabaseConnectionPool.expect('connectionCursorPair', None, None,
-                                        17)
     fakeExtensionsTable = exp.DummyObjectWithExpectations()
-    fakeExtensionsTable.expect('insert',
-                               (c.fakeCursor,
-                                (reportId,
-                                 date_processed,
-                                 0,
-                                 "{3f963a5b-e555-4543-90e2-c3908898db71}",
-                                 "8.5"),
-                                17),
-                               {'date_processed':date_processed})
-    fakeExtensionsTable.expect('insert',
-                               (c.fakeCursor,
-                                (reportId,
-                                 date_processed,
-                                 1,
-                                 "jqs@sun.com",
-                                 "1.0"),
-                                17),
-                               {'date_processed':date_processed})
-    fakeExtensionsTable.expect('insert',
-                               (c.fakeCursor,
-                                (reportId,
-                                 date_processed,
-                                 2,
-                                 "{20a82645-c095-46ed-80e3-08825760534b}",
-                                 "1.1"),
-                                17),
-                               {'date_processed':date_processed})
-    fakeExtensionsTable.expect('insert',
-                               (c.fakeCursor,
-                                (reportId,
-                                 date_processed,
-                                 3,
-                                 "avg@igear$%#^|[]()*ed",
-                                 "2.507$%#^|[]()*024.001"),
-                                17),
-                               {'date_processed':date_processed})
-    fakeExtensionsTable.expect('insert',
+    fakeExtensionsTable.expect('insertMany',
                                (c.fakeCursor,
-                                (reportId,
-                                 date_processed,
-                                 4,
-                                 "{972ce4c6-7e08-4474-a285-3208198ce6fd}",
-                                 "3.5.3"),
-                                17),
+                                [(reportId,
+                                  date_processed,
+                                  0,
+                                  "{3f963a5b-e555-4543-90e2-c3908898db71}",
+                                  "8.5"),
+                                 (reportId,
+                                  date_processed,
+                                  1,
+                                  "jqs@sun.com",
+                                  "1.0"),
+                                 (reportId,
+                                  date_processed,
+                                  2,
+                                  "{20a82645-c095-46ed-80e3-08825760534b}",
+                                  "1.1"),
+                                 (reportId,
+                                  date_processed,
+                                  3,
+                                  "avg@igear$%#^|[]()*ed",
+                                  "2.507$%#^|[]()*024.001"),
+                                 (reportId,
+                                  date_processed,
+                                  4,
+                                  "{972ce4c6-7e08-4474-a285-3208198ce6fd}",
+                                  "3.5.3")],
+                                p.partitionCursorPair),
                                {'date_processed':date_processed})
     p.extensionsTable = fakeExtensionsTable
     r = p.insertAdddonsIntoDatabase(c.fakeCursor,
@@ -1310,39 +1556,25 @@ def testInsertAdddonsIntoDatabase3():
                     "avg@igeared:2.507.024.001"
     date_processed = dt.datetime(2011,2,15,1,0,0, tzinfo=UTC)
     error_list = []
-    c.fakeDatabaseConnectionPool.expect('connectionCursorPair', None, None,
-                                        17)
-    c.fakeDatabaseConnectionPool.expect('connectionCursorPair', None, None,
-                                        17)
-    c.fakeDatabaseConnectionPool.expect('connectionCursorPair', None, None,
-                                        17)
     fakeExtensionsTable = exp.DummyObjectWithExpectations()
-    fakeExtensionsTable.expect('insert',
-                               (c.fakeCursor,
-                                (reportId,
-                                 date_processed,
-                                 0,
-                                 "jqs@sun.com",
-                                 "1.0"),
-                                17),
-                               {'date_processed':date_processed})
-    fakeExtensionsTable.expect('insert',
-                               (c.fakeCursor,
-                                (reportId,
-                                 date_processed,
-                                 1,
-                                 "this_addon_is_missing_its_version",
-                                 ''),
-                                17),
-                               {'date_processed':date_processed})
-    fakeExtensionsTable.expect('insert',
+    fakeExtensionsTable.expect('insertMany',
                                (c.fakeCursor,
-                                (reportId,
-                                 date_processed,
-                                 2,
-                                 "avg@igeared",
-                                 "2.507.024.001"),
-                                17),
+                                [(reportId,
+                                  date_processed,
+                                  0,
+                                  "jqs@sun.com",
+                                  "1.0"),
+                                 (reportId,
+                                  date_processed,
+                                  1,
+                                  "this_addon_is_missing_its_version",
+                                  ''),
+                                 (reportId,
+                                  date_processed,
+                                  2,
+                                  "avg@igeared",
+                                  "2.507.024.001")],
+                                p.partitionCursorPair),
                                {'date_processed':date_processed})
     p.extensionsTable = fakeExtensionsTable
     r = p.insertAdddonsIntoDatabase(c.fakeCursor,
@@ -1405,7 +1637,7 @@ def testInsertCrashProcess3():
     date_processed = dt.datetime(2011,2,15,1,0,0, tzinfo=UTC)
     error_list = []
 
-    c.fakeDatabaseModule.expect('singleRowSql',
+    c.fakeDatabaseModule.expect('singleValueSql',
                                 (c.fakeCursor,
                                  'select id from plugins '
                                  'where filename = %s '
@@ -1414,10 +1646,6 @@ def testInsertCrashProcess3():
                                   jd['PluginName'])),
                                 {},
                                 777)
-    c.fakeDatabaseConnectionPool.expect('connectionCursorPair',
-                                        None,
-                                        None,
-                                        None)
     fakePluginsReportsTable = exp.DummyObjectWithExpectations()
     fakePluginsReportsTable.expect('insert',
                                    (c.fakeCursor,
@@ -1425,7 +1653,7 @@ def testInsertCrashProcess3():
                                      777,
                                      date_processed,
                                      jd['PluginVersion']),
-                                    None),
+                                    p.partitionCursorPair),
                                    {'date_processed':date_processed})
     p.pluginsReportsTable = fakePluginsReportsTable
     r = p.insertCrashProcess(c.fakeCursor,
@@ -1452,7 +1680,7 @@ def testInsertCrashProcess4():
     date_processed = dt.datetime(2011,2,15,1,0,0, tzinfo=UTC)
     error_list = []
 
-    c.fakeDatabaseModule.expect('singleRowSql',
+    c.fakeDatabaseModule.expect('singleValueSql',
                                 (c.fakeCursor,
                                  'select id from plugins '
                                  'where filename = %s '
@@ -1461,27 +1689,15 @@ def testInsertCrashProcess4():
                                   jd['PluginName'])),
                                 {},
                                 None,
-                                sdb.SQLDidNotReturnSingleRow())
+                                sdb.SQLDidNotReturnSingleValue())
     fakePluginsTable = exp.DummyObjectWithExpectations()
     fakePluginsTable.expect('insert',
                             (c.fakeCursor,
                              (jd['PluginFilename'],
                               jd['PluginName'])),
-                            {})
+                            {},
+                            777)
     p.pluginsTable = fakePluginsTable
-    c.fakeDatabaseModule.expect('singleRowSql',
-                                (c.fakeCursor,
-                                 'select id from plugins '
-                                 'where filename = %s '
-                                 'and name = %s',
-                                 (jd['PluginFilename'],
-                                  jd['PluginName'])),
-                                {},
-                                777)
-    c.fakeDatabaseConnectionPool.expect('connectionCursorPair',
-                                        None,
-                                        None,
-                                        None)
     fakePluginsReportsTable = exp.DummyObjectWithExpectations()
     fakePluginsReportsTable.expect('insert',
                                    (c.fakeCursor,
@@ -1489,7 +1705,7 @@ def testInsertCrashProcess4():
                                      777,
                                      date_processed,
                                      jd['PluginVersion']),
-                                    None),
+                                    p.partitionCursorPair),
                                    {'date_processed':date_processed})
     p.pluginsReportsTable = fakePluginsReportsTable
     r = p.insertCrashProcess(c.fakeCursor,
@@ -1504,52 +1720,77 @@ def testInsertCrashProcess4():
         }
     assert r == e, 'expected\n%s\nbut got\n%s' % (e, r)
 
+class FakeResponse(object):
+  def __init__(self, status=200, reason='OK'):
+    self.status = status
+    self.reason = reason
+  def read(self):
+    return ''
+
+class FakeHTTPConnection(object):
+  """stands in for PooledHTTPConnection, recording the requests made on it"""
+  instances = []
+  def __init__(self, pool, host, port, timeout=None):
+    self.host = host
+    self.port = port
+    self.timeout = timeout
+    self.sock = None
+    self.requests = 0
+    self.sent = []
+    self.failure = None
+    self.response = FakeResponse()
+    FakeHTTPConnection.instances.append(self)
+  def request(self, method, url, body=None, headers={}):
+    self.sent.append((method, url))
+  def getresponse(self):
+    if self.failure:
+      raise self.failure
+    return self.response
+  def close(self):
+    pass
+
+def getProcessorWithFakeElasticSearch():
+  p, c = getMockedProcessorAndContext()
+  p.config.elasticSearchOoidSubmissionUrl = 'http://es.example.com:9999/queue/tasks/%s'
+  p.elasticSearchPool = proc.httpc.HttpConnectionPool(connection_class=FakeHTTPConnection)
+  FakeHTTPConnection.instances = []
+  return p
+
 def testSubmitOoidToElasticSearch_1():
-    """testSubmitOoidToElasticSearch_1: submit to ES with timeout"""
-    import socket as s
-    p, c = getMockedProcessorAndContext()
-    uuid = 'ef38fe89-43b6-4cd4-b154-392022110607'
-    salted_ooid = 'e110607ef38fe89-43b6-4cd4-b154-392022110607'
-    fakeUrllib2 = exp.DummyObjectWithExpectations()
-    fakeRequestObject = 17
-    fakeUrllib2.expect('Request', (salted_ooid, {}), {}, fakeRequestObject)
-    fakeFileLikeObject = exp.DummyObjectWithExpectations()
-    fakeFileLikeObject.expect('read', (), {}, None, s.timeout)
-    #fakeSocketModule = exp.DummyObjectWithExpectations()
-    #fakeSocketModule.expect('timeout', returnValue=socket.timeout)
-    fakeUrllib2.expect('urlopen', (17,), {'timeout':2}, fakeFileLikeObject)
-    fakeUrllib2.expect('socket', returnValue=s)
-    p.submitOoidToElasticSearch(uuid, fakeUrllib2)
+  """testSubmitOoidToElasticSearch_1: submit to ES with timeout"""
+  import socket as s
+  p = getProcessorWithFakeElasticSearch()
+  uuid = 'ef38fe89-43b6-4cd4-b154-392022110607'
+  salted_ooid = 'e110607ef38fe89-43b6-4cd4-b154-392022110607'
+  connection = p.elasticSearchPool.acquire('es.example.com', 9999)
+  connection.failure = s.timeout()
+  p.elasticSearchPool.release(connection)
+  p.submitOoidToElasticSearch(uuid)
+  assert [('POST', '/queue/tasks/%s' % salted_ooid)] == connection.sent
+  assert 0 == p.elasticSearchPool.statistics()['open']
 
 def testSubmitOoidToElasticSearch_2():
-    """testSubmitOoidToElasticSearch_2: submit to ES - success"""
-    import socket as s
-    p, c = getMockedProcessorAndContext()
-    uuid = 'ef38fe89-43b6-4cd4-b154-392022110607'
-    salted_ooid = 'e110607ef38fe89-43b6-4cd4-b154-392022110607'
-    fakeUrllib2 = exp.DummyObjectWithExpectations()
-    fakeRequestObject = 17
-    fakeUrllib2.expect('Request', (salted_ooid, {}), {}, fakeRequestObject)
-    fakeFileLikeObject = exp.DummyObjectWithExpectations()
-    fakeFileLikeObject.expect('read', (), {}, None)
-    fakeUrllib2.expect('urlopen', (17,), {'timeout':2}, fakeFileLikeObject)
-    p.submitOoidToElasticSearch(uuid, fakeUrllib2)
+  """testSubmitOoidToElasticSearch_2: submit to ES - success, on one kept alive connection"""
+  p = getProcessorWithFakeElasticSearch()
+  uuid = 'ef38fe89-43b6-4cd4-b154-392022110607'
+  salted_ooid = 'e110607ef38fe89-43b6-4cd4-b154-392022110607'
+  p.submitOoidToElasticSearch(uuid)
+  p.submitOoidToElasticSearch(uuid)
+  assert 1 == len(FakeHTTPConnection.instances)
+  e = [('POST', '/queue/tasks/%s' % salted_ooid)] * 2
+  assert e == FakeHTTPConnection.instances[0].sent
+  stats = p.elasticSearchPool.statistics()
+  assert 1 == stats['reused']
+  assert 1 == stats['idle']
 
 def testSubmitOoidToElasticSearch_3():
-    """testSubmitOoidToElasticSearch_3: submit to ES with utter failure"""
-    import socket as s
-    p, c = getMockedProcessorAndContext()
-    uuid = 'ef38fe89-43b6-4cd4-b154-392022110607'
-    salted_ooid = 'e110607ef38fe89-43b6-4cd4-b154-392022110607'
-    fakeUrllib2 = exp.DummyObjectWithExpectations()
-    fakeRequestObject = 17
-    fakeUrllib2.expect('Request', (salted_ooid, {}), {}, fakeRequestObject)
-    fakeFileLikeObject = exp.DummyObjectWithExpectations()
-    fakeFileLikeObject.expect('read', (), {}, None, Exception)
-    #fakeSocketModule = exp.DummyObjectWithExpectations()
-    #fakeSocketModule.expect('timeout', returnValue=socket.timeout)
-    fakeUrllib2.expect('urlopen', (17,), {'timeout':2}, fakeFileLikeObject)
-    fakeUrllib2.expect('socket', returnValue=s)
-    p.submitOoidToElasticSearch(uuid, fakeUrllib2)
+  """testSubmitOoidToElasticSearch_3: submit to ES with utter failure"""
+  p = getProcessorWithFakeElasticSearch()
+  uuid = 'ef38fe89-43b6-4cd4-b154-392022110607'
+  connection = p.elasticSearchPool.acquire('es.example.com', 9999)
+  connection.failure = Exception('utter failure')
+  p.elasticSearchPool.release(connection)
+  p.submitOoidToElasticSearch(uuid)
+  assert 0 == p.elasticSearchPool.statistics()['open']
 
 
@@ -0,0 +1,164 @@
+import threading
+import time
+import unittest
+
+import socorro.processor.raw_crash_prefetcher as rcp
+from socorro.lib.util import SilentFakeLogger
+
+
+class FakeCrashStorage(object):
+    """returns a raw crash whose dump is 'dump_size' bytes.  A fetch of a
+    uuid in 'blocked' waits for 'release', and a fetch of a uuid in 'broken'
+    raises."""
+
+    def __init__(self, dump_size=10):
+        self.dump_size = dump_size
+        self.fetched = []
+        self.blocked = set()
+        self.broken = set()
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+
+    def get_raw_crash(self, uuid):
+        with self.lock:
+            self.fetched.append(uuid)
+        if uuid in self.blocked:
+            self.release.wait(5)
+        if uuid in self.broken:
+            raise IOError('no such crash')
+        return {'uuid': uuid}, 'x' * self.dump_size, None
+
+
+def wait_for(predicate, timeout=5):
+    end = time.time() + timeout
+    while not predicate() and time.time() < end:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestRawCrashPrefetcher(unittest.TestCase):
+
+    def _prefetcher(self, storage, **kwargs):
+        prefetcher = rcp.RawCrashPrefetcher(lambda: storage,
+                                            SilentFakeLogger(), **kwargs)
+        self.addCleanup(prefetcher.close)
+        return prefetcher
+
+    def test_fetched_ahead(self):
+        storage = FakeCrashStorage()
+        prefetcher = self._prefetcher(storage, depth=4)
+        for x in range(3):
+            prefetcher.prefetch('uuid%d' % x)
+        self.assertTrue(wait_for(
+            lambda: prefetcher.statistics()['fetched'] == 3))
+        self.assertEqual(30, prefetcher.statistics()['bytes_held'])
+        self.assertEqual(({'uuid': 'uuid1'}, 'x' * 10, None),
+                         prefetcher.take('uuid1'))
+        # handed out only once
+        self.assertEqual(None, prefetcher.take('uuid1'))
+        statistics = prefetcher.statistics()
+        self.assertEqual(1, statistics['hits'])
+        self.assertEqual(1, statistics['misses'])
+        self.assertEqual(2, statistics['held'])
+        self.assertEqual(20, statistics['bytes_held'])
+
+    def test_depth_limits_the_fetches(self):
+        storage = FakeCrashStorage()
+        prefetcher = self._prefetcher(storage, depth=2)
+        for x in range(5):
+            prefetcher.prefetch('uuid%d' % x)
+        self.assertTrue(wait_for(lambda: len(storage.fetched) == 2))
+        time.sleep(0.05)
+        self.assertEqual(['uuid0', 'uuid1'], sorted(storage.fetched))
+        prefetcher.take('uuid0')
+        self.assertTrue(wait_for(lambda: len(storage.fetched) == 3))
+        self.assertEqual('uuid2', storage.fetched[-1])
+
+    def test_memory_budget_limits_the_fetches(self):
+        storage = FakeCrashStorage(dump_size=100)
+        prefetcher = self._prefetcher(storage, depth=10, memory_budget=150,
+                                      number_of_threads=1)
+        for x in range(4):
+            prefetcher.prefetch('uuid%d' % x)
+        self.assertTrue(wait_for(lambda: len(storage.fetched) == 2))
+        time.sleep(0.05)
+        self.assertEqual(2, len(storage.fetched))
+        prefetcher.take('uuid0')
+        prefetcher.take('uuid1')
+        self.assertTrue(wait_for(lambda: len(storage.fetched) == 4))
+
+    def test_take_waits_for_a_fetch_in_flight(self):
+        storage = FakeCrashStorage()
+        storage.blocked.add('uuid0')
+        prefetcher = self._prefetcher(storage)
+        prefetcher.prefetch('uuid0')
+        self.assertTrue(wait_for(lambda: storage.fetched == ['uuid0']))
+        threading.Timer(0.05, storage.release.set).start()
+        self.assertEqual('uuid0', prefetcher.take('uuid0')[0]['uuid'])
+        self.assertEqual(1, prefetcher.statistics()['waits'])
+
+    def test_not_started_is_left_to_the_worker(self):
+        storage = FakeCrashStorage()
+        storage.blocked.add('uuid0')
+        prefetcher = self._prefetcher(storage, depth=1)
+        prefetcher.prefetch('uuid0')
+        prefetcher.prefetch('uuid1')
+        self.assertTrue(wait_for(lambda: storage.fetched == ['uuid0']))
+        self.assertEqual(None, prefetcher.take('uuid1'))
+        self.assertEqual(0, prefetcher.statistics()['pending'])
+        storage.release.set()
+        prefetcher.take('uuid0')
+        time.sleep(0.05)
+        self.assertEqual(['uuid0'], storage.fetched)
+
+    def test_failed_fetch_is_left_to_the_worker(self):
+        storage = FakeCrashStorage()
+        storage.broken.add('uuid0')
+        prefetcher = self._prefetcher(storage)
+        prefetcher.prefetch('uuid0')
+        self.assertTrue(wait_for(
+            lambda: prefetcher.statistics()['failed'] == 1))
+        self.assertEqual(None, prefetcher.take('uuid0'))
+        self.assertEqual(0, prefetcher.statistics()['held'])
+
+    def test_hidden_latency(self):
+        clock = [100.0]
+        storage = FakeCrashStorage()
+        original = storage.get_raw_crash
+
+        def slow_get_raw_crash(uuid):
+            clock[0] += 2.0
+            return original(uuid)
+        storage.get_raw_crash = slow_get_raw_crash
+        prefetcher = self._prefetcher(storage, number_of_threads=1,
+                                      time_function=lambda: clock[0])
+        prefetcher.prefetch('uuid0')
+        self.assertTrue(wait_for(
+            lambda: prefetcher.statistics()['fetched'] == 1))
+        prefetcher.take('uuid0')
+        statistics = prefetcher.statistics()
+        self.assertEqual(2.0, statistics['fetch_seconds'])
+        self.assertEqual(2.0, statistics['hidden_seconds'])
+
+    def test_unclaimed_crashes_expire(self):
+        clock = [100.0]
+        storage = FakeCrashStorage()
+        prefetcher = self._prefetcher(storage, depth=1, maximum_age=60,
+                                      time_function=lambda: clock[0])
+        prefetcher.prefetch('uuid0')
+        prefetcher.prefetch('uuid1')
+        self.assertTrue(wait_for(lambda: len(storage.fetched) == 1))
+        clock[0] += 61
+        self.assertTrue(wait_for(lambda: len(storage.fetched) == 2))
+        self.assertEqual(1, prefetcher.statistics()['expired'])
+        self.assertEqual(None, prefetcher.take('uuid0'))
+
+    def test_close(self):
+        storage = FakeCrashStorage()
+        prefetcher = self._prefetcher(storage)
+        prefetcher.prefetch('uuid0')
+        self.assertTrue(wait_for(
+            lambda: prefetcher.statistics()['fetched'] == 1))
+        prefetcher.close()
+        self.assertFalse([x for x in prefetcher.threads if x.is_alive()])
+        self.assertEqual(0, prefetcher.statistics()['bytes_held'])
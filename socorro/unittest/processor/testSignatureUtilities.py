@@ -419,3 +419,183 @@ class TestCase(unittest.TestCase):
         assert_expected(e, notes)
 
 
+
+
+#==============================================================================
+# differential testing of the cached signature engine against the original
+# uncached implementation
+class OriginalCSignatureTool(sig.CSignatureTool):
+    """CSignatureTool as it was before caching and combined matching"""
+    def normalize_signature(self, module_name, function, source, source_line,
+                            instruction):
+        if function:
+            if self.signaturesWithLineNumbersRegEx.match(function):
+                function = "%s:%s" % (function, source_line)
+            function = self.fixupSpace.sub('', function)
+            function = self.fixupComma.sub(', ', function)
+            function = self.fixupInteger.sub(r'\1int\4', function)
+            return function
+        if source and source_line:
+            filename = source.rstrip('/\\')
+            if '\\' in filename:
+                source = filename.rsplit('\\')[-1]
+            else:
+                source = filename.rsplit('/')[-1]
+            return '%s#%s' % (source, source_line)
+        if not module_name:
+            module_name = ''
+        return '%s@%s' % (module_name, instruction)
+
+    def _do_generate(self, source_list, hang_type, crashed_thread,
+                     delimiter=' | '):
+        signature_notes = []
+        sentinel_locations = []
+        for a_sentinel in self.config.signatureSentinels:
+            if type(a_sentinel) == tuple:
+                a_sentinel, condition_fn = a_sentinel
+                if not condition_fn(source_list):
+                    continue
+            try:
+                sentinel_locations.append(source_list.index(a_sentinel))
+            except ValueError:
+                pass
+        if sentinel_locations:
+            source_list = source_list[min(sentinel_locations):]
+        newSignatureList = []
+        for aSignature in source_list:
+            if self.irrelevantSignatureRegEx.match(aSignature):
+                continue
+            newSignatureList.append(aSignature)
+            if not self.prefixSignatureRegEx.match(aSignature):
+                break
+        if hang_type:
+            newSignatureList.insert(0, self.hang_prefixes[hang_type])
+        signature = delimiter.join(newSignatureList)
+        if signature == '' or signature is None:
+            if crashed_thread is None:
+                signature_notes.append("CSignatureTool: No signature could be "
+                                       "created because we do not know which "
+                                       "thread crashed")
+                signature = "EMPTY: no crashing thread identified"
+            else:
+                signature_notes.append("CSignatureTool: No proper signature "
+                                       "could be created because no good data "
+                                       "for the crashing thread (%s) was found"
+                                       % crashed_thread)
+                try:
+                    signature = source_list[0]
+                except IndexError:
+                    signature = "EMPTY: no frame data available"
+        return signature, signature_notes
+
+
+differential_irrelevant = '|'.join([
+    '@0x[0-9a-fA-F]{2,}', '@0x[1-9a-fA-F]', 'ashmem', '_CxxThrowException',
+    'KiFastSystemCallRet', 'libc\.so@.*', 'MOZ_Assert', 'MOZ_Crash',
+    '(Nt|Zw)WaitForSingleObject(Ex)?', 'RaiseException', '_ZdlPv', 'zero',
+])
+differential_prefix = '|'.join([
+    '@0x0', '.*abort', 'arena_.*', '.*calloc', 'CFRelease', '_chkstk',
+    'dlmalloc', '.*free', 'js_.*', 'JS_.*', '.*malloc', 'memcpy', 'memset',
+    'moz_xmalloc', 'nsCOMPtr.*', 'RtlpWaitOnCriticalSection', 'strlen',
+])
+differential_functions = [
+    'KiFastSystemCallRet', 'NtWaitForSingleObject', 'ZwWaitForSingleObjectEx',
+    'RaiseException', 'abort', 'arena_dalloc_small', 'je_malloc', 'free',
+    'js_Interpret', 'JS_CallFunction', 'memcpy', 'strlen', 'moz_xmalloc',
+    'nsCOMPtr_base::assign_with_AddRef(nsISupports*)', '_purecall',
+    'sentinel', 'sentinel2', 'nsTArray<int,4u>::Foo(T *,int &)',
+    'mozilla::dom::Element::SetAttr(int, nsIAtom*, nsAString const&, bool)',
+    'PR_Lock', 'fnNeedNumber', 'std::vector<char, 10l>::push_back(char &)',
+    None, '',
+]
+differential_modules = ['xul.dll', 'libc.so', 'ntdll.dll', None, '']
+differential_sources = ['hg:hg.mozilla.org/mozilla-central:dom/Foo.cpp:abc',
+                        'c:\\builds\\moz2_slave\\obj\\nsBar.cpp', None, '']
+differential_instructions = ['0x0', '0x1', '0x1f', '0xdeadbeef', '0x2']
+
+
+def differential_frames(random, count):
+    for x in range(count):
+        yield (random.choice(differential_modules),
+               random.choice(differential_functions),
+               random.choice(differential_sources),
+               random.choice(['', None, '17', '4096']),
+               random.choice(differential_instructions))
+
+
+class TestCachedSignatureEngine(unittest.TestCase):
+
+    def _get_tools(self, cache_size=100, irrelevant=differential_irrelevant,
+                   prefix=differential_prefix):
+        tools = []
+        for a_class in (OriginalCSignatureTool, sig.CSignatureTool):
+            config = sutil.DotDict()
+            config.logger = sutil.FakeLogger()
+            config.irrelevantSignatureRegEx = irrelevant
+            config.prefixSignatureRegEx = prefix
+            config.signaturesWithLineNumbersRegEx = 'js_Interpret|fnNeed'
+            config.signatureSentinels = ('_purecall',
+                                         'sentinel',
+                                         ('sentinel2', lambda x: 'PR_Lock' in x),
+                                        )
+            config.signature_cache_size = cache_size
+            tools.append(a_class(config))
+        return tools
+
+    def _compare(self, original, cached, seed):
+        import random
+        random = random.Random(seed)
+        for x in range(2000):
+            frames = list(differential_frames(random, random.randint(0, 35)))
+            original_list = [original.normalize_signature(*f) for f in frames]
+            cached_list = [cached.normalize_signature(*f) for f in frames]
+            self.assertEqual(original_list, cached_list)
+            hang_type = random.choice([0, 0, -1, 1])
+            crashed_thread = random.choice([None, 0, 3])
+            self.assertEqual(original.generate(original_list,
+                                               hang_type,
+                                               crashed_thread),
+                             cached.generate(cached_list,
+                                             hang_type,
+                                             crashed_thread))
+
+    def test_identical_output(self):
+        original, cached = self._get_tools()
+        self.assertTrue(cached.combined_signature_regex is not None)
+        self._compare(original, cached, 1)
+        self.assertTrue(cached.normalized_function_cache.hits > 0)
+        self.assertTrue(cached.classification_cache.hits > 0)
+
+    def test_identical_output_small_cache(self):
+        original, cached = self._get_tools(cache_size=5)
+        self._compare(original, cached, 4)
+        self.assertTrue(cached.normalized_function_cache.evictions > 0)
+        self.assertTrue(cached.classification_cache.evictions > 0)
+        self.assertTrue(len(cached.normalized_function_cache) <= 5)
+        self.assertTrue(len(cached.classification_cache) <= 5)
+
+    def test_identical_output_without_caching(self):
+        original, cached = self._get_tools(cache_size=0)
+        self._compare(original, cached, 2)
+        self.assertEqual(len(cached.normalized_function_cache), 0)
+
+    def test_identical_output_uncombinable_patterns(self):
+        original, cached = self._get_tools(
+            irrelevant=differential_irrelevant + '|(?P<a>zz)(?P=a)',
+            prefix='(?i)' + differential_prefix,
+        )
+        self.assertTrue(cached.combined_signature_regex is None)
+        self._compare(original, cached, 3)
+
+    def test_classify_signature(self):
+        original, cached = self._get_tools()
+        self.assertEqual(cached.classify_signature('RaiseException'),
+                         cached.IRRELEVANT)
+        self.assertEqual(cached.classify_signature('je_malloc'),
+                         cached.PREFIX)
+        self.assertEqual(cached.classify_signature('PR_Lock'),
+                         cached.RELEVANT)
+        # both irrelevant and prefix: irrelevant wins as it always did
+        self.assertEqual(cached.classify_signature('zero_free'),
+                         cached.IRRELEVANT)
@@ -0,0 +1,172 @@
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+
+import socorro.processor.stackwalker as stackwalker
+from socorro.lib.util import DotDict, SilentFakeLogger, StrCachingIterator
+
+# a stand-in for a long-lived stackwalker.  For a dump named 'die' it exits in
+# the middle of its output, for 'hang' it never finishes, otherwise it echos
+# the dump name and its own pid.
+fake_stackwalker_source = r"""
+import os
+import sys
+import time
+while True:
+    line = sys.stdin.readline()
+    if not line:
+        break
+    dump = line.strip()
+    sys.stdout.write('OS|%s|%d\n' % (dump, os.getpid()))
+    sys.stdout.write('\n')
+    sys.stdout.write('0|0|module|function|source|1|0x0\n')
+    sys.stdout.flush()
+    if dump == 'die':
+        sys.exit(0)
+    if dump == 'hang':
+        time.sleep(60)
+    sys.stdout.write('%s|%d\n' % ('__STACKWALK_END_OF_OUTPUT__',
+                                  dump == 'bad' and 1 or 0))
+    sys.stdout.flush()
+"""
+
+
+class FakeStatsd(object):
+    def __init__(self):
+        self.counters = []
+
+    def incr(self, name):
+        self.counters.append(name)
+
+
+class TestStackwalkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        script = os.path.join(self.temp_dir, 'fake_stackwalker.py')
+        with open(script, 'w') as f:
+            f.write(fake_stackwalker_source)
+        self.command_line = '"%s" "%s"' % (sys.executable, script)
+        self.statsd = FakeStatsd()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _get_pool(self, size=1, maximum_jobs=0, timeout=0):
+        config = DotDict()
+        config.logger = SilentFakeLogger()
+        config.stackwalkerPoolSize = size
+        config.stackwalkerMaximumJobs = maximum_jobs
+        config.stackwalkerTimeout = timeout
+        return stackwalker.StackwalkerPool(config, self.command_line,
+                                           self.statsd, 'prefix')
+
+    def _output_lines(self, output):
+        return [x.split('|') for x in output]
+
+    def test_one_process_for_many_dumps(self):
+        pool = self._get_pool()
+        try:
+            pids = set()
+            for dump in ('a', 'b', 'c'):
+                output = pool.invoke(dump)
+                lines = self._output_lines(output)
+                self.assertEqual(len(lines), 3)
+                self.assertEqual(lines[0][1], dump)
+                self.assertEqual(lines[1], ['\n'])
+                pids.add(lines[0][2])
+                self.assertEqual(output.wait(), 0)
+            self.assertEqual(len(pids), 1)
+        finally:
+            pool.cleanup()
+
+    def test_partial_read_and_returncode(self):
+        pool = self._get_pool()
+        try:
+            output = pool.invoke('bad')
+            iterator = StrCachingIterator(output)
+            for line in iterator:
+                break  # as analyzeHeader would, stop part way through
+            self.assertEqual(output.wait(), 1)
+            self.assertEqual(pool.idle_workers.qsize(), 1)
+            # the worker must be in step for the next dump
+            output = pool.invoke('good')
+            self.assertEqual(self._output_lines(output)[0][1], 'good')
+            self.assertEqual(output.wait(), 0)
+        finally:
+            pool.cleanup()
+
+    def test_recycle_after_maximum_jobs(self):
+        pool = self._get_pool(maximum_jobs=2)
+        try:
+            pids = []
+            for dump in ('a', 'b', 'c'):
+                output = pool.invoke(dump)
+                pids.append(self._output_lines(output)[0][2])
+                output.wait()
+            self.assertEqual(pids[0], pids[1])
+            self.assertNotEqual(pids[1], pids[2])
+            self.assertEqual(self.statsd.counters,
+                             ['prefix.stackwalker.recycled'])
+        finally:
+            pool.cleanup()
+
+    def test_worker_dies(self):
+        pool = self._get_pool()
+        try:
+            output = pool.invoke('die')
+            self.assertEqual(len(self._output_lines(output)), 3)
+            self.assertNotEqual(output.wait(), 0)
+            output = pool.invoke('after')
+            self.assertEqual(self._output_lines(output)[0][1], 'after')
+            self.assertEqual(output.wait(), 0)
+        finally:
+            pool.cleanup()
+
+    def test_timeout(self):
+        pool = self._get_pool(timeout=0.5)
+        try:
+            output = pool.invoke('hang')
+            self.assertEqual(len(self._output_lines(output)), 3)
+            self.assertNotEqual(output.wait(), 0)
+            self.assertEqual(self.statsd.counters,
+                             ['prefix.stackwalker.timeouts'])
+            output = pool.invoke('after')
+            self.assertEqual(self._output_lines(output)[0][1], 'after')
+            self.assertEqual(output.wait(), 0)
+        finally:
+            pool.cleanup()
+
+    def test_command_line_checked_when_the_pool_is_built(self):
+        self.command_line = ''
+        self.assertRaises(ValueError, self._get_pool)
+        self.command_line = os.path.join(self.temp_dir, 'no_such_stackwalker')
+        self.assertRaises(ValueError, self._get_pool)
+
+
+class TestServe(unittest.TestCase):
+
+    def test_serve(self):
+        # a one-dump-per-run stackwalker that prints its dump's name, without
+        # a final newline, and fails for the dump named 'bad'
+        command = [sys.executable, '-c',
+                   'import sys; sys.stdout.write("OS|%s\\n0|0" % sys.argv[1]);'
+                   ' sys.exit(sys.argv[1] == "bad")',
+                   stackwalker.DUMP_PLACEHOLDER]
+        output = StringIO.StringIO()
+        stackwalker.serve(command, StringIO.StringIO('a\n\nbad\n'), output)
+        self.assertEqual(output.getvalue(),
+                         'OS|a\n0|0\n%(end)s|0\n'
+                         'OS|bad\n0|0\n%(end)s|1\n' %
+                         {'end': stackwalker.END_OF_OUTPUT})
+
+    def test_serve_missing_stackwalker(self):
+        output = StringIO.StringIO()
+        stackwalker.serve(['/no/such/stackwalker',
+                           stackwalker.DUMP_PLACEHOLDER],
+                          StringIO.StringIO('a\n'), output)
+        self.assertEqual(output.getvalue(),
+                         '%s|127\n' % stackwalker.END_OF_OUTPUT)
@@ -2,6 +2,7 @@ import unittest
 import os
 import sys
 import re
+import threading
 try:
   import json
 except ImportError:
@@ -180,7 +181,7 @@ def testCrashStorageSystemForHBase___init__():
   j.logger = d.logger = util.SilentFakeLogger()
   fakeHbaseConnection = exp.DummyObjectWithExpectations('fakeHbaseConnection')
   fakeHbaseModule = exp.DummyObjectWithExpectations('fakeHbaseModule')
-  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger}, fakeHbaseConnection, None)
+  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger, "write_flush_interval":None, "processed_crash_format":"json"}, fakeHbaseConnection, None)
   fakeHbaseConnection.expect('hbaseThriftExceptions', None, None, (), None)
   fakeHbaseModule.expect('NoConnectionException', None, None, hbc.NoConnectionException, None)
   fakeJsonDumpStore = exp.DummyObjectWithExpectations('fakeJsonDumpStore')
@@ -215,10 +216,13 @@ def testCrashStorageSystemForHBase_save_1():
 
   fakeHbaseConnection = exp.DummyObjectWithExpectations('fakeHbaseConnection')
   fakeHbaseConnection.expect('hbaseThriftExceptions', None, None, (), None)
+  fakeHbaseConnection.expect('round_trips', None, None, 0, None)
   fakeHbaseConnection.expect('put_json_dump', ('uuid', jdict, expectedDumpResult), {"number_of_retries":2}, None, None)
+  fakeHbaseConnection.expect('flush_pending_writes_if_due', (), {"number_of_retries":2}, None, None)
+  fakeHbaseConnection.expect('round_trips', None, None, 1, None)
 
   fakeHbaseModule = exp.DummyObjectWithExpectations('fakeHbaseModule')
-  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger}, fakeHbaseConnection, None)
+  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger, "write_flush_interval":None, "processed_crash_format":"json"}, fakeHbaseConnection, None)
   fakeHbaseModule.expect('NoConnectionException', None, None, hbc.NoConnectionException, None)
 
   fakeJsonDumpStore = exp.DummyObjectWithExpectations('fakeJsonDumpStore')
@@ -255,10 +259,11 @@ def testCrashStorageSystemForHBase_save_2():
 
   fakeHbaseConnection = exp.DummyObjectWithExpectations('fakeHbaseConnection')
   fakeHbaseConnection.expect('hbaseThriftExceptions', None, None, (), None)
+  fakeHbaseConnection.expect('round_trips', None, None, 0, None)
   fakeHbaseConnection.expect('put_json_dump', ('uuid', jdict, expectedDumpResult), {"number_of_retries":2}, None, Exception())
 
   fakeHbaseModule = exp.DummyObjectWithExpectations('fakeHbaseModule')
-  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger}, fakeHbaseConnection, None)
+  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger, "write_flush_interval":None, "processed_crash_format":"json"}, fakeHbaseConnection, None)
   fakeHbaseModule.expect('NoConnectionException', None, None, hbc.NoConnectionException, None)
 
 
@@ -305,10 +310,11 @@ def testCrashStorageSystemForHBase_save_3():
 
   fakeHbaseConnection = exp.DummyObjectWithExpectations('fakeHbaseConnection')
   fakeHbaseConnection.expect('hbaseThriftExceptions', None, None, (), None)
+  fakeHbaseConnection.expect('round_trips', None, None, 0, None)
   fakeHbaseConnection.expect('put_json_dump', ('uuid', jdict, expectedDumpResult), {"number_of_retries":2}, None, Exception())
 
   fakeHbaseModule = exp.DummyObjectWithExpectations('fakeHbaseModule')
-  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger}, fakeHbaseConnection, None)
+  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger, "write_flush_interval":None, "processed_crash_format":"json"}, fakeHbaseConnection, None)
   fakeHbaseModule.expect('NoConnectionException', None, None, hbc.NoConnectionException, None)
 
   fakeJsonDumpModule = exp.DummyObjectWithExpectations('fakeJsonDumpModule')
@@ -345,10 +351,11 @@ def testCrashStorageSystemForHBase_save_4():
 
   fakeHbaseConnection = exp.DummyObjectWithExpectations('fakeHbaseConnection')
   fakeHbaseConnection.expect('hbaseThriftExceptions', None, None, (), None)
+  fakeHbaseConnection.expect('round_trips', None, None, 0, None)
   fakeHbaseConnection.expect('put_json_dump', ('uuid', jdict, expectedDumpResult), {"number_of_retries":2}, None, hbc.NoConnectionException(Exception()))
 
   fakeHbaseModule = exp.DummyObjectWithExpectations('fakeHbaseModule')
-  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger}, fakeHbaseConnection, None)
+  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger, "write_flush_interval":None, "processed_crash_format":"json"}, fakeHbaseConnection, None)
   fakeHbaseModule.expect('NoConnectionException', None, None, hbc.NoConnectionException, None)
 
   fakeJsonDumpModule = exp.DummyObjectWithExpectations('fakeJsonDumpModule')
@@ -411,9 +418,9 @@ def testCrashStorageForDualHbaseCrashStorageSystem01():
   fakeHbaseConnection2.expect('hbaseThriftExceptions', None, None, (), None)
   fakeHbaseConnection2.expect('get_json', ('fakeOoid2',), {'number_of_retries':2}, 'fake_json2')
   fakeHbaseModule = exp.DummyObjectWithExpectations('fakeHbaseModule')
-  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger}, fakeHbaseConnection1, None)
+  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger, "write_flush_interval":None, "processed_crash_format":"json"}, fakeHbaseConnection1, None)
   fakeHbaseModule.expect('NoConnectionException', None, None, hbc.NoConnectionException, None)
-  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.secondaryHbaseHost, d.secondaryHbasePort, d.secondaryHbaseTimeout), {"logger":d.logger}, fakeHbaseConnection2, None)
+  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.secondaryHbaseHost, d.secondaryHbasePort, d.secondaryHbaseTimeout), {"logger":d.logger, "write_flush_interval":None, "processed_crash_format":"json"}, fakeHbaseConnection2, None)
   fakeHbaseModule.expect('NoConnectionException', None, None, hbc.NoConnectionException, None)
   fakeJsonDumpStore = exp.DummyObjectWithExpectations('fakeJsonDumpStore')
   fakeJsonDumpModule = exp.DummyObjectWithExpectations('fakeJsonDumpModule')
@@ -429,3 +436,232 @@ def testCrashStorageForDualHbaseCrashStorageSystem01():
   result = css.get_meta('fakeOoid2')
   assert result == 'fake_json2'
 
+
+def testCrashStorageSystem_get_raw_crash():
+  class TwoReadStorage(cstore.CrashStorageSystem):
+    def get_meta(self, uuid):
+      return {'uuid': uuid}
+    def get_raw_dump(self, uuid):
+      return 'dump of %s' % uuid
+  css = TwoReadStorage(util.DotDict({'logger': util.SilentFakeLogger()}))
+  assert css.get_raw_crash('fred') == ({'uuid': 'fred'}, 'dump of fred', None)
+
+def testCrashStorageForDualHbaseCrashStorageSystem_get_raw_crash():
+  """both columns in a single read, from the secondary hbase when the primary doesn't have the crash"""
+  d = util.DotDict()
+  j = util.DotDict()
+  d.hbaseHost = 'fred'
+  d.secondaryHbaseHost = 'barney'
+  d.hbasePort = 'ethel'
+  d.secondaryHbasePort = 'betty'
+  d.hbaseTimeout = 3000
+  d.secondaryHbaseTimeout = 10000
+  j.root = d.hbaseFallbackFS = '.'
+  d.throttleConditions = []
+  j.maxDirectoryEntries = d.hbaseFallbackDumpDirCount = 1000000
+  j.jsonSuffix = d.jsonFileSuffix = '.json'
+  j.dumpSuffix = d.dumpFileSuffix = '.dump'
+  j.dumpGID = d.hbaseFallbackdumpGID = 666
+  j.dumpPermissions = d.hbaseFallbackDumpPermissions = 660
+  j.dirPermissions = d.hbaseFallbackDirPermissions = 770
+  j.logger = d.logger = util.SilentFakeLogger()
+  row1 = {'meta_data:json': '{"ProductName": "Firefox"}', 'raw_data:dump': 'dump1', '_rowkey': 'row1',
+          'flags:processed': 'N', 'timestamps:submitted': '2012-05-04T03:04:05'}
+  row2 = {'meta_data:json': '{"ProductName": "Thunderbird"}', 'raw_data:dump': 'dump2', '_rowkey': 'row2'}
+  fakeHbaseConnection1 = exp.DummyObjectWithExpectations('fakeHbaseConnection1')
+  fakeHbaseConnection2 = exp.DummyObjectWithExpectations('fakeHbaseConnection2')
+  fakeHbaseConnection1.expect('hbaseThriftExceptions', None, None, (), None)
+  fakeHbaseConnection1.expect('get_raw_report', ('fakeOoid1',), {'number_of_retries':2}, row1)
+  fakeHbaseConnection1.expect('get_raw_report', ('fakeOoid2',), {'number_of_retries':2}, None, hbc.OoidNotFoundException())
+  fakeHbaseConnection2.expect('hbaseThriftExceptions', None, None, (), None)
+  fakeHbaseConnection2.expect('get_raw_report', ('fakeOoid2',), {'number_of_retries':2}, row2)
+  fakeHbaseModule = exp.DummyObjectWithExpectations('fakeHbaseModule')
+  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.hbaseHost, d.hbasePort, d.hbaseTimeout), {"logger":d.logger, "write_flush_interval":None, "processed_crash_format":"json"}, fakeHbaseConnection1, None)
+  fakeHbaseModule.expect('NoConnectionException', None, None, hbc.NoConnectionException, None)
+  fakeHbaseModule.expect('HBaseConnectionForCrashReports', (d.secondaryHbaseHost, d.secondaryHbasePort, d.secondaryHbaseTimeout), {"logger":d.logger, "write_flush_interval":None, "processed_crash_format":"json"}, fakeHbaseConnection2, None)
+  fakeHbaseModule.expect('NoConnectionException', None, None, hbc.NoConnectionException, None)
+  fakeJsonDumpStore = exp.DummyObjectWithExpectations('fakeJsonDumpStore')
+  fakeJsonDumpModule = exp.DummyObjectWithExpectations('fakeJsonDumpModule')
+  fakeJsonDumpModule.expect('JsonDumpStorage', (), j, fakeJsonDumpStore, None)
+  fakeJsonDumpModule.expect('JsonDumpStorage', (), j, fakeJsonDumpStore, None)
+  css = cstore.DualHbaseCrashStorageSystem(d,
+                                           hbaseClient=fakeHbaseModule,
+                                           jsonDumpStorage=fakeJsonDumpModule)
+  result = css.get_raw_crash('fakeOoid1')
+  expectedState = {'flags:processed': 'N', 'timestamps:submitted': '2012-05-04T03:04:05'}
+  assert result == ({'ProductName': 'Firefox'}, 'dump1', expectedState), result
+  result = css.get_raw_crash('fakeOoid2')
+  # without its processing state, put_processed_json reads it
+  assert result == ({'ProductName': 'Thunderbird'}, 'dump2', None), result
+
+class FakePooledCrashStorage(object):
+  """counts the crash storages made, and fails to be made while 'down' is set"""
+  made = []
+  down = False
+  def __init__(self, config):
+    if FakePooledCrashStorage.down:
+      raise hbc.NoConnectionException(None, 'down')
+    FakePooledCrashStorage.made.append(self)
+    self.alive = True
+    self.closed = False
+  def isAlive(self):
+    return self.alive
+  def close(self):
+    self.closed = True
+
+def crashStoragePoolForTest(**kwargs):
+  FakePooledCrashStorage.made = []
+  FakePooledCrashStorage.down = False
+  d = util.DotDict({'logger': util.SilentFakeLogger(), 'crashStoragePoolCheckInterval': 0})
+  d.update(kwargs)
+  clock = [100.0]
+  sleeps = []
+  def sleep(seconds):
+    sleeps.append(seconds)
+    clock[0] += seconds
+  pool = cstore.CrashStoragePool(d, storageClass=FakePooledCrashStorage, timeFunction=lambda: clock[0],
+                                 sleepFunction=sleep)
+  return pool, clock, sleeps
+
+def testCrashStoragePoolKeptByName():
+  pool, clock, sleeps = crashStoragePoolForTest()
+  a = pool.crashStorage('a')
+  assert pool.crashStorage('a') is a
+  assert pool.crashStorage('b') is not a
+  assert len(FakePooledCrashStorage.made) == 2
+  pool.remove('a')
+  assert a.closed
+  assert 'a' not in pool
+  statistics = pool.statistics()
+  assert statistics['open'] == 1 and statistics['kept'] == 1 and statistics['connects'] == 2, statistics
+  pool.cleanup()
+  assert pool.statistics()['open'] == 0
+  assert all(x.closed for x in FakePooledCrashStorage.made)
+
+def testCrashStoragePoolBorrowed():
+  pool, clock, sleeps = crashStoragePoolForTest()
+  with pool.borrowed() as a:
+    pass
+  with pool.borrowed() as b:
+    assert b is a
+    with pool.borrowed() as c:
+      assert c is not a
+  assert len(FakePooledCrashStorage.made) == 2
+  assert pool.statistics()['idle'] == 2
+  # a connection error closes the crash storage instead of giving it back
+  try:
+    with pool.borrowed() as d:
+      raise hbc.FatalException(None, 'gone')
+  except hbc.FatalException:
+    pass
+  assert d.closed
+  # any other error gives it back
+  try:
+    with pool.borrowed() as e:
+      raise KeyError('no such crash')
+  except KeyError:
+    pass
+  assert not e.closed
+  statistics = pool.statistics()
+  assert statistics['open'] == 1 and statistics['idle'] == 1, statistics
+
+def testCrashStoragePoolMaximumSize():
+  pool, clock, sleeps = crashStoragePoolForTest(crashStoragePoolMaximumSize=1)
+  a = pool.acquire()
+  borrowed = []
+  t = threading.Thread(target=lambda: borrowed.append(pool.acquire()))
+  t.start()
+  t.join(0.1)
+  assert not borrowed and pool.statistics()['waits'] == 1
+  pool.release(a)
+  t.join(5)
+  assert borrowed == [a]
+  assert len(FakePooledCrashStorage.made) == 1
+
+def testCrashStoragePoolAcquireTimeout():
+  pool, clock, sleeps = crashStoragePoolForTest(crashStoragePoolMaximumSize=1, crashStoragePoolAcquireTimeout=0.05)
+  # the only one is kept by a thread, and never released
+  pool.crashStorage('a')
+  try:
+    pool.acquire()
+    assert False, 'expected CrashStoragePoolTimeout'
+  except cstore.CrashStoragePoolTimeout:
+    pass
+  statistics = pool.statistics()
+  assert statistics['timeouts'] == 1 and statistics['open'] == 1, statistics
+
+def testCrashStoragePoolChecksKept():
+  pool, clock, sleeps = crashStoragePoolForTest(crashStoragePoolCheckInterval=60)
+  try:
+    name = threading.currentThread().getName()
+    a = pool.crashStorage()
+    a.alive = False
+    # not due yet
+    assert pool.crashStorage() is a
+    clock[0] += 60
+    # another thread doesn't check it: it may be in use
+    fromAnotherThread = []
+    t = threading.Thread(target=lambda: fromAnotherThread.append(pool.crashStorage(name)))
+    t.start()
+    t.join()
+    assert fromAnotherThread == [a] and not a.closed
+    b = pool.crashStorage()
+    assert b is not a and a.closed
+    assert pool.crashStorage() is b
+    statistics = pool.statistics()
+    assert statistics['failed_checks'] == 1 and statistics['reconnects'] == 1, statistics
+    assert statistics['open'] == 1 and statistics['kept'] == 1, statistics
+    # when it can't be replaced, it is forgotten
+    b.alive = False
+    clock[0] += 60
+    FakePooledCrashStorage.down = True
+    try:
+      pool.crashStorage()
+      assert False, 'expected NoConnectionException'
+    except hbc.NoConnectionException:
+      pass
+    assert name not in pool and pool.statistics()['open'] == 0
+  finally:
+    pool.cleanup()
+
+def testCrashStoragePoolChecks():
+  pool, clock, sleeps = crashStoragePoolForTest(crashStoragePoolMaximumIdle=60)
+  old = pool.acquire()
+  dead = pool.acquire()
+  fresh = pool.acquire()
+  pool.release(old)
+  clock[0] += 61
+  pool.release(dead)
+  pool.release(fresh)
+  dead.alive = False
+  t = threading.Thread(target=pool.crashStorage, name='shortLived')
+  t.start()
+  t.join()
+  pool.checkConnections()
+  assert old.closed and dead.closed and not fresh.closed
+  assert 'shortLived' not in pool
+  statistics = pool.statistics()
+  assert statistics['evicted'] == 1 and statistics['failed_checks'] == 1, statistics
+  assert statistics['reconnects'] == 1 and statistics['reclaimed'] == 1, statistics
+  # fresh, which the thread kept and which was taken back, and the replacement of dead
+  assert fresh in [x for x, releasedAt in pool.idle]
+  assert statistics['open'] == 2 and statistics['idle'] == 2, statistics
+
+def testCrashStoragePoolBackoff():
+  pool, clock, sleeps = crashStoragePoolForTest(crashStoragePoolMaximumBackoff=3)
+  FakePooledCrashStorage.down = True
+  for x in range(4):
+    try:
+      pool.acquire()
+      assert False, 'expected NoConnectionException'
+    except hbc.NoConnectionException:
+      pass
+  # no wait before the first attempt, then 1, 2 and 3 seconds
+  assert sleeps == [1, 2, 3], sleeps
+  FakePooledCrashStorage.down = False
+  pool.acquire()
+  assert sleeps == [1, 2, 3, 3], sleeps
+  pool.acquire()
+  assert len(sleeps) == 4
+  statistics = pool.statistics()
+  assert statistics['connect_failures'] == 4 and statistics['open'] == 2, statistics
@@ -1,7 +1,15 @@
 import socorro.storage.hbaseClient as hbc
+import socorro.storage.processed_crash_format as pcf
 import socorro.unittest.testlib.expectations as exp
 
+import gzip
+import itertools
+import os
 import re
+import shutil
+import tarfile
+import tempfile
+import time
 
 try:
   import json as js
@@ -646,3 +654,308 @@ def test_put_json_dump_1():
   conn.put_json_dump('abcdefghijklmnopqrstuvwxyz100102', jsonData, dumpBlob)
 
 
+
+class RecordingThriftClient(object):
+  def __init__(self, failing_table=None):
+    self.calls = []
+    self.failing_table = failing_table
+  def mutateRow(self, table, row, mutations):
+    self.calls.append(('mutateRow', table, row, mutations))
+  def mutateRows(self, table, batches):
+    if table == self.failing_table:
+      self.failing_table = None
+      raise ValueError('fail once')
+    self.calls.append(('mutateRows', table, sorted(batches)))
+  def atomicIncrement(self, table, row, column, amount):
+    self.calls.append(('atomicIncrement', table, row, column, amount))
+
+def test_put_json_dump_buffered():
+  hbcfcr = HBaseConnectionForCrashReportsWithPresetExpectations()
+  conn = hbcfcr.conn
+  fake_client = RecordingThriftClient(failing_table='crash_reports_index_submitted_time')
+  conn.client = hbc.ThriftCallCounter(fake_client, conn)
+  conn.mutationClass = lambda column, value: (column, value)
+  conn.batchMutationClass = lambda row, mutations: (row, mutations)
+  conn.write_flush_interval = 0
+  ooids = ['abcdefghijklmnopqrstuvwxyz100102', 'bbcdefghijklmnopqrstuvwxyz100102']
+  for ooid in ooids:
+    conn.put_json_dump(ooid, {"submitted_timestamp":'2010-05-04T03:10:00'}, 'dump')
+  # only the crash rows themselves and their processing queue index rows have been written
+  assert [x[:2] for x in fake_client.calls] == [('mutateRow', 'crash_reports'),
+                                                ('mutateRow', 'crash_reports_index_unprocessed_flag'),
+                                                ('mutateRow', 'crash_reports_index_legacy_unprocessed_flag')] * 2, \
+         fake_client.calls
+  try:
+    conn.flush_pending_writes()
+    assert False, 'expected the flush to fail'
+  except ValueError:
+    pass
+  assert 'crash_reports_index_submitted_time' in conn.pending_rows
+  conn.flush_pending_writes()
+  assert not conn.pending_rows and not conn.pending_counters
+  mutate_rows_calls = [x for x in fake_client.calls if x[0] == 'mutateRows']
+  assert sorted(x[1] for x in mutate_rows_calls) == ['crash_reports_index_legacy_submitted_time',
+                                                     'crash_reports_index_submitted_time'], mutate_rows_calls
+  for x in mutate_rows_calls:
+    assert [r[0][-32:] for r in x[2]] == ooids, x
+  increments = [x for x in fake_client.calls if x[0] == 'atomicIncrement']
+  # two queue counters plus two counters at each of five time levels, each sent once
+  assert len(increments) == 12, increments
+  assert set(x[4] for x in increments) == set([2]), increments
+  # 20 successful calls plus the one that failed
+  assert len(fake_client.calls) == 20, fake_client.calls
+  assert conn.round_trips == 21, conn.round_trips
+
+def test_buffered_writes_flushed_at_exit():
+  hbcfcr = HBaseConnectionForCrashReportsWithPresetExpectations()
+  conn = hbcfcr.conn
+  fake_client = RecordingThriftClient()
+  conn.client = fake_client
+  conn.write_flush_interval = 60
+  hbc._buffering_connections.add(conn)
+  conn.pending_counters[('metrics', 'crash_report_queue', 'counters:current_unprocessed_size')] = 3
+  try:
+    hbc._flush_buffering_connections()
+  finally:
+    hbc._buffering_connections.discard(conn)
+  assert fake_client.calls == [('atomicIncrement', 'metrics', 'crash_report_queue',
+                                'counters:current_unprocessed_size', 3)], fake_client.calls
+
+class FakeRawRow(object):
+  def __init__(self, row, columns):
+    self.row = row
+    self.columns = columns
+
+class StateReadingThriftClient(RecordingThriftClient):
+  """a RecordingThriftClient whose crash_reports rows all have the given processing state, but for the
+  missing ones"""
+  def __init__(self, processing_state, missing_rows=()):
+    super(StateReadingThriftClient, self).__init__()
+    self.processing_state = processing_state
+    self.missing_rows = missing_rows
+  def getRowWithColumns(self, table, row, columns):
+    self.calls.append(('getRowWithColumns', table, row))
+    if row in self.missing_rows:
+      return []
+    return [FakeRawRow(row, dict((k, ValueObject(v)) for k, v in self.processing_state.items()))]
+
+def test_fake_clients_match_the_thrift_client():
+  try:
+    import hbase.Hbase
+  except ImportError:
+    return
+  for fake in (RecordingThriftClient, StateReadingThriftClient):
+    for name in dir(fake):
+      if not name.startswith('_'):
+        assert hasattr(hbase.Hbase.Client, name), '%s.%s is not a Thrift call' % (fake.__name__, name)
+
+def test_acknowledge_ooids_as_legacy_priority_jobs():
+  hbcfcr = HBaseConnectionForCrashReportsWithPresetExpectations()
+  conn = hbcfcr.conn
+  fake_client = StateReadingThriftClient({'timestamps:submitted': '2010-05-04T03:10:00'},
+                                         missing_rows=[hbc.ooid_to_row_id('cbcdefghijklmnopqrstuvwxyz100103')])
+  conn.client = fake_client
+  conn.mutationClass = lambda column, value=None, isDelete=False: (column, value, isDelete)
+  conn.batchMutationClass = lambda row, mutations: (row, mutations)
+  result = conn.acknowledge_ooids_as_legacy_priority_jobs(['abcdefghijklmnopqrstuvwxyz100102',
+                                                           'bbcdefghijklmnopqrstuvwxyz100102',
+                                                           'cbcdefghijklmnopqrstuvwxyz100103'])
+  expected = set(['abcdefghijklmnopqrstuvwxyz100102', 'bbcdefghijklmnopqrstuvwxyz100102'])
+  assert result == expected, 'expected %s, but got %s' % (expected, result)
+  assert [x[:2] for x in fake_client.calls] == [('getRowWithColumns', 'crash_reports')] * 3 + \
+                                               [('mutateRows', 'crash_reports_index_legacy_unprocessed_flag'),
+                                                ('atomicIncrement', 'metrics')], fake_client.calls
+  # both index rows are deleted with the one mutateRows
+  expected = [(hbc.guid_to_timestamped_row_id(x, '2010-05-04T03:10:00'), [('ids:ooid', None, True)])
+              for x in sorted(expected)]
+  assert fake_client.calls[3][2] == expected, fake_client.calls[3]
+  assert fake_client.calls[4][4] == -2, fake_client.calls[4]
+
+def test_put_processed_jsons():
+  hbcfcr = HBaseConnectionForCrashReportsWithPresetExpectations()
+  conn = hbcfcr.conn
+  fake_client = StateReadingThriftClient({'flags:processed': 'N', 'timestamps:submitted': '2010-05-04T03:10:00'})
+  conn.client = fake_client
+  conn.mutationClass = lambda column, value=None, isDelete=False: (column, value, isDelete)
+  conn.batchMutationClass = lambda row, mutations: (row, mutations)
+  processed_json = {'completeddatetime': '2010-05-04T03:11:00', 'signature': 'sig'}
+  known_state = {'flags:processed': 'Y', 'timestamps:submitted': '2010-05-04T03:09:00'}
+  conn.put_processed_jsons([('abcdefghijklmnopqrstuvwxyz100102', processed_json, known_state),
+                            ('bbcdefghijklmnopqrstuvwxyz100102', processed_json, None)])
+  # only the crash whose state wasn't known is read
+  assert fake_client.calls[0] == ('getRowWithColumns', 'crash_reports',
+                                  hbc.ooid_to_row_id('bbcdefghijklmnopqrstuvwxyz100102')), fake_client.calls
+  assert [x[:2] for x in fake_client.calls[1:]] == [('mutateRows', 'crash_reports'),
+                                                    ('mutateRows', 'crash_reports_index_signature_ooid'),
+                                                    ('mutateRows', 'crash_reports_index_unprocessed_flag'),
+                                                    ('atomicIncrement', 'metrics')], fake_client.calls
+  assert [r[0] for r in fake_client.calls[2][2]] == ['sigabcdefghijklmnopqrstuvwxyz100102',
+                                                     'sigbbcdefghijklmnopqrstuvwxyz100102'], fake_client.calls[2]
+  # only the unprocessed crash leaves the unprocessed flag index
+  expected = [(hbc.guid_to_timestamped_row_id('bbcdefghijklmnopqrstuvwxyz100102', '2010-05-04T03:10:00'),
+               [('ids:ooid', None, True)])]
+  assert fake_client.calls[3][2] == expected, fake_client.calls[3]
+  assert fake_client.calls[4][4] == -1, fake_client.calls[4]
+
+def test_put_processed_jsons_without_processing_states():
+  # as when the raw crashes came from get_meta: every state is read, one row at a time
+  hbcfcr = HBaseConnectionForCrashReportsWithPresetExpectations()
+  conn = hbcfcr.conn
+  missing = 'cbcdefghijklmnopqrstuvwxyz100102'
+  fake_client = StateReadingThriftClient({'flags:processed': 'N', 'timestamps:submitted': '2010-05-04T03:10:00'},
+                                         missing_rows=[hbc.ooid_to_row_id(missing)])
+  assert not hasattr(fake_client, 'getRowsWithColumns')
+  conn.client = fake_client
+  conn.mutationClass = lambda column, value=None, isDelete=False: (column, value, isDelete)
+  conn.batchMutationClass = lambda row, mutations: (row, mutations)
+  processed_json = {'completeddatetime': '2010-05-04T03:11:00', 'signature': 'sig'}
+  ooids = ['abcdefghijklmnopqrstuvwxyz100102', 'bbcdefghijklmnopqrstuvwxyz100102', missing]
+  conn.put_processed_jsons([(x, processed_json, None) for x in ooids])
+  assert fake_client.calls[:3] == [('getRowWithColumns', 'crash_reports', hbc.ooid_to_row_id(x))
+                                   for x in ooids], fake_client.calls
+  assert [x[:2] for x in fake_client.calls[3:]] == [('mutateRows', 'crash_reports'),
+                                                    ('mutateRows', 'crash_reports_index_signature_ooid'),
+                                                    ('mutateRows', 'crash_reports_index_unprocessed_flag'),
+                                                    ('atomicIncrement', 'metrics')], fake_client.calls
+  assert len(fake_client.calls[3][2]) == 3, fake_client.calls[3]
+  # the crash whose row couldn't be read isn't in the unprocessed flag index
+  assert [r[0][-32:] for r in fake_client.calls[5][2]] == ooids[:2], fake_client.calls[5]
+  assert fake_client.calls[6][4] == -2, fake_client.calls[6]
+
+class ProcessedRowThriftClient(object):
+  """hands out a crash_reports row with the given processed_data:json"""
+  def __init__(self, stored):
+    self.stored = stored
+  def getRowWithColumns(self, table, row, columns):
+    assert columns == ['processed_data:json'], columns
+    return [FakeRawRow(row, {'processed_data:json': ValueObject(self.stored)})]
+
+def test_processed_crash_formats():
+  processed_json = {'completeddatetime': '2010-05-04T03:11:00', 'signature': 'sig', 'dump': 'OS|Linux\n' * 100}
+  for processed_crash_format in ('json', 'compressed'):
+    hbcfcr = HBaseConnectionForCrashReportsWithPresetExpectations()
+    conn = hbcfcr.conn
+    conn.processed_crash_format = processed_crash_format
+    conn.mutationClass = lambda column, value=None, isDelete=False: (column, value)
+    mutationList, sig_ooid_idx_row_key = conn._processed_row_mutations('abcdefghijklmnopqrstuvwxyz100102',
+                                                                       processed_json)
+    stored = dict(mutationList)['processed_data:json']
+    assert pcf.is_encoded(stored) == (processed_crash_format == 'compressed'), stored
+    conn.client = ProcessedRowThriftClient(stored)
+    assert conn.get_processed_json('abcdefghijklmnopqrstuvwxyz100102') == processed_json
+    without_dump = conn.get_processed_json('abcdefghijklmnopqrstuvwxyz100102', include_dump=False)
+    assert 'dump' not in without_dump and without_dump['signature'] == 'sig', without_dump
+    assert js.loads(conn.get_processed_json_as_string('abcdefghijklmnopqrstuvwxyz100102')) == processed_json
+    assert conn.get_processed_header('abcdefghijklmnopqrstuvwxyz100102') == \
+           {'completeddatetime': '2010-05-04T03:11:00', 'signature': 'sig'}
+
+class FakeScanningThriftClient(object):
+  """hands out, in batches, the rows of a table whose row keys are given"""
+  def __init__(self, rowkeys, failing_prefix=None):
+    self.rowkeys = sorted(rowkeys)
+    self.failing_prefix = failing_prefix
+    self.batch_sizes = set()
+    self.scanners_closed = 0
+  def scannerOpenWithPrefix(self, table, prefix, columns):
+    self.prefix = prefix
+    self.scanner = iter([x for x in self.rowkeys if x.startswith(prefix)])
+    return 1
+  def scannerGetList(self, scanner, number_of_rows):
+    if self.prefix == self.failing_prefix:
+      raise ValueError('scanner %s failed' % self.prefix)
+    self.batch_sizes.add(number_of_rows)
+    return [FakeRawRow(x, {'processed_data:json': ValueObject('{"row": "%s"}' % x)})
+            for x in itertools.islice(self.scanner, number_of_rows)]
+  def scannerClose(self, scanner):
+    self.scanners_closed += 1
+
+class FakeScanningConnection(hbc.HBaseConnectionForCrashReports):
+  def __init__(self, client):
+    self.client = client
+    self.closed = False
+  def close(self):
+    self.closed = True
+
+def make_scanning_connections(rowkeys, failing_prefix=None):
+  connections = []
+  def factory():
+    connections.append(FakeScanningConnection(FakeScanningThriftClient(rowkeys, failing_prefix)))
+    return connections[-1]
+  return connections, factory
+
+def salted_rowkeys(date, rows_per_salt):
+  return ['%s%s%s%025x%s' % (salt, date, salt, i, date) for salt in '0123456789abcdef' for i in range(rows_per_salt)]
+
+def wait_for(condition, seconds=5.0):
+  end = time.time() + seconds
+  while not condition() and time.time() < end:
+    time.sleep(0.01)
+  return condition()
+
+def test_parallel_union_scan_with_prefix_1():
+  rowkeys = salted_rowkeys('120504', 25)
+  connections, factory = make_scanning_connections(rowkeys + salted_rowkeys('120505', 3))
+  hbcfcr = HBaseConnectionForCrashReportsWithPresetExpectations()
+  conn = hbcfcr.conn
+  rows = list(conn.parallel_union_scan_with_prefix('crash_reports', '120504', ['processed_data:json'],
+                                                   batch_size=10, connection_factory=factory))
+  assert sorted(x['_rowkey'] for x in rows) == sorted(rowkeys)
+  assert rows[0]['processed_data:json'] == '{"row": "%s"}' % rows[0]['_rowkey']
+  assert len(connections) == 16
+  assert wait_for(lambda: all(x.closed for x in connections))
+  for x in connections:
+    assert x.client.batch_sizes == set([10]), x.client.batch_sizes
+    assert x.client.scanners_closed == 1
+
+def test_parallel_union_scan_with_prefix_2():
+  """stopping early shuts the scanners down and limited_iteration still applies"""
+  connections, factory = make_scanning_connections(salted_rowkeys('120504', 500))
+  hbcfcr = HBaseConnectionForCrashReportsWithPresetExpectations()
+  conn = hbcfcr.conn
+  rows = conn.parallel_union_scan_with_prefix('crash_reports', '120504', ['processed_data:json'],
+                                              batch_size=5, connection_factory=factory)
+  result = list(conn.limited_iteration(rows, 12))
+  assert len(result) == 12
+  rows.close()
+  assert wait_for(lambda: len(connections) == 16 and all(x.closed for x in connections))
+  for x in connections:
+    assert x.client.scanners_closed == 1
+
+def test_parallel_union_scan_with_prefix_3():
+  """a failing scanner raises its exception in the consumer"""
+  connections, factory = make_scanning_connections(salted_rowkeys('120504', 3), failing_prefix='7120504')
+  hbcfcr = HBaseConnectionForCrashReportsWithPresetExpectations()
+  conn = hbcfcr.conn
+  try:
+    list(conn.parallel_union_scan_with_prefix('crash_reports', '120504', ['processed_data:json'],
+                                              connection_factory=factory))
+    assert False, 'expected a ValueError'
+  except ValueError, x:
+    assert str(x) == 'scanner 7120504 failed'
+
+def test_export_jsonz_tarball_for_date():
+  rowkeys = salted_rowkeys('120504', 1)[:4]
+  hbcfcr = HBaseConnectionForCrashReportsWithPresetExpectations()
+  conn = hbcfcr.conn
+  def fake_scan(table, prefix, columns):
+    for x in rowkeys:
+      yield {'_rowkey': x, 'processed_data:json': '{"row": "%s"}' % x}
+  conn.parallel_union_scan_with_prefix = fake_scan
+  temp_path = tempfile.mkdtemp()
+  try:
+    tarball_name = os.path.join(temp_path, 'out.tar.gz')
+    conn.export_jsonz_tarball_for_date('120504', temp_path, tarball_name)
+    assert os.listdir(temp_path) == ['out.tar.gz']
+    tf = tarfile.open(tarball_name)
+    try:
+      names = tf.getnames()
+      ooid = hbc.row_id_to_ooid(rowkeys[0])
+      name = os.path.join(ooid[:2], ooid[2:4], ooid + '.jsonz')
+      assert name in names, names
+      assert len(names) == 4
+      content = gzip.GzipFile(fileobj=tf.extractfile(name)).read()
+      assert js.loads(content) == '{"row": "%s"}' % rowkeys[0]
+    finally:
+      tf.close()
+  finally:
+    shutil.rmtree(temp_path)
@@ -0,0 +1,78 @@
+import socorro.storage.processed_crash_format as pcf
+
+try:
+  import json as js
+except ImportError:
+  import simplejson as js
+
+processedCrash = {'uuid': 'abcdefghijklmnopqrstuvwxyz100102',
+                  'signature': 'js_Interpret',
+                  'product': 'Firefox',
+                  'version': '12.0',
+                  'date_processed': '2012-05-04 03:04:05.123456',
+                  'success': True,
+                  'addons': [['{972ce4c6-7e08-4474-a285-3208198ce6fd}', '12.0']],
+                  'dump': u'OS|Windows NT|6.1.7601 Service Pack 1\n0|0|xul.dll|js_Interpret|\xe9.cpp|123|0x1a\n' * 200}
+
+def testRoundTrip():
+  encoded = pcf.encode(processedCrash)
+  assert pcf.is_encoded(encoded)
+  assert pcf.decode(encoded) == processedCrash
+  assert len(encoded) < len(js.dumps(processedCrash)) / 10, len(encoded)
+
+def testNoDump():
+  crash = dict(processedCrash)
+  del crash['dump']
+  encoded = pcf.encode(crash)
+  assert pcf.decode(encoded) == crash
+  assert pcf.read_dump(encoded) is None
+
+def testReadHeader():
+  encoded = pcf.encode(processedCrash)
+  expected = {'uuid': 'abcdefghijklmnopqrstuvwxyz100102', 'signature': 'js_Interpret', 'product': 'Firefox',
+              'version': '12.0', 'date_processed': '2012-05-04 03:04:05.123456', 'success': True}
+  assert pcf.read_header(encoded) == expected, pcf.read_header(encoded)
+  # the header is readable even when the frames are not
+  assert pcf.read_header(encoded[:-20]) == expected
+  assert pcf.read_header(js.dumps(processedCrash)) == expected
+
+def testDumpIsInflatedOnlyWhenAskedFor():
+  encoded = pcf.encode(processedCrash)
+  header, start = pcf._split(encoded)
+  name, offset, length, codec = header['frames'][1]
+  assert name == 'dump'
+  # spoil the dump frame: only readers of the dump should notice
+  spoiled = encoded[:start + offset] + 'x' * length + encoded[start + offset + length:]
+  withoutDump = dict(processedCrash)
+  del withoutDump['dump']
+  assert pcf.decode(spoiled, include_dump=False) == withoutDump
+  try:
+    pcf.decode(spoiled)
+    assert False, 'expected ProcessedCrashFormatError'
+  except pcf.ProcessedCrashFormatError:
+    pass
+  assert pcf.read_dump(encoded) == processedCrash['dump']
+
+def testOldJsonRows():
+  stored = js.dumps(processedCrash)
+  assert not pcf.is_encoded(stored)
+  assert pcf.decode(stored) == processedCrash
+  withoutDump = pcf.decode(stored, include_dump=False)
+  assert 'dump' not in withoutDump
+  assert pcf.read_dump(stored) == processedCrash['dump']
+  assert pcf.to_json(stored) is stored
+  assert js.loads(pcf.to_json(pcf.encode(processedCrash))) == processedCrash
+
+def testUnknownVersion():
+  encoded = pcf.encode(processedCrash)
+  newer = encoded[:4] + chr(pcf.VERSION + 1) + encoded[5:]
+  try:
+    pcf.decode(newer)
+    assert False, 'expected ProcessedCrashFormatError'
+  except pcf.ProcessedCrashFormatError:
+    pass
+  try:
+    pcf.decode(pcf.MAGIC)
+    assert False, 'expected ProcessedCrashFormatError'
+  except pcf.ProcessedCrashFormatError:
+    pass
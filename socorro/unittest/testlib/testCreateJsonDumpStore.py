@@ -64,7 +64,7 @@ def testCreateTestSet():
     '%s/20071025/name/0b'%testDir:(set(['ba']), set([])),
     '%s/20071025/date/05/04'%testDir:(set(['webhead02_0']), set([])),
     '%s/20071025/name/0b/ba/61'%testDir:(set(['c5']), set([])),
-    '%s/20071025'%testDir:(set(['date', 'name']), set([])),
+    '%s/20071025'%testDir:(set(['date', 'name']), set(['journal'])),
     '%s/20071025/date/05/04/webhead02_0'%testDir:(set(['0bba61c5-dfc3-43e7-effe-8afd20071025']), set([])),
     '%s/20071025/name'%testDir:(set(['0b']), set([])),
     '%s'%testDir:(set(['20071025']), set([])),
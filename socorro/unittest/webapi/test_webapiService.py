@@ -0,0 +1,78 @@
+import json
+import unittest
+
+import socorro.lib.util as util
+import socorro.webapi.webapiService as webapi
+import socorro.unittest.testlib.util as testutil
+
+
+#------------------------------------------------------------------------------
+def setup_module():
+    testutil.nosePrintModule(__file__)
+
+
+#==============================================================================
+class ListService(webapi.JsonWebServiceBase):
+
+    def __init__(self, config, result):
+        super(ListService, self).__init__(config)
+        self.result = result
+
+    def get(self, *args):
+        return self.result
+
+
+#==============================================================================
+class TestStreamJson(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def test_is_streamed(self):
+        self.assertTrue(webapi.is_streamed({"hits": iter([])}))
+        self.assertTrue(webapi.is_streamed({"hits": (x for x in [])}))
+        self.assertFalse(webapi.is_streamed({"hits": []}))
+        self.assertFalse(webapi.is_streamed([1, 2]))
+
+    #--------------------------------------------------------------------------
+    def test_dump_is_valid_json(self):
+        hits = [{"uuid": "uuid%d" % x, "count": x} for x in range(100)]
+        result = {"hits": iter(hits), "total": 100}
+        chunks = list(webapi.stream_json(result, chunk_size=200))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual({"hits": hits, "total": 100},
+                         json.loads("".join(chunks)))
+        # the values that are not streamed come first
+        self.assertTrue(chunks[0].startswith('{"total": 100, "hits": ['))
+
+    #--------------------------------------------------------------------------
+    def test_empty_iterators(self):
+        result = {"hits": iter([]), "more": iter([])}
+        self.assertEqual({"hits": [], "more": []},
+                         json.loads("".join(webapi.stream_json(result))))
+        self.assertEqual("{}", "".join(webapi.stream_json({})))
+
+    #--------------------------------------------------------------------------
+    def test_items_are_read_while_streaming(self):
+        read = []
+
+        def hits():
+            for x in range(10):
+                read.append(x)
+                yield x
+
+        chunks = webapi.stream_json({"hits": hits()}, chunk_size=1)
+        chunks.next()
+        self.assertEqual([0], read)
+
+    #--------------------------------------------------------------------------
+    def test_get_response(self):
+        service = ListService(util.DotDict(), {"hits": [1, 2], "total": 2})
+        body, content_type = service.get_response()
+        self.assertEqual('application/json', content_type)
+        self.assertEqual({"hits": [1, 2], "total": 2}, json.loads(body))
+
+        service = ListService(util.DotDict(), {"hits": iter([1, 2]),
+                                               "total": 2})
+        body, content_type = service.get_response()
+        self.assertFalse(isinstance(body, basestring))
+        self.assertEqual({"hits": [1, 2], "total": 2},
+                         json.loads("".join(body)))
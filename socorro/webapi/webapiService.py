@@ -2,7 +2,9 @@ try:
     import json
 except ImportError:
     import simplejson as json
+import collections
 import logging
+import threading
 import web
 
 import socorro.lib.util as util
@@ -13,6 +15,25 @@ import socorro.storage.crashstorage as cs
 logger = logging.getLogger("webapi")
 
 
+# services are made anew for each request, so the ones made with the same
+# configuration share a crash storage pool
+_crash_storage_pools = {}
+_crash_storage_pools_lock = threading.Lock()
+
+
+def crash_storage_pool(config):
+    """
+    Return the crash storage pool of the services made with config.
+    """
+    with _crash_storage_pools_lock:
+        if id(config) not in _crash_storage_pools:
+            pool = cs.CrashStoragePool(config,
+                                       storageClass=config.hbaseStorageClass)
+            # the config is kept so that its id isn't reused
+            _crash_storage_pools[id(config)] = (config, pool)
+        return _crash_storage_pools[id(config)][1]
+
+
 def typeConversion(type_converters, values_to_convert):
     """
     Convert a list of values into new types and return the new list.
@@ -20,6 +41,55 @@ def typeConversion(type_converters, values_to_convert):
     return (t(v) for t, v in zip(type_converters, values_to_convert))
 
 
+def is_streamed(result):
+    """
+    Return True if result is a dict with at least one iterator value, which
+    the web layer sends as a JSON list while it iterates over it.
+    """
+    return (isinstance(result, dict) and
+            any(isinstance(v, collections.Iterator) for v in result.values()))
+
+
+def stream_json(result, chunk_size=65536):
+    """
+    Yield the JSON dump of a dict whose values may be iterators, in chunks
+    of about chunk_size bytes.
+
+    The other values come first, so that a client reading the response gets
+    a "total" before the hits.  Only the items of one chunk are held in
+    memory at a time.
+    """
+    chunk = []
+    chunk_length = 0
+    separator = "{"
+    values = sorted(result.items(),
+                    key=lambda x: isinstance(x[1], collections.Iterator))
+    for key, value in values:
+        chunk.append("%s%s: " % (separator, json.dumps(key)))
+        separator = ", "
+        if not isinstance(value, collections.Iterator):
+            chunk.append(json.dumps(value))
+            continue
+        item_separator = "["
+        for item in value:
+            item = json.dumps(item)
+            chunk.append(item_separator)
+            chunk.append(item)
+            item_separator = ", "
+            chunk_length += len(item) + 2
+            if chunk_length >= chunk_size:
+                yield "".join(chunk)
+                chunk = []
+                chunk_length = 0
+        if item_separator == "[":
+            chunk.append("[")
+        chunk.append("]")
+    if separator == "{":
+        chunk.append("{")
+    chunk.append("}")
+    yield "".join(chunk)
+
+
 class Timeout(web.webapi.HTTPError):
 
     """
@@ -55,14 +125,16 @@ class JsonWebServiceBase(object):
         Return a JSON dump of the returned value,
         or the raw result if a content type was returned.
 
+        A dict with iterator values is dumped while it is sent, see
+        stream_json.
+
         """
         try:
-            result = self.get(*args)
-            if isinstance(result, tuple):
-                web.header('Content-Type', result[1])
-                return result[0]
-            web.header('Content-Type', 'application/json')
-            return json.dumps(result)
+            body, content_type = self.get_response(*args)
+            web.header('Content-Type', content_type)
+            if not isinstance(body, basestring):
+                return self.log_stream_errors(body)
+            return body
         except web.webapi.HTTPError:
             raise
         except Exception:
@@ -74,6 +146,35 @@ class JsonWebServiceBase(object):
                 pass
             raise Exception(stringLogger.getMessages())
 
+    def get_response(self, *args):
+        """
+        Call the get method and return its result as a (body, content type)
+        tuple.  The body is an iterator of chunks if the result is streamed.
+
+        """
+        result = self.get(*args)
+        if isinstance(result, tuple):
+            return result[0], result[1]
+        if is_streamed(result):
+            chunk_size = self.context.get('streamingChunkSize', 65536)
+            return stream_json(result, chunk_size), 'application/json'
+        return json.dumps(result), 'application/json'
+
+    def log_stream_errors(self, chunks):
+        """
+        Yield the chunks of a streamed response, logging the errors that
+        happen while it is sent, after GET returned.
+        """
+        try:
+            for chunk in chunks:
+                yield chunk
+        except Exception:
+            try:
+                util.reportExceptionAndContinue(self.context.logger)
+            except (AttributeError, KeyError):
+                util.reportExceptionAndContinue(logger)
+            raise
+
     def get(self, *args):
         raise NotImplementedError(
                     "The GET function has not been implemented for %s" % args)
@@ -118,7 +219,6 @@ class JsonServiceBase(JsonWebServiceBase):
         super(JsonServiceBase, self).__init__(config)
         try:
             self.database = db.Database(config)
-            self.crashStoragePool = cs.CrashStoragePool(config,
-                                        storageClass=config.hbaseStorageClass)
+            self.crashStoragePool = crash_storage_pool(config)
         except (AttributeError, KeyError):
             util.reportExceptionAndContinue(logger)